@@ -1,20 +1,34 @@
-from flask import Flask, request, jsonify, render_template, session, redirect, url_for
+from flask import Flask, Response, stream_with_context, request, jsonify, render_template, session, redirect, url_for
 from sqlalchemy.orm import Session
 from sqlalchemy import func
-from models import DataSource, TableMetadata, ColumnMetadata, ExtractionHistory, TableRelationship, ETLTask
-from db_manager import get_db_session
-from extractor_base import (
-    MySQLMetadataExtractor, 
-    PostgreSQLMetadataExtractor, 
-    SQLServerMetadataExtractor, 
-    OracleMetadataExtractor,
-    StarRocksMetadataExtractor
-)
+from models import DataSource, TableMetadata, ColumnMetadata, ExtractionHistory, TableRelationship, ETLTask, ExtractionProfile
+from db_manager import get_db_session, get_pool_status, install_replica_routing
+from extractor_base import EXTRACTOR_MAP
+from extraction_service import run_extraction, resume_extraction, cancel_extraction
+from extraction_orchestrator import ExtractionOrchestrator, get_run_summary
+from extraction_worker import JobQueue
+from source_throttle import get_throttle, parse_throttle_config
+from metrics import REGISTRY, CONTENT_TYPE, instrument_app
+from etl_logger import read_run_log
+from extraction_stats import slowest_tables, slowest_sources, predict_duration
+from storage_growth import table_trend, source_trend, top_growing_tables
+from schema_history import schema_history, schema_version_detail, schema_at
+from schema_diff import load_catalog, iter_schema_diff, diff_catalogs
+from relationship_graph import get_graph, find_join_path, find_impact, invalidate_graph
+from relationship_inference import infer_relationships
+from column_profiling import profile_datasource, table_profile
+from catalog_export import export_catalog, export_content_type, export_filename
+from catalog_snapshot import import_snapshot
+from extraction_lock import get_lock
+from history_retention import purge_history, daily_history, total_extracted_tables, parse_retention_days, retention_days
 from datetime import datetime, timezone, timedelta
 from auth import login_required, admin_required, permission_required, login_user, logout_user, get_current_user, has_permission, init_auth_tables, create_user, update_user, delete_user, get_all_users, get_user_by_id, change_user_password
+import hmac
 import json
 import os
-from exceptions import DataSourceNotFoundException, ExtractionException, ValidationException, DatabaseConnectionException
+import tempfile
+from urllib.parse import quote
+from exceptions import DataSourceNotFoundException, ExtractionException, ValidationException, DatabaseConnectionException, ExtractionInProgressException
 import logging
 
 # 定义北京时区（UTC+8）
@@ -66,14 +80,33 @@ def create_app():
     from config import Config
     init_db_manager(Config.DATABASE_URL)
     
-    # 数据库类型到抽取器的映射
-    EXTRACTOR_MAP = {
-        'mysql': MySQLMetadataExtractor,
-        'postgresql': PostgreSQLMetadataExtractor,
-        'sqlserver': SQLServerMetadataExtractor,
-        'oracle': OracleMetadataExtractor,
-        'starrocks': StarRocksMetadataExtractor
-    }
+    # 记录各路由的请求耗时
+    instrument_app(app)
+    
+    # GET 请求的读操作发往只读副本（配置了 DB_REPLICA_URLS 时）
+    install_replica_routing(app)
+    
+    @app.route('/metrics', methods=['GET'])
+    def get_metrics():
+        """Prometheus 文本格式的运行指标，配置了 METRICS_TOKEN 时需要携带 Bearer 令牌"""
+        if Config.METRICS_TOKEN:
+            auth_header = request.headers.get('Authorization', '')
+            if not hmac.compare_digest(auth_header, f'Bearer {Config.METRICS_TOKEN}'):
+                return jsonify({'error': '未授权访问'}), 401
+        try:
+            return Response(REGISTRY.render(), content_type=CONTENT_TYPE)
+        except Exception as e:
+            logging.error(f"生成指标失败: {str(e)}")
+            return jsonify({'error': f'生成指标失败: {str(e)}'}), 500
+
+    @app.route('/api/system/db-pool', methods=['GET'])
+    @admin_required
+    def get_db_pool_status():
+        """本进程元数据库连接池的配置和使用情况"""
+        status = get_pool_status()
+        if status is None:
+            return jsonify({'error': '数据库管理器未初始化'}), 503
+        return jsonify(status)
     
     @app.route('/api/data-sources', methods=['GET'])
     @login_required
@@ -203,6 +236,99 @@ def create_app():
             logging.error(f"更新数据源失败: {str(e)}")
             return jsonify({'error': f'更新数据源失败: {str(e)}'}), 500
     
+    @app.route('/api/data-sources/<int:source_id>/throttle', methods=['GET'])
+    @login_required
+    def get_data_source_throttle(source_id):
+        """获取数据源的限流配置（包含全局默认值）及当前限流状态"""
+        try:
+            with get_db_session() as session:
+                source = session.query(DataSource).filter(DataSource.id == source_id).first()
+                if not source:
+                    return jsonify({'error': '数据源不存在'}), 404
+                throttle = get_throttle(source)
+                return jsonify({
+                    'datasource_id': source.id,
+                    'custom_config': json.loads(source.throttle_config) if source.throttle_config else None,
+                    'effective_config': throttle.config,
+                    'backoff_level': throttle.backoff_level,
+                    'in_quiet_hours': throttle.in_quiet_hours()
+                })
+        except ValidationException as e:
+            return jsonify({'error': str(e)}), 400
+        except Exception as e:
+            logging.error(f"获取限流配置失败: {str(e)}")
+            return jsonify({'error': f'获取限流配置失败: {str(e)}'}), 500
+    
+    @app.route('/api/data-sources/<int:source_id>/throttle', methods=['PUT'])
+    @login_required
+    @permission_required('manage_datasources')
+    def update_data_source_throttle(source_id):
+        """更新数据源的限流配置，传空对象恢复为全局默认值"""
+        try:
+            data = request.get_json(silent=True)
+            if data is None or not isinstance(data, dict):
+                return jsonify({'error': '限流配置必须是JSON对象'}), 400
+            effective = parse_throttle_config(data)
+            
+            with get_db_session() as session:
+                source = session.query(DataSource).filter(DataSource.id == source_id).first()
+                if not source:
+                    return jsonify({'error': '数据源不存在'}), 404
+                source.throttle_config = json.dumps(data, ensure_ascii=False) if data else None
+                source.updated_at = datetime.utcnow()
+            
+            return jsonify({'datasource_id': source_id, 'custom_config': data or None, 'effective_config': effective})
+        except ValidationException as e:
+            return jsonify({'error': str(e)}), 400
+        except Exception as e:
+            logging.error(f"更新限流配置失败: {str(e)}")
+            return jsonify({'error': f'更新限流配置失败: {str(e)}'}), 500
+    
+    @app.route('/api/data-sources/<int:source_id>/retention', methods=['GET'])
+    @login_required
+    def get_data_source_retention(source_id):
+        """获取数据源的抽取历史保留天数"""
+        try:
+            with get_db_session() as session:
+                source = session.query(DataSource).filter(DataSource.id == source_id).first()
+                if not source:
+                    return jsonify({'error': '数据源不存在'}), 404
+                return jsonify({
+                    'datasource_id': source.id,
+                    'history_retention_days': source.history_retention_days,
+                    'effective_retention_days': retention_days(source)
+                })
+        except Exception as e:
+            logging.error(f"获取保留配置失败: {str(e)}")
+            return jsonify({'error': f'获取保留配置失败: {str(e)}'}), 500
+    
+    @app.route('/api/data-sources/<int:source_id>/retention', methods=['PUT'])
+    @login_required
+    @permission_required('manage_datasources')
+    def update_data_source_retention(source_id):
+        """更新数据源的抽取历史保留天数，传 null 恢复为全局默认值，0 表示永久保留"""
+        try:
+            data = request.get_json(silent=True)
+            if not isinstance(data, dict):
+                return jsonify({'error': '保留配置必须是JSON对象'}), 400
+            days = parse_retention_days(data.get('history_retention_days'))
+            
+            with get_db_session() as session:
+                source = session.query(DataSource).filter(DataSource.id == source_id).first()
+                if not source:
+                    return jsonify({'error': '数据源不存在'}), 404
+                source.history_retention_days = days
+                source.updated_at = datetime.utcnow()
+                effective = retention_days(source)
+            
+            return jsonify({'datasource_id': source_id, 'history_retention_days': days,
+                            'effective_retention_days': effective})
+        except ValidationException as e:
+            return jsonify({'error': str(e)}), 400
+        except Exception as e:
+            logging.error(f"更新保留配置失败: {str(e)}")
+            return jsonify({'error': f'更新保留配置失败: {str(e)}'}), 500
+    
     @app.route('/api/data-sources/<int:source_id>', methods=['DELETE'])
     @login_required
     @permission_required('manage_datasources')
@@ -254,206 +380,136 @@ def create_app():
             logging.error(f"测试连接失败: {str(e)}")
             return jsonify({'success': False, 'error': f'连接测试失败: {str(e)}'}), 500
     
+    @app.route('/api/data-sources/<int:source_id>/extraction-lock', methods=['GET'])
+    @login_required
+    def get_extraction_lock(source_id):
+        """查询数据源的抽取锁：正在执行的运行、持有进程和锁到期时间"""
+        try:
+            lock = get_lock(source_id)
+            return jsonify({'datasource_id': source_id, 'locked': lock is not None, 'lock': lock})
+        except Exception as e:
+            logging.error(f"查询抽取锁失败: {str(e)}")
+            return jsonify({'error': f'查询抽取锁失败: {str(e)}'}), 500
+    
     @app.route('/api/data-sources/<int:source_id>/extract', methods=['POST'])
     @login_required
     def extract_metadata(source_id):
         """抽取指定数据源的元数据"""
-        from etl_logger import ETLLogger
-        import time
-
-        start_time = time.time()
-        history_record_id = None
-
         try:
-            with get_db_session() as session:
-                source = session.query(DataSource).filter(DataSource.id == source_id).first()
-                if not source:
-                    return jsonify({'error': '数据源不存在'}), 404
-
-                # 根据数据库类型选择对应的抽取器
-                if source.type not in EXTRACTOR_MAP:
-                    return jsonify({'error': f'不支持的数据库类型: {source.type}'}), 400
-
-                extractor_class = EXTRACTOR_MAP[source.type]
-                extractor = extractor_class(source)
-
-                # 创建执行中的记录
-                history_record = ExtractionHistory(
-                    datasource_id=source.id,
-                    status='running',
-                    message='正在抽取元数据...',
-                    extracted_tables=0
-                )
-                session.add(history_record)
-                session.flush()
-                history_record_id = history_record.id
-                session.commit()
-
-                # 执行元数据抽取
-                result = extractor.extract_all_metadata()
-
-                if result['status'] == 'success' or (result.get('tables') and len(result['tables']) > 0):
-                    # 即使抽数部分失败，只要有表数据就保存
-                    # 清除旧的元数据（保留历史数据，但清空关联的表和列数据）
-                    # 获取该数据源下的所有表
-                    existing_tables = session.query(TableMetadata).filter(
-                        TableMetadata.datasource_id == source.id
-                    ).all()
-
-                    ETLLogger.log_clear_old_metadata(source.id, len(existing_tables))
-
-                    # 删除所有关联的列、表和关系数据
-                    for table in existing_tables:
-                        # 删除关联的列
-                        session.query(ColumnMetadata).filter(
-                            ColumnMetadata.table_id == table.id
-                        ).delete()
-
-                        # 删除关联的关系
-                        session.query(TableRelationship).filter(
-                            TableRelationship.table_id == table.id
-                        ).delete()
-                        session.query(TableRelationship).filter(
-                            TableRelationship.referenced_table_id == table.id
-                        ).delete()
-
-                    # 删除表本身
-                    session.query(TableMetadata).filter(
-                        TableMetadata.datasource_id == source.id
-                    ).delete()
-
-                    # 创建新的元数据
-                    # 首先创建所有表并建立表名到ID的映射
-                    table_mapping = {}
-                    columns_count = 0
-                    for table_data in result.get('tables', []):
-                        table_info = table_data['table_info']
-
-                        # 创建新表记录
-                        table_meta = TableMetadata(
-                            table_name=table_info['table_name'],
-                            schema_name=table_info['schema_name'],
-                            row_count=table_info['row_count'],
-                            size_bytes=table_info['size_bytes'],
-                            comment=table_info['comment'],
-                            datasource_id=source.id
-                        )
-                        session.add(table_meta)
-                        session.flush()  # 获取自动生成的ID
-
-                        # 存储表名到ID的映射
-                        table_mapping[f"{table_info['schema_name']}.{table_info['table_name']}"] = table_meta.id
-
-                        # 处理列元数据
-                        for col_data in table_data['columns']:
-                            columns_count += 1
-                            column_meta = ColumnMetadata(
-                                column_name=col_data['column_name'],
-                                data_type=col_data['data_type'],
-                                is_nullable=col_data['is_nullable'],
-                                default_value=col_data['default_value'],
-                                column_comment=col_data['column_comment'],
-                                ordinal_position=col_data['ordinal_position'],
-                                table_id=table_meta.id
-                            )
-                            session.add(column_meta)
-
-                    # 创建关联关系（如果有）
-                    relationships_count = 0
-                    if result.get('relationships'):
-                        for relationship in result.get('relationships', []):
-                            # 根据不同数据库类型调整键的格式
-                            if source.type == 'mysql':
-                                table_name_key = f"{source.database}.{relationship['table_name']}"
-                                referenced_table_name_key = f"{source.database}.{relationship['referenced_table_name']}"
-                            elif source.type == 'postgresql':
-                                table_name_key = f"public.{relationship['table_name']}"  # PostgreSQL通常使用public schema
-                                referenced_table_name_key = f"public.{relationship['referenced_table_name']}"
-                            elif source.type == 'sqlserver':
-                                table_name_key = f"dbo.{relationship['table_name']}"  # SQL Server通常使用dbo schema
-                                referenced_table_name_key = f"dbo.{relationship['referenced_table_name']}"
-                            elif source.type == 'oracle':
-                                table_name_key = f"{source.username.upper()}.{relationship['table_name']}"  # Oracle schema通常是用户名
-                                referenced_table_name_key = f"{source.username.upper()}.{relationship['referenced_table_name']}"
-                            else:
-                                table_name_key = f"{source.database}.{relationship['table_name']}"
-                                referenced_table_name_key = f"{source.database}.{relationship['referenced_table_name']}"
-
-                            table_id = table_mapping.get(table_name_key)
-                            referenced_table_id = table_mapping.get(referenced_table_name_key)
-
-                            if table_id and referenced_table_id:
-                                relationships_count += 1
-                                rel = TableRelationship(
-                                    constraint_name=relationship.get('constraint_name'),
-                                    table_id=table_id,
-                                    referenced_table_id=referenced_table_id,
-                                    column_name=relationship['column_name'],
-                                    referenced_column_name=relationship['referenced_column_name'],
-                                    constraint_type=relationship.get('constraint_type', 'FOREIGN KEY')
-                                )
-                                session.add(rel)
-
-                    ETLLogger.log_save_metadata(
-                        source.id,
-                        len(result.get('tables', [])),
-                        columns_count,
-                        relationships_count
-                    )
-
-                    # 如果关联关系获取失败，更新抽取历史记录
-                    if result['status'] != 'success' and relationships_count == 0:
-                        result['status'] = 'partial_success'
-                        history_record.message = f"部分成功：已抽取 {len(result.get('tables', []))} 个表和 {columns_count} 个列，但关联关系获取失败"
-
-                duration = time.time() - start_time
-                ETLLogger.get_logger().info(f"抽数总耗时: {duration:.2f}秒")
-
-                # 更新历史记录状态
-                history_record.status = result['status']
-                history_record.message = result.get('message', '')
-                history_record.extracted_tables = result.get('tables_count', 0)
-                history_record.duration = int(duration)
-
-                # 如果关联关系获取失败，更新抽取历史记录
-                if result['status'] != 'success' and relationships_count == 0:
-                    history_record.status = 'partial_success'
-                    history_record.message = f"部分成功：已抽取 {len(result.get('tables', []))} 个表和 {columns_count} 个列，但关联关系获取失败"
-
-                session.commit()
-
-                return jsonify(result)
+            result = run_extraction(source_id, task_type='full')
+            if result['status'] == 'failed':
+                return jsonify({'error': f"元数据抽取失败: {result.get('message', '')}", **result}), 500
+            return jsonify(result)
         except DataSourceNotFoundException as e:
-            if history_record_id:
-                with get_db_session() as session:
-                    history = session.query(ExtractionHistory).filter(ExtractionHistory.id == history_record_id).first()
-                    if history:
-                        history.status = 'failed'
-                        history.message = f"数据源不存在: {str(e)}"
-                        session.commit()
-            return jsonify({'error': str(e)}), 404
+            return jsonify({'error': '数据源不存在'}), 404
+        except ValidationException as e:
+            return jsonify({'error': str(e)}), 400
+        except ExtractionInProgressException as e:
+            return jsonify({'error': str(e), 'status': 'running', 'coalesced': True, **e.holder}), 409
         except ExtractionException as e:
-            if history_record_id:
-                with get_db_session() as session:
-                    history = session.query(ExtractionHistory).filter(ExtractionHistory.id == history_record_id).first()
-                    if history:
-                        history.status = 'failed'
-                        history.message = f"抽取异常: {str(e)}"
-                        session.commit()
             return jsonify({'error': str(e)}), 500
         except Exception as e:
-            if history_record_id:
-                with get_db_session() as session:
-                    history = session.query(ExtractionHistory).filter(ExtractionHistory.id == history_record_id).first()
-                    if history:
-                        history.status = 'failed'
-                        history.message = f"元数据抽取失败: {str(e)}"
-                        session.commit()
             # 捕获所有异常并返回JSON格式错误
-            ETLLogger.get_logger().error(f"元数据抽取失败: {str(e)}")
             logging.error(f"元数据抽取失败: {str(e)}")
             return jsonify({'error': f'元数据抽取失败: {str(e)}'}), 500
     
+    @app.route('/api/orchestration-runs', methods=['POST'])
+    @login_required
+    @permission_required('manage_etl')
+    def start_orchestration_run():
+        """启动批量抽取编排运行（后台执行）"""
+        try:
+            data = request.get_json(silent=True) or {}
+            source_ids = data.get('datasource_ids')
+            if source_ids is not None and not isinstance(source_ids, list):
+                return jsonify({'error': 'datasource_ids 必须是数组'}), 400
+            for field in ('max_workers', 'per_host_limit', 'per_engine_limit'):
+                value = data.get(field)
+                if value is not None and (isinstance(value, bool) or not isinstance(value, int) or value <= 0):
+                    return jsonify({'error': f'{field} 必须是正整数'}), 400
+            
+            orchestrator = ExtractionOrchestrator(
+                max_workers=data.get('max_workers'),
+                per_host_limit=data.get('per_host_limit'),
+                per_engine_limit=data.get('per_engine_limit'),
+                task_type=data.get('task_type', 'full')
+            )
+            run_id = orchestrator.start(source_ids, triggered_by=session.get('username'))
+            return jsonify(get_run_summary(run_id)), 202
+        except ValidationException as e:
+            return jsonify({'error': str(e)}), 400
+        except Exception as e:
+            logging.error(f"启动编排运行失败: {str(e)}")
+            return jsonify({'error': f'启动编排运行失败: {str(e)}'}), 500
+    
+    @app.route('/api/orchestration-runs/<int:run_id>', methods=['GET'])
+    @login_required
+    def get_orchestration_run(run_id):
+        """获取编排运行的聚合记录"""
+        try:
+            summary = get_run_summary(run_id)
+            if not summary:
+                return jsonify({'error': '编排运行不存在'}), 404
+            return jsonify(summary)
+        except Exception as e:
+            logging.error(f"获取编排运行失败: {str(e)}")
+            return jsonify({'error': f'获取编排运行失败: {str(e)}'}), 500
+    
+    @app.route('/api/extraction-jobs', methods=['POST'])
+    @login_required
+    @permission_required('manage_etl')
+    def enqueue_extraction_jobs():
+        """提交抽取作业到队列，由独立的抽取工作进程执行"""
+        try:
+            data = request.get_json(silent=True) or {}
+            source_ids = data.get('datasource_ids')
+            if not source_ids or not isinstance(source_ids, list):
+                return jsonify({'error': 'datasource_ids 必须是非空数组'}), 400
+            
+            queue = JobQueue()
+            jobs = queue.enqueue_many(
+                source_ids,
+                task_type=data.get('task_type', 'full'),
+                priority=data.get('priority', 0),
+                requested_by=session.get('username')
+            )
+            return jsonify({'jobs': jobs}), 202
+        except DataSourceNotFoundException as e:
+            return jsonify({'error': str(e)}), 404
+        except ValidationException as e:
+            return jsonify({'error': str(e)}), 400
+        except Exception as e:
+            logging.error(f"提交抽取作业失败: {str(e)}")
+            return jsonify({'error': f'提交抽取作业失败: {str(e)}'}), 500
+    
+    @app.route('/api/extraction-jobs', methods=['GET'])
+    @login_required
+    def get_extraction_jobs():
+        """获取抽取作业列表"""
+        try:
+            jobs = JobQueue().list_jobs(
+                status=request.args.get('status', type=str),
+                datasource_id=request.args.get('datasource_id', type=int),
+                limit=min(request.args.get('limit', 100, type=int), 1000)
+            )
+            return jsonify({'jobs': jobs})
+        except Exception as e:
+            logging.error(f"获取抽取作业失败: {str(e)}")
+            return jsonify({'error': f'获取抽取作业失败: {str(e)}'}), 500
+    
+    @app.route('/api/extraction-jobs/<int:job_id>', methods=['GET'])
+    @login_required
+    def get_extraction_job(job_id):
+        """获取单个抽取作业"""
+        try:
+            job = JobQueue().get_job(job_id)
+            if not job:
+                return jsonify({'error': '抽取作业不存在'}), 404
+            return jsonify(job)
+        except Exception as e:
+            logging.error(f"获取抽取作业失败: {str(e)}")
+            return jsonify({'error': f'获取抽取作业失败: {str(e)}'}), 500
+    
     @app.route('/api/etl-tasks', methods=['GET'])
     @login_required
     def get_etl_tasks():
@@ -618,204 +674,32 @@ def create_app():
     @permission_required('manage_etl')
     def execute_etl_task(task_id):
         """执行ETL任务 - 进行元数据抽取"""
-        start_time = datetime.utcnow()
-        history_record_id = None
-
         try:
             with get_db_session() as session:
                 task = session.query(ETLTask).filter(ETLTask.id == task_id).first()
                 if not task:
                     return jsonify({'error': 'ETL任务不存在'}), 404
-
-                # 获取关联的数据源
-                source = session.query(DataSource).filter(DataSource.id == task.datasource_id).first()
-                if not source:
-                    return jsonify({'error': '数据源不存在'}), 404
-
-                # 根据数据库类型选择对应的抽取器
-                if source.type not in EXTRACTOR_MAP:
-                    return jsonify({'error': f'不支持的数据库类型: {source.type}'}), 400
-
-                extractor_class = EXTRACTOR_MAP[source.type]
-                extractor = extractor_class(source)
-
-                # 创建执行中的记录
-                history_record = ExtractionHistory(
-                    datasource_id=source.id,
-                    status='running',
-                    message=f'正在执行ETL任务: {task.name}...',
-                    extracted_tables=0,
-                    etl_task_id=task.id
-                )
-                session.add(history_record)
-                session.flush()
-                history_record_id = history_record.id
-                session.commit()
-
-                # 根据任务类型选择抽取方法
+                datasource_id = task.datasource_id
                 task_type = task.task_type
 
-                if task_type == 'full':
-                    # 全量抽取
-                    result = extractor.extract_all_metadata()
-                    full_extraction = True
-                elif task_type == 'incremental':
-                    # 增量抽取：获取上次执行时间
-                    last_history = session.query(ExtractionHistory).filter(
-                        ExtractionHistory.etl_task_id == task_id
-                    ).order_by(ExtractionHistory.extraction_time.desc()).first()
+            result = run_extraction(datasource_id, task_type=task_type, etl_task_id=task_id)
 
-                    last_sync_time = last_history.extraction_time if last_history else None
-                    result = extractor.extract_incremental_metadata(last_sync_time)
-                    full_extraction = False
-                elif task_type == 'schema_only':
-                    # 仅结构抽取
-                    result = extractor.extract_schema_only_metadata()
-                    full_extraction = True
-                else:
-                    return jsonify({'error': f'不支持的任务类型: {task_type}'}), 400
-
-                # 计算耗时
-                end_time = datetime.utcnow()
-                duration = int((end_time - start_time).total_seconds())
-
-                # 更新任务执行时间
-                task.last_run = end_time
-
-                # 更新历史记录
-                history_record.status = result['status']
-                history_record.message = result.get('message', '')
-                history_record.extracted_tables = result.get('tables_count', 0)
-                history_record.duration = duration
-
-                if result['status'] == 'success':
-                    if full_extraction:
-                        # 全量抽取和仅结构抽取：清除旧数据
-                        existing_tables = session.query(TableMetadata).filter(
-                            TableMetadata.datasource_id == source.id
-                        ).all()
-
-                        for table in existing_tables:
-                            session.query(ColumnMetadata).filter(
-                                ColumnMetadata.table_id == table.id
-                            ).delete()
-                            session.query(TableRelationship).filter(
-                                TableRelationship.table_id == table.id
-                            ).delete()
-                            session.query(TableRelationship).filter(
-                                TableRelationship.referenced_table_id == table.id
-                            ).delete()
-
-                        session.query(TableMetadata).filter(
-                            TableMetadata.datasource_id == source.id
-                        ).delete()
-                    # 增量抽取不清除旧数据
-
-                    # 创建/更新新的元数据
-                    table_mapping = {}
-                    for table_data in result['tables']:
-                        table_info = table_data['table_info']
-                        table_key = f"{table_info['schema_name']}.{table_info['table_name']}"
-
-                        # 增量抽取：检查表是否已存在
-                        existing_table = None
-                        if not full_extraction:
-                            existing_table = session.query(TableMetadata).filter(
-                                TableMetadata.datasource_id == source.id,
-                                TableMetadata.table_name == table_info['table_name'],
-                                TableMetadata.schema_name == table_info['schema_name']
-                            ).first()
-
-                        if existing_table:
-                            # 更新现有表
-                            existing_table.row_count = table_info['row_count']
-                            existing_table.size_bytes = table_info['size_bytes']
-                            existing_table.comment = table_info['comment']
-                            existing_table.updated_at = datetime.utcnow()
-                            table_meta = existing_table
-
-                            # 删除旧字段
-                            session.query(ColumnMetadata).filter(
-                                ColumnMetadata.table_id == existing_table.id
-                            ).delete()
-                        else:
-                            # 创建新表
-                            table_meta = TableMetadata(
-                                table_name=table_info['table_name'],
-                                schema_name=table_info['schema_name'],
-                                row_count=table_info['row_count'],
-                                size_bytes=table_info['size_bytes'],
-                                comment=table_info['comment'],
-                                datasource_id=source.id
-                            )
-                            session.add(table_meta)
-                            session.flush()
-
-                        table_mapping[table_key] = table_meta.id
-
-                        # 添加/更新字段
-                        for col_data in table_data['columns']:
-                            column_meta = ColumnMetadata(
-                                column_name=col_data['column_name'],
-                                data_type=col_data['data_type'],
-                                is_nullable=col_data['is_nullable'],
-                                default_value=col_data['default_value'],
-                                column_comment=col_data['column_comment'],
-                                ordinal_position=col_data['ordinal_position'],
-                                table_id=table_meta.id
-                            )
-                            session.add(column_meta)
-
-                    # 只有全量抽取才创建关联关系
-                    if full_extraction and 'relationships' in result:
-                        for relationship in result.get('relationships', []):
-                            if source.type == 'mysql':
-                                table_name_key = f"{source.database}.{relationship['table_name']}"
-                                referenced_table_name_key = f"{source.database}.{relationship['referenced_table_name']}"
-                            elif source.type == 'postgresql':
-                                table_name_key = f"public.{relationship['table_name']}"
-                                referenced_table_name_key = f"public.{relationship['referenced_table_name']}"
-                            elif source.type == 'sqlserver':
-                                table_name_key = f"dbo.{relationship['table_name']}"
-                                referenced_table_name_key = f"dbo.{relationship['referenced_table_name']}"
-                            elif source.type == 'oracle':
-                                table_name_key = f"{source.username.upper()}.{relationship['table_name']}"
-                                referenced_table_name_key = f"{source.username.upper()}.{relationship['referenced_table_name']}"
-                            else:
-                                table_name_key = f"{source.database}.{relationship['table_name']}"
-                                referenced_table_name_key = f"{source.database}.{relationship['referenced_table_name']}"
-
-                            table_id = table_mapping.get(table_name_key)
-                            referenced_table_id = table_mapping.get(referenced_table_name_key)
-
-                            if table_id and referenced_table_id:
-                                rel = TableRelationship(
-                                    constraint_name=relationship.get('constraint_name'),
-                                    table_id=table_id,
-                                    referenced_table_id=referenced_table_id,
-                                    column_name=relationship['column_name'],
-                                    referenced_column_name=relationship['referenced_column_name'],
-                                    constraint_type=relationship.get('constraint_type', 'FOREIGN KEY')
-                                )
-                                session.add(rel)
-
-                session.commit()
-
-                return jsonify({
-                    'success': result['status'] == 'success',
-                    'status': result['status'],
-                    'message': result.get('message', ''),
-                    'tables_count': result.get('tables_count', 0),
-                    'extraction_type': result.get('extraction_type', 'full')
-                })
+            return jsonify({
+                'success': result['status'] == 'success',
+                'status': result['status'],
+                'message': result.get('message', ''),
+                'tables_count': result.get('tables_count', 0),
+                'extraction_type': result.get('extraction_type', 'full'),
+                'history_id': result.get('history_id'),
+                'coalesced': result.get('coalesced', False)
+            })
+        except DataSourceNotFoundException as e:
+            return jsonify({'error': '数据源不存在'}), 404
+        except ValidationException as e:
+            return jsonify({'error': str(e)}), 400
+        except ExtractionInProgressException as e:
+            return jsonify({'error': str(e), 'status': 'running', 'coalesced': True, **e.holder}), 409
         except Exception as e:
-            if history_record_id:
-                with get_db_session() as session:
-                    history = session.query(ExtractionHistory).filter(ExtractionHistory.id == history_record_id).first()
-                    if history:
-                        history.status = 'failed'
-                        history.message = f"执行ETL任务失败: {str(e)}"
-                        session.commit()
             logging.error(f"执行ETL任务失败: {str(e)}")
             return jsonify({'error': f'执行ETL任务失败: {str(e)}'}), 500
     
@@ -926,7 +810,8 @@ def create_app():
                             'column_name': rel.column_name,
                             'referenced_table_name': referenced_table.table_name if referenced_table else 'Unknown',
                             'referenced_column_name': rel.referenced_column_name,
-                            'constraint_type': rel.constraint_type
+                            'constraint_type': rel.constraint_type,
+                            'confidence': rel.confidence
                         })
                     else:
                         # 当前表是被引用表
@@ -939,7 +824,8 @@ def create_app():
                             'column_name': rel.column_name,
                             'referencing_table_name': referencing_table.table_name if referencing_table else 'Unknown',
                             'referencing_column_name': rel.column_name,
-                            'constraint_type': rel.constraint_type
+                            'constraint_type': rel.constraint_type,
+                            'confidence': rel.confidence
                         })
                 
                 return jsonify({
@@ -1014,7 +900,7 @@ def create_app():
                     ColumnMetadata.table_id == table_id
                 ).order_by(ColumnMetadata.ordinal_position).all()
                 
-            return jsonify([{
+                return jsonify([{
                     'id': col.id,
                     'column_name': col.column_name,
                     'data_type': col.data_type,
@@ -1063,6 +949,33 @@ def create_app():
             logging.error(f"更新字段注释失败: {str(e)}")
             return jsonify({'error': f'更新字段注释失败: {str(e)}'}), 500
     
+    @app.route('/api/extraction-history/daily', methods=['GET'])
+    @login_required
+    def get_extraction_history_daily():
+        """按天统计的抽取运行，包含已超过保留期被清理的记录"""
+        try:
+            days = request.args.get('days', 90, type=int)
+            datasource_id = request.args.get('datasource_id', type=int)
+            return jsonify({'days': days, 'daily': daily_history(datasource_id, days)})
+        except Exception as e:
+            logging.error(f"获取按天抽取统计失败: {str(e)}")
+            return jsonify({'error': f'获取按天抽取统计失败: {str(e)}'}), 500
+    
+    @app.route('/api/extraction-history/purge', methods=['POST'])
+    @login_required
+    @permission_required('manage_etl')
+    def purge_extraction_history():
+        """清理超过保留期的抽取历史（先汇总、归档再删除），dry_run 时只统计"""
+        try:
+            data = request.get_json(silent=True) or {}
+            result = purge_history(data.get('datasource_id'), dry_run=bool(data.get('dry_run')))
+            return jsonify(result)
+        except DataSourceNotFoundException as e:
+            return jsonify({'error': str(e)}), 404
+        except Exception as e:
+            logging.error(f"清理抽取历史失败: {str(e)}")
+            return jsonify({'error': f'清理抽取历史失败: {str(e)}'}), 500
+    
     @app.route('/api/extraction-history', methods=['GET'])
     @login_required
     def get_extraction_history():
@@ -1092,6 +1005,12 @@ def create_app():
                     ExtractionHistory.extraction_time.desc()
                 ).offset((page - 1) * per_page).limit(per_page).all()
                 
+                # 运行中的记录附带预计耗时
+                running = {(record.datasource_id, record.task_type) for record in history_records
+                           if record.status == 'running'}
+                expected = {(source_id, task_type): predict_duration(source_id, task_type)['expected_seconds']
+                            for source_id, task_type in running}
+                
                 return jsonify({
                     'history': [{
                         'id': record.id,
@@ -1102,7 +1021,15 @@ def create_app():
                         'status': record.status,
                         'message': record.message,
                         'extracted_tables': record.extracted_tables,
-                        'duration': record.duration
+                        'duration': record.duration,
+                        'task_type': record.task_type,
+                        'total_tables': record.total_tables,
+                        'checkpointed_tables': record.checkpointed_tables,
+                        'checkpoint_cursor': record.checkpoint_cursor,
+                        'resumed_from_id': record.resumed_from_id,
+                        'cancel_requested': bool(record.cancel_requested),
+                        'details': json.loads(record.details) if record.details else None,
+                        'expected_duration': expected.get((record.datasource_id, record.task_type))
                     } for record in history_records],
                     'pagination': {
                         'page': page,
@@ -1115,6 +1042,419 @@ def create_app():
             logging.error(f"获取抽取历史失败: {str(e)}")
             return jsonify({'error': f'获取抽取历史失败: {str(e)}'}), 500
     
+    @app.route('/api/extraction-history/<int:history_id>/resume', methods=['POST'])
+    @login_required
+    @permission_required('manage_etl')
+    def resume_extraction_history(history_id):
+        """从失败运行的检查点恢复抽取"""
+        try:
+            result = resume_extraction(history_id)
+            if result['status'] == 'failed':
+                return jsonify({'error': f"元数据抽取失败: {result.get('message', '')}", **result}), 500
+            return jsonify(result)
+        except DataSourceNotFoundException as e:
+            return jsonify({'error': '数据源不存在'}), 404
+        except ValidationException as e:
+            return jsonify({'error': str(e)}), 400
+        except ExtractionInProgressException as e:
+            return jsonify({'error': str(e), 'status': 'running', 'coalesced': True, **e.holder}), 409
+        except ExtractionException as e:
+            return jsonify({'error': str(e)}), 500
+        except Exception as e:
+            logging.error(f"恢复抽取失败: {str(e)}")
+            return jsonify({'error': f'恢复抽取失败: {str(e)}'}), 500
+    
+    @app.route('/api/extraction-history/<int:history_id>/cancel', methods=['POST'])
+    @login_required
+    @permission_required('manage_etl')
+    def cancel_extraction_history(history_id):
+        """取消正在执行的抽取，已抽取的部分会保留"""
+        try:
+            return jsonify(cancel_extraction(history_id))
+        except ValidationException as e:
+            return jsonify({'error': str(e)}), 400
+        except Exception as e:
+            logging.error(f"取消抽取失败: {str(e)}")
+            return jsonify({'error': f'取消抽取失败: {str(e)}'}), 500
+    
+    @app.route('/api/extraction-history/<int:history_id>/profile', methods=['GET'])
+    @login_required
+    def get_extraction_profile(history_id):
+        """获取抽取运行的查询剖析结果（按阶段、语句汇总的耗时、行数和错误）"""
+        try:
+            with get_db_session() as session:
+                record = session.query(ExtractionProfile).filter(
+                    ExtractionProfile.history_id == history_id
+                ).first()
+                if not record:
+                    return jsonify({'error': '该抽取记录没有剖析数据'}), 404
+
+                return jsonify({
+                    'history_id': record.history_id,
+                    'datasource_id': record.datasource_id,
+                    'created_at': format_datetime(record.created_at),
+                    **json.loads(record.profile)
+                })
+        except Exception as e:
+            logging.error(f"获取抽取剖析失败: {str(e)}")
+            return jsonify({'error': f'获取抽取剖析失败: {str(e)}'}), 500
+    
+    @app.route('/api/extraction-history/<int:history_id>/logs', methods=['GET'])
+    @login_required
+    def get_extraction_logs(history_id):
+        """
+        查询单次抽取运行的ETL日志
+        参数：tail（最后N条）、level（最低级别）、event（事件类型）、table（表名）、q（消息包含的文本）、limit
+        """
+        try:
+            result = read_run_log(
+                history_id,
+                tail=request.args.get('tail', type=int),
+                level=request.args.get('level', type=str),
+                event=request.args.get('event', type=str),
+                table=request.args.get('table', type=str),
+                contains=request.args.get('q', type=str),
+                limit=request.args.get('limit', 1000, type=int)
+            )
+            return jsonify(result)
+        except ValidationException as e:
+            return jsonify({'error': str(e)}), 400
+        except Exception as e:
+            logging.error(f"查询抽取日志失败: {str(e)}")
+            return jsonify({'error': f'查询抽取日志失败: {str(e)}'}), 500
+    
+    @app.route('/api/extraction-stats/tables', methods=['GET'])
+    @login_required
+    def get_slowest_tables():
+        """跨运行统计平均抽取耗时最长的表，参数：datasource_id、days、limit"""
+        try:
+            return jsonify({'tables': slowest_tables(
+                datasource_id=request.args.get('datasource_id', type=int),
+                days=request.args.get('days', 30, type=int),
+                limit=min(request.args.get('limit', 20, type=int), 200)
+            )})
+        except Exception as e:
+            logging.error(f"获取表抽取统计失败: {str(e)}")
+            return jsonify({'error': f'获取表抽取统计失败: {str(e)}'}), 500
+    
+    @app.route('/api/extraction-stats/sources', methods=['GET'])
+    @login_required
+    def get_slowest_sources():
+        """跨运行统计平均运行耗时最长的数据源，参数：days、limit"""
+        try:
+            return jsonify({'sources': slowest_sources(
+                days=request.args.get('days', 30, type=int),
+                limit=min(request.args.get('limit', 20, type=int), 200)
+            )})
+        except Exception as e:
+            logging.error(f"获取数据源抽取统计失败: {str(e)}")
+            return jsonify({'error': f'获取数据源抽取统计失败: {str(e)}'}), 500
+    
+    @app.route('/api/data-sources/<int:datasource_id>/eta', methods=['GET'])
+    @login_required
+    def get_extraction_eta(datasource_id):
+        """预测数据源下一次抽取的耗时，参数：task_type"""
+        try:
+            task_type = request.args.get('task_type', type=str)
+            return jsonify(dict(predict_duration(datasource_id, task_type),
+                                datasource_id=datasource_id, task_type=task_type))
+        except Exception as e:
+            logging.error(f"预测抽取耗时失败: {str(e)}")
+            return jsonify({'error': f'预测抽取耗时失败: {str(e)}'}), 500
+    
+    @app.route('/api/data-sources/<int:datasource_id>/growth', methods=['GET'])
+    @login_required
+    def get_source_growth(datasource_id):
+        """数据源所有表合计的容量趋势，参数：days、granularity（day, week, month）"""
+        try:
+            return jsonify(source_trend(datasource_id,
+                                        days=request.args.get('days', 90, type=int),
+                                        granularity=request.args.get('granularity', type=str)))
+        except ValidationException as e:
+            return jsonify({'error': str(e)}), 400
+        except Exception as e:
+            logging.error(f"获取数据源容量趋势失败: {str(e)}")
+            return jsonify({'error': f'获取数据源容量趋势失败: {str(e)}'}), 500
+    
+    @app.route('/api/data-sources/<int:datasource_id>/tables/<path:table_name>/growth', methods=['GET'])
+    @login_required
+    def get_table_growth(datasource_id, table_name):
+        """单表的容量趋势，参数：days、granularity（raw, day, week, month）"""
+        try:
+            return jsonify(table_trend(datasource_id, table_name,
+                                       days=request.args.get('days', 90, type=int),
+                                       granularity=request.args.get('granularity', type=str)))
+        except ValidationException as e:
+            return jsonify({'error': str(e)}), 400
+        except Exception as e:
+            logging.error(f"获取表容量趋势失败: {str(e)}")
+            return jsonify({'error': f'获取表容量趋势失败: {str(e)}'}), 500
+    
+    @app.route('/api/storage-growth/top', methods=['GET'])
+    @login_required
+    def get_top_growing_tables():
+        """增长最快的表，参数：days、limit、metric（size_bytes, row_count）、datasource_id"""
+        try:
+            return jsonify({'tables': top_growing_tables(
+                days=request.args.get('days', 30, type=int),
+                limit=min(request.args.get('limit', 10, type=int), 100),
+                metric=request.args.get('metric', 'size_bytes', type=str),
+                datasource_id=request.args.get('datasource_id', type=int)
+            )})
+        except ValidationException as e:
+            return jsonify({'error': str(e)}), 400
+        except Exception as e:
+            logging.error(f"获取增长最快的表失败: {str(e)}")
+            return jsonify({'error': f'获取增长最快的表失败: {str(e)}'}), 500
+    
+    def _format_version(version):
+        return dict(version, created_at=format_datetime(version['created_at']))
+    
+    @app.route('/api/data-sources/<int:datasource_id>/schema-versions', methods=['GET'])
+    @login_required
+    def get_schema_versions(datasource_id):
+        """数据源的结构版本历史，参数：table（只看涉及该表的版本）、column（与 table 一起使用）、limit"""
+        try:
+            versions = schema_history(
+                datasource_id,
+                table_name=request.args.get('table', type=str),
+                column_name=request.args.get('column', type=str),
+                limit=min(request.args.get('limit', 50, type=int), 500)
+            )
+            return jsonify({'versions': [_format_version(version) for version in versions]})
+        except Exception as e:
+            logging.error(f"获取结构版本历史失败: {str(e)}")
+            return jsonify({'error': f'获取结构版本历史失败: {str(e)}'}), 500
+    
+    @app.route('/api/data-sources/<int:datasource_id>/schema-versions/<int:version>', methods=['GET'])
+    @login_required
+    def get_schema_version(datasource_id, version):
+        """单个结构版本的增量（新增、删除、修改的表和字段）"""
+        try:
+            detail = schema_version_detail(datasource_id, version)
+            if not detail:
+                return jsonify({'error': '结构版本不存在'}), 404
+            return jsonify(_format_version(detail))
+        except Exception as e:
+            logging.error(f"获取结构版本失败: {str(e)}")
+            return jsonify({'error': f'获取结构版本失败: {str(e)}'}), 500
+    
+    @app.route('/api/data-sources/<int:datasource_id>/schema', methods=['GET'])
+    @login_required
+    def get_schema_at(datasource_id):
+        """重建数据源在某个版本或时间点的结构，参数：version 或 at（ISO时间，不带时区时按UTC）"""
+        try:
+            at = request.args.get('at', type=str)
+            if at:
+                try:
+                    at = datetime.fromisoformat(at)
+                except ValueError:
+                    return jsonify({'error': f'无效的时间: {at}'}), 400
+                if at.tzinfo is not None:
+                    at = at.astimezone(timezone.utc).replace(tzinfo=None)
+            schema = schema_at(datasource_id, version=request.args.get('version', type=int), at=at)
+            if not schema:
+                return jsonify({'error': '该数据源在指定版本或时间点没有结构记录'}), 404
+            return jsonify(_format_version(schema))
+        except Exception as e:
+            logging.error(f"获取历史结构失败: {str(e)}")
+            return jsonify({'error': f'获取历史结构失败: {str(e)}'}), 500
+    
+    @app.route('/api/schema-diff', methods=['POST'])
+    @login_required
+    def post_schema_diff():
+        """
+        比较两个目录的表结构
+        请求体：{left: {datasource_id, version?, at?, history_id?}, right: {...}, ignore_case?, match_schema?, stream?}
+        stream 为 true 时以 NDJSON 逐条输出差异，最后一行为汇总
+        """
+        try:
+            data = request.get_json() or {}
+            ignore_case = bool(data.get('ignore_case', True))
+            match_schema = bool(data.get('match_schema', False))
+            if not data.get('stream'):
+                return jsonify(diff_catalogs(data.get('left'), data.get('right'), ignore_case, match_schema))
+
+            left_description, left = load_catalog(data.get('left'))
+            right_description, right = load_catalog(data.get('right'))
+
+            def generate():
+                yield json.dumps({'type': 'catalogs', 'left': left_description, 'right': right_description},
+                                 ensure_ascii=False) + '\n'
+                for event in iter_schema_diff(left, right, ignore_case, match_schema):
+                    yield json.dumps(event, ensure_ascii=False) + '\n'
+
+            return Response(stream_with_context(generate()), mimetype='application/x-ndjson')
+        except DataSourceNotFoundException as e:
+            return jsonify({'error': str(e)}), 404
+        except ValidationException as e:
+            return jsonify({'error': str(e)}), 400
+        except Exception as e:
+            logging.error(f"比较表结构失败: {str(e)}")
+            return jsonify({'error': f'比较表结构失败: {str(e)}'}), 500
+    
+    @app.route('/api/data-sources/<int:datasource_id>/export', methods=['GET'])
+    @login_required
+    def export_datasource_catalog(datasource_id):
+        """
+        流式导出数据源的表、字段和关联关系
+        参数：format=jsonl|csv|parquet，compression=gzip|zstd
+        """
+        try:
+            fmt = request.args.get('format', 'jsonl')
+            compression = request.args.get('compression') or None
+            chunks = export_catalog(datasource_id, fmt, compression)
+            with get_db_session() as session:
+                source_name = session.query(DataSource.name).filter(DataSource.id == datasource_id).scalar()
+            filename = quote(export_filename(source_name, fmt, compression))
+            return Response(stream_with_context(chunks), mimetype=export_content_type(fmt, compression),
+                            headers={'Content-Disposition': f"attachment; filename*=UTF-8''{filename}"})
+        except DataSourceNotFoundException as e:
+            return jsonify({'error': str(e)}), 404
+        except ValidationException as e:
+            return jsonify({'error': str(e)}), 400
+        except Exception as e:
+            logging.error(f"导出目录失败: {str(e)}")
+            return jsonify({'error': f'导出目录失败: {str(e)}'}), 500
+    
+    @app.route('/api/data-sources/<int:datasource_id>/snapshot-import', methods=['POST'])
+    @login_required
+    @permission_required('manage_etl')
+    def import_datasource_snapshot(datasource_id):
+        """导入离线抽取的目录快照（multipart 上传的 file 字段），按增量差异更新元数据"""
+        upload = request.files.get('file')
+        if not upload:
+            return jsonify({'error': '缺少快照文件 file'}), 400
+        # 上传的快照先落盘，导入时流式读取两遍（校验、导入）
+        handle, path = tempfile.mkstemp(suffix='.snapshot.gz')
+        try:
+            with os.fdopen(handle, 'wb') as file:
+                upload.save(file)
+            return jsonify(import_snapshot(datasource_id, path))
+        except DataSourceNotFoundException as e:
+            return jsonify({'error': str(e)}), 404
+        except ValidationException as e:
+            return jsonify({'error': str(e)}), 400
+        except ExtractionInProgressException as e:
+            return jsonify({'error': str(e), **e.holder}), 409
+        except Exception as e:
+            logging.error(f"导入快照失败: {str(e)}")
+            return jsonify({'error': f'导入快照失败: {str(e)}'}), 500
+        finally:
+            os.remove(path)
+
+    @app.route('/api/tables/<int:table_id>/join-path', methods=['GET'])
+    @login_required
+    def get_join_path(table_id):
+        """两个表之间最短的关联路径，参数：to（目标表ID）、max_depth"""
+        try:
+            target_table_id = request.args.get('to', type=int)
+            if not target_table_id:
+                return jsonify({'error': '缺少目标表参数 to'}), 400
+            return jsonify(find_join_path(table_id, target_table_id, request.args.get('max_depth', type=int)))
+        except ValidationException as e:
+            return jsonify({'error': str(e)}), 400
+        except Exception as e:
+            logging.error(f"查询关联路径失败: {str(e)}")
+            return jsonify({'error': f'查询关联路径失败: {str(e)}'}), 500
+    
+    @app.route('/api/tables/<int:table_id>/impact', methods=['GET'])
+    @login_required
+    def get_table_impact(table_id):
+        """
+        表的影响范围，参数：direction（upstream：传递引用该表的表；downstream：该表传递引用的表）、max_depth、limit
+        """
+        try:
+            return jsonify(find_impact(
+                table_id,
+                direction=request.args.get('direction', 'upstream', type=str),
+                max_depth=request.args.get('max_depth', type=int),
+                limit=min(request.args.get('limit', 1000, type=int), 100000)
+            ))
+        except ValidationException as e:
+            return jsonify({'error': str(e)}), 400
+        except Exception as e:
+            logging.error(f"查询影响范围失败: {str(e)}")
+            return jsonify({'error': f'查询影响范围失败: {str(e)}'}), 500
+    
+    @app.route('/api/data-sources/<int:datasource_id>/relationship-graph', methods=['GET'])
+    @login_required
+    def get_relationship_graph_stats(datasource_id):
+        """数据源关联关系图索引的概况（表数、关联数、版本），必要时触发重建"""
+        try:
+            return jsonify(get_graph(datasource_id).stats())
+        except Exception as e:
+            logging.error(f"获取关联关系图失败: {str(e)}")
+            return jsonify({'error': f'获取关联关系图失败: {str(e)}'}), 500
+    
+    @app.route('/api/data-sources/<int:datasource_id>/infer-relationships', methods=['POST'])
+    @login_required
+    @permission_required('manage_etl')
+    def infer_datasource_relationships(datasource_id):
+        """按命名规则推断数据源的关联关系，dry_run 时只返回结果不保存"""
+        try:
+            data = request.get_json(silent=True) or {}
+            sample_size = data.get('sample_size')
+            min_confidence = data.get('min_confidence')
+            if sample_size is not None and (not isinstance(sample_size, int) or sample_size < 0):
+                return jsonify({'error': 'sample_size 必须是非负整数'}), 400
+            if min_confidence is not None and (not isinstance(min_confidence, (int, float)) or not 0 <= min_confidence <= 1):
+                return jsonify({'error': 'min_confidence 必须在 0 到 1 之间'}), 400
+            dry_run = bool(data.get('dry_run', False))
+            
+            with get_db_session() as session:
+                source = session.query(DataSource).filter(DataSource.id == datasource_id).first()
+                if not source:
+                    return jsonify({'error': '数据源不存在'}), 404
+                result = infer_relationships(session, source, sample_size=sample_size,
+                                             min_confidence=min_confidence, dry_run=dry_run)
+            if not dry_run:
+                invalidate_graph(datasource_id)
+            return jsonify(dict(result, datasource_id=datasource_id, dry_run=dry_run))
+        except Exception as e:
+            logging.error(f"推断关联关系失败: {str(e)}")
+            return jsonify({'error': f'推断关联关系失败: {str(e)}'}), 500
+    
+    @app.route('/api/data-sources/<int:datasource_id>/profile', methods=['POST'])
+    @login_required
+    @permission_required('manage_etl')
+    def profile_datasource_columns(datasource_id):
+        """在时间预算内对数据源的字段抽样画像"""
+        try:
+            data = request.get_json(silent=True) or {}
+            budget_seconds = data.get('budget_seconds')
+            sample_rows = data.get('sample_rows')
+            tables = data.get('tables')
+            if budget_seconds is not None and (not isinstance(budget_seconds, (int, float)) or budget_seconds <= 0):
+                return jsonify({'error': 'budget_seconds 必须是正数'}), 400
+            if sample_rows is not None and (not isinstance(sample_rows, int) or sample_rows <= 0):
+                return jsonify({'error': 'sample_rows 必须是正整数'}), 400
+            if tables is not None and not isinstance(tables, list):
+                return jsonify({'error': 'tables 必须是数组'}), 400
+            
+            return jsonify(profile_datasource(datasource_id, budget_seconds=budget_seconds,
+                                              sample_rows=sample_rows, table_names=tables))
+        except DataSourceNotFoundException:
+            return jsonify({'error': '数据源不存在'}), 404
+        except ValidationException as e:
+            return jsonify({'error': str(e)}), 400
+        except Exception as e:
+            logging.error(f"字段画像失败: {str(e)}")
+            return jsonify({'error': f'字段画像失败: {str(e)}'}), 500
+    
+    @app.route('/api/tables/<int:table_id>/profile', methods=['GET'])
+    @login_required
+    def get_table_profile(table_id):
+        """获取表的字段画像"""
+        try:
+            profile = table_profile(table_id)
+            if profile is None:
+                return jsonify({'error': '表不存在'}), 404
+            return jsonify(profile)
+        except Exception as e:
+            logging.error(f"获取字段画像失败: {str(e)}")
+            return jsonify({'error': f'获取字段画像失败: {str(e)}'}), 500
+    
     @app.route('/api/overview')
     @login_required
     def get_overview():
@@ -1130,10 +1470,8 @@ def create_app():
                 # 获取字段数量
                 columns_count = session.query(ColumnMetadata).count()
                 
-                # 获取总数据量
-                total_size = session.query(ExtractionHistory).with_entities(
-                    func.sum(ExtractionHistory.extracted_tables)
-                ).scalar() or 0
+                # 获取总数据量（保留期内的明细加上已清理记录的按天汇总）
+                total_size = total_extracted_tables(session)
                 
                 # 获取最近抽取记录
                 recent_extraction = session.query(ExtractionHistory).order_by(
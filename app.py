@@ -3,6 +3,7 @@ import sys
 from api import create_app
 from db_manager import init_db_manager
 from auth import init_auth_tables
+from models import init_database
 from config import Config
 import logging
 
@@ -36,6 +37,11 @@ def initialize_system():
         init_db_manager(Config.DATABASE_URL)
         print("数据库管理器初始化完成")
         
+        # 初始化元数据表（补齐新增的表和字段）
+        print("正在初始化元数据表...")
+        init_database()
+        print("元数据表初始化完成")
+        
         # 初始化认证表
         print("正在初始化认证表...")
         init_auth_tables()
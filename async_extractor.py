@@ -0,0 +1,430 @@
+"""
+基于asyncio的元数据抽取引擎
+
+面向网络往返延迟较高的远程数据源：
+1. 有异步驱动的数据库（MySQL/StarRocks: aiomysql/asyncmy，PostgreSQL: asyncpg）使用SQLAlchemy异步引擎
+2. 只有同步驱动的数据库（SQL Server: pyodbc，Oracle: oracledb 厚模式等）将查询放到线程池中执行
+3. 每个数据源内的各表目录查询通过有界信号量并发执行，多个数据源的I/O在同一进程内重叠
+
+抽取结果与 MetadataExtractorBase.extract_metadata 的返回结构一致，
+各数据库的目录查询SQL直接复用同步抽取器中的实现
+"""
+import asyncio
+import copy
+import importlib.util
+import logging
+import time
+from concurrent.futures import ThreadPoolExecutor
+from typing import Dict, Any, List, Optional, Callable, Iterable, Tuple
+
+from sqlalchemy import create_engine
+from sqlalchemy.engine import make_url
+
+from config import Config
+from models import DataSource
+from db_config import get_connection_string
+from extractor_base import MetadataExtractorBase, get_extractor_class, is_transient_error, retry_delay
+from extraction_timeout import apply_statement_timeout, is_statement_timeout, CancellationToken
+from etl_logger import ETLLogger
+from exceptions import DatabaseConnectionException, ValidationException, ExtractionCancelledException
+
+try:
+    from sqlalchemy.ext.asyncio import create_async_engine
+except ImportError:  # greenlet 不可用时只能使用线程池方式
+    create_async_engine = None
+
+
+# 重试退避期间检查取消令牌的间隔（秒）
+BACKOFF_POLL_SECONDS = 0.1
+
+# 数据库类型可用的异步驱动：(驱动模块名, SQLAlchemy驱动名)，按优先级排列
+ASYNC_DRIVERS = {
+    'mysql': [('asyncmy', 'asyncmy'), ('aiomysql', 'aiomysql')],
+    'starrocks': [('asyncmy', 'asyncmy'), ('aiomysql', 'aiomysql')],
+    'postgresql': [('asyncpg', 'asyncpg')],
+}
+
+
+def get_async_driver(db_type: str) -> Optional[str]:
+    """
+    获取数据库类型可用的异步驱动名
+    :return: SQLAlchemy驱动名，没有可用的异步驱动时返回None
+    """
+    if create_async_engine is None:
+        return None
+    for module_name, driver_name in ASYNC_DRIVERS.get(db_type, []):
+        if importlib.util.find_spec(module_name) is not None:
+            return driver_name
+    return None
+
+
+class AsyncMetadataExtractor:
+    """
+    异步元数据抽取器
+    包装对应数据库类型的同步抽取器，复用其目录查询
+    """
+
+    def __init__(self, datasource: DataSource, concurrency: int = None):
+        extractor_class = get_extractor_class(datasource.type)
+        if not extractor_class:
+            raise ValidationException(f"不支持的数据库类型: {datasource.type}")
+        self.datasource = datasource
+        self.extractor: MetadataExtractorBase = extractor_class(datasource)
+        self.concurrency = concurrency or Config.ASYNC_PER_SOURCE_CONCURRENCY
+        # 每个连接顺序执行语句，限制连接并发数即限制了同时执行的语句数
+        self.throttle = self.extractor.throttle
+        if self.throttle.max_concurrent:
+            self.concurrency = min(self.concurrency, self.throttle.max_concurrent)
+        self.async_driver = get_async_driver(datasource.type)
+        self.engine = None
+        self._executor = None
+
+    @property
+    def profiler(self):
+        """查询剖析器，设置在被包装的同步抽取器上，绑定连接的副本共用"""
+        return self.extractor.profiler
+
+    @profiler.setter
+    def profiler(self, profiler):
+        self.extractor.profiler = profiler
+
+    def table_key(self, table_name: str):
+        """表在检查点中的键，与被包装的同步抽取器一致"""
+        return self.extractor.table_key(table_name)
+
+    @property
+    def mode(self) -> str:
+        """执行方式：async（异步驱动）或 thread（线程池）"""
+        return 'async' if self.async_driver else 'thread'
+
+    def _bind(self, connection) -> MetadataExtractorBase:
+        """复制一个绑定到指定连接的同步抽取器，使各表的查询可以在不同连接上并发执行"""
+        bound = copy.copy(self.extractor)
+        bound.connection = connection
+        return bound
+
+    def _connection_string(self) -> str:
+        connection_string = get_connection_string(
+            db_type=self.datasource.type,
+            host=self.datasource.host,
+            port=self.datasource.port,
+            username=self.datasource.username,
+            password=self.datasource.password,
+            database=self.datasource.database
+        )
+        if self.async_driver:
+            url = make_url(connection_string)
+            connection_string = url.set(drivername=f"{url.get_backend_name()}+{self.async_driver}")
+        return connection_string
+
+    async def connect(self):
+        """创建连接池，池大小与单数据源并发数一致"""
+        try:
+            pool_args = {'pool_size': self.concurrency, 'max_overflow': 0, 'pool_pre_ping': True}
+            if self.async_driver:
+                self.engine = create_async_engine(self._connection_string(), **pool_args)
+                apply_statement_timeout(self.engine.sync_engine, self.datasource.type)
+                self.throttle.instrument(self.engine.sync_engine, blocking=False)
+                if self.profiler:
+                    self.profiler.instrument(self.engine.sync_engine)
+                async with self.engine.connect() as conn:
+                    await conn.run_sync(lambda c: None)
+            else:
+                # 独立的线程池，避免与其他数据源共用默认线程池导致并发数被压低
+                self._executor = ThreadPoolExecutor(max_workers=self.concurrency,
+                                                    thread_name_prefix=f'async-extract-{self.datasource.id}')
+                self.engine = create_engine(self._connection_string(), **pool_args)
+                apply_statement_timeout(self.engine, self.datasource.type)
+                self.throttle.instrument(self.engine)
+                if self.profiler:
+                    self.profiler.instrument(self.engine)
+                await self._to_thread(self._check_sync_connection)
+            ETLLogger.log_connection_success(self.datasource.name, self.datasource.type)
+        except Exception as e:
+            ETLLogger.log_connection_failed(self.datasource.name, self.datasource.type, str(e))
+            logging.error(f"连接数据库失败: {str(e)}")
+            raise DatabaseConnectionException(f"连接数据库失败: {str(e)}")
+
+    def _check_sync_connection(self):
+        with self.engine.connect():
+            pass
+
+    async def disconnect(self):
+        """释放连接池"""
+        try:
+            if self.engine is not None:
+                if self.async_driver:
+                    await self.engine.dispose()
+                else:
+                    await self._to_thread(self.engine.dispose)
+        except Exception as e:
+            logging.error(f"断开数据库连接失败: {str(e)}")
+        finally:
+            self.engine = None
+            if self._executor is not None:
+                self._executor.shutdown(wait=False)
+                self._executor = None
+
+    async def _to_thread(self, fn, *args):
+        return await asyncio.get_running_loop().run_in_executor(self._executor, fn, *args)
+
+    def _run_sync_with_connection(self, fn):
+        """线程池方式：从同步连接池取出连接执行"""
+        with self.engine.connect() as conn:
+            return fn(self._bind(conn))
+
+    async def run(self, fn):
+        """
+        在一个独立连接上执行基于同步抽取器的函数
+        :param fn: 接收绑定连接的抽取器并返回结果的函数
+        """
+        if self.async_driver:
+            # 异步驱动的每条语句在 before_cursor_execute 中等待限流，不阻塞事件循环
+            async with self.engine.connect() as conn:
+                return await conn.run_sync(lambda sync_conn: fn(self._bind(sync_conn)))
+        return await self._to_thread(self._run_sync_with_connection, fn)
+
+    def _in_phase(self, name: str, fn):
+        """在执行语句的线程（或greenlet）中标记剖析阶段后调用fn"""
+        with self.extractor._phase(name):
+            return fn()
+
+    @staticmethod
+    async def _backoff(delay: float, cancel_token: Optional[CancellationToken]) -> bool:
+        """
+        重试前等待，不阻塞事件循环；取消或到达截止时间时提前结束
+        :return: 是否已取消
+        """
+        if cancel_token is None:
+            await asyncio.sleep(delay)
+            return False
+        end = time.monotonic() + delay
+        while not cancel_token.is_cancelled():
+            remaining = end - time.monotonic()
+            if cancel_token.remaining() is not None:
+                remaining = min(remaining, cancel_token.remaining())
+            if remaining <= 0:
+                break
+            await asyncio.sleep(min(remaining, BACKOFF_POLL_SECONDS))
+        return cancel_token.is_cancelled()
+
+    async def _extract_one(self, semaphore: asyncio.Semaphore, table_name: str, include_stats: bool,
+                           last_sync_time: str = None,
+                           cancel_token: Optional[CancellationToken] = None) -> Optional[Dict[str, Any]]:
+        """抽取单个表，瞬时错误按指数退避重试，返回None表示增量抽取时表未变更"""
+        async with semaphore:
+            # 排队期间可能已被取消或超过截止时间
+            if cancel_token and cancel_token.is_cancelled():
+                raise ExtractionCancelledException(cancel_token.reason)
+            table_start_time = time.time()
+
+            def work(extractor: MetadataExtractorBase):
+                with extractor._table_scope(table_name):
+                    if last_sync_time and not extractor.is_table_changed(table_name, last_sync_time):
+                        return None
+                    return extractor.extract_table(table_name, include_stats)
+
+            attempt = 0
+            while True:
+                try:
+                    # 每次执行都从连接池取连接，失效的连接由 pool_pre_ping 替换
+                    table_data = await self.run(work)
+                    break
+                except Exception as e:
+                    attempt += 1
+                    if attempt > Config.EXTRACTION_TABLE_RETRIES or not is_transient_error(e):
+                        self.extractor._record_table(table_name, time.time() - table_start_time, error=e)
+                        raise
+                    delay = retry_delay(attempt)
+                    logging.warning(f"抽取表 {table_name} 遇到瞬时错误，{delay:.1f}秒后第 {attempt} 次重试: {str(e)}")
+                    if await self._backoff(delay, cancel_token):
+                        raise ExtractionCancelledException(cancel_token.reason)
+
+            if table_data is not None:
+                self.extractor._record_table(table_name, time.time() - table_start_time, table_data)
+                ETLLogger.log_table_extracted(
+                    table_name,
+                    table_data['table_info']['row_count'],
+                    table_data['table_info']['size_bytes'],
+                    time.time() - table_start_time,
+                    column_count=len(table_data['columns'])
+                )
+            return table_data
+
+    async def extract_metadata_async(self, full: bool = True, include_stats: bool = True,
+                                     last_sync_time: str = None,
+                                     skip_tables: Optional[Iterable[Tuple[str, str]]] = None,
+                                     on_batch: Optional[Callable[[List[Dict[str, Any]]], None]] = None,
+                                     batch_size: int = None,
+                                     cancel_token: Optional[CancellationToken] = None) -> Dict[str, Any]:
+        """
+        异步抽取元数据，参数和返回结构与 MetadataExtractorBase.extract_metadata 一致
+        检查点回调在线程中执行，不阻塞事件循环
+        """
+        start_time = time.time()
+        skip_tables = set(skip_tables or [])
+        batch_size = batch_size or Config.EXTRACTION_BATCH_SIZE
+        ETLLogger.log_extraction_start(self.datasource.id, self.datasource.name, self.datasource.type)
+        ETLLogger.get_logger().info(f"异步抽取模式: {self.mode}, 单数据源并发数: {self.concurrency}")
+
+        tables_data = []
+        delivered_tables = 0
+        batch_lock = asyncio.Lock()
+        checkpoint_errors = []
+        tasks: List[asyncio.Future] = []
+
+        def deliver(batch: List[Dict[str, Any]]):
+            with self.extractor._phase('checkpoint'):
+                on_batch(batch)
+
+        async def flush(force: bool = False):
+            nonlocal tables_data, delivered_tables
+            async with batch_lock:
+                if not tables_data or (not force and len(tables_data) < batch_size):
+                    return
+                batch, tables_data = tables_data, []
+                await asyncio.to_thread(deliver, batch)
+                delivered_tables += len(batch)
+
+        async def extract_and_collect(table_name: str):
+            table_data = await self._extract_one(semaphore, table_name, include_stats, sync_time, cancel_token)
+            if table_data is not None:
+                tables_data.append(table_data)
+                if on_batch:
+                    try:
+                        await flush()
+                    except Exception as e:
+                        checkpoint_errors.append(e)
+                        # 检查点写入失败即整次抽取失败，不再等待其余的表
+                        current = asyncio.current_task()
+                        for task in tasks:
+                            if task is not current:
+                                task.cancel()
+
+        try:
+            with self.extractor._phase('connect'):
+                await self.connect()
+            table_names = await self.run(lambda extractor: self._in_phase('table_list', extractor.get_table_list))
+            ETLLogger.get_logger().info(f"发现 {len(table_names)} 个表")
+            if skip_tables:
+                ETLLogger.get_logger().info(f"从检查点恢复，跳过已完成的 {len(skip_tables)} 个表")
+            table_names = [table_name for table_name in table_names
+                           if self.table_key(table_name) not in skip_tables]
+
+            semaphore = asyncio.Semaphore(self.concurrency)
+            sync_time = last_sync_time if not full else None
+            tasks.extend(asyncio.ensure_future(extract_and_collect(table_name)) for table_name in table_names)
+            results = await asyncio.gather(*tasks, return_exceptions=True)
+
+            # 检查点写入失败视为整次抽取失败
+            if checkpoint_errors:
+                raise checkpoint_errors[0]
+
+            failed_tables = 0
+            skipped_tables = []
+            timed_out_tables = []
+            for table_name, table_result in zip(table_names, results):
+                if isinstance(table_result, ExtractionCancelledException):
+                    skipped_tables.append(table_name)
+                elif isinstance(table_result, Exception):
+                    failed_tables += 1
+                    if is_statement_timeout(table_result):
+                        timed_out_tables.append(table_name)
+                    ETLLogger.log_table_failed(table_name, str(table_result))
+                    logging.warning(f"抽取表 {table_name} 失败: {str(table_result)}")
+            if on_batch:
+                await flush(force=True)
+
+            cancelled = cancel_token is not None and cancel_token.is_cancelled()
+
+            # 获取表关联关系（只有全量抽取才获取，取消后不再获取）
+            relationships = []
+            if full and not cancelled:
+                relationships = await self.run(
+                    lambda extractor: self._in_phase('relationships', extractor.get_table_relationships)
+                )
+                for rel in relationships:
+                    ETLLogger.log_relationship_extracted(
+                        rel.get('constraint_name', ''),
+                        rel.get('table_name', ''),
+                        rel.get('referenced_table_name', '')
+                    )
+
+            tables_count = len(tables_data) + delivered_tables
+            total_duration = time.time() - start_time
+            ETLLogger.log_extraction_success(self.datasource.id, tables_count, len(relationships), total_duration)
+            if failed_tables > 0:
+                ETLLogger.log_summary(tables_count + failed_tables, tables_count, failed_tables)
+
+            result = {
+                "status": "partial_success" if cancelled else "success",
+                "datasource_id": self.datasource.id,
+                "tables_count": tables_count,
+                "failed_tables": failed_tables,
+                "skipped_tables": skipped_tables,
+                "timed_out_tables": timed_out_tables,
+                "tables": tables_data,
+                "relationships": relationships,
+                "extraction_type": "full" if full else "incremental"
+            }
+            if cancelled:
+                result["message"] = f"{cancel_token.reason}，已抽取 {tables_count} 个表，跳过 {len(skipped_tables)} 个表"
+                if full:
+                    result["message"] += "，未获取关联关系"
+                ETLLogger.get_logger().warning(result["message"])
+            return result
+        except Exception as e:
+            ETLLogger.log_extraction_failed(self.datasource.id, str(e))
+            logging.error(f"抽取元数据失败: {str(e)}")
+            return {"status": "failed", "message": str(e), "tables_count": delivered_tables}
+        finally:
+            await self.disconnect()
+
+    # 与同步抽取器相同的入口，便于在同步代码中直接替换使用
+    def extract_metadata(self, **kwargs) -> Dict[str, Any]:
+        return asyncio.run(self.extract_metadata_async(**kwargs))
+
+    def extract_all_metadata(self) -> Dict[str, Any]:
+        return self.extract_metadata(full=True, include_stats=True)
+
+    def extract_incremental_metadata(self, last_sync_time: str = None) -> Dict[str, Any]:
+        return self.extract_metadata(full=False, include_stats=True, last_sync_time=last_sync_time)
+
+    def extract_schema_only_metadata(self) -> Dict[str, Any]:
+        return self.extract_metadata(full=True, include_stats=False)
+
+
+async def extract_many(sources: List[DataSource], full: bool = True, include_stats: bool = True,
+                       max_concurrent_sources: int = None, concurrency: int = None) -> Dict[int, Dict[str, Any]]:
+    """
+    在同一事件循环中并发抽取多个数据源
+    :param sources: 数据源列表
+    :param max_concurrent_sources: 同时抽取的数据源数量上限
+    :param concurrency: 单个数据源内的并发查询数
+    :return: {数据源ID: 抽取结果}
+    """
+    semaphore = asyncio.Semaphore(max_concurrent_sources or Config.ASYNC_MAX_CONCURRENT_SOURCES)
+
+    async def extract_source(source: DataSource):
+        async with semaphore:
+            try:
+                extractor = AsyncMetadataExtractor(source, concurrency=concurrency)
+            except ValidationException as e:
+                return source.id, {"status": "failed", "message": str(e)}
+            return source.id, await extractor.extract_metadata_async(full=full, include_stats=include_stats)
+
+    results = await asyncio.gather(*[extract_source(source) for source in sources])
+    return dict(results)
+
+
+def create_extractor(datasource: DataSource):
+    """
+    根据配置的抽取后端创建抽取器
+    EXTRACTION_BACKEND=async 时返回异步抽取器，否则返回同步抽取器
+    """
+    if Config.EXTRACTION_BACKEND == 'async':
+        return AsyncMetadataExtractor(datasource)
+    extractor_class = get_extractor_class(datasource.type)
+    if not extractor_class:
+        raise ValidationException(f"不支持的数据库类型: {datasource.type}")
+    return extractor_class(datasource)
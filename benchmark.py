@@ -0,0 +1,324 @@
+"""
+合成目录基准测试
+
+在本地 SQLite 中生成合成的源库（表数量、字段数量、外键密度可配置），使用 SQLiteMetadataExtractor
+端到端测量热点路径，结果输出为 JSON，可与基线结果比较以便在部署前发现性能回退：
+1. extract：只抽取不持久化（抽取器本身的耗时）
+2. first_run：run_extraction 首次全量抽取并持久化到空的元数据库
+3. rerun：元数据已存在时再次全量抽取（按表更新的路径）
+4. api：读接口（表列表、表详情、字段列表、影响范围、数据源列表）的延迟分位数
+
+默认使用 tracemalloc 记录各阶段的内存峰值，会带来固定比例的耗时开销，
+只有 memory_traced 相同的结果之间才能比较；字段画像有独立的时间预算，基准测试中关闭
+
+用法:
+    python benchmark.py --suite smoke
+    python benchmark.py --tables 1000 10000 --columns 10 40 --fk-density 0.1 1 -o results.json
+    python benchmark.py --suite standard --work-dir /data/bench -o new.json --baseline main.json
+"""
+import argparse
+import itertools
+import json
+import logging
+import os
+import platform
+import random
+import resource
+import sqlite3
+import statistics
+import tempfile
+import time
+import tracemalloc
+from contextlib import contextmanager
+from datetime import datetime
+from typing import Dict, Any, List
+
+import sqlalchemy
+
+from config import Config
+
+
+# 预置的场景组合：(表数量, 每表平均字段数, 每表平均外键数)
+SUITES = {
+    'smoke': ([200], [8], [0.2]),
+    'standard': ([1000, 10000, 100000], [10], [0.1]),
+    'wide': ([1000, 10000], [10, 40, 120], [0.0, 1.0]),
+}
+
+# 合成字段轮换使用的类型
+COLUMN_TYPES = ('INTEGER', 'VARCHAR(64)', 'TEXT', 'REAL', 'NUMERIC(12,2)', 'DATETIME', 'BOOLEAN', 'BLOB')
+
+# 结果中越小越好的指标后缀，比较基线时只比较这些指标
+LOWER_IS_BETTER = ('_seconds', '_ms', '_mb')
+# 单次请求的最大延迟受偶发抖动影响较大，不参与比较
+IGNORED_METRICS = ('max_ms',)
+# 比较时忽略的绝对差异（秒、毫秒、MB），避免小数值的抖动被判定为回退
+NOISE_FLOOR = {'_seconds': 0.05, '_ms': 2.0, '_mb': 1.0}
+
+RESULT_VERSION = 1
+
+
+def generate_catalog(path: str, tables: int, columns: int, fk_density: float, rows: int = 3,
+                     seed: int = 42) -> Dict[str, int]:
+    """
+    生成合成源库，同样的参数生成同样的结构
+    :param columns: 每表平均字段数（实际为 columns/2 ~ columns*3/2）
+    :param fk_density: 每表平均外键数，外键只引用编号更小的表
+    :param rows: 每表插入的行数
+    :return: 表、字段、外键数量
+    """
+    rng = random.Random(seed)
+    if os.path.exists(path):
+        os.remove(path)
+    connection = sqlite3.connect(path)
+    column_count = 0
+    fk_count = 0
+    try:
+        connection.execute('BEGIN')
+        for index in range(tables):
+            definitions = ['id INTEGER PRIMARY KEY']
+            width = rng.randint(max(1, columns // 2), max(1, columns * 3 // 2)) - 1
+            for position in range(width):
+                definitions.append(f"c{position} {COLUMN_TYPES[(index + position) % len(COLUMN_TYPES)]}")
+            foreign_keys = int(fk_density) + (1 if rng.random() < fk_density - int(fk_density) else 0)
+            for fk in range(foreign_keys if index else 0):
+                definitions.append(f"ref{fk}_id INTEGER REFERENCES t{rng.randrange(index):06d}(id)")
+            fk_count += foreign_keys if index else 0
+            column_count += len(definitions)
+            connection.execute(f"CREATE TABLE t{index:06d} ({', '.join(definitions)})")
+            if rows:
+                connection.executemany(f"INSERT INTO t{index:06d} (id) VALUES (?)", [(row,) for row in range(rows)])
+        connection.execute('COMMIT')
+    finally:
+        connection.close()
+    return {'tables': tables, 'columns': column_count, 'foreign_keys': fk_count}
+
+
+@contextmanager
+def measure(metrics: Dict[str, Any], name: str, trace_memory: bool):
+    """记录代码块的耗时和（可选）内存峰值"""
+    if trace_memory:
+        tracemalloc.start()
+    start = time.perf_counter()
+    try:
+        yield
+    finally:
+        metrics[f"{name}_seconds"] = round(time.perf_counter() - start, 4)
+        if trace_memory:
+            metrics[f"{name}_peak_mb"] = round(tracemalloc.get_traced_memory()[1] / 1024 / 1024, 2)
+            tracemalloc.stop()
+
+
+def _latency_summary(samples: List[float], errors: int) -> Dict[str, Any]:
+    ordered = sorted(samples)
+    return {
+        'requests': len(samples),
+        'errors': errors,
+        'p50_ms': round(statistics.median(ordered), 3) if ordered else None,
+        'p95_ms': round(ordered[min(len(ordered) - 1, int(len(ordered) * 0.95))], 3) if ordered else None,
+        'max_ms': round(ordered[-1], 3) if ordered else None,
+    }
+
+
+def measure_read_api(datasource_id: int, table_ids: List[int], requests: int, seed: int) -> Dict[str, Any]:
+    """通过 Flask 测试客户端测量读接口的延迟（每个接口先预热一次，不计入结果）"""
+    from api import create_app
+    app = create_app()
+    client = app.test_client()
+    with client.session_transaction() as sess:
+        sess['user_id'] = 1
+        sess['role'] = 'admin'
+
+    rng = random.Random(seed)
+    pages = max(1, len(table_ids) // 50)
+    endpoints = {
+        'data_sources': lambda: '/api/data-sources',
+        'list_tables': lambda: f"/api/data-sources/{datasource_id}/tables?per_page=50&page={rng.randint(1, pages)}",
+        'table_detail': lambda: f"/api/tables/{rng.choice(table_ids)}",
+        'table_columns': lambda: f"/api/tables/{rng.choice(table_ids)}/columns",
+        'impact': lambda: f"/api/tables/{rng.choice(table_ids)}/impact?direction=downstream&max_depth=3",
+    }
+
+    results = {}
+    for name, url in endpoints.items():
+        client.get(url())
+        samples, errors = [], 0
+        for _ in range(requests):
+            start = time.perf_counter()
+            response = client.get(url())
+            samples.append((time.perf_counter() - start) * 1000)
+            if response.status_code != 200:
+                errors += 1
+        results[name] = _latency_summary(samples, errors)
+    return results
+
+
+def run_scenario(work_dir: str, tables: int, columns: int, fk_density: float, rows: int, requests: int,
+                 trace_memory: bool, seed: int) -> Dict[str, Any]:
+    """
+    执行一个场景：生成（或复用）源库，依次测量抽取、首次持久化、再次抽取和读接口
+    """
+    from db_manager import init_db_manager, get_db_session
+    from models import DataSource, TableMetadata, init_database
+    from extractor_base import SQLiteMetadataExtractor, enable_sqlite_sources
+    from extraction_service import run_extraction
+
+    enable_sqlite_sources()
+    name = f"t{tables}_c{columns}_fk{fk_density:g}"
+    metrics: Dict[str, Any] = {}
+    source_path = os.path.join(work_dir, f"source_{name}_r{rows}_s{seed}.db")
+    catalog_path = source_path + '.json'
+    if os.path.exists(source_path) and os.path.exists(catalog_path):
+        # 同样的参数生成同样的源库，可以在多次运行之间复用
+        with open(catalog_path, encoding='utf-8') as file:
+            catalog = json.load(file)
+    else:
+        with measure(metrics, 'generate', False):
+            catalog = generate_catalog(source_path + '.tmp', tables, columns, fk_density, rows, seed)
+        os.replace(source_path + '.tmp', source_path)
+        with open(catalog_path, 'w', encoding='utf-8') as file:
+            json.dump(catalog, file)
+
+    metadata_path = os.path.join(work_dir, f"metadata_{name}.db")
+    if os.path.exists(metadata_path):
+        os.remove(metadata_path)
+    Config.DATABASE_URL = f"sqlite:///{metadata_path}"
+    init_db_manager(Config.DATABASE_URL)
+    init_database()
+    with get_db_session() as session:
+        source = DataSource(name=f"benchmark_{name}", type='sqlite', host='localhost', port=0,
+                            username='', password='', database=source_path)
+        session.add(source)
+        session.flush()
+        datasource_id = source.id
+        session.expunge(source)
+
+    extractor = SQLiteMetadataExtractor(source)
+    delivered = []
+    with measure(metrics, 'extract', trace_memory):
+        result = extractor.extract_metadata(full=True, on_batch=lambda batch: delivered.append(len(batch)))
+    extractor.disconnect()
+    metrics['extract_tables'] = sum(delivered)
+    metrics['extract_relationships'] = len(result.get('relationships', []))
+
+    for phase in ('first_run', 'rerun'):
+        with measure(metrics, phase, trace_memory):
+            summary = run_extraction(datasource_id, 'full')
+        if summary['status'] != 'success':
+            raise RuntimeError(f"场景 {name} 的 {phase} 抽取失败: {summary.get('message')}")
+        metrics[f"{phase}_columns"] = summary['columns_count']
+        metrics[f"{phase}_relationships"] = summary['relationships_count']
+
+    with get_db_session() as session:
+        table_ids = [row[0] for row in session.query(TableMetadata.id).filter(
+            TableMetadata.datasource_id == datasource_id
+        ).all()]
+    if requests:
+        metrics['api'] = measure_read_api(datasource_id, table_ids, requests, seed)
+
+    return {'name': name, 'tables': tables, 'columns': columns, 'fk_density': fk_density, 'rows': rows,
+            'catalog': catalog, 'metrics': metrics}
+
+
+def _flatten(metrics: Dict[str, Any], prefix: str = '') -> Dict[str, float]:
+    flat = {}
+    for key, value in metrics.items():
+        if isinstance(value, dict):
+            flat.update(_flatten(value, f"{prefix}{key}."))
+        elif isinstance(value, (int, float)) and not isinstance(value, bool):
+            flat[f"{prefix}{key}"] = value
+    return flat
+
+
+def compare_results(current: Dict[str, Any], baseline: Dict[str, Any], tolerance: float) -> List[Dict[str, Any]]:
+    """
+    与基线比较同名场景中越小越好的指标
+    :param tolerance: 允许的相对增幅（0.2 表示慢 20% 以内不算回退）
+    :return: 回退的指标列表
+    """
+    if current.get('memory_traced') != baseline.get('memory_traced'):
+        raise ValueError("当前结果与基线的 memory_traced 不同，耗时不可比较")
+    baseline_scenarios = {scenario['name']: scenario for scenario in baseline.get('scenarios', [])}
+    regressions = []
+    for scenario in current['scenarios']:
+        previous = baseline_scenarios.get(scenario['name'])
+        if not previous:
+            continue
+        before = _flatten(previous['metrics'])
+        for metric, value in _flatten(scenario['metrics']).items():
+            suffix = next((suffix for suffix in LOWER_IS_BETTER if metric.endswith(suffix)), None)
+            if suffix is None or metric.endswith(IGNORED_METRICS) or not before.get(metric):
+                continue
+            if value > before[metric] * (1 + tolerance) and value - before[metric] > NOISE_FLOOR[suffix]:
+                regressions.append({'scenario': scenario['name'], 'metric': metric, 'baseline': before[metric],
+                                    'current': value, 'change': round(value / before[metric] - 1, 4)})
+    return regressions
+
+
+def main(argv=None):
+    """基准测试命令行入口"""
+    parser = argparse.ArgumentParser(description='Super MetaData 合成目录基准测试')
+    parser.add_argument('--suite', choices=sorted(SUITES), help='预置的场景组合，指定后忽略下面三个参数')
+    parser.add_argument('--tables', type=int, nargs='+', default=[1000], help='表数量')
+    parser.add_argument('--columns', type=int, nargs='+', default=[10], help='每表平均字段数')
+    parser.add_argument('--fk-density', type=float, nargs='+', default=[0.1], help='每表平均外键数')
+    parser.add_argument('--rows', type=int, default=3, help='每表插入的行数')
+    parser.add_argument('--requests', type=int, default=50, help='每个读接口的请求次数，0 为不测量')
+    parser.add_argument('--seed', type=int, default=42, help='随机种子')
+    parser.add_argument('--no-memory', action='store_true', help='不记录内存峰值（耗时更接近真实值）')
+    parser.add_argument('--work-dir', help='源库和元数据库的目录，指定后生成的源库可以复用')
+    parser.add_argument('-o', '--output', help='结果 JSON 文件，默认为标准输出')
+    parser.add_argument('--baseline', help='基线结果 JSON 文件，有回退时退出码为1')
+    parser.add_argument('--tolerance', type=float, default=0.2, help='与基线比较时允许的相对增幅')
+    args = parser.parse_args(argv)
+
+    logging.basicConfig(level=logging.WARNING, format='%(asctime)s - %(levelname)s - %(message)s')
+    Config.COLUMN_PROFILING_ENABLED = False
+    # 逐表的ETL日志仍写入日志文件，不输出到控制台
+    Config.ETL_LOG_CONSOLE = False
+    work_dir = args.work_dir or tempfile.mkdtemp(prefix='metadata-benchmark-')
+    os.makedirs(work_dir, exist_ok=True)
+
+    tables, columns, densities = SUITES[args.suite] if args.suite else (args.tables, args.columns, args.fk_density)
+    scenarios = []
+    for table_count, column_count, density in itertools.product(tables, columns, densities):
+        logging.warning(f"场景: {table_count} 个表，平均 {column_count} 个字段，每表 {density:g} 个外键")
+        scenarios.append(run_scenario(work_dir, table_count, column_count, density, args.rows, args.requests,
+                                      not args.no_memory, args.seed))
+
+    results = {
+        'version': RESULT_VERSION,
+        'created_at': datetime.utcnow().isoformat(),
+        'memory_traced': not args.no_memory,
+        'environment': {
+            'python': platform.python_version(),
+            'sqlalchemy': sqlalchemy.__version__,
+            'sqlite': sqlite3.sqlite_version,
+            'platform': platform.platform(),
+            'extraction_backend': Config.EXTRACTION_BACKEND,
+            'extraction_batch_size': Config.EXTRACTION_BATCH_SIZE,
+        },
+        'scenarios': scenarios,
+        'max_rss_mb': round(resource.getrusage(resource.RUSAGE_SELF).ru_maxrss / 1024, 1),
+    }
+
+    exit_code = 0
+    if args.baseline:
+        with open(args.baseline, encoding='utf-8') as file:
+            results['regressions'] = compare_results(results, json.load(file), args.tolerance)
+        for regression in results['regressions']:
+            logging.warning(f"性能回退: {regression['scenario']} {regression['metric']} "
+                            f"{regression['baseline']} -> {regression['current']} (+{regression['change']:.0%})")
+        exit_code = 1 if results['regressions'] else 0
+
+    text = json.dumps(results, ensure_ascii=False, indent=2)
+    if args.output:
+        with open(args.output, 'w', encoding='utf-8') as file:
+            file.write(text + '\n')
+    else:
+        print(text)
+    return exit_code
+
+
+if __name__ == '__main__':
+    raise SystemExit(main())
@@ -0,0 +1,270 @@
+"""
+目录导出
+
+流式导出一个数据源的全部表、字段和关联关系，替代逐页调用表列表接口再逐表调用详情接口：
+1. 读取：按表、字段、关联关系依次查询，yield_per 使用服务端游标分批读取，内存占用与数据源大小无关
+2. 格式：jsonl（每行一条记录）、csv、parquet（列式，每批写一个行组）；三种格式使用相同的扁平记录，
+   record_type 区分 source、table、column、relationship
+3. 压缩：jsonl、csv 边生成边压缩（gzip、zstd），parquet 使用格式内部的列压缩
+
+parquet 需要安装 pyarrow，zstd 需要安装 zstandard
+
+用法:
+    python catalog_export.py --datasource-id 1 --format jsonl --compression gzip -o catalog.jsonl.gz
+    python catalog_export.py --datasource-id 1 --format parquet -o catalog.parquet
+"""
+import argparse
+import csv
+import io
+import json
+import logging
+import sys
+import zlib
+from datetime import datetime
+from typing import Dict, Any, Iterator, Optional
+
+from sqlalchemy.orm import aliased
+
+from config import Config
+from models import DataSource, TableMetadata, ColumnMetadata, TableRelationship
+from db_manager import get_db_session
+from exceptions import DataSourceNotFoundException, ValidationException
+
+
+EXPORT_FORMATS = ('jsonl', 'csv', 'parquet')
+COMPRESSIONS = ('gzip', 'zstd')
+# 扁平记录的字段，csv 的表头和 parquet 的列按此顺序
+EXPORT_FIELDS = (
+    'record_type', 'datasource_id', 'datasource_name', 'source_type', 'schema_name', 'table_name',
+    'table_comment', 'row_count', 'size_bytes',
+    'column_name', 'data_type', 'is_nullable', 'default_value', 'column_comment', 'ordinal_position',
+    'constraint_name', 'constraint_type', 'referenced_table_name', 'referenced_column_name', 'confidence',
+)
+CONTENT_TYPES = {'jsonl': 'application/x-ndjson', 'csv': 'text/csv', 'parquet': 'application/vnd.apache.parquet'}
+COMPRESSED_CONTENT_TYPES = {'gzip': 'application/gzip', 'zstd': 'application/zstd'}
+FILE_SUFFIXES = {'gzip': '.gz', 'zstd': '.zst'}
+
+
+def _source_record(source: DataSource) -> Dict[str, Any]:
+    return {'record_type': 'source', 'datasource_id': source.id, 'datasource_name': source.name,
+            'source_type': source.type, 'schema_name': source.database}
+
+
+def iter_catalog_records(datasource_id: int, chunk_size: Optional[int] = None) -> Iterator[Dict[str, Any]]:
+    """
+    按 source、table、column、relationship 的顺序逐条生成数据源的目录记录
+    :param chunk_size: 每批从元数据库读取的行数，默认 EXPORT_CHUNK_SIZE
+    """
+    chunk_size = chunk_size or Config.EXPORT_CHUNK_SIZE
+    with get_db_session() as session:
+        source = session.query(DataSource).filter(DataSource.id == datasource_id).first()
+        if not source:
+            return
+        yield _source_record(source)
+
+        for table_name, schema_name, comment, row_count, size_bytes in session.query(
+            TableMetadata.table_name, TableMetadata.schema_name, TableMetadata.comment,
+            TableMetadata.row_count, TableMetadata.size_bytes
+        ).filter(TableMetadata.datasource_id == datasource_id).order_by(TableMetadata.id).yield_per(chunk_size):
+            yield {'record_type': 'table', 'datasource_id': datasource_id, 'schema_name': schema_name,
+                   'table_name': table_name, 'table_comment': comment, 'row_count': row_count,
+                   'size_bytes': size_bytes}
+
+        for row in session.query(
+            TableMetadata.schema_name, TableMetadata.table_name, ColumnMetadata.column_name,
+            ColumnMetadata.data_type, ColumnMetadata.is_nullable, ColumnMetadata.default_value,
+            ColumnMetadata.column_comment, ColumnMetadata.ordinal_position
+        ).join(TableMetadata, TableMetadata.id == ColumnMetadata.table_id).filter(
+            TableMetadata.datasource_id == datasource_id
+        ).order_by(ColumnMetadata.table_id, ColumnMetadata.ordinal_position).yield_per(chunk_size):
+            yield {'record_type': 'column', 'datasource_id': datasource_id, 'schema_name': row[0],
+                   'table_name': row[1], 'column_name': row[2], 'data_type': row[3], 'is_nullable': row[4],
+                   'default_value': row[5], 'column_comment': row[6], 'ordinal_position': row[7]}
+
+        referenced = aliased(TableMetadata)
+        for row in session.query(
+            TableMetadata.schema_name, TableMetadata.table_name, TableRelationship.column_name,
+            TableRelationship.constraint_name, TableRelationship.constraint_type, referenced.table_name,
+            TableRelationship.referenced_column_name, TableRelationship.confidence
+        ).join(TableMetadata, TableMetadata.id == TableRelationship.table_id).join(
+            referenced, referenced.id == TableRelationship.referenced_table_id
+        ).filter(TableMetadata.datasource_id == datasource_id).order_by(TableRelationship.id).yield_per(chunk_size):
+            yield {'record_type': 'relationship', 'datasource_id': datasource_id, 'schema_name': row[0],
+                   'table_name': row[1], 'column_name': row[2], 'constraint_name': row[3],
+                   'constraint_type': row[4], 'referenced_table_name': row[5],
+                   'referenced_column_name': row[6], 'confidence': row[7]}
+
+
+def _batches(records: Iterator[Dict[str, Any]], size: int) -> Iterator[list]:
+    batch = []
+    for record in records:
+        batch.append(record)
+        if len(batch) >= size:
+            yield batch
+            batch = []
+    if batch:
+        yield batch
+
+
+def _encode_jsonl(records: Iterator[Dict[str, Any]], chunk_size: int) -> Iterator[bytes]:
+    for batch in _batches(records, chunk_size):
+        yield ''.join(json.dumps({key: value for key, value in record.items() if value is not None},
+                                 ensure_ascii=False, default=str) + '\n' for record in batch).encode('utf-8')
+
+
+def _encode_csv(records: Iterator[Dict[str, Any]], chunk_size: int) -> Iterator[bytes]:
+    buffer = io.StringIO()
+    writer = csv.DictWriter(buffer, fieldnames=EXPORT_FIELDS, extrasaction='ignore')
+    writer.writeheader()
+    for batch in _batches(records, chunk_size):
+        writer.writerows(batch)
+        yield buffer.getvalue().encode('utf-8')
+        buffer.seek(0)
+        buffer.truncate()
+
+
+class _ChunkSink(io.RawIOBase):
+    """收集 pyarrow 写出的字节，每写完一个行组取走一次"""
+
+    def __init__(self):
+        super().__init__()
+        self.chunks = []
+
+    def writable(self):
+        return True
+
+    def write(self, data):
+        self.chunks.append(bytes(data))
+        return len(data)
+
+    def drain(self) -> bytes:
+        data = b''.join(self.chunks)
+        self.chunks = []
+        return data
+
+
+def _parquet_schema():
+    import pyarrow as pa
+    integer_fields = ('datasource_id', 'row_count', 'size_bytes', 'ordinal_position')
+    return pa.schema([
+        (field, pa.int64() if field in integer_fields else pa.float64() if field == 'confidence' else pa.string())
+        for field in EXPORT_FIELDS
+    ])
+
+
+def _encode_parquet(records: Iterator[Dict[str, Any]], chunk_size: int, compression: Optional[str]) -> Iterator[bytes]:
+    import pyarrow as pa
+    import pyarrow.parquet as pq
+    schema = _parquet_schema()
+    sink = _ChunkSink()
+    writer = pq.ParquetWriter(sink, schema, compression=compression or 'snappy')
+    try:
+        for batch in _batches(records, chunk_size):
+            columns = {field: [record.get(field) for record in batch] for field in EXPORT_FIELDS}
+            writer.write_table(pa.table(columns, schema=schema))
+            yield sink.drain()
+    finally:
+        writer.close()
+    yield sink.drain()
+
+
+def _compress(chunks: Iterator[bytes], compression: Optional[str]) -> Iterator[bytes]:
+    """边生成边压缩"""
+    if not compression:
+        yield from chunks
+        return
+    if compression == 'gzip':
+        compressor = zlib.compressobj(6, zlib.DEFLATED, 31)
+    else:
+        import zstandard
+        compressor = zstandard.ZstdCompressor().compressobj()
+    for chunk in chunks:
+        data = compressor.compress(chunk)
+        if data:
+            yield data
+    yield compressor.flush()
+
+
+def _check_options(fmt: str, compression: Optional[str]):
+    if fmt not in EXPORT_FORMATS:
+        raise ValidationException(f"不支持的导出格式: {fmt}")
+    if compression and compression not in COMPRESSIONS:
+        raise ValidationException(f"不支持的压缩方式: {compression}")
+    if fmt == 'parquet':
+        try:
+            import pyarrow.parquet  # noqa: F401
+        except ImportError:
+            raise ValidationException("parquet 导出需要安装 pyarrow")
+    elif compression == 'zstd':
+        try:
+            import zstandard  # noqa: F401
+        except ImportError:
+            raise ValidationException("zstd 压缩需要安装 zstandard")
+
+
+def export_catalog(datasource_id: int, fmt: str = 'jsonl', compression: Optional[str] = None,
+                   chunk_size: Optional[int] = None) -> Iterator[bytes]:
+    """
+    导出数据源的目录，参数和数据源在调用时校验，返回的生成器在迭代时才读取元数据库
+    :param fmt: jsonl, csv, parquet
+    :param compression: gzip, zstd 或 None；parquet 时为列压缩的编码
+    :return: 字节块的迭代器
+    """
+    _check_options(fmt, compression)
+    with get_db_session() as session:
+        exists = session.query(DataSource.id).filter(DataSource.id == datasource_id).first()
+    if not exists:
+        raise DataSourceNotFoundException(f"数据源不存在: {datasource_id}")
+
+    chunk_size = chunk_size or Config.EXPORT_CHUNK_SIZE
+    records = iter_catalog_records(datasource_id, chunk_size)
+    if fmt == 'parquet':
+        return _encode_parquet(records, chunk_size, compression)
+    encoded = _encode_jsonl(records, chunk_size) if fmt == 'jsonl' else _encode_csv(records, chunk_size)
+    return _compress(encoded, compression)
+
+
+def export_content_type(fmt: str, compression: Optional[str] = None) -> str:
+    if compression and fmt != 'parquet':
+        return COMPRESSED_CONTENT_TYPES[compression]
+    return CONTENT_TYPES[fmt]
+
+
+def export_filename(datasource_name: str, fmt: str, compression: Optional[str] = None) -> str:
+    suffix = FILE_SUFFIXES[compression] if compression and fmt != 'parquet' else ''
+    return f"{datasource_name}_{datetime.utcnow().strftime('%Y%m%d%H%M%S')}.{fmt}{suffix}"
+
+
+def main(argv=None):
+    """目录导出命令行入口"""
+    parser = argparse.ArgumentParser(description='Super MetaData 目录导出')
+    parser.add_argument('--datasource-id', type=int, required=True, help='数据源ID')
+    parser.add_argument('--format', choices=EXPORT_FORMATS, default='jsonl', help='导出格式')
+    parser.add_argument('--compression', choices=COMPRESSIONS, help='压缩方式')
+    parser.add_argument('--chunk-size', type=int, default=Config.EXPORT_CHUNK_SIZE, help='每批读取的行数')
+    parser.add_argument('-o', '--output', help='输出文件，默认为标准输出')
+    parser.add_argument('--database-url', default=Config.DATABASE_URL, help='元数据库连接URL')
+    args = parser.parse_args(argv)
+
+    logging.basicConfig(level=Config.LOG_LEVEL, format='%(asctime)s - %(levelname)s - %(message)s')
+
+    from db_manager import init_db_manager
+    init_db_manager(args.database_url)
+
+    try:
+        chunks = export_catalog(args.datasource_id, args.format, args.compression, args.chunk_size)
+        output = open(args.output, 'wb') if args.output else sys.stdout.buffer
+        try:
+            for chunk in chunks:
+                output.write(chunk)
+        finally:
+            if args.output:
+                output.close()
+    except (DataSourceNotFoundException, ValidationException) as e:
+        logging.error(str(e))
+        return 2
+    return 0
+
+
+if __name__ == '__main__':
+    raise SystemExit(main())
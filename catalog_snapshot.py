@@ -0,0 +1,448 @@
+"""
+离线目录快照
+
+元数据服务器无法连接的数据源（隔离网络中的数据库）由DBA在本地抽取元数据并导出为快照文件，
+再上传到服务器导入：
+1. 导出：命令行直接连接数据源，使用与在线抽取相同的抽取器，不需要元数据库；
+   每抽取一批表就写入文件，内存占用与数据源大小无关
+2. 文件格式：gzip 压缩的 jsonl，第一行为文件头（格式名、版本、数据源信息），
+   之后每行一个表（table_info 和 columns，与抽取器的结果相同）或一个关联关系，
+   最后一行为文件尾（表、列、关联关系的数量，以及此前所有行的 sha256）
+3. 导入：先完整读取一遍校验版本、数量和校验和，再分批读取第二遍，与元数据库中的表逐批比较，
+   只有变化的表通过 CheckpointWriter 持久化（与在线抽取相同的路径），未变化的表只记录检查点，
+   最后由 finalize_full 删除快照中不存在的表并重建关联关系；
+   导入记为 task_type 为 snapshot 的抽取历史，失败后重新导入文件即可
+
+用法:
+    python catalog_snapshot.py export --type mysql --host 10.0.0.5 --port 3306 --username reader \\
+        --password *** --database orders -o orders.snapshot.gz
+    python catalog_snapshot.py verify orders.snapshot.gz
+    python catalog_snapshot.py import --datasource-id 3 orders.snapshot.gz
+"""
+import argparse
+import gzip
+import hashlib
+import json
+import logging
+import time
+import zlib
+from collections import defaultdict
+from datetime import datetime
+from typing import Dict, Any, Iterator, List, Optional, Tuple
+
+from config import Config
+from models import DataSource, TableMetadata, ColumnMetadata, ExtractionHistory, ExtractionCheckpoint
+from db_manager import get_db_session
+from extractor_base import get_extractor_class
+from extraction_service import CheckpointWriter, MetadataPersister, mark_history_failed
+from extraction_lock import acquire_lock, attach_history, release_lock
+from schema_history import record_schema_version
+from relationship_inference import infer_relationships
+from relationship_graph import invalidate_graph
+from storage_growth import record_samples, compact_samples
+from metrics import record_extraction
+from etl_logger import ETLLogger
+from exceptions import DataSourceNotFoundException, ExtractionException, ValidationException, ExtractionInProgressException
+
+
+SNAPSHOT_FORMAT = 'super-metadata-snapshot'
+# 当前写出的快照版本，导入时接受不高于该版本的快照
+SNAPSHOT_VERSION = 1
+SNAPSHOT_TASK_TYPE = 'snapshot'
+
+
+def _dump_line(record: Dict[str, Any]) -> bytes:
+    return (json.dumps(record, ensure_ascii=False, default=str) + '\n').encode('utf-8')
+
+
+class SnapshotWriter:
+    """
+    快照写入器
+    作为抽取器的 on_batch 回调，每批表直接写入文件，同时累计数量和校验和
+    """
+
+    def __init__(self, path: str, source: DataSource, include_stats: bool = True):
+        self.path = path
+        self.file = gzip.open(path, 'wb')
+        self.digest = hashlib.sha256()
+        self.tables = 0
+        self.columns = 0
+        self.relationships = 0
+        self._write({
+            'format': SNAPSHOT_FORMAT,
+            'version': SNAPSHOT_VERSION,
+            'created_at': datetime.utcnow().isoformat(),
+            'include_stats': include_stats,
+            'source': {'name': source.name, 'type': source.type, 'host': source.host,
+                       'port': source.port, 'username': source.username, 'database': source.database}
+        })
+
+    def _write(self, record: Dict[str, Any]):
+        line = _dump_line(record)
+        self.digest.update(line)
+        self.file.write(line)
+
+    def __call__(self, tables: List[Dict[str, Any]]):
+        for table_data in tables:
+            self._write({'type': 'table', 'table_info': table_data['table_info'], 'columns': table_data['columns']})
+            self.tables += 1
+            self.columns += len(table_data['columns'])
+
+    def finish(self, relationships: List[Dict[str, Any]]):
+        """写入关联关系和文件尾"""
+        for relationship in relationships or []:
+            self._write({'type': 'relationship', **relationship})
+            self.relationships += 1
+        self.file.write(_dump_line({
+            'type': 'end',
+            'tables': self.tables,
+            'columns': self.columns,
+            'relationships': self.relationships,
+            'sha256': self.digest.hexdigest()
+        }))
+        self.file.close()
+
+    def abort(self):
+        self.file.close()
+
+
+def write_snapshot(source: DataSource, path: str, include_stats: bool = True) -> Dict[str, Any]:
+    """
+    连接数据源抽取元数据并写入快照文件，不访问元数据库
+    :param source: 数据源（不需要已保存到元数据库）
+    :param include_stats: 是否包含行数和大小
+    :return: 抽取状态和写入的数量
+    """
+    extractor_class = get_extractor_class(source.type)
+    if not extractor_class:
+        raise ValidationException(f"不支持的数据库类型: {source.type}")
+
+    writer = SnapshotWriter(path, source, include_stats)
+    try:
+        result = extractor_class(source).extract_metadata(full=True, include_stats=include_stats, on_batch=writer)
+        if result['status'] != 'success':
+            raise ExtractionException(result.get('message') or '元数据抽取失败')
+        writer(result.get('tables', []))
+        writer.finish(result.get('relationships', []))
+    except Exception:
+        writer.abort()
+        raise
+    return {'status': 'success', 'path': path, 'failed_tables': result.get('failed_tables', 0),
+            'tables': writer.tables, 'columns': writer.columns, 'relationships': writer.relationships}
+
+
+def _iter_lines(path: str) -> Iterator[bytes]:
+    try:
+        with gzip.open(path, 'rb') as file:
+            yield from file
+    except (OSError, EOFError, zlib.error) as e:
+        raise ValidationException(f"快照文件已损坏或不是 gzip 文件: {str(e)}")
+
+
+def _parse(line: bytes) -> Dict[str, Any]:
+    try:
+        return json.loads(line)
+    except ValueError:
+        raise ValidationException("快照文件包含无法解析的行")
+
+
+def verify_snapshot(path: str) -> Dict[str, Any]:
+    """
+    流式读取整个快照，校验文件头、数量和校验和
+    :return: {'header': 文件头, 'tables': int, 'columns': int, 'relationships': int}
+    """
+    digest = hashlib.sha256()
+    header = None
+    trailer = None
+    counts = {'tables': 0, 'columns': 0, 'relationships': 0}
+    for line in _iter_lines(path):
+        if trailer is not None:
+            raise ValidationException("快照文件尾之后还有数据")
+        record = _parse(line)
+        if header is None:
+            if record.get('format') != SNAPSHOT_FORMAT:
+                raise ValidationException("不是元数据快照文件")
+            if not isinstance(record.get('version'), int) or record['version'] > SNAPSHOT_VERSION:
+                raise ValidationException(f"不支持的快照版本: {record.get('version')}")
+            header = record
+        elif record.get('type') == 'end':
+            trailer = record
+            continue
+        elif record.get('type') == 'table':
+            counts['tables'] += 1
+            counts['columns'] += len(record['columns'])
+        elif record.get('type') == 'relationship':
+            counts['relationships'] += 1
+        else:
+            raise ValidationException(f"未知的快照记录类型: {record.get('type')}")
+        digest.update(line)
+
+    if header is None or trailer is None:
+        raise ValidationException("快照文件不完整，缺少文件头或文件尾")
+    if trailer.get('sha256') != digest.hexdigest():
+        raise ValidationException("快照校验和不一致，文件可能已损坏")
+    for key, count in counts.items():
+        if trailer.get(key) != count:
+            raise ValidationException(f"快照的 {key} 数量不一致: 文件尾 {trailer.get(key)}, 实际 {count}")
+    return {'header': header, **counts}
+
+
+def iter_snapshot(path: str) -> Iterator[Dict[str, Any]]:
+    """逐条读取快照中的表和关联关系记录（应先调用 verify_snapshot 校验）"""
+    lines = _iter_lines(path)
+    next(lines, None)
+    for line in lines:
+        record = _parse(line)
+        if record.get('type') == 'end':
+            return
+        yield record
+
+
+def _text(value) -> Optional[str]:
+    return None if value is None else str(value)
+
+
+def _fingerprint(table_info: Dict[str, Any], columns: List[Tuple]) -> Tuple:
+    return (_text(table_info.get('comment')), table_info.get('row_count'), table_info.get('size_bytes'),
+            tuple(sorted(columns, key=lambda column: column[-1] or 0)))
+
+
+def _column_key(column: Dict[str, Any]) -> Tuple:
+    return (column['column_name'], _text(column['data_type']), _text(column['is_nullable']),
+            _text(column['default_value']), _text(column['column_comment']), column['ordinal_position'])
+
+
+def split_changed(session, datasource_id: int,
+                  tables: List[Dict[str, Any]]) -> Tuple[List[Dict[str, Any]], List[Dict[str, Any]]]:
+    """
+    将一批快照中的表与元数据库比较
+    :return: (新增或有变化的表, 未变化的表)
+    """
+    table_names = list({table_data['table_info']['table_name'] for table_data in tables})
+    existing = {}
+    for table in session.query(TableMetadata).filter(
+        TableMetadata.datasource_id == datasource_id,
+        TableMetadata.table_name.in_(table_names)
+    ).all():
+        existing[table.id] = (f"{table.schema_name}.{table.table_name}",
+                              {'comment': table.comment, 'row_count': table.row_count,
+                               'size_bytes': table.size_bytes})
+
+    columns = defaultdict(list)
+    if existing:
+        for column in session.query(ColumnMetadata).filter(ColumnMetadata.table_id.in_(list(existing))).all():
+            columns[column.table_id].append(_column_key({
+                'column_name': column.column_name, 'data_type': column.data_type,
+                'is_nullable': column.is_nullable, 'default_value': column.default_value,
+                'column_comment': column.column_comment, 'ordinal_position': column.ordinal_position
+            }))
+    fingerprints = {key: _fingerprint(table_info, columns[table_id])
+                    for table_id, (key, table_info) in existing.items()}
+
+    changed, unchanged = [], []
+    for table_data in tables:
+        table_info = table_data['table_info']
+        fingerprint = fingerprints.get(f"{table_info['schema_name']}.{table_info['table_name']}")
+        if fingerprint == _fingerprint(table_info, [_column_key(column) for column in table_data['columns']]):
+            unchanged.append(table_data)
+        else:
+            changed.append(table_data)
+    return changed, unchanged
+
+
+def import_snapshot(datasource_id: int, path: str, batch_size: Optional[int] = None) -> Dict[str, Any]:
+    """
+    将快照导入到数据源，按增量差异更新元数据库
+    :param datasource_id: 快照所属的数据源ID，数据库类型必须与快照一致
+    :param path: 快照文件路径
+    :param batch_size: 每批比较和持久化的表数量，默认 EXTRACTION_BATCH_SIZE
+    :return: 导入结果摘要
+    :raises ExtractionInProgressException: 数据源正在抽取或导入中
+    """
+    acquired, holder = acquire_lock(datasource_id, SNAPSHOT_TASK_TYPE)
+    if not acquired:
+        raise ExtractionInProgressException(
+            f"数据源 {datasource_id} 正在抽取中（抽取记录: {holder.get('history_id')}），请稍后导入", holder
+        )
+    try:
+        return _import_snapshot(datasource_id, path, batch_size)
+    finally:
+        release_lock(datasource_id)
+
+
+def _import_snapshot(datasource_id: int, path: str, batch_size: Optional[int] = None) -> Dict[str, Any]:
+    """导入快照（调用方已持有数据源的抽取锁）"""
+    start_time = time.time()
+    batch_size = batch_size or Config.EXTRACTION_BATCH_SIZE
+    summary = verify_snapshot(path)
+    header = summary['header']
+
+    with get_db_session() as session:
+        source = session.query(DataSource).filter(DataSource.id == datasource_id).first()
+        if source:
+            session.expunge(source)
+    if not source:
+        raise DataSourceNotFoundException(f"数据源不存在: {datasource_id}")
+    snapshot_source = header.get('source') or {}
+    if snapshot_source.get('type') != source.type:
+        raise ValidationException(f"快照的数据库类型 {snapshot_source.get('type')} 与数据源 {source.type} 不一致")
+    if snapshot_source.get('database') != source.database:
+        logging.warning(f"快照的数据库名 {snapshot_source.get('database')} 与数据源 {source.database} 不一致，"
+                        f"关联关系可能无法匹配")
+
+    with get_db_session() as session:
+        history_record = ExtractionHistory(
+            datasource_id=source.id,
+            status='running',
+            message='正在导入元数据快照...',
+            extracted_tables=0,
+            task_type=SNAPSHOT_TASK_TYPE,
+            total_tables=summary['tables'],
+            checkpointed_tables=0
+        )
+        session.add(history_record)
+        session.flush()
+        history_id = history_record.id
+    attach_history(source.id, history_id)
+
+    with ETLLogger.run_context(history_id, source.id):
+        try:
+            writer = CheckpointWriter(source, history_id)
+            relationships = []
+            size_records = []
+            batch = []
+
+            def flush():
+                with get_db_session() as session:
+                    changed, unchanged = split_changed(session, source.id, batch)
+                writer(changed, unchanged)
+                batch.clear()
+
+            for record in iter_snapshot(path):
+                if record['type'] == 'relationship':
+                    relationships.append(record)
+                    continue
+                batch.append(record)
+                size_records.append({'table_name': record['table_info']['table_name'],
+                                     'row_count': record['table_info'].get('row_count'),
+                                     'size_bytes': record['table_info'].get('size_bytes')})
+                if len(batch) >= batch_size:
+                    flush()
+            if batch:
+                flush()
+
+            with get_db_session() as session:
+                finalized = MetadataPersister(session, source).finalize_full([history_id], relationships)
+                ETLLogger.log_save_metadata(source.id, writer.written, writer.columns_count,
+                                            finalized['relationships_count'])
+                version = record_schema_version(session, source.id, history_id)
+                if Config.RELATIONSHIP_INFERENCE_ENABLED:
+                    try:
+                        with session.begin_nested():
+                            infer_relationships(session, source)
+                    except Exception as e:
+                        logging.warning(f"推断关联关系失败: {str(e)}")
+                session.query(ExtractionCheckpoint).filter(
+                    ExtractionCheckpoint.history_id == history_id
+                ).delete(synchronize_session=False)
+
+                if header.get('include_stats', True):
+                    sampled_at = datetime.fromisoformat(header['created_at']) if header.get('created_at') else None
+                    record_samples(session, source.id, size_records, sampled_at=sampled_at)
+                    compact_samples(session, source.id)
+
+                duration = time.time() - start_time
+                message = (f"快照导入完成：更新 {writer.written} 个表，未变化 {writer.unchanged} 个表，"
+                           f"删除 {finalized['deleted_tables']} 个表")
+                history = session.query(ExtractionHistory).filter(ExtractionHistory.id == history_id).first()
+                history.status = 'success'
+                history.message = message
+                history.extracted_tables = writer.written + writer.unchanged
+                history.duration = int(duration)
+                history.details = json.dumps({'snapshot': {
+                    'created_at': header.get('created_at'),
+                    'version': header['version'],
+                    'source': {key: snapshot_source.get(key) for key in ('name', 'host', 'database')}
+                }}, ensure_ascii=False)
+            ETLLogger.get_logger().info(message)
+
+            record_extraction(source.id, SNAPSHOT_TASK_TYPE, 'success', duration,
+                              writer.written, writer.columns_count)
+            invalidate_graph(source.id)
+            return {
+                'status': 'success',
+                'message': message,
+                'history_id': history_id,
+                'datasource_id': source.id,
+                'tables_count': summary['tables'],
+                'changed_tables': writer.written,
+                'unchanged_tables': writer.unchanged,
+                'deleted_tables': finalized['deleted_tables'],
+                'columns_count': writer.columns_count,
+                'relationships_count': finalized['relationships_count'],
+                'schema_version': version,
+                'duration': int(duration)
+            }
+        except Exception as e:
+            # 快照导入不能从检查点恢复，失败后重新导入文件
+            try:
+                with get_db_session() as session:
+                    session.query(ExtractionCheckpoint).filter(
+                        ExtractionCheckpoint.history_id == history_id
+                    ).delete(synchronize_session=False)
+            except Exception as cleanup_error:
+                logging.error(f"清理快照导入检查点失败: {str(cleanup_error)}")
+            mark_history_failed(history_id, f"快照导入失败: {str(e)}", start_time)
+            record_extraction(source.id, SNAPSHOT_TASK_TYPE, 'failed', time.time() - start_time, 0, 0)
+            ETLLogger.get_logger().error(f"快照导入失败: {str(e)}")
+            logging.error(f"快照导入失败: {str(e)}")
+            raise ExtractionException(f"快照导入失败: {str(e)}")
+
+
+def main(argv=None):
+    """离线快照命令行入口"""
+    parser = argparse.ArgumentParser(description='Super MetaData 离线目录快照')
+    commands = parser.add_subparsers(dest='command', required=True)
+
+    export_parser = commands.add_parser('export', help='连接数据源并导出快照（不需要元数据库）')
+    export_parser.add_argument('--type', required=True, help='数据库类型')
+    export_parser.add_argument('--host', required=True, help='主机地址')
+    export_parser.add_argument('--port', type=int, required=True, help='端口号')
+    export_parser.add_argument('--username', required=True, help='用户名')
+    export_parser.add_argument('--password', default='', help='密码')
+    export_parser.add_argument('--database', required=True, help='数据库名')
+    export_parser.add_argument('--name', help='数据源名称，默认为数据库名')
+    export_parser.add_argument('--schema-only', action='store_true', help='不抽取行数和大小')
+    export_parser.add_argument('-o', '--output', required=True, help='快照文件路径')
+
+    verify_parser = commands.add_parser('verify', help='校验快照文件')
+    verify_parser.add_argument('path', help='快照文件路径')
+
+    import_parser = commands.add_parser('import', help='将快照导入元数据库')
+    import_parser.add_argument('--datasource-id', type=int, required=True, help='数据源ID')
+    import_parser.add_argument('--database-url', default=Config.DATABASE_URL, help='元数据库连接URL')
+    import_parser.add_argument('path', help='快照文件路径')
+    args = parser.parse_args(argv)
+
+    logging.basicConfig(level=Config.LOG_LEVEL, format='%(asctime)s - %(levelname)s - %(message)s')
+
+    try:
+        if args.command == 'export':
+            source = DataSource(name=args.name or args.database, type=args.type, host=args.host, port=args.port,
+                                username=args.username, password=args.password, database=args.database)
+            result = write_snapshot(source, args.output, include_stats=not args.schema_only)
+        elif args.command == 'verify':
+            result = verify_snapshot(args.path)
+        else:
+            from db_manager import init_db_manager
+            init_db_manager(args.database_url)
+            result = import_snapshot(args.datasource_id, args.path)
+    except (DataSourceNotFoundException, ValidationException, ExtractionException) as e:
+        logging.error(str(e))
+        return 2
+    print(json.dumps(result, ensure_ascii=False, default=str))
+    return 0
+
+
+if __name__ == '__main__':
+    raise SystemExit(main())
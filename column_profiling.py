@@ -0,0 +1,354 @@
+"""
+字段画像
+
+元数据只记录字段名、类型和注释，数据负责人还需要空值率、不同值数、最值和高频值。
+大表上执行精确聚合的代价无法接受，画像只基于采样数据：
+1. 抽样：PostgreSQL、SQL Server 使用 TABLESAMPLE，Oracle 使用 SAMPLE，其他数据库为有界的 LIMIT 扫描
+   （见各抽取器的 get_sample_rows）
+2. 统计：每个字段维护可合并的草图（见 sketches），不同值数用 HyperLogLog，数值分位数用 KLL，高频值用 Misra-Gries
+3. 合并：随机抽样的结果与 COLUMN_PROFILE_MERGE_DAYS 天内、字段类型未变的画像合并草图，逐次扩大样本，否则替换
+4. 预算：每个数据源每次画像有时间预算，从未画像或画像最旧的表开始，上次耗时超过剩余预算的表留到下次
+
+成功的抽取结束后自动执行（COLUMN_PROFILING_ENABLED），静默时段内不执行
+"""
+import json
+import logging
+import math
+import time
+import zlib
+from collections import Counter
+from datetime import datetime, timedelta
+from decimal import Decimal
+from typing import Dict, Any, List, Optional, Tuple
+
+from sqlalchemy import func
+
+from config import Config
+from models import DataSource, TableMetadata, ColumnMetadata, ColumnProfile
+from db_manager import get_db_session
+from extractor_base import get_extractor_class
+from schema_diff import normalize_type, TYPE_FAMILIES
+from sketches import HyperLogLog, KLLSketch, FrequentItems
+from exceptions import DataSourceNotFoundException, ValidationException
+
+
+PROFILE_QUANTILES = (0.01, 0.25, 0.5, 0.75, 0.99)
+TOP_VALUES_LIMIT = 10
+# 最值和高频值的最大长度
+MAX_VALUE_LENGTH = 255
+# 二进制和JSON没有有意义的最值与高频值，大文本读取代价高，都不画像
+SKIPPED_FAMILIES = ('binary', 'json')
+SKIPPED_TYPES = ('text', 'mediumtext', 'longtext')
+# 随机抽样的结果才合并，LIMIT 扫描每次读到的基本是同一批行，合并只会重复计数
+RANDOM_SAMPLE_METHODS = ('tablesample', 'sample')
+
+
+def _encode(payload: Dict[str, Any]) -> bytes:
+    return zlib.compress(json.dumps(payload, ensure_ascii=False, separators=(',', ':')).encode('utf-8'))
+
+
+def _decode(payload: bytes) -> Dict[str, Any]:
+    return json.loads(zlib.decompress(payload).decode('utf-8'))
+
+
+def _display(value) -> str:
+    if isinstance(value, datetime):
+        value = value.isoformat(sep=' ')
+    return str(value)[:MAX_VALUE_LENGTH]
+
+
+def profiled_columns(columns: List[Tuple[str, str]]) -> List[Tuple[str, str]]:
+    """
+    选出需要画像的字段，最多 COLUMN_PROFILE_MAX_COLUMNS 个
+    :param columns: [(字段名, 类型)]，按字段顺序
+    """
+    selected = []
+    for column_name, data_type in columns:
+        name, _ = normalize_type(data_type)
+        if name in SKIPPED_TYPES or TYPE_FAMILIES.get(name, (None, 0))[0] in SKIPPED_FAMILIES:
+            continue
+        selected.append((column_name, data_type))
+    return selected[:Config.COLUMN_PROFILE_MAX_COLUMNS]
+
+
+class ColumnSketch:
+    """
+    单个字段的可合并统计
+    """
+
+    def __init__(self, rows: int = 0, nulls: int = 0, minimum=None, maximum=None,
+                 hll: HyperLogLog = None, kll: KLLSketch = None, top: FrequentItems = None):
+        self.rows = rows
+        self.nulls = nulls
+        self.minimum = minimum
+        self.maximum = maximum
+        self.hll = hll or HyperLogLog()
+        self.kll = kll or KLLSketch()
+        self.top = top or FrequentItems()
+
+    def _bound(self, value):
+        try:
+            if self.minimum is None or value < self.minimum:
+                self.minimum = value
+            if self.maximum is None or value > self.maximum:
+                self.maximum = value
+        except TypeError:
+            # 同一字段的值类型不一致（如驱动对部分行返回字符串），按字符串比较
+            self.minimum, self.maximum = min(str(self.minimum), str(value)), max(str(self.maximum), str(value))
+
+    def update(self, values):
+        """加入一批采样值"""
+        counts = Counter()
+        for value in values:
+            self.rows += 1
+            if value is None:
+                self.nulls += 1
+                continue
+            if isinstance(value, (int, float, Decimal)) and not isinstance(value, bool):
+                number = value if isinstance(value, int) else float(value)
+                if isinstance(number, float) and (math.isnan(number) or math.isinf(number)):
+                    continue
+                self.kll.add(float(number))
+                self._bound(number)
+            else:
+                self._bound(_display(value))
+            key = _display(value)
+            self.hll.add(key)
+            counts[key] += 1
+        self.top.update(counts)
+
+    def merge(self, other: 'ColumnSketch'):
+        self.rows += other.rows
+        self.nulls += other.nulls
+        for value in (other.minimum, other.maximum):
+            if value is not None:
+                self._bound(value)
+        self.hll.merge(other.hll)
+        self.kll.merge(other.kll)
+        self.top.merge(other.top)
+
+    def summary(self) -> Dict[str, Any]:
+        """画像结果：空值率、不同值数、最值、分位数、高频值"""
+        non_null = self.rows - self.nulls
+        distinct = min(self.hll.count(), non_null)
+        quantiles = None
+        if self.kll.count:
+            quantiles = {f"p{int(rank * 100)}": value
+                         for rank, value in zip(PROFILE_QUANTILES, self.kll.quantiles(list(PROFILE_QUANTILES)))}
+        return {
+            'sampled_rows': self.rows,
+            'null_count': self.nulls,
+            'null_ratio': round(self.nulls / self.rows, 4) if self.rows else None,
+            'distinct_count': distinct,
+            'distinct_ratio': round(distinct / non_null, 4) if non_null else None,
+            'min_value': _display(self.minimum) if self.minimum is not None else None,
+            'max_value': _display(self.maximum) if self.maximum is not None else None,
+            'quantiles': quantiles,
+            'top_values': self.top.top(TOP_VALUES_LIMIT)
+        }
+
+    def to_dict(self) -> Dict[str, Any]:
+        return {'rows': self.rows, 'nulls': self.nulls, 'min': self.minimum, 'max': self.maximum,
+                'hll': self.hll.to_dict(), 'kll': self.kll.to_dict(), 'top': self.top.to_dict()}
+
+    @classmethod
+    def from_dict(cls, data: Dict[str, Any]) -> 'ColumnSketch':
+        return cls(data['rows'], data['nulls'], data['min'], data['max'], HyperLogLog.from_dict(data['hll']),
+                   KLLSketch.from_dict(data['kll']), FrequentItems.from_dict(data['top']))
+
+
+def profile_table(extractor, table_name: str, columns: List[Tuple[str, str]], sample_rows: int,
+                  estimated_rows: int = 0) -> Tuple[str, Dict[str, ColumnSketch], float]:
+    """
+    抽样一个表并计算各字段的草图
+    :param extractor: 已连接的抽取器
+    :param columns: profiled_columns 选出的字段
+    :return: (抽样方式, {字段名: 草图}, 耗时秒数)
+    """
+    started = time.time()
+    method, rows = extractor.get_sample_rows(table_name, [name for name, _ in columns], sample_rows, estimated_rows)
+    sketches = {}
+    for index, (column_name, _) in enumerate(columns):
+        sketch = ColumnSketch()
+        sketch.update(row[index] for row in rows)
+        sketches[column_name] = sketch
+    return method, sketches, time.time() - started
+
+
+def save_table_profiles(session, datasource_id: int, table_name: str, data_types: Dict[str, str],
+                        sketches: Dict[str, ColumnSketch], method: str, cost: float,
+                        now: Optional[datetime] = None) -> int:
+    """
+    保存一个表的字段画像，随机抽样时与近期且类型未变的画像合并草图；不再画像的字段删除旧画像
+    :param data_types: {字段名: 类型}
+    :return: 保存的字段数
+    """
+    now = now or datetime.utcnow()
+    merge_after = now - timedelta(days=Config.COLUMN_PROFILE_MERGE_DAYS)
+    existing = {row.column_name: row for row in session.query(ColumnProfile).filter(
+        ColumnProfile.datasource_id == datasource_id,
+        ColumnProfile.table_name == table_name
+    ).all()}
+
+    for column_name, sketch in sketches.items():
+        row = existing.pop(column_name, None)
+        samples = 1
+        if (row is not None and row.sketch and row.data_type == data_types[column_name]
+                and method in RANDOM_SAMPLE_METHODS and row.sample_method == method
+                and row.profiled_at and row.profiled_at >= merge_after):
+            merged = ColumnSketch.from_dict(_decode(row.sketch))
+            merged.merge(sketch)
+            sketch = merged
+            samples = (row.samples or 1) + 1
+        if row is None:
+            row = ColumnProfile(datasource_id=datasource_id, table_name=table_name, column_name=column_name)
+            session.add(row)
+        summary = sketch.summary()
+        row.data_type = data_types[column_name]
+        row.sample_method = method
+        row.sampled_rows = summary['sampled_rows']
+        row.null_count = summary['null_count']
+        row.distinct_count = summary['distinct_count']
+        row.min_value = summary['min_value']
+        row.max_value = summary['max_value']
+        row.quantiles = json.dumps(summary['quantiles']) if summary['quantiles'] else None
+        row.top_values = json.dumps(summary['top_values'], ensure_ascii=False)
+        row.sketch = _encode(sketch.to_dict())
+        row.samples = samples
+        row.cost_seconds = round(cost, 3)
+        row.profiled_at = now
+
+    for row in existing.values():
+        session.delete(row)
+    return len(sketches)
+
+
+def _load_plan(session, datasource_id: int, table_names: Optional[List[str]]):
+    """需要画像的表（含字段和估算行数），以及各表上次画像的时间和耗时"""
+    tables = {}
+    query = session.query(TableMetadata.id, TableMetadata.table_name, TableMetadata.row_count).filter(
+        TableMetadata.datasource_id == datasource_id
+    )
+    if table_names:
+        query = query.filter(TableMetadata.table_name.in_(table_names))
+    table_ids = {}
+    for table_id, table_name, row_count in query.all():
+        tables[table_name] = {'row_count': row_count or 0, 'columns': []}
+        table_ids[table_id] = table_name
+    for table_id, column_name, data_type in session.query(
+        ColumnMetadata.table_id, ColumnMetadata.column_name, ColumnMetadata.data_type
+    ).join(TableMetadata, TableMetadata.id == ColumnMetadata.table_id).filter(
+        TableMetadata.datasource_id == datasource_id
+    ).order_by(ColumnMetadata.table_id, ColumnMetadata.ordinal_position).all():
+        if table_id in table_ids:
+            tables[table_ids[table_id]]['columns'].append((column_name, data_type))
+
+    history = {table_name: (profiled_at, cost) for table_name, profiled_at, cost in session.query(
+        ColumnProfile.table_name, func.min(ColumnProfile.profiled_at), func.max(ColumnProfile.cost_seconds)
+    ).filter(ColumnProfile.datasource_id == datasource_id).group_by(ColumnProfile.table_name).all()}
+    return tables, history
+
+
+def profile_datasource(datasource_id: int, budget_seconds: Optional[float] = None, sample_rows: Optional[int] = None,
+                       table_names: Optional[List[str]] = None) -> Dict[str, Any]:
+    """
+    在时间预算内对数据源的表抽样画像，从未画像或画像最旧的表开始
+    :param budget_seconds: 时间预算（秒），默认 COLUMN_PROFILE_BUDGET_SECONDS
+    :param sample_rows: 每个表抽样的最大行数，默认 COLUMN_PROFILE_SAMPLE_ROWS
+    :param table_names: 只画像指定的表
+    :return: {tables_profiled, columns_profiled, tables_deferred, failed, elapsed_seconds, budget_seconds}
+    """
+    budget = Config.COLUMN_PROFILE_BUDGET_SECONDS if budget_seconds is None else budget_seconds
+    sample_rows = sample_rows or Config.COLUMN_PROFILE_SAMPLE_ROWS
+    with get_db_session() as session:
+        source = session.query(DataSource).filter(DataSource.id == datasource_id).first()
+        if source:
+            session.expunge(source)
+            tables, history = _load_plan(session, datasource_id, table_names)
+    if not source:
+        raise DataSourceNotFoundException(f"数据源不存在: {datasource_id}")
+    extractor_class = get_extractor_class(source.type)
+    if not extractor_class:
+        raise ValidationException(f"不支持的数据库类型: {source.type}")
+
+    result = {'datasource_id': datasource_id, 'tables_profiled': 0, 'columns_profiled': 0,
+              'tables_deferred': 0, 'failed': [], 'elapsed_seconds': 0, 'budget_seconds': budget}
+    extractor = extractor_class(source)
+    if extractor.throttle.lightweight_only():
+        return dict(result, skipped='quiet_hours', tables_deferred=len(tables))
+
+    # 从未画像的表优先，其次是画像最旧的表
+    order = sorted(tables, key=lambda name: (name in history, history.get(name, (None,))[0] or datetime.min))
+    started = time.time()
+    extractor.connect()
+    try:
+        for table_name in order:
+            columns = profiled_columns(tables[table_name]['columns'])
+            if not columns:
+                continue
+            remaining = budget - (time.time() - started)
+            last_cost = history.get(table_name, (None, None))[1]
+            if remaining <= 0 or (last_cost and last_cost > remaining):
+                result['tables_deferred'] += 1
+                continue
+            try:
+                method, sketches, cost = profile_table(extractor, table_name, columns, sample_rows,
+                                                       tables[table_name]['row_count'])
+            except Exception as e:
+                logging.warning(f"字段画像失败 {table_name}: {str(e)}")
+                result['failed'].append({'table_name': table_name, 'error': str(e)})
+                extractor.connection.rollback()
+                continue
+            with get_db_session() as session:
+                result['columns_profiled'] += save_table_profiles(
+                    session, datasource_id, table_name, dict(columns), sketches, method, cost
+                )
+            result['tables_profiled'] += 1
+    finally:
+        extractor.disconnect()
+    result['elapsed_seconds'] = round(time.time() - started, 3)
+    return result
+
+
+def _profile_dict(row: ColumnProfile) -> Dict[str, Any]:
+    non_null = (row.sampled_rows or 0) - (row.null_count or 0)
+    return {
+        'column_name': row.column_name,
+        'data_type': row.data_type,
+        'sample_method': row.sample_method,
+        'sampled_rows': row.sampled_rows,
+        'null_count': row.null_count,
+        'null_ratio': round(row.null_count / row.sampled_rows, 4) if row.sampled_rows else None,
+        'distinct_count': row.distinct_count,
+        'distinct_ratio': round(row.distinct_count / non_null, 4) if non_null and row.distinct_count is not None else None,
+        'min_value': row.min_value,
+        'max_value': row.max_value,
+        'quantiles': json.loads(row.quantiles) if row.quantiles else None,
+        'top_values': json.loads(row.top_values) if row.top_values else [],
+        'samples': row.samples,
+        'profiled_at': row.profiled_at
+    }
+
+
+def table_profile(table_id: int) -> Optional[Dict[str, Any]]:
+    """
+    表的字段画像，按字段顺序排列
+    :return: {table_id, table_name, datasource_id, columns: [...]}，表不存在时返回None
+    """
+    with get_db_session() as session:
+        table = session.query(TableMetadata.datasource_id, TableMetadata.table_name).filter(
+            TableMetadata.id == table_id
+        ).first()
+        if not table:
+            return None
+        positions = dict(session.query(ColumnMetadata.column_name, ColumnMetadata.ordinal_position).filter(
+            ColumnMetadata.table_id == table_id
+        ).all())
+        rows = session.query(ColumnProfile).filter(
+            ColumnProfile.datasource_id == table.datasource_id,
+            ColumnProfile.table_name == table.table_name
+        ).all()
+        columns = sorted((_profile_dict(row) for row in rows),
+                         key=lambda column: positions.get(column['column_name']) or 0)
+    return {'table_id': table_id, 'table_name': table.table_name, 'datasource_id': table.datasource_id,
+            'columns': columns}
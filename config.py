@@ -24,6 +24,17 @@ class Config:
     DB_POOL_SIZE = DB_POOL_CONFIG.get('pool_size', 10)
     DB_POOL_MAX_OVERFLOW = DB_POOL_CONFIG.get('max_overflow', 20)
     DB_POOL_RECYCLE = DB_POOL_CONFIG.get('pool_recycle', 3600)
+    DB_POOL_TIMEOUT = DB_POOL_CONFIG.get('pool_timeout', 30)
+    DB_POOL_PRE_PING = DB_POOL_CONFIG.get('pool_pre_ping', True)
+    DB_MAX_CONNECTIONS = DB_POOL_CONFIG.get('max_connections', 0)  # 所有进程合计的连接数上限，0表示不限制
+    DB_POOL_WORKERS = DB_POOL_CONFIG.get('worker_processes', 1)  # 共享元数据库的工作进程数
+    
+    # 只读副本（读写分离）配置
+    DB_REPLICA_CONFIG = DatabaseConfig.get_system_database_replica_config()
+    DB_REPLICA_URLS = DB_REPLICA_CONFIG.get('urls', [])
+    DB_REPLICA_MAX_LAG = DB_REPLICA_CONFIG.get('max_lag_seconds', 10)  # 允许的最大复制延迟（秒）
+    DB_REPLICA_LAG_CHECK_INTERVAL = DB_REPLICA_CONFIG.get('lag_check_interval', 5)  # 延迟检查结果的缓存时间（秒）
+    DB_READ_AFTER_WRITE_SECONDS = DB_REPLICA_CONFIG.get('read_after_write_seconds', 5)  # 写请求后继续读主库的时间（秒）
     DB_ECHO = DatabaseConfig.is_echo_enabled()
     
     # 连接参数
@@ -43,10 +54,81 @@ class Config:
     # 元数据抽取配置
     EXTRACTION_BATCH_SIZE = int(os.environ.get('EXTRACTION_BATCH_SIZE', '100'))  # 批量处理表的数量
     EXTRACTION_TIMEOUT = int(os.environ.get('EXTRACTION_TIMEOUT', '3600'))  # 抽取超时时间（秒）
+    EXTRACTION_TABLE_RETRIES = int(os.environ.get('EXTRACTION_TABLE_RETRIES', '3'))  # 单表瞬时错误的最大重试次数
+    EXTRACTION_RETRY_BACKOFF_SECONDS = float(os.environ.get('EXTRACTION_RETRY_BACKOFF_SECONDS', '1'))  # 单表重试的基础退避时间（秒）
+    ALLOW_SQLITE_SOURCES = os.environ.get('ALLOW_SQLITE_SOURCES', 'false').lower() == 'true'  # 是否允许 SQLite 文件作为数据源（仅用于本地测试，默认关闭）
+    EXTRACTION_BACKEND = os.environ.get('EXTRACTION_BACKEND', 'sync')  # 抽取引擎：sync（同步）或 async（asyncio）
+    ASYNC_PER_SOURCE_CONCURRENCY = int(os.environ.get('ASYNC_PER_SOURCE_CONCURRENCY', '4'))  # 异步抽取时单个数据源的并发查询数
+    ASYNC_MAX_CONCURRENT_SOURCES = int(os.environ.get('ASYNC_MAX_CONCURRENT_SOURCES', '16'))  # 异步抽取时同时抽取的数据源数量
+    
+    # 数据源保护限流配置（可在数据源的 throttle_config 中单独覆盖）
+    THROTTLE_MAX_QPS = float(os.environ.get('THROTTLE_MAX_QPS', '0'))  # 每秒最大查询数，0表示不限制
+    THROTTLE_MAX_CONCURRENT = int(os.environ.get('THROTTLE_MAX_CONCURRENT', '0'))  # 最大并发语句数，0表示不限制
+    THROTTLE_LATENCY_FACTOR = float(os.environ.get('THROTTLE_LATENCY_FACTOR', '3'))  # 延迟超过基线多少倍时退避
+    THROTTLE_QUIET_HOURS = os.environ.get('THROTTLE_QUIET_HOURS', '')  # 静默时段，如 08:00-20:00，多个用逗号分隔
+    
+    # 批量抽取编排配置
+    ORCHESTRATOR_MAX_WORKERS = int(os.environ.get('ORCHESTRATOR_MAX_WORKERS', '8'))  # 全局并发抽取上限
+    ORCHESTRATOR_PER_HOST_LIMIT = int(os.environ.get('ORCHESTRATOR_PER_HOST_LIMIT', '2'))  # 同一主机的并发上限
+    ORCHESTRATOR_PER_ENGINE_LIMIT = int(os.environ.get('ORCHESTRATOR_PER_ENGINE_LIMIT', '4'))  # 同一数据库类型的并发上限
+    
+    # 分布式抽取工作进程配置
+    WORKER_CONCURRENCY = int(os.environ.get('WORKER_CONCURRENCY', '2'))  # 单个工作进程同时执行的作业数
+    WORKER_LEASE_SECONDS = int(os.environ.get('WORKER_LEASE_SECONDS', '300'))  # 作业租约时长（秒）
+    WORKER_HEARTBEAT_SECONDS = int(os.environ.get('WORKER_HEARTBEAT_SECONDS', '30'))  # 心跳续约间隔（秒）
+    WORKER_POLL_SECONDS = float(os.environ.get('WORKER_POLL_SECONDS', '5'))  # 队列为空时的轮询间隔（秒）
+    JOB_MAX_ATTEMPTS = int(os.environ.get('JOB_MAX_ATTEMPTS', '3'))  # 作业最大尝试次数
+    JOB_RETRY_BACKOFF_SECONDS = int(os.environ.get('JOB_RETRY_BACKOFF_SECONDS', '60'))  # 作业失败重试的基础退避时间（秒）
+    EXTRACTION_LOCK_TTL_SECONDS = int(os.environ.get('EXTRACTION_LOCK_TTL_SECONDS', '120'))  # 数据源抽取锁的租期（秒），持有者每隔三分之一租期续约
+    
+    # 表容量增长采样配置（按月汇总的数据永久保留）
+    GROWTH_RAW_RETENTION_DAYS = int(os.environ.get('GROWTH_RAW_RETENTION_DAYS', '30'))  # 每次抽取的原始采样保留天数
+    GROWTH_DAILY_RETENTION_DAYS = int(os.environ.get('GROWTH_DAILY_RETENTION_DAYS', '400'))  # 按天汇总的保留天数
+    GROWTH_WEEKLY_RETENTION_DAYS = int(os.environ.get('GROWTH_WEEKLY_RETENTION_DAYS', '1100'))  # 按周汇总的保留天数
+    
+    # 抽取历史保留配置（过期记录先汇总为按天统计、写入归档文件，再分批删除）
+    HISTORY_RETENTION_DAYS = int(os.environ.get('HISTORY_RETENTION_DAYS', '180'))  # 默认保留天数，数据源可单独配置，0表示永久保留
+    HISTORY_ARCHIVE_DIR = os.environ.get('HISTORY_ARCHIVE_DIR', '')  # 归档目录，默认为 archive/extraction_history
+    HISTORY_PURGE_BATCH_SIZE = int(os.environ.get('HISTORY_PURGE_BATCH_SIZE', '500'))  # 每个事务删除的历史记录数
+    
+    # 表结构版本配置
+    SCHEMA_CHECKPOINT_INTERVAL = int(os.environ.get('SCHEMA_CHECKPOINT_INTERVAL', '20'))  # 每隔多少个版本保存一次完整快照
+    
+    # 关联关系图配置
+    RELATIONSHIP_GRAPH_MAX_DEPTH = int(os.environ.get('RELATIONSHIP_GRAPH_MAX_DEPTH', '8'))  # 路径和影响分析的最大深度
+    RELATIONSHIP_GRAPH_CACHE_SOURCES = int(os.environ.get('RELATIONSHIP_GRAPH_CACHE_SOURCES', '16'))  # 内存中缓存关联关系图的数据源数量
+    
+    # 关联关系推断配置
+    RELATIONSHIP_INFERENCE_ENABLED = os.environ.get('RELATIONSHIP_INFERENCE_ENABLED', 'True').lower() == 'true'  # 抽取成功后是否按命名规则推断关联关系
+    RELATIONSHIP_INFERENCE_MIN_CONFIDENCE = float(os.environ.get('RELATIONSHIP_INFERENCE_MIN_CONFIDENCE', '0.6'))  # 保存推断关系的最低置信度
+    RELATIONSHIP_INFERENCE_SAMPLE_SIZE = int(os.environ.get('RELATIONSHIP_INFERENCE_SAMPLE_SIZE', '0'))  # 抽取后推断时抽样校验的值数量，0表示不抽样
+    
+    # 字段画像配置
+    COLUMN_PROFILING_ENABLED = os.environ.get('COLUMN_PROFILING_ENABLED', 'True').lower() == 'true'  # 抽取成功后是否对字段抽样画像
+    COLUMN_PROFILE_BUDGET_SECONDS = float(os.environ.get('COLUMN_PROFILE_BUDGET_SECONDS', '120'))  # 每个数据源每次画像的时间预算（秒）
+    COLUMN_PROFILE_SAMPLE_ROWS = int(os.environ.get('COLUMN_PROFILE_SAMPLE_ROWS', '10000'))  # 每个表每次抽样的最大行数
+    COLUMN_PROFILE_MAX_COLUMNS = int(os.environ.get('COLUMN_PROFILE_MAX_COLUMNS', '50'))  # 每个表画像的最大字段数
+    COLUMN_PROFILE_MERGE_DAYS = int(os.environ.get('COLUMN_PROFILE_MERGE_DAYS', '7'))  # 与多少天内的画像合并草图，更早的画像直接替换
+    
+    # 目录导出配置
+    EXPORT_CHUNK_SIZE = int(os.environ.get('EXPORT_CHUNK_SIZE', '5000'))  # 导出时每批从元数据库读取和写出的行数
+    
+    # 指标配置
+    METRICS_TOKEN = os.environ.get('METRICS_TOKEN', '')  # 访问 /metrics 需要的Bearer令牌，为空表示不校验
     
     # 日志配置
     LOG_LEVEL = os.environ.get('LOG_LEVEL', 'INFO')
     LOG_FILE = os.environ.get('LOG_FILE', 'metadata_manager.log')
+    
+    # ETL日志配置
+    ETL_LOG_DIR = os.environ.get('ETL_LOG_DIR', '')  # ETL日志目录，为空时使用程序目录下的 logs
+    ETL_LOG_LEVEL = os.environ.get('ETL_LOG_LEVEL', 'INFO')
+    ETL_LOG_PROCESS_NAME = os.environ.get('ETL_LOG_PROCESS_NAME', '')  # 日志文件名 etl-<进程标识>.log 中的进程标识，为空时使用进程号
+    ETL_LOG_MAX_BYTES = int(os.environ.get('ETL_LOG_MAX_BYTES', str(50 * 1024 * 1024)))  # 本进程的日志文件超过该大小后轮转
+    ETL_LOG_ROTATE_INTERVAL_HOURS = int(os.environ.get('ETL_LOG_ROTATE_INTERVAL_HOURS', '24'))  # 按时间轮转的间隔（小时），0表示只按大小轮转
+    ETL_LOG_BACKUP_COUNT = int(os.environ.get('ETL_LOG_BACKUP_COUNT', '10'))  # 保留的压缩备份数量
+    ETL_LOG_CONSOLE = os.environ.get('ETL_LOG_CONSOLE', 'True').lower() == 'true'  # 是否同时输出到控制台
+    ETL_RUN_LOG_RETENTION_DAYS = int(os.environ.get('ETL_RUN_LOG_RETENTION_DAYS', '30'))  # 单次运行日志和已退出进程的日志文件的保留天数
 
 
 class DevelopmentConfig(Config):
@@ -1,14 +1,13 @@
-import os
-from sqlalchemy import create_engine
-from sqlalchemy.orm import sessionmaker
-from sqlalchemy.pool import QueuePool
+"""
+系统数据库配置（兼容层）
+
+元数据库的连接池统一由 db_manager 管理，这里保留旧的 DatabaseConfig 接口供 auth_models、auth_utils 使用
+"""
 from contextlib import contextmanager
-from exceptions import DatabaseConnectionException
-import logging
 
+import db_manager
 # 从统一配置文件导入数据库连接配置
 from database_connections import (
-    SYSTEM_DATABASE,
     DatabaseConfig as DBConfig,
     get_connection_string,
     SUPPORTED_DATABASES
@@ -19,53 +18,33 @@ class DatabaseConfig:
     """
     数据库配置类（系统数据库连接）
     
-    注意：现在所有数据库连接配置都在 database_connections.py 中统一管理
+    注意：现在所有数据库连接配置都在 database_connections.py 中统一管理，
+    引擎和会话来自 db_manager 的全局连接池，不再单独创建连接池
     """
-    def __init__(self):
-        # 从统一配置文件获取数据库URL
-        self.database_url = DBConfig.get_system_database_url()
-        self.engine = None
-        self.SessionLocal = None
-        
+    @property
+    def database_url(self):
+        if db_manager.db_manager is not None:
+            return db_manager.db_manager.database_url
+        return DBConfig.get_system_database_url()
+
+    @property
+    def engine(self):
+        return db_manager.init_db_manager(self.database_url).engine
+
     def init_db(self):
-        """初始化数据库引擎"""
-        try:
-            # 从统一配置获取连接池参数
-            pool_config = DBConfig.get_system_database_pool_config()
-            connect_args = DBConfig.get_system_database_connect_args()
-            
-            self.engine = create_engine(
-                self.database_url,
-                poolclass=QueuePool,
-                pool_size=pool_config.get('pool_size', 10),
-                max_overflow=pool_config.get('max_overflow', 20),
-                pool_recycle=pool_config.get('pool_recycle', 3600),
-                pool_pre_ping=pool_config.get('pool_pre_ping', True),
-                echo=DBConfig.is_echo_enabled(),
-                connect_args=connect_args
-            )
-              
-            # 创建会话工厂
-            self.SessionLocal = sessionmaker(autocommit=False, autoflush=False, bind=self.engine)
-              
-            return self.engine
-        except Exception as e:
-            logging.error(f"数据库引擎初始化失败: {str(e)}")
-            raise DatabaseConnectionException(f"数据库引擎初始化失败: {str(e)}")
-    
+        """初始化数据库引擎（已初始化时复用）"""
+        return self.engine
+
     @contextmanager
     def get_session(self):
         """获取数据库会话的上下文管理器"""
-        session = self.SessionLocal()
-        try:
+        db_manager.init_db_manager(self.database_url)
+        with db_manager.get_db_session() as session:
             yield session
-            session.commit()
-        except Exception as e:
-            session.rollback()
-            logging.error(f"数据库会话错误: {str(e)}")
-            raise DatabaseConnectionException(f"数据库操作失败: {str(e)}")
-        finally:
-            session.close()
+
+
+# 全局实例
+db_config = DatabaseConfig()
 
 
 # 支持的数据库类型映射（从统一配置导入）
@@ -77,6 +56,7 @@ SUPPORTED_DATABASES = SUPPORTED_DATABASES
 # 保留此函数引用以保持向后兼容
 __all__ = [
     'DatabaseConfig',
+    'db_config',
     'SUPPORTED_DATABASES',
     'get_connection_string',
 ]
@@ -1,43 +1,181 @@
 """
 数据库连接管理器
+
+元数据库在每个进程中只有一个连接池：连接池参数来自 SYSTEM_DATABASE['pool']（见 config.Config.DB_POOL_*），
+连接参数按数据库方言生成；配置了 DB_MAX_CONNECTIONS 时每个进程的连接数按工作进程数均分，
+fork 出的子进程第一次使用时丢弃继承自父进程的连接
+
+配置了只读副本（SYSTEM_DATABASE['replicas']）时支持读写分离：
+1. 只有在 use_read_replica() 范围内（如 GET 请求）的 SELECT 才会发往副本，写操作和原生SQL始终发往主库
+2. 会话中发生写操作后，之后的读也留在主库，保证读到自己的写入
+3. 副本的复制延迟定期检查，超过 DB_REPLICA_MAX_LAG 或无法连接时回退到主库
 """
 from contextlib import contextmanager
+import contextvars
 import logging
-from sqlalchemy import create_engine, text
-from sqlalchemy.orm import sessionmaker
-from sqlalchemy.pool import QueuePool
+import os
+import threading
+import time
+from sqlalchemy import create_engine, text, Select, TextClause
+from sqlalchemy.engine import make_url
+from sqlalchemy.orm import sessionmaker, Session
+from sqlalchemy.pool import QueuePool, StaticPool
 from sqlalchemy.exc import SQLAlchemyError
+from config import Config
 from exceptions import DatabaseConnectionException
+from metrics import InstrumentedQueuePool
+
+
+# 当前线程（或协程）的读操作是否可以发往只读副本，由 use_read_replica 设置
+_read_replica: contextvars.ContextVar = contextvars.ContextVar('db_read_replica', default=False)
+
+
+@contextmanager
+def use_read_replica(enabled=True):
+    """在此范围内，会话中的 SELECT 可以发往只读副本"""
+    token = _read_replica.set(enabled)
+    try:
+        yield
+    finally:
+        _read_replica.reset(token)
+
+
+def per_process_pool_size(pool_size, max_overflow, max_connections=0, worker_processes=1):
+    """
+    按工作进程数均分连接数上限
+    :param max_connections: 所有进程合计的连接数上限，0表示不限制
+    :return: (pool_size, max_overflow)
+    """
+    if not max_connections:
+        return pool_size, max_overflow
+    budget = max(1, max_connections // max(1, worker_processes))
+    pool_size = min(pool_size, budget)
+    return pool_size, max(0, min(max_overflow, budget - pool_size))
+
+
+class RoutingSession(Session):
+    """
+    按语句路由的会话：写操作、flush 和原生SQL发往主库，只读范围内的 SELECT 发往健康的副本
+    """
+
+    def __init__(self, manager=None, **kwargs):
+        super().__init__(**kwargs)
+        self.manager = manager
+        self._wrote = False
+
+    def get_bind(self, mapper=None, clause=None, **kwargs):
+        if self.manager is None or not self.manager.replicas:
+            return super().get_bind(mapper=mapper, clause=clause, **kwargs)
+        if self._flushing or not isinstance(clause, Select):
+            # 原生SQL（text）也可能是写操作，保守地发往主库；只有 SELECT 文本不视为写入
+            if not (isinstance(clause, TextClause) and clause.text.lstrip()[:6].lower() == 'select'):
+                self._wrote = True
+            return self.manager.engine
+        if self._wrote or not _read_replica.get():
+            return self.manager.engine
+        return self.manager.pick_replica() or self.manager.engine
 
 
 class DatabaseManager:
     """
     数据库连接管理器，提供连接池和会话管理
     """
-    def __init__(self, database_url, pool_size=10, max_overflow=20):
+    def __init__(self, database_url, pool_size=None, max_overflow=None, pool_recycle=None, pool_timeout=None,
+                 echo=None, max_connections=None, worker_processes=None, replica_urls=None):
+        """
+        未指定的参数使用 Config 中的连接池配置
+        :param replica_urls: 只读副本的连接URL列表，默认为 Config.DB_REPLICA_URLS
+        """
         self.database_url = database_url
-        self.pool_size = pool_size
-        self.max_overflow = max_overflow
+        self.pool_size, self.max_overflow = per_process_pool_size(
+            Config.DB_POOL_SIZE if pool_size is None else pool_size,
+            Config.DB_POOL_MAX_OVERFLOW if max_overflow is None else max_overflow,
+            Config.DB_MAX_CONNECTIONS if max_connections is None else max_connections,
+            Config.DB_POOL_WORKERS if worker_processes is None else worker_processes
+        )
+        self.pool_recycle = Config.DB_POOL_RECYCLE if pool_recycle is None else pool_recycle
+        self.pool_timeout = Config.DB_POOL_TIMEOUT if pool_timeout is None else pool_timeout
+        self.echo = Config.DB_ECHO if echo is None else echo
+        self.replica_urls = list(Config.DB_REPLICA_URLS if replica_urls is None else replica_urls)
+        self.replicas = []
+        self._replica_state = {}  # 副本序号 -> {'checked_at', 'healthy', 'lag'}
+        self._replica_lock = threading.Lock()  # 只保护游标和健康状况缓存，检查本身在锁外执行
+        self._replica_checking = set()  # 正在由某个线程检查的副本序号
+        self._replica_cursor = 0
+        self.pid = os.getpid()
+        self.options = {}  # init_db_manager 传入的参数，用于判断是否需要重建
         self.engine = None
         self.SessionLocal = None
         self._init_engine()
 
+    @property
+    def backend(self):
+        return make_url(self.database_url).get_backend_name()
+
+    @staticmethod
+    def _url_label(url):
+        """日志和状态中显示的副本地址（不含用户名和密码）"""
+        parsed = make_url(url)
+        return f"{parsed.host or ''}:{parsed.port or ''}/{parsed.database or ''}"
+
+    @property
+    def capacity(self):
+        """本进程最多可同时借出的连接数"""
+        return self.pool_size + self.max_overflow
+
+    def _connect_args(self, url=None):
+        """根据数据库方言生成连接参数（charset等参数只有MySQL驱动支持）"""
+        backend = make_url(url or self.database_url).get_backend_name()
+        if backend == 'mysql':
+            return {'connect_timeout': Config.CONNECTION_TIMEOUT,
+                    'charset': Config.DB_CONNECT_ARGS.get('charset', 'utf8mb4')}
+        if backend == 'postgresql':
+            return {'connect_timeout': Config.CONNECTION_TIMEOUT}
+        if backend == 'sqlite':
+            # 允许多线程共享连接，并在多进程写入时等待锁释放
+            return {'check_same_thread': False, 'timeout': Config.CONNECTION_TIMEOUT}
+        return {}
+
+    def _pool_args(self):
+        """连接池参数；SQLite 内存库只能共享同一个连接"""
+        if self.backend == 'sqlite' and make_url(self.database_url).database in (None, '', ':memory:'):
+            self.pool_size, self.max_overflow = 1, 0
+            return {'poolclass': StaticPool}
+        return {
+            'poolclass': InstrumentedQueuePool,
+            'pool_size': self.pool_size,
+            'max_overflow': self.max_overflow,
+            'pool_recycle': self.pool_recycle,
+            'pool_timeout': self.pool_timeout,
+            'pool_pre_ping': Config.DB_POOL_PRE_PING,
+        }
+
+    def _replica_pool_args(self):
+        """副本使用与主库相同大小的普通连接池（取连接等待指标只统计主库）"""
+        return {
+            'poolclass': QueuePool,
+            'pool_size': self.pool_size,
+            'max_overflow': self.max_overflow,
+            'pool_recycle': self.pool_recycle,
+            'pool_timeout': self.pool_timeout,
+            'pool_pre_ping': Config.DB_POOL_PRE_PING,
+        }
+
     def _init_engine(self):
         """初始化数据库引擎"""
         try:
             self.engine = create_engine(
                 self.database_url,
-                poolclass=QueuePool,
-                pool_size=self.pool_size,
-                max_overflow=self.max_overflow,
-                pool_pre_ping=True,
-                echo=False,
-                connect_args={
-                    'connect_timeout': 30,
-                    'charset': 'utf8mb4'
-                }
+                echo=self.echo,
+                connect_args=self._connect_args(),
+                **self._pool_args()
             )
+            self.replicas = [create_engine(url, echo=self.echo, connect_args=self._connect_args(url),
+                                           **self._replica_pool_args())
+                             for url in self.replica_urls]
             self.SessionLocal = sessionmaker(
+                class_=RoutingSession,
+                manager=self,
                 autocommit=False, 
                 autoflush=False, 
                 bind=self.engine
@@ -46,9 +184,132 @@ class DatabaseManager:
             logging.error(f"数据库引擎初始化失败: {str(e)}")
             raise DatabaseConnectionException(f"数据库引擎初始化失败: {str(e)}")
 
+    def _check_process(self):
+        """fork 出的子进程不能使用父进程的连接，丢弃后由本进程重新建立"""
+        pid = os.getpid()
+        if pid != self.pid:
+            self.engine.dispose(close=False)
+            for replica in self.replicas:
+                replica.dispose(close=False)
+            self.pid = pid
+
+    def _replica_lag(self, engine):
+        """
+        查询副本的复制延迟（秒）
+        :return: 延迟秒数；复制已中断时返回None；不是副本或方言不提供延迟信息时返回0
+        """
+        with engine.connect() as conn:
+            backend = engine.dialect.name
+            if backend == 'mysql':
+                try:
+                    row = conn.execute(text("SHOW REPLICA STATUS")).mappings().first()
+                except Exception:
+                    row = conn.execute(text("SHOW SLAVE STATUS")).mappings().first()
+                if row is None:
+                    return 0
+                lag = row.get('Seconds_Behind_Source', row.get('Seconds_Behind_Master'))
+                return None if lag is None else float(lag)
+            if backend == 'postgresql':
+                lag = conn.execute(text(
+                    "SELECT CASE WHEN pg_is_in_recovery() "
+                    "THEN EXTRACT(EPOCH FROM now() - pg_last_xact_replay_timestamp()) ELSE 0 END"
+                )).scalar()
+                return None if lag is None else max(0.0, float(lag))
+            conn.execute(text("SELECT 1"))
+            return 0
+
+    def _check_replica(self, index):
+        """
+        检查副本的健康状况并更新缓存
+        调用方需先在 _replica_checking 中认领该副本；连接和查询不持有 _replica_lock，
+        副本不可达时只有认领检查的线程等待连接超时
+        """
+        try:
+            lag = self._replica_lag(self.replicas[index])
+            healthy = lag is not None and lag <= Config.DB_REPLICA_MAX_LAG
+            error = None
+        except Exception as e:
+            lag, healthy, error = None, False, str(e)
+        with self._replica_lock:
+            state = self._replica_state.get(index)
+            self._replica_state[index] = {'checked_at': time.monotonic(), 'healthy': healthy, 'lag': lag,
+                                          'error': error}
+            self._replica_checking.discard(index)
+        if not healthy and (state is None or state['healthy']):
+            logging.warning(f"只读副本 {self._url_label(self.replica_urls[index])} 不可用，读操作回退到主库: "
+                            f"{error or f'复制延迟 {lag} 秒'}")
+        return healthy
+
+    def pick_replica(self):
+        """
+        轮询选择一个健康的副本
+        健康状况缓存 DB_REPLICA_LAG_CHECK_INTERVAL 秒；缓存过期后由一个请求线程重新检查，
+        其他线程在检查期间沿用上次的结果（从未检查过的副本视为不可用）
+        :return: 副本引擎；没有可用副本时返回None（回退到主库）
+        """
+        if not self.replicas:
+            return None
+        with self._replica_lock:
+            start = self._replica_cursor
+            self._replica_cursor = (start + 1) % len(self.replicas)
+        for offset in range(len(self.replicas)):
+            index = (start + offset) % len(self.replicas)
+            with self._replica_lock:
+                state = self._replica_state.get(index)
+                fresh = state is not None and \
+                    time.monotonic() - state['checked_at'] < Config.DB_REPLICA_LAG_CHECK_INTERVAL
+                claimed = not fresh and index not in self._replica_checking
+                if claimed:
+                    self._replica_checking.add(index)
+            healthy = self._check_replica(index) if claimed else bool(state and state['healthy'])
+            if healthy:
+                return self.replicas[index]
+        return None
+
+    def pool_status(self):
+        """
+        连接池的配置和当前使用情况
+        :return: 字典，utilization 为已借出连接数占容量的比例
+        """
+        pool = self.engine.pool
+        status = {
+            'pid': os.getpid(),
+            'dialect': self.engine.dialect.name,
+            'pool_class': type(pool).__name__,
+            'pool_size': self.pool_size,
+            'max_overflow': self.max_overflow,
+            'capacity': self.capacity,
+            'pool_timeout': self.pool_timeout,
+            'pool_recycle': self.pool_recycle,
+        }
+        if isinstance(pool, QueuePool):
+            checked_out = pool.checkedout()
+            status.update({
+                'checked_out': checked_out,
+                'checked_in': pool.checkedin(),
+                'overflow': max(0, pool.overflow()),
+                'utilization': round(checked_out / self.capacity, 3) if self.capacity else None,
+            })
+        if self.replicas:
+            status['replicas'] = [{
+                'url': self._url_label(url),
+                'checked_out': replica.pool.checkedout(),
+                'healthy': self._replica_state.get(index, {}).get('healthy'),
+                'lag_seconds': self._replica_state.get(index, {}).get('lag'),
+            } for index, (url, replica) in enumerate(zip(self.replica_urls, self.replicas))]
+        return status
+
+    def dispose(self):
+        """关闭连接池中的所有连接"""
+        if self.engine is not None:
+            self.engine.dispose()
+        for replica in self.replicas:
+            replica.dispose()
+
     @contextmanager
     def get_session(self):
         """获取数据库会话的上下文管理器"""
+        self._check_process()
         session = self.SessionLocal()
         try:
             yield session
@@ -89,17 +350,38 @@ class DatabaseManager:
             raise DatabaseConnectionException(f"执行查询失败: {str(e)}")
 
 
-# 全球数据库管理器实例
+# 全局数据库管理器实例
 db_manager = None
+_init_lock = threading.Lock()
 
 
-def init_db_manager(database_url):
-    """初始化数据库管理器"""
+def init_db_manager(database_url=None, **options):
+    """
+    初始化数据库管理器（幂等）
+    已用相同的URL初始化、且未指定参数或参数相同时直接返回现有实例；否则关闭原连接池后重新创建
+    :param database_url: 元数据库连接URL，默认为 Config.DATABASE_URL
+    :param options: DatabaseManager 的连接池参数
+    """
     global db_manager
-    db_manager = DatabaseManager(database_url)
+    database_url = database_url or Config.DATABASE_URL
+    with _init_lock:
+        if db_manager is not None and db_manager.database_url == database_url \
+                and (not options or db_manager.options == options):
+            return db_manager
+        if db_manager is not None:
+            db_manager.dispose()
+        db_manager = DatabaseManager(database_url, **options)
+        db_manager.options = options
     return db_manager
 
 
+def get_pool_status():
+    """本进程元数据库连接池的状态，未初始化时返回None"""
+    if db_manager is None:
+        return None
+    return db_manager.pool_status()
+
+
 def get_db():
     """获取数据库会话生成器（用于依赖注入）"""
     if db_manager is None:
@@ -111,4 +393,35 @@ def get_db_session():
     """直接获取数据库会话"""
     if db_manager is None:
         raise DatabaseConnectionException("数据库管理器未初始化")
-    return db_manager.get_session()
\ No newline at end of file
+    return db_manager.get_session()
+
+
+def install_replica_routing(app):
+    """
+    GET/HEAD 请求中的读操作发往只读副本；用户在 DB_READ_AFTER_WRITE_SECONDS 秒内做过写请求时仍读主库，
+    保证刚修改（如更新表注释）后能读到自己的写入
+    :param app: Flask应用
+    """
+    from flask import request, session, g
+
+    @app.before_request
+    def route_reads_to_replica():
+        if db_manager is None or not db_manager.replicas or request.method not in ('GET', 'HEAD'):
+            return
+        last_write = session.get('db_last_write_at')
+        if last_write and time.time() - last_write < Config.DB_READ_AFTER_WRITE_SECONDS:
+            return
+        g._read_replica_token = _read_replica.set(True)
+
+    @app.after_request
+    def remember_write(response):
+        if db_manager is not None and db_manager.replicas and request.method not in ('GET', 'HEAD', 'OPTIONS') \
+                and response.status_code < 400:
+            session['db_last_write_at'] = time.time()
+        return response
+
+    @app.teardown_request
+    def reset_replica_routing(exc):
+        token = g.pop('_read_replica_token', None)
+        if token is not None:
+            _read_replica.reset(token)
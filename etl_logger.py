@@ -2,146 +2,474 @@
 ETL日志记录模块
 
 用于记录所有ETL（抽取、转换、加载）过程的详细日志
+
+1. 记录先放入内存队列，由后台线程写文件和控制台，抽取线程不等待磁盘I/O
+2. logs/etl-<进程标识>.log 为JSON行格式，每行带运行ID（抽取历史ID）和数据源ID，按大小和时间轮转并gzip压缩；
+   Web进程、工作进程和命令行各写自己的文件，轮转不会在进程之间互相覆盖
+3. 每次运行的日志同时写入 logs/runs/<运行ID>.jsonl，按运行查询日志时只读取该运行自己的文件
+4. 启动和每次轮转时清理超过保留天数的单次运行日志和已退出进程的日志文件
 """
 
+import atexit
+import contextvars
+import gzip
+import json
 import logging
+import logging.handlers
 import os
+import queue
+import shutil
+import threading
+import time
+from collections import OrderedDict, deque
+from contextlib import contextmanager
 from datetime import datetime
 from pathlib import Path
+from typing import Dict, Any, List, Optional, Callable
+
+from config import Config
+from exceptions import ValidationException
+
+
+# 同时保持打开的单次运行日志文件数量
+MAX_OPEN_RUN_FILES = 32
+# 按运行查询日志时最多返回的条数
+MAX_QUERY_LINES = 5000
+# 倒序读取日志文件的块大小
+TAIL_BLOCK_SIZE = 64 * 1024
+
+# 当前线程（或协程）所属的运行ID和数据源ID，由 ETLLogger.run_context 设置
+_run_id: contextvars.ContextVar = contextvars.ContextVar('etl_run_id', default=None)
+_source_id: contextvars.ContextVar = contextvars.ContextVar('etl_source_id', default=None)
+
+
+def _log_dir() -> Path:
+    return Path(Config.ETL_LOG_DIR) if Config.ETL_LOG_DIR else Path(__file__).parent / 'logs'
+
+
+def _run_log_path(run_id) -> Path:
+    return _log_dir() / 'runs' / f"{int(run_id)}.jsonl"
+
+
+def _process_log_path() -> Path:
+    """本进程的日志文件，进程标识默认为进程号"""
+    return _log_dir() / f"etl-{Config.ETL_LOG_PROCESS_NAME or os.getpid()}.log"
+
+
+class _RunContextFilter(logging.Filter):
+    """在调用线程中为日志记录附加运行ID和数据源ID（进入队列之前）"""
+
+    def filter(self, record):
+        if not hasattr(record, 'run_id'):
+            record.run_id = _run_id.get()
+        if not hasattr(record, 'source_id'):
+            record.source_id = _source_id.get()
+        return True
+
+
+class JsonLinesFormatter(logging.Formatter):
+    """JSON行格式：时间、级别、消息、运行ID、数据源ID、事件及其结构化字段"""
+
+    def format(self, record):
+        entry = {
+            'ts': datetime.fromtimestamp(record.created).isoformat(timespec='milliseconds'),
+            'level': record.levelname,
+            'message': record.getMessage(),
+            'run_id': getattr(record, 'run_id', None),
+            'source_id': getattr(record, 'source_id', None),
+        }
+        event = getattr(record, 'event', None)
+        if event:
+            entry['event'] = event
+        fields = getattr(record, 'fields', None)
+        if fields:
+            entry.update(fields)
+        if record.exc_info:
+            entry['exception'] = self.formatException(record.exc_info)
+        return json.dumps(entry, ensure_ascii=False, default=str)
+
+
+def _gzip_namer(name: str) -> str:
+    return name + '.gz'
+
+
+def _gzip_rotator(source: str, dest: str):
+    """轮转时压缩旧日志文件"""
+    with open(source, 'rb') as src, gzip.open(dest, 'wb') as dst:
+        shutil.copyfileobj(src, dst)
+    os.remove(source)
+
+
+class SizeAndTimeRotatingFileHandler(logging.handlers.RotatingFileHandler):
+    """
+    按大小或时间轮转的日志文件，任一条件满足即轮转，旧文件压缩为 etl.log.1.gz, etl.log.2.gz ...
+    """
+
+    def __init__(self, filename, max_bytes: int, backup_count: int, interval_seconds: int = 0,
+                 on_rollover: Optional[Callable[[], None]] = None):
+        """
+        :param on_rollover: 每次轮转后的回调（清理过期日志），长期运行的进程据此定期清理
+        """
+        super().__init__(filename, maxBytes=max_bytes, backupCount=backup_count, encoding='utf-8', delay=True)
+        self.namer = _gzip_namer
+        self.rotator = _gzip_rotator
+        self.interval_seconds = interval_seconds
+        self.on_rollover = on_rollover
+        self.rollover_at = self._next_rollover(os.path.getmtime(filename) if os.path.exists(filename) else None)
+
+    def _next_rollover(self, start: Optional[float] = None) -> Optional[float]:
+        if not self.interval_seconds:
+            return None
+        return (start or time.time()) + self.interval_seconds
+
+    def shouldRollover(self, record):
+        if self.rollover_at is not None and time.time() >= self.rollover_at:
+            return True
+        return super().shouldRollover(record)
+
+    def doRollover(self):
+        # 时间到期但文件为空时不产生空的备份
+        if os.path.exists(self.baseFilename) and os.path.getsize(self.baseFilename) > 0:
+            super().doRollover()
+        self.rollover_at = self._next_rollover()
+        if self.on_rollover:
+            try:
+                self.on_rollover()
+            except Exception as e:
+                logging.warning(f"清理过期ETL日志失败: {str(e)}")
+
+
+class RunFileHandler(logging.Handler):
+    """
+    将带运行ID的日志追加到该运行自己的文件
+    只在后台线程中调用，打开的文件按最近使用保留 MAX_OPEN_RUN_FILES 个
+    """
+
+    def __init__(self):
+        super().__init__()
+        self._files: OrderedDict = OrderedDict()
+
+    def emit(self, record):
+        run_id = getattr(record, 'run_id', None)
+        if run_id is None:
+            return
+        try:
+            stream = self._files.pop(run_id, None)
+            if stream is None:
+                path = _run_log_path(run_id)
+                path.parent.mkdir(parents=True, exist_ok=True)
+                stream = open(path, 'a', encoding='utf-8')
+                while len(self._files) >= MAX_OPEN_RUN_FILES:
+                    self._files.popitem(last=False)[1].close()
+            self._files[run_id] = stream
+            stream.write(self.format(record) + '\n')
+            stream.flush()
+        except Exception:
+            self.handleError(record)
+
+    def close(self):
+        for stream in self._files.values():
+            stream.close()
+        self._files.clear()
+        super().close()
+
+
+def cleanup_logs(log_dir: Path, retention_days: int, current: Optional[Path] = None):
+    """
+    删除超过保留天数未修改的单次运行日志，以及已退出进程遗留的日志文件和备份
+    :param current: 本进程正在写入的日志文件，不删除
+    """
+    if retention_days <= 0 or not log_dir.exists():
+        return
+    cutoff = time.time() - retention_days * 86400
+    candidates = list((log_dir / 'runs').glob('*.jsonl')) + list(log_dir.glob('etl-*.log*'))
+    for path in candidates:
+        if current is not None and path == current:
+            continue
+        try:
+            if path.stat().st_mtime < cutoff:
+                path.unlink()
+        except OSError:
+            continue
 
 
 class ETLLogger:
     """ETL日志记录器"""
-    
+
     _logger = None
-    
+    _listener = None
+    _pid = None
+    _lock = threading.Lock()
+
     @classmethod
     def get_logger(cls):
-        """获取ETL日志记录器单例"""
-        if cls._logger is None:
-            cls._logger = cls._setup_logger()
+        """获取ETL日志记录器单例（fork 出的子进程重新建立，写入自己的日志文件）"""
+        if cls._logger is None or cls._pid != os.getpid():
+            with cls._lock:
+                if cls._logger is None or cls._pid != os.getpid():
+                    cls._logger = cls._setup_logger()
+                    cls._pid = os.getpid()
         return cls._logger
-    
+
     @classmethod
     def _setup_logger(cls):
-        """设置ETL日志记录器"""
-        
+        """设置ETL日志记录器：调用方只把记录放入队列，由后台线程写文件和控制台"""
+
         logger = logging.getLogger('etl')
-        logger.setLevel(logging.INFO)
-        
-        if logger.handlers:
+        logger.setLevel(Config.ETL_LOG_LEVEL)
+        # 已有独立的控制台输出，不再传递给根记录器重复输出
+        logger.propagate = False
+
+        if logger.handlers and cls._pid in (None, os.getpid()):
             return logger
-        
-        formatter = logging.Formatter(
-            '%(asctime)s - %(levelname)s - %(message)s',
-            datefmt='%Y-%m-%d %H:%M:%S'
+        # fork 出的子进程继承了父进程的队列处理器，但写文件的后台线程没有随 fork 复制
+        for handler in list(logger.handlers):
+            logger.removeHandler(handler)
+        for log_filter in list(logger.filters):
+            logger.removeFilter(log_filter)
+        cls._listener = None
+
+        log_dir = _log_dir()
+        log_dir.mkdir(parents=True, exist_ok=True)
+        log_path = _process_log_path()
+
+        def cleanup():
+            cleanup_logs(log_dir, Config.ETL_RUN_LOG_RETENTION_DAYS, current=log_path)
+
+        cleanup()
+        json_formatter = JsonLinesFormatter()
+
+        file_handler = SizeAndTimeRotatingFileHandler(
+            log_path,
+            max_bytes=Config.ETL_LOG_MAX_BYTES,
+            backup_count=Config.ETL_LOG_BACKUP_COUNT,
+            interval_seconds=Config.ETL_LOG_ROTATE_INTERVAL_HOURS * 3600,
+            on_rollover=cleanup
         )
-        
-        log_dir = Path(__file__).parent / 'logs'
-        log_dir.mkdir(exist_ok=True)
-        
-        log_file = log_dir / 'etl.log'
-        
-        file_handler = logging.FileHandler(log_file, encoding='utf-8')
-        file_handler.setLevel(logging.INFO)
-        file_handler.setFormatter(formatter)
-        
-        console_handler = logging.StreamHandler()
-        console_handler.setLevel(logging.INFO)
-        console_handler.setFormatter(formatter)
-        
-        logger.addHandler(file_handler)
-        logger.addHandler(console_handler)
-        
+        file_handler.setFormatter(json_formatter)
+
+        run_handler = RunFileHandler()
+        run_handler.setFormatter(json_formatter)
+
+        handlers = [file_handler, run_handler]
+        if Config.ETL_LOG_CONSOLE:
+            console_handler = logging.StreamHandler()
+            console_handler.setFormatter(logging.Formatter(
+                '%(asctime)s - %(levelname)s - %(message)s',
+                datefmt='%Y-%m-%d %H:%M:%S'
+            ))
+            handlers.append(console_handler)
+
+        log_queue = queue.SimpleQueue()
+        queue_handler = logging.handlers.QueueHandler(log_queue)
+        logger.addFilter(_RunContextFilter())
+        logger.addHandler(queue_handler)
+
+        cls._listener = logging.handlers.QueueListener(log_queue, *handlers, respect_handler_level=True)
+        cls._listener.start()
+        atexit.register(cls.shutdown)
+
         return logger
-    
+
+    @classmethod
+    def shutdown(cls):
+        """停止后台线程，写完队列中剩余的日志"""
+        listener, cls._listener = cls._listener, None
+        if listener is not None:
+            listener.stop()
+            for handler in listener.handlers:
+                handler.close()
+
+    @classmethod
+    @contextmanager
+    def run_context(cls, run_id, source_id=None):
+        """
+        在上下文内记录的ETL日志都带上运行ID和数据源ID，并写入该运行的日志文件
+        :param run_id: 运行ID（抽取历史ID）
+        :param source_id: 数据源ID
+        """
+        run_token = _run_id.set(run_id)
+        source_token = _source_id.set(source_id)
+        try:
+            yield
+        finally:
+            _source_id.reset(source_token)
+            _run_id.reset(run_token)
+
+    @classmethod
+    def _log(cls, level, event, message, **fields):
+        logger = cls.get_logger()
+        if logger.isEnabledFor(level):
+            logger.log(level, message, extra={'event': event, 'fields': fields})
+
     @classmethod
     def log_extraction_start(cls, source_id, source_name, source_type):
         """记录抽数开始"""
-        logger = cls.get_logger()
-        logger.info("=" * 80)
-        logger.info(f"开始抽数 - 数据源ID: {source_id}, 名称: {source_name}, 类型: {source_type}")
-        logger.info("=" * 80)
-    
+        cls._log(logging.INFO, 'extraction_start',
+                 f"开始抽数 - 数据源ID: {source_id}, 名称: {source_name}, 类型: {source_type}",
+                 source_name=source_name, source_type=source_type)
+
     @classmethod
     def log_extraction_success(cls, source_id, tables_count, relationships_count, duration=None):
         """记录抽数成功"""
-        logger = cls.get_logger()
         msg = f"抽数成功 - 数据源ID: {source_id}, 抽取表数量: {tables_count}, 关联关系数量: {relationships_count}"
         if duration:
             msg += f", 耗时: {duration:.2f}秒"
-        logger.info(msg)
-        logger.info("=" * 80)
-        logger.info("")
-    
+        cls._log(logging.INFO, 'extraction_success', msg, tables_count=tables_count,
+                 relationships_count=relationships_count,
+                 duration=round(duration, 3) if duration else None)
+
     @classmethod
     def log_extraction_failed(cls, source_id, error_msg):
         """记录抽数失败"""
-        logger = cls.get_logger()
-        logger.error(f"抽数失败 - 数据源ID: {source_id}, 错误: {error_msg}")
-        logger.error("=" * 80)
-        logger.error("")
-    
+        cls._log(logging.ERROR, 'extraction_failed', f"抽数失败 - 数据源ID: {source_id}, 错误: {error_msg}",
+                 error=error_msg)
+
     @classmethod
-    def log_table_extracted(cls, table_name, row_count, size_bytes, duration=None):
-        """记录表抽取成功"""
+    def log_table_extracted(cls, table_name, row_count, size_bytes, duration=None, column_count=None):
+        """记录表抽取成功（每个表一条记录）"""
         logger = cls.get_logger()
+        if not logger.isEnabledFor(logging.INFO):
+            return
         size_mb = size_bytes / (1024 * 1024) if size_bytes else 0
         msg = f"  ✓ 抽取表: {table_name}, 行数: {row_count}, 大小: {size_mb:.2f}MB"
+        if column_count is not None:
+            msg += f", 列数: {column_count}"
         if duration:
             msg += f", 耗时: {duration:.2f}秒"
-        logger.info(msg)
-    
+        cls._log(logging.INFO, 'table_extracted', msg, table=table_name, row_count=row_count,
+                 size_bytes=size_bytes, column_count=column_count,
+                 duration=round(duration, 3) if duration else None)
+
     @classmethod
     def log_table_failed(cls, table_name, error_msg):
         """记录表抽取失败"""
-        logger = cls.get_logger()
-        logger.warning(f"  ✗ 抽取表失败: {table_name}, 错误: {error_msg}")
-    
+        cls._log(logging.WARNING, 'table_failed', f"  ✗ 抽取表失败: {table_name}, 错误: {error_msg}",
+                 table=table_name, error=error_msg)
+
     @classmethod
     def log_column_extracted(cls, table_name, column_count):
-        """记录列抽取"""
-        logger = cls.get_logger()
-        logger.info(f"    - 表 {table_name} 抽取到 {column_count} 个列")
-    
+        """记录列抽取（列数已包含在 log_table_extracted 中，这里只在DEBUG级别输出）"""
+        cls._log(logging.DEBUG, 'columns_extracted', f"    - 表 {table_name} 抽取到 {column_count} 个列",
+                 table=table_name, column_count=column_count)
+
     @classmethod
     def log_relationship_extracted(cls, constraint_name, table_name, ref_table_name):
-        """记录关联关系抽取"""
-        logger = cls.get_logger()
-        logger.info(f"    - 关联关系: {table_name} -> {ref_table_name} ({constraint_name})")
-    
+        """记录关联关系抽取（数量已包含在抽数成功记录中，这里只在DEBUG级别输出）"""
+        cls._log(logging.DEBUG, 'relationship_extracted',
+                 f"    - 关联关系: {table_name} -> {ref_table_name} ({constraint_name})",
+                 table=table_name, referenced_table=ref_table_name, constraint_name=constraint_name)
+
     @classmethod
     def log_clear_old_metadata(cls, source_id, tables_count):
         """记录清除旧元数据"""
-        logger = cls.get_logger()
-        logger.info(f"清除旧元数据 - 数据源ID: {source_id}, 删除表数量: {tables_count}")
-    
+        cls._log(logging.INFO, 'clear_old_metadata',
+                 f"清除旧元数据 - 数据源ID: {source_id}, 删除表数量: {tables_count}", tables_count=tables_count)
+
     @classmethod
     def log_save_metadata(cls, source_id, tables_count, columns_count, relationships_count):
         """记录保存元数据"""
-        logger = cls.get_logger()
-        logger.info(f"保存元数据到数据库 - 数据源ID: {source_id}")
-        logger.info(f"  表数量: {tables_count}, 列数量: {columns_count}, 关联关系数量: {relationships_count}")
-    
+        cls._log(logging.INFO, 'save_metadata',
+                 f"保存元数据到数据库 - 数据源ID: {source_id}, 表数量: {tables_count}, "
+                 f"列数量: {columns_count}, 关联关系数量: {relationships_count}",
+                 tables_count=tables_count, columns_count=columns_count, relationships_count=relationships_count)
+
     @classmethod
     def log_connection_success(cls, source_name, source_type):
         """记录连接成功"""
-        logger = cls.get_logger()
-        logger.info(f"数据库连接成功 - {source_type}: {source_name}")
-    
+        cls._log(logging.INFO, 'connection_success', f"数据库连接成功 - {source_type}: {source_name}",
+                 source_name=source_name, source_type=source_type)
+
     @classmethod
     def log_connection_failed(cls, source_name, source_type, error_msg):
         """记录连接失败"""
-        logger = cls.get_logger()
-        logger.error(f"数据库连接失败 - {source_type}: {source_name}, 错误: {error_msg}")
-    
+        cls._log(logging.ERROR, 'connection_failed',
+                 f"数据库连接失败 - {source_type}: {source_name}, 错误: {error_msg}",
+                 source_name=source_name, source_type=source_type, error=error_msg)
+
     @classmethod
     def log_summary(cls, total_tables, success_tables, failed_tables):
         """记录汇总信息"""
-        logger = cls.get_logger()
-        logger.info("-" * 80)
-        logger.info(f"抽数汇总 - 总表数: {total_tables}, 成功: {success_tables}, 失败: {failed_tables}")
-        logger.info("-" * 80)
+        cls._log(logging.INFO, 'summary',
+                 f"抽数汇总 - 总表数: {total_tables}, 成功: {success_tables}, 失败: {failed_tables}",
+                 total_tables=total_tables, success_tables=success_tables, failed_tables=failed_tables)
+
+
+def _tail_lines(path: Path, count: int) -> List[str]:
+    """从文件末尾按块倒序读取最后count行"""
+    with open(path, 'rb') as f:
+        f.seek(0, os.SEEK_END)
+        position = f.tell()
+        buffer = b''
+        lines: List[bytes] = []
+        while position > 0 and len(lines) <= count:
+            read_size = min(TAIL_BLOCK_SIZE, position)
+            position -= read_size
+            f.seek(position)
+            buffer = f.read(read_size) + buffer
+            lines = buffer.splitlines()
+        return [line.decode('utf-8', errors='replace') for line in lines[-count:]]
+
+
+def read_run_log(run_id: int, tail: Optional[int] = None, level: Optional[str] = None,
+                 event: Optional[str] = None, contains: Optional[str] = None,
+                 table: Optional[str] = None, limit: int = 1000) -> Dict[str, Any]:
+    """
+    查询单次运行的日志，只读取该运行自己的日志文件
+    :param run_id: 运行ID（抽取历史ID）
+    :param tail: 只返回最后N条（无其他过滤条件时从文件末尾倒序读取）
+    :param level: 最低日志级别，如 WARNING
+    :param event: 事件类型，如 table_failed
+    :param contains: 消息中包含的文本
+    :param table: 表名
+    :param limit: 最多返回条数
+    :return: {run_id, entries, truncated}
+    """
+    limit = max(1, min(limit, MAX_QUERY_LINES))
+    path = _run_log_path(run_id)
+    if not path.exists():
+        return {'run_id': run_id, 'entries': [], 'truncated': False}
+
+    min_level = logging.getLevelName(level.upper()) if level else None
+    if level and not isinstance(min_level, int):
+        raise ValidationException(f"不支持的日志级别: {level}")
+    filtered = bool(min_level or event or contains or table)
+
+    def matches(entry: Dict[str, Any]) -> bool:
+        if min_level and logging.getLevelName(entry.get('level', 'INFO')) < min_level:
+            return False
+        if event and entry.get('event') != event:
+            return False
+        if table and entry.get('table') != table:
+            return False
+        if contains and contains not in entry.get('message', ''):
+            return False
+        return True
+
+    def parse(line: str) -> Optional[Dict[str, Any]]:
+        try:
+            return json.loads(line)
+        except ValueError:
+            return None
+
+    if tail and not filtered:
+        entries = [entry for entry in map(parse, _tail_lines(path, min(tail, limit))) if entry]
+        return {'run_id': run_id, 'entries': entries, 'truncated': False}
+
+    # 有过滤条件时顺序扫描该运行的文件；指定tail时只保留最后N条匹配的记录
+    keep = min(tail, limit) if tail else limit
+    entries = deque(maxlen=keep) if tail else []
+    truncated = False
+    with open(path, 'r', encoding='utf-8', errors='replace') as f:
+        for line in f:
+            entry = parse(line)
+            if entry is None or not matches(entry):
+                continue
+            if not tail and len(entries) >= keep:
+                truncated = True
+                break
+            entries.append(entry)
+    return {'run_id': run_id, 'entries': list(entries), 'truncated': truncated}
 
 
 def get_etl_logger():
@@ -36,4 +36,15 @@ class ExtractionException(MetadataException):
 class ValidationException(MetadataException):
     """验证异常"""
     def __init__(self, message="参数验证失败"):
-        super().__init__(message, "VALIDATION_ERROR")
\ No newline at end of file
+        super().__init__(message, "VALIDATION_ERROR")
+
+class ExtractionInProgressException(MetadataException):
+    """数据源已有其他进程中的抽取运行"""
+    def __init__(self, message="数据源正在抽取中", holder=None):
+        super().__init__(message, "EXTRACTION_IN_PROGRESS")
+        self.holder = holder or {}
+
+class ExtractionCancelledException(MetadataException):
+    """抽取被取消或超过截止时间"""
+    def __init__(self, message="抽取已被取消"):
+        super().__init__(message, "EXTRACTION_CANCELLED")
@@ -0,0 +1,226 @@
+"""
+数据源抽取锁
+
+每个数据源同一时间只允许一个抽取运行，锁保存在元数据库的 extraction_locks 表中，跨进程、跨主机生效：
+1. 获取：插入以数据源ID为主键的锁记录，主键冲突说明已有运行持有锁
+2. 续约：持有锁的进程由后台线程每隔 EXTRACTION_LOCK_TTL_SECONDS / 3 秒续约
+3. 接管：锁过期未续约（持有进程崩溃或失联）时视为失效锁，由新的运行以条件更新接管，
+   并将失联运行的抽取记录标记为失败；抽取记录已结束但仍在续约的锁（运行正在做画像等后处理）不可接管
+4. 丢失：续约时发现锁已被其他进程接管，调用获取锁时登记的回调（抽取服务借此取消本进程的运行）
+"""
+import logging
+import os
+import socket
+import threading
+import time
+import uuid
+from datetime import datetime, timedelta
+from typing import Dict, Any, Optional, Tuple, Callable
+
+from sqlalchemy.exc import IntegrityError
+
+from config import Config
+from models import ExtractionLock, ExtractionHistory, ExtractionJob
+from db_manager import get_db_session
+from exceptions import DataSourceNotFoundException
+
+
+_owner: Optional[Tuple[int, str]] = None
+# 本进程持有的锁：数据源ID -> 锁丢失时的回调
+_held: Dict[int, Optional[Callable[[], None]]] = {}
+_held_lock = threading.Lock()
+_heartbeat_thread: Optional[threading.Thread] = None
+
+
+def process_owner() -> str:
+    """本进程的锁持有者标识：主机名:进程号:随机后缀（fork 后重新生成）"""
+    global _owner
+    pid = os.getpid()
+    if _owner is None or _owner[0] != pid:
+        _owner = (pid, f"{socket.gethostname()}:{pid}:{uuid.uuid4().hex[:8]}")
+    return _owner[1]
+
+
+def lock_to_dict(lock: ExtractionLock, job_id: Optional[int] = None) -> Dict[str, Any]:
+    """将锁转换为字典"""
+    return {
+        'datasource_id': lock.datasource_id,
+        'owner': lock.owner,
+        'task_type': lock.task_type,
+        'history_id': lock.history_id,
+        'job_id': job_id,
+        'acquired_at': lock.acquired_at.isoformat() if lock.acquired_at else None,
+        'heartbeat_at': lock.heartbeat_at.isoformat() if lock.heartbeat_at else None,
+        'expires_at': lock.expires_at.isoformat() if lock.expires_at else None
+    }
+
+
+def _holder(session, lock: ExtractionLock) -> Dict[str, Any]:
+    job_id = None
+    if lock.history_id:
+        job = session.query(ExtractionJob.id).filter(ExtractionJob.history_id == lock.history_id).first()
+        job_id = job[0] if job else None
+    return lock_to_dict(lock, job_id)
+
+
+def _is_stale(lock: ExtractionLock, now: datetime) -> bool:
+    """
+    锁是否失效：只看是否过期未续约
+    持有进程写完抽取结果后仍持有锁执行后处理，此时抽取记录已不在执行中，但锁仍然有效
+    """
+    return lock.expires_at is None or lock.expires_at < now
+
+
+def acquire_lock(datasource_id: int, task_type: str = None,
+                 on_lost: Optional[Callable[[], None]] = None) -> Tuple[bool, Optional[Dict[str, Any]]]:
+    """
+    获取数据源的抽取锁
+    :param on_lost: 续约时发现锁已被其他进程接管的回调
+    :return: (是否获得锁, 当前持有者信息)；获得锁时持有者信息为空
+    """
+    owner = process_owner()
+    now = datetime.utcnow()
+    expires_at = now + timedelta(seconds=Config.EXTRACTION_LOCK_TTL_SECONDS)
+    acquired = False
+    missing = False
+    holder = None
+    with get_db_session() as session:
+        lock = session.query(ExtractionLock).filter(ExtractionLock.datasource_id == datasource_id).first()
+        if lock is None:
+            try:
+                with session.begin_nested():
+                    session.add(ExtractionLock(datasource_id=datasource_id, owner=owner, task_type=task_type,
+                                               acquired_at=now, heartbeat_at=now, expires_at=expires_at))
+                acquired = True
+            except IntegrityError:
+                # 其他进程同时插入了锁，或数据源不存在（外键约束）
+                lock = session.query(ExtractionLock).filter(ExtractionLock.datasource_id == datasource_id).first()
+                missing = lock is None
+
+        if not acquired and not missing and _is_stale(lock, now):
+            # 条件更新保证只有一个进程能接管失效锁
+            stale_owner, stale_history_id = lock.owner, lock.history_id
+            updated = session.query(ExtractionLock).filter(
+                ExtractionLock.datasource_id == datasource_id,
+                ExtractionLock.owner == stale_owner,
+                ExtractionLock.expires_at == lock.expires_at
+            ).update({
+                ExtractionLock.owner: owner,
+                ExtractionLock.task_type: task_type,
+                ExtractionLock.history_id: None,
+                ExtractionLock.acquired_at: now,
+                ExtractionLock.heartbeat_at: now,
+                ExtractionLock.expires_at: expires_at
+            }, synchronize_session=False)
+            if updated == 1:
+                acquired = True
+                logging.warning(f"数据源 {datasource_id} 的抽取锁已失效（持有者: {stale_owner}），由 {owner} 接管")
+                if stale_history_id:
+                    session.query(ExtractionHistory).filter(
+                        ExtractionHistory.id == stale_history_id,
+                        ExtractionHistory.status == 'running'
+                    ).update({
+                        ExtractionHistory.status: 'failed',
+                        ExtractionHistory.message: f"持有抽取锁的进程 {stale_owner} 失联，锁已过期"
+                    }, synchronize_session=False)
+            else:
+                session.expire(lock)
+        if not acquired and not missing:
+            holder = _holder(session, lock)
+
+    # 在会话外抛出，避免被会话包装为数据库异常
+    if missing:
+        raise DataSourceNotFoundException(f"数据源不存在: {datasource_id}")
+    if acquired:
+        with _held_lock:
+            _held[datasource_id] = on_lost
+        _ensure_heartbeat()
+    return acquired, holder
+
+
+def attach_history(datasource_id: int, history_id: int):
+    """记录锁对应的抽取历史记录，其他请求据此关联到正在执行的运行"""
+    with get_db_session() as session:
+        session.query(ExtractionLock).filter(
+            ExtractionLock.datasource_id == datasource_id,
+            ExtractionLock.owner == process_owner()
+        ).update({ExtractionLock.history_id: history_id}, synchronize_session=False)
+
+
+def release_lock(datasource_id: int):
+    """释放本进程持有的抽取锁"""
+    with _held_lock:
+        _held.pop(datasource_id, None)
+    try:
+        with get_db_session() as session:
+            session.query(ExtractionLock).filter(
+                ExtractionLock.datasource_id == datasource_id,
+                ExtractionLock.owner == process_owner()
+            ).delete(synchronize_session=False)
+    except Exception as e:
+        # 释放失败时锁在过期后可被接管
+        logging.error(f"释放数据源 {datasource_id} 的抽取锁失败: {str(e)}")
+
+
+def refresh_locks() -> int:
+    """
+    为本进程持有的锁续约，已被其他进程接管的锁调用其丢失回调
+    :return: 续约的锁数量
+    """
+    with _held_lock:
+        held = dict(_held)
+    if not held:
+        return 0
+    owner = process_owner()
+    now = datetime.utcnow()
+    with get_db_session() as session:
+        session.query(ExtractionLock).filter(
+            ExtractionLock.datasource_id.in_(list(held)),
+            ExtractionLock.owner == owner
+        ).update({
+            ExtractionLock.heartbeat_at: now,
+            ExtractionLock.expires_at: now + timedelta(seconds=Config.EXTRACTION_LOCK_TTL_SECONDS)
+        }, synchronize_session=False)
+        owned = {row[0] for row in session.query(ExtractionLock.datasource_id).filter(
+            ExtractionLock.datasource_id.in_(list(held)),
+            ExtractionLock.owner == owner
+        ).all()}
+
+    for datasource_id, on_lost in held.items():
+        if datasource_id in owned:
+            continue
+        with _held_lock:
+            if _held.get(datasource_id, False) is not on_lost:
+                continue  # 续约期间已释放
+            _held.pop(datasource_id, None)
+        logging.warning(f"数据源 {datasource_id} 的抽取锁已被其他进程接管")
+        if on_lost:
+            on_lost()
+    return len(owned)
+
+
+def _heartbeat_loop():
+    interval = max(1, Config.EXTRACTION_LOCK_TTL_SECONDS // 3)
+    while True:
+        time.sleep(interval)
+        try:
+            refresh_locks()
+        except Exception as e:
+            logging.error(f"抽取锁续约失败: {str(e)}")
+
+
+def _ensure_heartbeat():
+    """按需启动本进程的续约线程"""
+    global _heartbeat_thread
+    with _held_lock:
+        if _heartbeat_thread is None or not _heartbeat_thread.is_alive():
+            _heartbeat_thread = threading.Thread(target=_heartbeat_loop, name='extraction-lock-heartbeat',
+                                                 daemon=True)
+            _heartbeat_thread.start()
+
+
+def get_lock(datasource_id: int) -> Optional[Dict[str, Any]]:
+    """查询数据源当前的抽取锁，没有运行持有锁时返回None"""
+    with get_db_session() as session:
+        lock = session.query(ExtractionLock).filter(ExtractionLock.datasource_id == datasource_id).first()
+        return _holder(session, lock) if lock else None
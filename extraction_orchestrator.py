@@ -0,0 +1,313 @@
+"""
+批量抽取编排器
+
+并发抽取多个数据源的元数据：
+1. 全局并发上限，避免一次打开过多的源库连接
+2. 按主机、按数据库类型的并发上限，避免同一共享集群被大量连接压垮
+3. 按陈旧程度（距上次成功抽取的时间）相对预计耗时的比值排定优先级，预计耗时由 extraction_stats 按各表历史耗时估算
+4. 一次编排运行对应一条 OrchestrationRun 记录，关联各数据源的 ExtractionHistory
+"""
+import logging
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+from datetime import datetime
+from typing import Dict, Any, List, Optional, Callable
+
+from sqlalchemy import func
+
+from config import Config
+from models import DataSource, ExtractionHistory, OrchestrationRun
+from db_manager import get_db_session
+from extraction_service import run_extraction, TASK_TYPES
+from extraction_stats import predict_durations
+from exceptions import ValidationException, ExtractionInProgressException
+
+# 计算优先级时预计耗时的下限（秒），避免耗时极短或未知的数据源因分母过小而总是排在最前
+MIN_EXPECTED_SECONDS = 60
+
+
+def _parse_limit(value: Any, name: str, default: int) -> int:
+    """
+    校验并发配额参数，未提供时使用默认值
+    :raises ValidationException: 参数不是正整数
+    """
+    if value is None:
+        return default
+    if isinstance(value, bool) or not isinstance(value, int) or value <= 0:
+        raise ValidationException(f"{name} 必须是正整数")
+    return value
+
+
+class SourcePlan:
+    """编排计划中的单个数据源"""
+
+    def __init__(self, source_id: int, name: str, db_type: str, host: str,
+                 last_success: Optional[datetime], expected_duration: float):
+        self.source_id = source_id
+        self.name = name
+        self.db_type = db_type
+        self.host = host
+        self.last_success = last_success
+        self.expected_duration = expected_duration
+
+    def priority_score(self, now: datetime) -> float:
+        """
+        优先级得分：陈旧秒数 / 预计耗时，即每花一秒抽取时间能消除多少陈旧度，
+        同样陈旧时耗时短的优先，耗时相近时更陈旧的优先
+        """
+        staleness = max((now - self.last_success).total_seconds(), 0.0)
+        return staleness / max(self.expected_duration, MIN_EXPECTED_SECONDS)
+
+    def priority_key(self, now: datetime):
+        """
+        优先级排序键：从未成功抽取过的数据源最优先（其中预计耗时短的优先），
+        其余按优先级得分从高到低
+        """
+        if self.last_success is None:
+            return (0, self.expected_duration)
+        return (1, -self.priority_score(now))
+
+    def to_dict(self) -> Dict[str, Any]:
+        return {
+            'datasource_id': self.source_id,
+            'datasource_name': self.name,
+            'type': self.db_type,
+            'host': self.host,
+            'last_success': self.last_success.isoformat() if self.last_success else None,
+            'expected_duration': self.expected_duration
+        }
+
+
+class ExtractionOrchestrator:
+    """
+    批量抽取编排器
+    """
+
+    def __init__(self, max_workers: int = None, per_host_limit: int = None,
+                 per_engine_limit: int = None, task_type: str = 'full',
+                 extract_func: Callable[..., Dict[str, Any]] = None):
+        self.max_workers = _parse_limit(max_workers, 'max_workers', Config.ORCHESTRATOR_MAX_WORKERS)
+        self.per_host_limit = _parse_limit(per_host_limit, 'per_host_limit', Config.ORCHESTRATOR_PER_HOST_LIMIT)
+        self.per_engine_limit = _parse_limit(per_engine_limit, 'per_engine_limit',
+                                             Config.ORCHESTRATOR_PER_ENGINE_LIMIT)
+        if task_type not in TASK_TYPES:
+            raise ValidationException(f"不支持的任务类型: {task_type}")
+        self.task_type = task_type
+        self.extract_func = extract_func or run_extraction
+
+        self._condition = threading.Condition()
+        self._host_running: Dict[str, int] = {}
+        self._engine_running: Dict[str, int] = {}
+        self._running = 0
+
+    def plan(self, source_ids: Optional[List[int]] = None) -> List[SourcePlan]:
+        """
+        生成按优先级排序的抽取计划
+        :param source_ids: 需要抽取的数据源ID列表，为空时抽取全部数据源
+        """
+        with get_db_session() as session:
+            query = session.query(DataSource.id, DataSource.name, DataSource.type, DataSource.host)
+            if source_ids:
+                query = query.filter(DataSource.id.in_(source_ids))
+            sources = query.all()
+
+            # 每个数据源最近一次成功抽取的时间
+            last_success = dict(session.query(
+                ExtractionHistory.datasource_id,
+                func.max(ExtractionHistory.extraction_time)
+            ).filter(
+                ExtractionHistory.status == 'success'
+            ).group_by(ExtractionHistory.datasource_id).all())
+
+        # 按同类型任务最近几次成功运行中各表的耗时预计本次耗时
+        predictions = predict_durations([source_id for source_id, _, _, _ in sources], self.task_type)
+
+        plans = [SourcePlan(
+            source_id=source_id,
+            name=name,
+            db_type=db_type,
+            host=host,
+            last_success=last_success.get(source_id),
+            expected_duration=float(predictions[source_id]['expected_seconds'] or 0)
+        ) for source_id, name, db_type, host in sources]
+        now = datetime.utcnow()
+        plans.sort(key=lambda plan: plan.priority_key(now))
+        return plans
+
+    def _has_capacity(self, plan: SourcePlan) -> bool:
+        """检查主机和数据库类型的并发配额"""
+        return (self._host_running.get(plan.host, 0) < self.per_host_limit
+                and self._engine_running.get(plan.db_type, 0) < self.per_engine_limit)
+
+    def _acquire(self, plan: SourcePlan):
+        self._running += 1
+        self._host_running[plan.host] = self._host_running.get(plan.host, 0) + 1
+        self._engine_running[plan.db_type] = self._engine_running.get(plan.db_type, 0) + 1
+
+    def _release(self, plan: SourcePlan):
+        with self._condition:
+            self._running -= 1
+            self._host_running[plan.host] -= 1
+            self._engine_running[plan.db_type] -= 1
+            self._condition.notify_all()
+
+    def _next_runnable(self, pending: List[SourcePlan]) -> Optional[SourcePlan]:
+        """按优先级取出第一个满足配额的数据源，调用方需持有锁"""
+        if self._running >= self.max_workers:
+            return None
+        for index, plan in enumerate(pending):
+            if self._has_capacity(plan):
+                return pending.pop(index)
+        return None
+
+    def create_run(self, plans: List[SourcePlan], triggered_by: str = None) -> int:
+        """创建编排运行记录"""
+        with get_db_session() as session:
+            run = OrchestrationRun(
+                status='running',
+                message=f'正在抽取 {len(plans)} 个数据源...',
+                total_sources=len(plans),
+                success_sources=0,
+                failed_sources=0,
+                extracted_tables=0,
+                max_workers=self.max_workers,
+                triggered_by=triggered_by
+            )
+            session.add(run)
+            session.flush()
+            return run.id
+
+    def execute(self, run_id: int, plans: List[SourcePlan]) -> Dict[str, Any]:
+        """
+        执行编排运行，阻塞直到所有数据源抽取完成
+        :return: 聚合后的运行结果
+        """
+        start_time = time.time()
+        pending = list(plans)
+        results: Dict[int, Dict[str, Any]] = {}
+
+        def worker(plan: SourcePlan):
+            try:
+                results[plan.source_id] = self.extract_func(
+                    plan.source_id,
+                    task_type=self.task_type,
+                    orchestration_run_id=run_id
+                )
+            except ExtractionInProgressException as e:
+                # 数据源正被其他运行抽取，本次编排不重复抽取也不计为失败
+                logging.info(f"编排运行 {run_id} 跳过正在抽取中的数据源 {plan.name}")
+                results[plan.source_id] = {'status': 'in_progress', 'coalesced': True, 'message': str(e),
+                                           'datasource_id': plan.source_id,
+                                           'history_id': e.holder.get('history_id')}
+            except Exception as e:
+                logging.error(f"编排运行 {run_id} 抽取数据源 {plan.name} 失败: {str(e)}")
+                results[plan.source_id] = {'status': 'failed', 'message': str(e), 'datasource_id': plan.source_id}
+            finally:
+                self._release(plan)
+
+        with ThreadPoolExecutor(max_workers=self.max_workers, thread_name_prefix=f'orchestration-{run_id}') as pool:
+            while pending:
+                with self._condition:
+                    plan = self._next_runnable(pending)
+                    while plan is None:
+                        self._condition.wait()
+                        plan = self._next_runnable(pending)
+                    self._acquire(plan)
+                pool.submit(worker, plan)
+
+        return self.finish_run(run_id, results, time.time() - start_time)
+
+    def finish_run(self, run_id: int, results: Dict[int, Dict[str, Any]], duration: float) -> Dict[str, Any]:
+        """汇总各数据源结果并更新编排运行记录"""
+        success = sum(1 for r in results.values() if r.get('status') == 'success')
+        partial = sum(1 for r in results.values() if r.get('status') == 'partial_success')
+        # 正被其他运行抽取的数据源既不计为成功也不计为失败
+        in_progress = sum(1 for r in results.values() if r.get('status') == 'in_progress')
+        failed = len(results) - success - partial - in_progress
+        extracted_tables = sum(r.get('tables_count', 0) or 0 for r in results.values())
+
+        if failed == 0 and partial == 0:
+            status = 'success'
+        elif success == 0 and partial == 0:
+            status = 'failed'
+        else:
+            status = 'partial_success'
+
+        with get_db_session() as session:
+            run = session.query(OrchestrationRun).filter(OrchestrationRun.id == run_id).first()
+            run.status = status
+            run.success_sources = success + partial
+            run.failed_sources = failed
+            run.extracted_tables = extracted_tables
+            run.finished_at = datetime.utcnow()
+            run.duration = int(duration)
+            run.message = f"共 {len(results)} 个数据源，成功 {success} 个，部分成功 {partial} 个，失败 {failed} 个"
+            if in_progress:
+                run.message += f"，{in_progress} 个正在由其他运行抽取"
+
+        logging.info(f"编排运行 {run_id} 完成: 状态 {status}, 耗时 {duration:.2f}秒")
+        return get_run_summary(run_id)
+
+    def run(self, source_ids: Optional[List[int]] = None, triggered_by: str = None) -> Dict[str, Any]:
+        """同步执行一次编排运行"""
+        plans = self.plan(source_ids)
+        run_id = self.create_run(plans, triggered_by)
+        return self.execute(run_id, plans)
+
+    def start(self, source_ids: Optional[List[int]] = None, triggered_by: str = None) -> int:
+        """在后台线程中启动编排运行，立即返回运行ID"""
+        plans = self.plan(source_ids)
+        run_id = self.create_run(plans, triggered_by)
+
+        def background():
+            try:
+                self.execute(run_id, plans)
+            except Exception as e:
+                logging.error(f"编排运行 {run_id} 失败: {str(e)}")
+                with get_db_session() as session:
+                    run = session.query(OrchestrationRun).filter(OrchestrationRun.id == run_id).first()
+                    if run:
+                        run.status = 'failed'
+                        run.message = f"编排运行失败: {str(e)}"
+                        run.finished_at = datetime.utcnow()
+
+        threading.Thread(target=background, name=f'orchestration-{run_id}', daemon=True).start()
+        return run_id
+
+
+def get_run_summary(run_id: int) -> Optional[Dict[str, Any]]:
+    """获取编排运行的聚合记录，包括关联的各数据源抽取历史"""
+    with get_db_session() as session:
+        run = session.query(OrchestrationRun).filter(OrchestrationRun.id == run_id).first()
+        if not run:
+            return None
+
+        histories = session.query(ExtractionHistory).filter(
+            ExtractionHistory.orchestration_run_id == run_id
+        ).order_by(ExtractionHistory.extraction_time.asc()).all()
+
+        return {
+            'id': run.id,
+            'status': run.status,
+            'message': run.message,
+            'total_sources': run.total_sources,
+            'success_sources': run.success_sources,
+            'failed_sources': run.failed_sources,
+            'extracted_tables': run.extracted_tables,
+            'max_workers': run.max_workers,
+            'triggered_by': run.triggered_by,
+            'started_at': run.started_at.isoformat() if run.started_at else None,
+            'finished_at': run.finished_at.isoformat() if run.finished_at else None,
+            'duration': run.duration,
+            'extractions': [{
+                'history_id': record.id,
+                'datasource_id': record.datasource_id,
+                'datasource_name': record.datasource.name if record.datasource else 'Unknown',
+                'status': record.status,
+                'message': record.message,
+                'extracted_tables': record.extracted_tables,
+                'duration': record.duration,
+                'extraction_time': record.extraction_time.isoformat() if record.extraction_time else None
+            } for record in histories]
+        }
@@ -0,0 +1,802 @@
+"""
+元数据抽取服务
+
+封装单个数据源的一次完整抽取流程（创建历史记录 -> 抽取 -> 持久化 -> 更新历史记录），
+供API、批量编排器等入口共用
+
+抽取过程中每完成 EXTRACTION_BATCH_SIZE 个表就持久化一批并写入检查点，
+失败的运行可以通过 resume_from 从检查点继续，而不必重新抽取全部表
+
+每次运行都有 EXTRACTION_TIMEOUT 截止时间，超时或被取消后保留已抽取的部分，
+状态记为 partial_success 并在 details 中列出跳过的表
+
+每次运行的查询剖析（按阶段、语句指纹汇总的耗时、行数和错误）写入 extraction_profiles，
+各表的耗时、语句数、行数和状态写入 table_extraction_stats，
+行数和大小同时追加到 table_size_samples 作为容量增长的时间序列；
+成功的运行结束后结构有变化时在 schema_versions 中记录新的结构版本，
+并按命名规则重新推断没有声明外键的关联关系（见 relationship_inference），
+最后在时间预算内对字段抽样画像（见 column_profiling）
+
+同一数据源同一时间只执行一个抽取运行：本进程内任务类型相同的重复请求等待并共享正在执行的运行的结果，
+跨进程、跨主机由 extraction_locks 中的抽取锁保证（见 extraction_lock），
+其他进程持有锁时抛出 ExtractionInProgressException，携带正在执行的运行的历史记录ID和作业ID
+"""
+import json
+import logging
+import threading
+import time
+from concurrent.futures import Future
+from datetime import datetime
+from typing import Dict, Any, List, Optional, Callable
+
+from sqlalchemy import insert
+
+from models import (DataSource, TableMetadata, ColumnMetadata, TableRelationship, ExtractionHistory, ETLTask,
+                    ExtractionCheckpoint, ExtractionProfile)
+from config import Config
+from db_manager import get_db_session
+from extractor_base import get_extractor_class
+from async_extractor import create_extractor
+from extraction_timeout import CancellationToken
+from source_throttle import get_throttle
+from query_profiler import QueryProfiler
+from extraction_stats import save_table_stats
+from storage_growth import record_samples, compact_samples
+from schema_history import record_schema_version
+from relationship_graph import invalidate_graph
+from relationship_inference import infer_relationships
+from column_profiling import profile_datasource
+from metrics import EXTRACTION_IN_FLIGHT, record_extraction
+from etl_logger import ETLLogger
+from extraction_lock import acquire_lock, attach_history, release_lock, get_lock, process_owner
+from exceptions import (DataSourceNotFoundException, ExtractionException, ValidationException,
+                        ExtractionInProgressException)
+
+
+# 支持的任务类型
+TASK_TYPES = ('full', 'incremental', 'schema_only')
+
+# 可以从检查点恢复的运行状态（partial_success 为超时或取消后保留的部分结果）
+RESUMABLE_STATUSES = ('failed', 'partial_success')
+
+# 运行详情中最多记录的表名数量，超出部分只记录数量
+DETAILS_MAX_TABLES = 1000
+
+# 按ID批量删除时每条语句的ID数量
+DELETE_CHUNK_SIZE = 1000
+
+
+class MetadataPersister:
+    """
+    元数据持久化器
+    负责将抽取结果写入元数据库
+    """
+
+    def __init__(self, session, source: DataSource):
+        self.session = session
+        self.source = source
+
+    def relationship_table_key(self, table_name: str) -> str:
+        """根据不同数据库类型生成关联关系中表的映射键"""
+        source = self.source
+        if source.type == 'postgresql':
+            return f"public.{table_name}"  # PostgreSQL通常使用public schema
+        elif source.type == 'sqlserver':
+            return f"dbo.{table_name}"  # SQL Server通常使用dbo schema
+        elif source.type == 'oracle':
+            return f"{source.username.upper()}.{table_name}"  # Oracle schema通常是用户名
+        elif source.type == 'sqlite':
+            return f"main.{table_name}"  # SQLite 的主数据库固定为main
+        return f"{source.database}.{table_name}"
+
+    def clear_all(self) -> int:
+        """清除数据源下所有的表、列和关联关系"""
+        session = self.session
+        table_ids = [row[0] for row in session.query(TableMetadata.id).filter(
+            TableMetadata.datasource_id == self.source.id
+        ).all()]
+
+        ETLLogger.log_clear_old_metadata(self.source.id, len(table_ids))
+
+        if table_ids:
+            table_ids_query = session.query(TableMetadata.id).filter(
+                TableMetadata.datasource_id == self.source.id
+            )
+            session.query(ColumnMetadata).filter(
+                ColumnMetadata.table_id.in_(table_ids_query.scalar_subquery())
+            ).delete(synchronize_session=False)
+            session.query(TableRelationship).filter(
+                TableRelationship.table_id.in_(table_ids_query.scalar_subquery())
+                | TableRelationship.referenced_table_id.in_(table_ids_query.scalar_subquery())
+            ).delete(synchronize_session=False)
+            session.query(TableMetadata).filter(
+                TableMetadata.datasource_id == self.source.id
+            ).delete(synchronize_session=False)
+
+        return len(table_ids)
+
+    def save_tables(self, tables: List[Dict[str, Any]], upsert: bool = False) -> Dict[str, Any]:
+        """
+        保存表和列元数据
+        :param tables: 抽取结果中的表数据列表
+        :param upsert: 是否按 schema.table 更新已存在的表（增量抽取）
+        :return: {'table_mapping': {schema.table: id}, 'columns_count': int}
+        """
+        session = self.session
+        existing = {}
+        if upsert and tables:
+            # 只加载本批涉及的表，避免大数据源每批都加载全部表
+            table_names = list({table_data['table_info']['table_name'] for table_data in tables})
+            for table in session.query(TableMetadata).filter(
+                TableMetadata.datasource_id == self.source.id,
+                TableMetadata.table_name.in_(table_names)
+            ).all():
+                existing[f"{table.schema_name}.{table.table_name}"] = table
+
+        now = datetime.utcnow()
+        table_objects = []
+        for table_data in tables:
+            table_info = table_data['table_info']
+            table_key = f"{table_info['schema_name']}.{table_info['table_name']}"
+            table_meta = existing.get(table_key)
+            is_new = table_meta is None
+            if not is_new:
+                table_meta.row_count = table_info['row_count']
+                table_meta.size_bytes = table_info['size_bytes']
+                table_meta.comment = table_info['comment']
+                table_meta.updated_at = now
+            else:
+                table_meta = TableMetadata(
+                    table_name=table_info['table_name'],
+                    schema_name=table_info['schema_name'],
+                    row_count=table_info['row_count'],
+                    size_bytes=table_info['size_bytes'],
+                    comment=table_info['comment'],
+                    datasource_id=self.source.id
+                )
+                session.add(table_meta)
+            table_objects.append((table_key, table_meta, table_data['columns'], is_new))
+
+        # 一次flush获取所有新表的ID，避免逐表往返
+        session.flush()
+
+        # 已存在的表先删除旧字段，再统一插入新字段
+        updated_ids = [table_meta.id for _, table_meta, _, is_new in table_objects if not is_new]
+        if updated_ids:
+            session.query(ColumnMetadata).filter(
+                ColumnMetadata.table_id.in_(updated_ids)
+            ).delete(synchronize_session=False)
+
+        table_mapping = {}
+        column_rows = []
+        for table_key, table_meta, columns, _ in table_objects:
+            table_mapping[table_key] = table_meta.id
+            for col_data in columns:
+                column_rows.append({
+                    'column_name': col_data['column_name'],
+                    'data_type': col_data['data_type'],
+                    'is_nullable': col_data['is_nullable'],
+                    'default_value': col_data['default_value'],
+                    'column_comment': col_data['column_comment'],
+                    'ordinal_position': col_data['ordinal_position'],
+                    'table_id': table_meta.id
+                })
+
+        if column_rows:
+            session.execute(insert(ColumnMetadata), column_rows)
+
+        return {'table_mapping': table_mapping, 'columns_count': len(column_rows)}
+
+    def save_relationships(self, relationships: List[Dict[str, Any]], table_mapping: Dict[str, int]) -> int:
+        """保存表关联关系，返回保存的数量"""
+        rows = []
+        for relationship in relationships or []:
+            table_id = table_mapping.get(self.relationship_table_key(relationship['table_name']))
+            referenced_table_id = table_mapping.get(
+                self.relationship_table_key(relationship['referenced_table_name'])
+            )
+            if table_id and referenced_table_id:
+                rows.append({
+                    'constraint_name': relationship.get('constraint_name'),
+                    'table_id': table_id,
+                    'referenced_table_id': referenced_table_id,
+                    'column_name': relationship['column_name'],
+                    'referenced_column_name': relationship['referenced_column_name'],
+                    'constraint_type': relationship.get('constraint_type', 'FOREIGN KEY'),
+                    'confidence': 1.0
+                })
+        if rows:
+            self.session.execute(insert(TableRelationship), rows)
+        return len(rows)
+
+    def delete_tables(self, table_ids: List[int]):
+        """删除指定的表及其列和关联关系"""
+        session = self.session
+        for i in range(0, len(table_ids), DELETE_CHUNK_SIZE):
+            chunk = table_ids[i:i + DELETE_CHUNK_SIZE]
+            session.query(ColumnMetadata).filter(
+                ColumnMetadata.table_id.in_(chunk)
+            ).delete(synchronize_session=False)
+            session.query(TableRelationship).filter(
+                TableRelationship.table_id.in_(chunk) | TableRelationship.referenced_table_id.in_(chunk)
+            ).delete(synchronize_session=False)
+            session.query(TableMetadata).filter(
+                TableMetadata.id.in_(chunk)
+            ).delete(synchronize_session=False)
+
+    def finalize_full(self, history_ids: List[int], relationships: List[Dict[str, Any]]) -> Dict[str, int]:
+        """
+        全量抽取完成后的收尾：删除本次运行（含恢复前的运行）未抽取到的旧表，并重建关联关系
+        :param history_ids: 本次运行及其恢复链上的抽取历史ID
+        :param relationships: 抽取到的关联关系
+        :return: 删除的表数量和保存的关联关系数量
+        """
+        session = self.session
+        extracted = {
+            (schema_name, table_name) for schema_name, table_name in session.query(
+                ExtractionCheckpoint.schema_name, ExtractionCheckpoint.table_name
+            ).filter(ExtractionCheckpoint.history_id.in_(history_ids)).all()
+        }
+
+        table_mapping = {}
+        stale_ids = []
+        for table_id, schema_name, table_name in session.query(
+            TableMetadata.id, TableMetadata.schema_name, TableMetadata.table_name
+        ).filter(TableMetadata.datasource_id == self.source.id).all():
+            if (schema_name, table_name) in extracted:
+                table_mapping[f"{schema_name}.{table_name}"] = table_id
+            else:
+                stale_ids.append(table_id)
+
+        ETLLogger.log_clear_old_metadata(self.source.id, len(stale_ids))
+        self.delete_tables(stale_ids)
+
+        table_ids_query = session.query(TableMetadata.id).filter(TableMetadata.datasource_id == self.source.id)
+        session.query(TableRelationship).filter(
+            TableRelationship.table_id.in_(table_ids_query.scalar_subquery())
+        ).delete(synchronize_session=False)
+        relationships_count = self.save_relationships(relationships, table_mapping)
+
+        return {'deleted_tables': len(stale_ids), 'relationships_count': relationships_count}
+
+    def persist(self, result: Dict[str, Any], full: bool = True) -> Dict[str, int]:
+        """
+        持久化一次抽取结果
+        :param result: 抽取器返回的结果
+        :param full: 全量抽取会先清除旧数据，增量抽取按表更新
+        :return: 保存的表、列、关联关系数量
+        """
+        tables = result.get('tables', [])
+        if full:
+            self.clear_all()
+        saved = self.save_tables(tables, upsert=not full)
+        relationships_count = 0
+        if full:
+            relationships_count = self.save_relationships(result.get('relationships', []), saved['table_mapping'])
+
+        ETLLogger.log_save_metadata(
+            self.source.id,
+            len(tables),
+            saved['columns_count'],
+            relationships_count
+        )
+        return {
+            'tables_count': len(tables),
+            'columns_count': saved['columns_count'],
+            'relationships_count': relationships_count
+        }
+
+
+def _load_source(session, source_id: int) -> Optional[DataSource]:
+    """加载数据源并与会话分离，使其在会话关闭后仍可在抽取线程中使用"""
+    source = session.query(DataSource).filter(DataSource.id == source_id).first()
+    if source:
+        session.expunge(source)
+    return source
+
+
+def _last_sync_time(session, source_id: int, etl_task_id: Optional[int], exclude_history_id: int):
+    """获取增量抽取的上次同步时间（同一任务或数据源最近一次成功抽取的时间）"""
+    query = session.query(ExtractionHistory).filter(
+        ExtractionHistory.id != exclude_history_id,
+        ExtractionHistory.status == 'success'
+    )
+    if etl_task_id:
+        query = query.filter(ExtractionHistory.etl_task_id == etl_task_id)
+    else:
+        query = query.filter(ExtractionHistory.datasource_id == source_id)
+    last_history = query.order_by(ExtractionHistory.extraction_time.desc()).first()
+    return last_history.extraction_time if last_history else None
+
+
+def _resume_chain(session, history_id: Optional[int]) -> List[int]:
+    """获取恢复链上的所有抽取历史ID（被恢复的运行及其更早的被恢复运行）"""
+    chain = []
+    while history_id and history_id not in chain:
+        chain.append(history_id)
+        history_id = session.query(ExtractionHistory.resumed_from_id).filter(
+            ExtractionHistory.id == history_id
+        ).scalar()
+    return chain
+
+
+# 本进程中正在执行的抽取运行的取消令牌：{历史记录ID: CancellationToken}
+_active_tokens: Dict[int, CancellationToken] = {}
+_active_tokens_lock = threading.Lock()
+
+
+class _InFlightRun:
+    """本进程中某个数据源正在执行的抽取运行，任务类型相同的重复请求等待其结果"""
+
+    def __init__(self, task_type: str, resume_from: Optional[int] = None):
+        self.future = Future()
+        self.task_type = task_type
+        self.resume_from = resume_from
+        self.history_id = None
+        self._callbacks: List[Callable[[int], None]] = []
+        self._lock = threading.Lock()
+
+    def on_history_created(self, callback: Callable[[int], None]):
+        """历史记录已创建时立即回调，否则在创建后回调"""
+        with self._lock:
+            if self.history_id is None:
+                self._callbacks.append(callback)
+                return
+        callback(self.history_id)
+
+    def set_history(self, history_id: int):
+        with self._lock:
+            self.history_id = history_id
+            callbacks, self._callbacks = self._callbacks, []
+        for callback in callbacks:
+            callback(history_id)
+
+    def accepts(self, task_type: str, resume_from: Optional[int]) -> bool:
+        """重复请求能否合并到本运行：任务类型相同且双方都不是恢复运行"""
+        return task_type == self.task_type and resume_from is None and self.resume_from is None
+
+    def holder(self, source_id: int) -> Dict[str, Any]:
+        """本运行的持有者信息，格式与抽取锁一致"""
+        return {
+            'datasource_id': source_id,
+            'owner': process_owner(),
+            'task_type': self.task_type,
+            'history_id': self.history_id,
+            'job_id': None
+        }
+
+    def cancel(self, reason: str):
+        with _active_tokens_lock:
+            token = _active_tokens.get(self.history_id)
+        if token:
+            token.cancel(reason)
+
+
+# 本进程中正在执行的抽取运行：{数据源ID: _InFlightRun}
+_in_flight: Dict[int, _InFlightRun] = {}
+_in_flight_lock = threading.Lock()
+
+
+class CheckpointWriter:
+    """
+    检查点写入器
+    作为抽取器的 on_batch 回调，每批表在独立事务中持久化并记录检查点和运行游标，
+    同时检查其他进程写入的取消请求
+    """
+
+    def __init__(self, source: DataSource, history_id: int, completed: int = 0,
+                 cancel_token: Optional[CancellationToken] = None):
+        self.source = source
+        self.history_id = history_id
+        self.cancel_token = cancel_token
+        self.completed = completed
+        self.written = 0
+        self.unchanged = 0
+        self.columns_count = 0
+        self.batch_no = 0
+
+    def __call__(self, tables: List[Dict[str, Any]], unchanged: Optional[List[Dict[str, Any]]] = None):
+        """
+        :param tables: 本批需要持久化的表
+        :param unchanged: 与元数据库一致、只记录检查点的表（快照导入时使用，见 catalog_snapshot）
+        """
+        unchanged = unchanged or []
+        checkpointed = tables + unchanged
+        if not checkpointed:
+            return
+        self.batch_no += 1
+        with get_db_session() as session:
+            columns_count = 0
+            if tables:
+                columns_count = MetadataPersister(session, self.source).save_tables(tables, upsert=True)['columns_count']
+            session.execute(insert(ExtractionCheckpoint), [{
+                'history_id': self.history_id,
+                'datasource_id': self.source.id,
+                'schema_name': table_data['table_info']['schema_name'],
+                'table_name': table_data['table_info']['table_name'],
+                'batch_no': self.batch_no
+            } for table_data in checkpointed])
+            session.query(ExtractionHistory).filter(ExtractionHistory.id == self.history_id).update({
+                ExtractionHistory.checkpointed_tables:
+                    self.completed + self.written + self.unchanged + len(checkpointed),
+                ExtractionHistory.checkpoint_cursor: checkpointed[-1]['table_info']['table_name']
+            }, synchronize_session=False)
+            cancel_requested = session.query(ExtractionHistory.cancel_requested).filter(
+                ExtractionHistory.id == self.history_id
+            ).scalar()
+        if cancel_requested and self.cancel_token:
+            self.cancel_token.cancel('抽取已被用户取消')
+        self.written += len(tables)
+        self.unchanged += len(unchanged)
+        self.columns_count += columns_count
+        ETLLogger.get_logger().info(
+            f"检查点 - 批次 {self.batch_no}, 本批 {len(checkpointed)} 个表, "
+            f"累计 {self.completed + self.written + self.unchanged} 个表"
+        )
+
+
+def _table_list_details(tables: List[str]) -> Dict[str, Any]:
+    """表名列表的摘要，过长时截断"""
+    return {'count': len(tables), 'tables': tables[:DETAILS_MAX_TABLES]}
+
+
+def build_run_details(result: Dict[str, Any], cancel_token: Optional[CancellationToken] = None,
+                      throttle_summary: Optional[Dict[str, Any]] = None) -> Dict[str, Any]:
+    """
+    根据抽取结果生成运行详情
+    :param throttle_summary: 本次运行的限流统计和决策
+    :return: 详情字典，没有需要记录的内容时为空字典
+    """
+    details = {}
+    if result.get('skipped_tables'):
+        details['skipped_tables'] = _table_list_details(result['skipped_tables'])
+    if result.get('timed_out_tables'):
+        details['timed_out_tables'] = _table_list_details(result['timed_out_tables'])
+    if result.get('failed_tables'):
+        details['failed_tables_count'] = result['failed_tables']
+    if cancel_token and cancel_token.reason:
+        details['cancel_reason'] = cancel_token.reason
+    if throttle_summary:
+        config = throttle_summary['config']
+        # 未启用任何限流且没有发生决策时不记录
+        if (config['max_qps'] or config['max_concurrent'] or config['quiet_hours']
+                or throttle_summary['decisions']):
+            details['throttle'] = throttle_summary
+    return details
+
+
+def run_extraction(source_id: int, task_type: str = 'full', etl_task_id: Optional[int] = None,
+                   orchestration_run_id: Optional[int] = None,
+                   on_history_created: Optional[Callable[[int], None]] = None,
+                   resume_from: Optional[int] = None,
+                   cancel_token: Optional[CancellationToken] = None) -> Dict[str, Any]:
+    """
+    执行一次数据源元数据抽取并持久化结果
+    同一数据源在本进程中已有相同任务类型的运行时不重复抽取，等待并返回该运行的结果（coalesced 为 True）；
+    任务类型不同或为恢复运行时不合并，抛出 ExtractionInProgressException
+    :param source_id: 数据源ID
+    :param task_type: 任务类型：full, incremental, schema_only
+    :param etl_task_id: 关联的ETL任务ID
+    :param orchestration_run_id: 关联的批量编排运行ID
+    :param on_history_created: 抽取历史记录创建后的回调，参数为历史记录ID
+    :param resume_from: 从指定的失败运行的检查点恢复，已完成的表不再重新抽取
+    :param cancel_token: 调用方持有的取消令牌（如工作进程在作业租约被收回时取消），默认按 EXTRACTION_TIMEOUT 新建
+    :return: 抽取结果摘要（不包含表数据本身）
+    :raises ExtractionInProgressException: 本进程中正在执行无法合并的运行，或其他进程正在抽取该数据源
+    """
+    if task_type not in TASK_TYPES:
+        raise ValidationException(f"不支持的任务类型: {task_type}")
+
+    with _in_flight_lock:
+        run = _in_flight.get(source_id)
+        leader = run is None
+        if leader:
+            run = _in_flight[source_id] = _InFlightRun(task_type, resume_from)
+    if not leader and not run.accepts(task_type, resume_from):
+        # 优先使用抽取锁中的持有者信息（包含作业ID）
+        holder = get_lock(source_id) or run.holder(source_id)
+        raise ExtractionInProgressException(
+            f"数据源 {source_id} 正在执行 {run.task_type} 抽取（抽取记录: {holder.get('history_id')}），"
+            f"无法同时执行 {task_type} 抽取", holder
+        )
+    if not leader:
+        logging.info(f"数据源 {source_id} 正在抽取中，等待运行结果")
+        if on_history_created:
+            run.on_history_created(on_history_created)
+        return {**run.future.result(), 'coalesced': True}
+
+    try:
+        # 先确认数据源存在再获取锁，在会话外抛出异常，避免被会话包装为数据库异常
+        with get_db_session() as session:
+            exists = session.query(DataSource.id).filter(DataSource.id == source_id).first() is not None
+        if not exists:
+            raise DataSourceNotFoundException(f"数据源不存在: {source_id}")
+
+        acquired, holder = acquire_lock(source_id, task_type,
+                                        on_lost=lambda: run.cancel('抽取锁已被其他进程接管'))
+        if not acquired:
+            raise ExtractionInProgressException(
+                f"数据源 {source_id} 正在其他进程中抽取（抽取记录: {holder.get('history_id')}）", holder
+            )
+        try:
+            def history_created(history_id: int):
+                attach_history(source_id, history_id)
+                run.set_history(history_id)
+                if on_history_created:
+                    on_history_created(history_id)
+
+            result = _execute_extraction(source_id, task_type, etl_task_id, orchestration_run_id,
+                                         history_created, resume_from, cancel_token)
+        finally:
+            release_lock(source_id)
+        run.future.set_result(result)
+        return {**result, 'coalesced': False}
+    except BaseException as e:
+        run.future.set_exception(e)
+        raise
+    finally:
+        with _in_flight_lock:
+            _in_flight.pop(source_id, None)
+
+
+def _execute_extraction(source_id: int, task_type: str = 'full', etl_task_id: Optional[int] = None,
+                        orchestration_run_id: Optional[int] = None,
+                        on_history_created: Optional[Callable[[int], None]] = None,
+                        resume_from: Optional[int] = None,
+                        cancel_token: Optional[CancellationToken] = None) -> Dict[str, Any]:
+    """
+    执行一次数据源元数据抽取并持久化结果（调用方已持有数据源的抽取锁）
+    :param source_id: 数据源ID
+    :param task_type: 任务类型：full, incremental, schema_only
+    :param etl_task_id: 关联的ETL任务ID
+    :param orchestration_run_id: 关联的批量编排运行ID
+    :param on_history_created: 抽取历史记录创建后的回调，参数为历史记录ID
+    :param resume_from: 从指定的失败运行的检查点恢复，已完成的表不再重新抽取
+    :param cancel_token: 取消令牌，默认按 EXTRACTION_TIMEOUT 新建
+    :return: 抽取结果摘要（不包含表数据本身）
+    """
+    if task_type not in TASK_TYPES:
+        raise ValidationException(f"不支持的任务类型: {task_type}")
+
+    start_time = time.time()
+
+    # 校验在会话外抛出异常，避免被会话包装为数据库异常
+    with get_db_session() as session:
+        source = _load_source(session, source_id)
+        previous = None
+        if resume_from:
+            previous = session.query(
+                ExtractionHistory.datasource_id, ExtractionHistory.status,
+                ExtractionHistory.task_type, ExtractionHistory.etl_task_id
+            ).filter(ExtractionHistory.id == resume_from).first()
+
+    if not source:
+        raise DataSourceNotFoundException(f"数据源不存在: {source_id}")
+    if not get_extractor_class(source.type):
+        raise ValidationException(f"不支持的数据库类型: {source.type}")
+    if resume_from:
+        if not previous or previous.datasource_id != source.id:
+            raise ValidationException(f"抽取记录不存在或不属于该数据源: {resume_from}")
+        if previous.status not in RESUMABLE_STATUSES:
+            raise ValidationException(f"抽取记录状态为 {previous.status}，无法恢复")
+        task_type = previous.task_type or task_type
+        etl_task_id = etl_task_id or previous.etl_task_id
+
+    extractor = create_extractor(source)
+    with get_db_session() as session:
+        chain = _resume_chain(session, resume_from)
+
+        # 创建执行中的记录
+        history_record = ExtractionHistory(
+            datasource_id=source.id,
+            status='running',
+            message='正在从检查点恢复抽取...' if resume_from else '正在抽取元数据...',
+            extracted_tables=0,
+            etl_task_id=etl_task_id,
+            orchestration_run_id=orchestration_run_id,
+            task_type=task_type,
+            checkpointed_tables=0,
+            resumed_from_id=resume_from
+        )
+        session.add(history_record)
+        session.flush()
+        history_id = history_record.id
+
+        completed_tables = set()
+        if chain:
+            # 按 (模式, 表名) 匹配，其他模式下的同名表不算已完成
+            completed_tables = {(schema_name, table_name) for schema_name, table_name in session.query(
+                ExtractionCheckpoint.schema_name, ExtractionCheckpoint.table_name
+            ).filter(ExtractionCheckpoint.history_id.in_(chain)).all()
+                if extractor.table_key(table_name) == (schema_name, table_name)}
+            history_record.checkpointed_tables = len(completed_tables)
+
+        last_sync_time = None
+        if task_type == 'incremental':
+            last_sync_time = _last_sync_time(session, source.id, etl_task_id, history_id)
+
+    # 本次运行的ETL日志带上运行ID，写入该运行自己的日志文件
+    with ETLLogger.run_context(history_id, source.id):
+        try:
+            if on_history_created:
+                on_history_created(history_id)
+
+            full = task_type != 'incremental'
+            cancel_token = cancel_token or CancellationToken()
+            throttle = get_throttle(source)
+            throttle_marker = throttle.marker()
+            profiler = QueryProfiler()
+            with _active_tokens_lock:
+                _active_tokens[history_id] = cancel_token
+            EXTRACTION_IN_FLIGHT.inc()
+            try:
+                writer = CheckpointWriter(source, history_id, completed=len(completed_tables), cancel_token=cancel_token)
+                extractor.profiler = profiler
+                result = extractor.extract_metadata(
+                    full=full,
+                    include_stats=task_type != 'schema_only',
+                    last_sync_time=last_sync_time,
+                    skip_tables=completed_tables,
+                    on_batch=writer,
+                    cancel_token=cancel_token
+                )
+                if result.get('tables'):
+                    writer(result['tables'])
+            finally:
+                EXTRACTION_IN_FLIGHT.dec()
+                with _active_tokens_lock:
+                    _active_tokens.pop(history_id, None)
+
+            status = result['status']
+            message = result.get('message', '')
+            relationships_count = 0
+            details = build_run_details(result, cancel_token, throttle.summary_since(throttle_marker))
+            profile = profiler.profile()
+
+            with get_db_session() as session:
+                if status == 'success':
+                    if full:
+                        relationships_count = MetadataPersister(session, source).finalize_full(
+                            chain + [history_id], result.get('relationships', [])
+                        )['relationships_count']
+                    ETLLogger.log_save_metadata(source.id, writer.written, writer.columns_count, relationships_count)
+                    record_schema_version(session, source.id, history_id)
+                    if Config.RELATIONSHIP_INFERENCE_ENABLED:
+                        # 推断失败不影响本次抽取的结果
+                        try:
+                            with session.begin_nested():
+                                inferred = infer_relationships(session, source)
+                            ETLLogger.get_logger().info(f"推断关联关系: {inferred['saved']} 个")
+                        except Exception as e:
+                            logging.warning(f"推断关联关系失败: {str(e)}")
+                    # 运行成功后检查点不再需要
+                    session.query(ExtractionCheckpoint).filter(
+                        ExtractionCheckpoint.history_id.in_(chain + [history_id])
+                    ).delete(synchronize_session=False)
+                elif writer.completed + writer.written > 0:
+                    message = (f"{message}；已写入检查点 {writer.completed + writer.written} 个表，"
+                               f"可从检查点恢复")
+
+                duration = time.time() - start_time
+                ETLLogger.get_logger().info(f"抽数总耗时: {duration:.2f}秒")
+
+                history = session.query(ExtractionHistory).filter(ExtractionHistory.id == history_id).first()
+                history.status = status
+                history.message = message
+                history.extracted_tables = writer.completed + writer.written
+                history.duration = int(duration)
+                if details:
+                    history.details = json.dumps(details, ensure_ascii=False)
+                if status == 'success':
+                    history.total_tables = writer.completed + writer.written + result.get('failed_tables', 0)
+                session.add(ExtractionProfile(
+                    history_id=history_id,
+                    datasource_id=source.id,
+                    total_ms=profile['total_ms'],
+                    statement_count=profile['statement_count'],
+                    error_count=profile['error_count'],
+                    rows_fetched=profile['rows_fetched'],
+                    profile=json.dumps(profile, ensure_ascii=False)
+                ))
+                table_records = profiler.table_records()
+                save_table_stats(session, history_id, source.id, table_records)
+                record_samples(session, source.id, [record for record in table_records
+                                                    if record['status'] == 'success'])
+                compact_samples(session, source.id)
+
+                if etl_task_id:
+                    task = session.query(ETLTask).filter(ETLTask.id == etl_task_id).first()
+                    if task:
+                        task.last_run = datetime.utcnow()
+
+            record_extraction(source.id, task_type, status, duration, writer.written, writer.columns_count)
+            profiling = None
+            if status == 'success':
+                invalidate_graph(source.id)
+                if Config.COLUMN_PROFILING_ENABLED:
+                    # 字段画像有独立的时间预算，失败不影响本次抽取的结果
+                    try:
+                        profiling = profile_datasource(source.id)
+                    except Exception as e:
+                        logging.warning(f"字段画像失败: {str(e)}")
+
+            return {
+                'status': status,
+                'message': message,
+                'history_id': history_id,
+                'datasource_id': source.id,
+                'tables_count': writer.written,
+                'resumed_tables': writer.completed,
+                'columns_count': writer.columns_count,
+                'relationships_count': relationships_count,
+                'extraction_type': result.get('extraction_type', task_type),
+                'duration': int(duration),
+                'details': details,
+                'profiling': profiling
+            }
+        except Exception as e:
+            mark_history_failed(history_id, f"元数据抽取失败: {str(e)}", start_time)
+            record_extraction(source.id, task_type, 'failed', time.time() - start_time, 0, 0)
+            ETLLogger.get_logger().error(f"元数据抽取失败: {str(e)}")
+            logging.error(f"元数据抽取失败: {str(e)}")
+            raise ExtractionException(f"元数据抽取失败: {str(e)}")
+
+
+def resume_extraction(history_id: int, **kwargs) -> Dict[str, Any]:
+    """
+    从失败运行的检查点恢复抽取
+    :param history_id: 失败的抽取历史ID
+    :return: 抽取结果摘要
+    """
+    with get_db_session() as session:
+        previous = session.query(
+            ExtractionHistory.datasource_id, ExtractionHistory.task_type
+        ).filter(ExtractionHistory.id == history_id).first()
+        resumed = session.query(ExtractionHistory.id).filter(
+            ExtractionHistory.resumed_from_id == history_id
+        ).first()
+
+    if not previous:
+        raise ValidationException(f"抽取记录不存在: {history_id}")
+    if resumed:
+        raise ValidationException(f"抽取记录已被恢复，请恢复最新的运行: {resumed[0]}")
+    return run_extraction(previous.datasource_id, task_type=previous.task_type or 'full',
+                          resume_from=history_id, **kwargs)
+
+
+def cancel_extraction(history_id: int) -> Dict[str, Any]:
+    """
+    请求取消正在执行的抽取运行
+    本进程中的运行立即取消；其他进程（抽取工作进程）中的运行在写入下一个检查点时取消
+    :param history_id: 抽取历史ID
+    :return: 取消结果
+    """
+    with get_db_session() as session:
+        updated = session.query(ExtractionHistory).filter(
+            ExtractionHistory.id == history_id,
+            ExtractionHistory.status == 'running'
+        ).update({ExtractionHistory.cancel_requested: True}, synchronize_session=False)
+
+    if not updated:
+        raise ValidationException(f"抽取记录不存在或不在执行中: {history_id}")
+
+    with _active_tokens_lock:
+        token = _active_tokens.get(history_id)
+    if token:
+        token.cancel('抽取已被用户取消')
+    logging.info(f"已请求取消抽取运行 {history_id}")
+    return {'history_id': history_id, 'cancel_requested': True, 'cancelled_in_process': token is not None}
+
+
+def mark_history_failed(history_id: int, message: str, start_time: float = None):
+    """将抽取历史记录标记为失败"""
+    try:
+        with get_db_session() as session:
+            history = session.query(ExtractionHistory).filter(ExtractionHistory.id == history_id).first()
+            if history:
+                history.status = 'failed'
+                history.message = message
+                if start_time:
+                    history.duration = int(time.time() - start_time)
+    except Exception as e:
+        logging.error(f"更新抽取历史记录失败: {str(e)}")
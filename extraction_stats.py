@@ -0,0 +1,223 @@
+"""
+表抽取统计
+
+每次运行结束后将各表的耗时、语句数、行数、大小和状态批量写入 table_extraction_stats，
+在此基础上提供：
+1. 热点分析：跨运行统计最慢的表和数据源
+2. 耗时预测：按最近几次成功运行中各表耗时的中位数估算下一次运行的耗时，
+   再用历史上“运行总耗时 / 各表耗时之和”的比例修正并发和固定开销，供编排器排序和界面显示预计完成时间
+"""
+import statistics
+from datetime import datetime, timedelta
+from typing import Dict, Any, List, Optional, Iterable
+
+from sqlalchemy import func, case, insert
+
+from models import DataSource, ExtractionHistory, TableExtractionStat
+from db_manager import get_db_session
+
+
+# 批量写入的每批行数
+STATS_INSERT_CHUNK = 1000
+# 错误信息的最大长度
+ERROR_MAX_LENGTH = 1000
+# 预测时参考的最近成功运行数
+PREDICTION_RUNS = 5
+# 热点分析默认统计的天数
+DEFAULT_HOTSPOT_DAYS = 30
+
+
+def save_table_stats(session, history_id: int, datasource_id: int, records: List[Dict[str, Any]]) -> int:
+    """
+    批量写入一次运行的表抽取统计
+    :param session: 数据库会话
+    :param records: QueryProfiler.table_records() 的结果
+    :return: 写入的行数
+    """
+    now = datetime.utcnow()
+    rows = [{
+        'history_id': history_id,
+        'datasource_id': datasource_id,
+        'table_name': record['table_name'],
+        'status': record['status'],
+        'duration_ms': record['duration_ms'],
+        'query_count': record.get('query_count', 0),
+        'row_count': record.get('row_count'),
+        'size_bytes': record.get('size_bytes'),
+        'error': record['error'][:ERROR_MAX_LENGTH] if record.get('error') else None,
+        'created_at': now
+    } for record in records]
+    for start in range(0, len(rows), STATS_INSERT_CHUNK):
+        session.execute(insert(TableExtractionStat), rows[start:start + STATS_INSERT_CHUNK])
+    return len(rows)
+
+
+def slowest_tables(datasource_id: Optional[int] = None, days: int = DEFAULT_HOTSPOT_DAYS,
+                   limit: int = 20) -> List[Dict[str, Any]]:
+    """
+    跨运行统计平均抽取耗时最长的表
+    :param datasource_id: 只统计指定数据源
+    :param days: 统计最近多少天
+    :param limit: 返回数量
+    """
+    since = datetime.utcnow() - timedelta(days=days)
+    with get_db_session() as session:
+        query = session.query(
+            TableExtractionStat.datasource_id,
+            DataSource.name,
+            TableExtractionStat.table_name,
+            func.count(TableExtractionStat.id),
+            func.avg(TableExtractionStat.duration_ms),
+            func.max(TableExtractionStat.duration_ms),
+            func.avg(TableExtractionStat.query_count),
+            func.max(TableExtractionStat.row_count),
+            func.sum(case((TableExtractionStat.status != 'success', 1), else_=0))
+        ).join(DataSource, DataSource.id == TableExtractionStat.datasource_id).filter(
+            TableExtractionStat.created_at >= since
+        )
+        if datasource_id:
+            query = query.filter(TableExtractionStat.datasource_id == datasource_id)
+        rows = query.group_by(
+            TableExtractionStat.datasource_id, DataSource.name, TableExtractionStat.table_name
+        ).order_by(func.avg(TableExtractionStat.duration_ms).desc()).limit(limit).all()
+
+    return [{
+        'datasource_id': source_id,
+        'datasource_name': source_name,
+        'table_name': table_name,
+        'runs': runs,
+        'avg_duration_ms': round(float(avg_ms or 0), 2),
+        'max_duration_ms': round(float(max_ms or 0), 2),
+        'avg_query_count': round(float(avg_queries or 0), 1),
+        'max_row_count': max_rows,
+        'failures': int(failures or 0)
+    } for source_id, source_name, table_name, runs, avg_ms, max_ms, avg_queries, max_rows, failures in rows]
+
+
+def slowest_sources(days: int = DEFAULT_HOTSPOT_DAYS, limit: int = 20) -> List[Dict[str, Any]]:
+    """
+    跨运行统计平均运行耗时最长的数据源
+    :param days: 统计最近多少天
+    :param limit: 返回数量
+    """
+    since = datetime.utcnow() - timedelta(days=days)
+    with get_db_session() as session:
+        runs = session.query(
+            ExtractionHistory.datasource_id,
+            DataSource.name,
+            func.count(ExtractionHistory.id),
+            func.avg(ExtractionHistory.duration),
+            func.max(ExtractionHistory.duration),
+            func.sum(case((ExtractionHistory.status != 'success', 1), else_=0))
+        ).join(DataSource, DataSource.id == ExtractionHistory.datasource_id).filter(
+            ExtractionHistory.extraction_time >= since,
+            ExtractionHistory.status != 'running'
+        ).group_by(
+            ExtractionHistory.datasource_id, DataSource.name
+        ).order_by(func.avg(ExtractionHistory.duration).desc()).limit(limit).all()
+
+        source_ids = [row[0] for row in runs]
+        table_totals = {}
+        if source_ids:
+            table_totals = {source_id: (tables, failed) for source_id, tables, failed in session.query(
+                TableExtractionStat.datasource_id,
+                func.count(func.distinct(TableExtractionStat.table_name)),
+                func.sum(case((TableExtractionStat.status != 'success', 1), else_=0))
+            ).filter(
+                TableExtractionStat.datasource_id.in_(source_ids),
+                TableExtractionStat.created_at >= since
+            ).group_by(TableExtractionStat.datasource_id).all()}
+
+    return [{
+        'datasource_id': source_id,
+        'datasource_name': source_name,
+        'runs': run_count,
+        'failed_runs': int(failed_runs or 0),
+        'avg_duration': round(float(avg_duration or 0), 2),
+        'max_duration': max_duration,
+        'tables': table_totals.get(source_id, (0, 0))[0],
+        'table_failures': int(table_totals.get(source_id, (0, 0))[1] or 0)
+    } for source_id, source_name, run_count, avg_duration, max_duration, failed_runs in runs]
+
+
+def _predict(runs: List[tuple], stats: List[tuple]) -> Dict[str, Any]:
+    """
+    根据最近的成功运行和其中各表的耗时预测下一次运行的耗时
+    :param runs: [(history_id, duration秒)]，按时间倒序
+    :param stats: [(history_id, table_name, duration_ms)]，只包含成功的表
+    """
+    durations = [duration for _, duration in runs if duration is not None]
+    if not durations:
+        return {'expected_seconds': None, 'method': 'none', 'runs': 0}
+
+    table_durations: Dict[str, List[float]] = {}
+    run_table_seconds: Dict[int, float] = {}
+    latest_tables = set()
+    latest_id = runs[0][0]
+    for history_id, table_name, duration_ms in stats:
+        seconds = (duration_ms or 0) / 1000
+        table_durations.setdefault(table_name, []).append(seconds)
+        run_table_seconds[history_id] = run_table_seconds.get(history_id, 0.0) + seconds
+        if history_id == latest_id:
+            latest_tables.add(table_name)
+
+    # 运行总耗时与各表耗时之和的比例，反映并发抽取和连接、持久化等固定开销
+    ratios = [duration / run_table_seconds[history_id] for history_id, duration in runs
+              if duration is not None and run_table_seconds.get(history_id)]
+    if latest_tables and ratios:
+        table_seconds = sum(statistics.median(table_durations[name]) for name in latest_tables)
+        expected = table_seconds * statistics.median(ratios)
+        method = 'per_table'
+    else:
+        expected = statistics.median(durations)
+        method = 'history_median'
+
+    return {
+        'expected_seconds': round(expected, 1),
+        'min_seconds': min(durations),
+        'max_seconds': max(durations),
+        'method': method,
+        'runs': len(durations),
+        'tables': len(latest_tables)
+    }
+
+
+def predict_durations(source_ids: Iterable[int], task_type: Optional[str] = None,
+                      runs: int = PREDICTION_RUNS) -> Dict[int, Dict[str, Any]]:
+    """
+    预测多个数据源下一次运行的耗时
+    :param source_ids: 数据源ID列表
+    :param task_type: 任务类型，指定时只参考同类型的运行（增量运行通常比全量快得多）
+    :param runs: 参考的最近成功运行数
+    :return: {数据源ID: {expected_seconds, min_seconds, max_seconds, method, runs, tables}}
+    """
+    source_ids = list(source_ids)
+    with get_db_session() as session:
+        recent_runs: Dict[int, List[tuple]] = {}
+        for source_id in source_ids:
+            query = session.query(ExtractionHistory.id, ExtractionHistory.duration).filter(
+                ExtractionHistory.datasource_id == source_id,
+                ExtractionHistory.status == 'success'
+            )
+            if task_type:
+                query = query.filter(ExtractionHistory.task_type == task_type)
+            recent_runs[source_id] = query.order_by(ExtractionHistory.id.desc()).limit(runs).all()
+
+        history_ids = [history_id for rows in recent_runs.values() for history_id, _ in rows]
+        stats_by_run: Dict[int, List[tuple]] = {}
+        for start in range(0, len(history_ids), STATS_INSERT_CHUNK):
+            for history_id, table_name, duration_ms in session.query(
+                TableExtractionStat.history_id, TableExtractionStat.table_name, TableExtractionStat.duration_ms
+            ).filter(
+                TableExtractionStat.history_id.in_(history_ids[start:start + STATS_INSERT_CHUNK]),
+                TableExtractionStat.status == 'success'
+            ).all():
+                stats_by_run.setdefault(history_id, []).append((history_id, table_name, duration_ms))
+
+    return {source_id: _predict(rows, [stat for history_id, _ in rows for stat in stats_by_run.get(history_id, [])])
+            for source_id, rows in recent_runs.items()}
+
+
+def predict_duration(source_id: int, task_type: Optional[str] = None) -> Dict[str, Any]:
+    """预测单个数据源下一次运行的耗时"""
+    return predict_durations([source_id], task_type)[source_id]
@@ -0,0 +1,129 @@
+"""
+抽取超时控制
+
+1. 语句级超时（Config.QUERY_TIMEOUT）：在源库连接建立时设置服务端语句超时，
+   单个目录查询或 COUNT(*) 超时后由数据库中止，不会无限期挂起抽取
+2. 运行级截止时间（Config.EXTRACTION_TIMEOUT）：通过 CancellationToken 协作式取消，
+   抽取器在每个表之间检查，超时或被取消后停止抽取并保留已完成的部分
+"""
+import logging
+import threading
+import time
+from typing import Optional
+
+from sqlalchemy import event
+
+from config import Config
+
+
+# 各数据库在连接建立时执行的超时设置语句，{ms} 为毫秒，{s} 为秒
+STATEMENT_TIMEOUT_SQL = {
+    'mysql': ["SET SESSION max_execution_time = {ms}"],
+    'starrocks': ["SET query_timeout = {s}"],
+    'postgresql': ["SET statement_timeout = {ms}", "SET lock_timeout = {ms}"],
+    'sqlserver': ["SET LOCK_TIMEOUT {ms}"],
+}
+
+# 语句超时被数据库中止时的错误信息特征
+STATEMENT_TIMEOUT_PATTERNS = (
+    'max_execution_time',           # MySQL 3024
+    'maximum statement execution time',
+    'query timeout',                # StarRocks
+    'statement timeout',            # PostgreSQL
+    'canceling statement',
+    'lock timeout',
+    'lock request time out',        # SQL Server 1222
+    'query timeout expired',        # SQL Server (pyodbc)
+    'dpi-1067',                     # Oracle call_timeout
+    'dpy-4024',
+)
+
+
+def apply_statement_timeout(engine, db_type: str, timeout_seconds: int = None):
+    """
+    为源库引擎注册连接事件，在每个新连接上设置语句超时
+    :param engine: SQLAlchemy引擎（异步引擎传入 engine.sync_engine）
+    :param db_type: 数据库类型
+    :param timeout_seconds: 超时时间（秒），默认 Config.QUERY_TIMEOUT，小于等于0表示不限制
+    """
+    timeout_seconds = Config.QUERY_TIMEOUT if timeout_seconds is None else timeout_seconds
+    if not timeout_seconds or timeout_seconds <= 0:
+        return
+    timeout_ms = int(timeout_seconds * 1000)
+    statements = [sql.format(ms=timeout_ms, s=int(timeout_seconds)) for sql in STATEMENT_TIMEOUT_SQL.get(db_type, [])]
+
+    @event.listens_for(engine, 'connect')
+    def set_statement_timeout(dbapi_connection, connection_record):
+        try:
+            if db_type == 'oracle':
+                # oracledb 的调用超时作用于每次数据库往返
+                dbapi_connection.call_timeout = timeout_ms
+            elif db_type == 'sqlserver':
+                # pyodbc 的查询超时（秒），配合 LOCK_TIMEOUT 避免锁等待挂起
+                dbapi_connection.timeout = int(timeout_seconds)
+            if statements:
+                cursor = dbapi_connection.cursor()
+                try:
+                    for sql in statements:
+                        cursor.execute(sql)
+                finally:
+                    cursor.close()
+        except Exception as e:
+            # 老版本数据库可能不支持对应的会话变量，不影响抽取
+            logging.warning(f"设置 {db_type} 语句超时失败: {str(e)}")
+
+
+def is_statement_timeout(error: Exception) -> bool:
+    """判断异常是否为语句超时导致的中止"""
+    message = str(error).lower()
+    return any(pattern in message for pattern in STATEMENT_TIMEOUT_PATTERNS)
+
+
+class CancellationToken:
+    """
+    抽取运行的取消令牌
+    到达截止时间或被显式取消后 is_cancelled() 返回True，抽取器据此停止抽取后续的表
+    """
+
+    def __init__(self, timeout_seconds: Optional[float] = None):
+        """
+        :param timeout_seconds: 运行截止时间（秒），默认 Config.EXTRACTION_TIMEOUT，小于等于0表示不限制
+        """
+        timeout_seconds = Config.EXTRACTION_TIMEOUT if timeout_seconds is None else timeout_seconds
+        self.deadline = time.monotonic() + timeout_seconds if timeout_seconds and timeout_seconds > 0 else None
+        self.timeout_seconds = timeout_seconds
+        self._event = threading.Event()
+        self._reason = None
+
+    def cancel(self, reason: str = '抽取已被取消'):
+        """请求取消"""
+        if not self._event.is_set():
+            self._reason = reason
+            self._event.set()
+
+    def is_cancelled(self) -> bool:
+        """是否已取消（显式取消或超过截止时间）"""
+        if not self._event.is_set() and self.deadline is not None and time.monotonic() >= self.deadline:
+            self.cancel(f"超过抽取截止时间 {self.timeout_seconds} 秒")
+        return self._event.is_set()
+
+    @property
+    def reason(self) -> Optional[str]:
+        return self._reason
+
+    def remaining(self) -> Optional[float]:
+        """距截止时间的剩余秒数，不限制时返回None"""
+        if self.deadline is None:
+            return None
+        return max(0.0, self.deadline - time.monotonic())
+
+    def wait(self, timeout: float) -> bool:
+        """
+        等待最多 timeout 秒（不超过截止时间），期间被取消时立即返回
+        :return: 是否已取消
+        """
+        remaining = self.remaining()
+        if remaining is not None:
+            timeout = min(timeout, remaining)
+        self._event.wait(timeout)
+        return self.is_cancelled()
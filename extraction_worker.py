@@ -0,0 +1,488 @@
+"""
+分布式抽取工作进程
+
+独立于Web进程运行，可在多台主机上同时启动：
+1. 从元数据库的 extraction_jobs 队列表中租用作业（MySQL/PostgreSQL 使用 SELECT ... FOR UPDATE SKIP LOCKED）
+2. 执行期间定期心跳续约，租约到期未续约的作业视为工作进程崩溃，自动重新排队；
+   续约时发现租约已被收回的作业通过取消令牌停止抽取
+3. 失败的作业按指数退避重试，超过最大尝试次数后标记为失败
+4. 同一数据源同一时间只租出一个作业；数据源正被其他运行抽取时作业延后重新排队，不计入尝试次数
+
+用法:
+    python extraction_worker.py --concurrency 4
+    python extraction_worker.py --worker-id node-1 --once
+"""
+import argparse
+import logging
+import os
+import signal
+import socket
+import threading
+import uuid
+from concurrent.futures import ThreadPoolExecutor
+from datetime import datetime, timedelta
+from typing import Dict, Any, List, Optional, Callable
+
+from sqlalchemy.orm import aliased
+
+from config import Config
+from models import DataSource, ExtractionJob, ExtractionHistory
+from db_manager import get_db_session
+from extraction_service import run_extraction, TASK_TYPES
+from extraction_timeout import CancellationToken
+from exceptions import DataSourceNotFoundException, ValidationException, ExtractionInProgressException
+from metrics import JOB_LEASE_LAG
+
+
+# 仍在处理中的作业状态
+ACTIVE_JOB_STATUSES = ('queued', 'leased')
+
+
+def job_to_dict(job: ExtractionJob) -> Dict[str, Any]:
+    """将作业转换为字典"""
+    return {
+        'id': job.id,
+        'datasource_id': job.datasource_id,
+        'task_type': job.task_type,
+        'etl_task_id': job.etl_task_id,
+        'status': job.status,
+        'priority': job.priority,
+        'attempts': job.attempts,
+        'max_attempts': job.max_attempts,
+        'worker_id': job.worker_id,
+        'lease_expires_at': job.lease_expires_at.isoformat() if job.lease_expires_at else None,
+        'heartbeat_at': job.heartbeat_at.isoformat() if job.heartbeat_at else None,
+        'enqueued_at': job.enqueued_at.isoformat() if job.enqueued_at else None,
+        'started_at': job.started_at.isoformat() if job.started_at else None,
+        'finished_at': job.finished_at.isoformat() if job.finished_at else None,
+        'history_id': job.history_id,
+        'error': job.error,
+        'requested_by': job.requested_by
+    }
+
+
+class JobQueue:
+    """
+    基于元数据库的抽取作业队列
+    """
+
+    def __init__(self, lease_seconds: int = None, max_attempts: int = None, retry_backoff: int = None):
+        self.lease_seconds = lease_seconds or Config.WORKER_LEASE_SECONDS
+        self.max_attempts = max_attempts or Config.JOB_MAX_ATTEMPTS
+        self.retry_backoff = retry_backoff if retry_backoff is not None else Config.JOB_RETRY_BACKOFF_SECONDS
+
+    def enqueue(self, datasource_id: int, task_type: str = 'full', etl_task_id: int = None,
+                priority: int = 0, requested_by: str = None) -> Dict[str, Any]:
+        """
+        提交抽取作业
+        同一数据源已有排队或执行中的同类作业（或包含本次内容的全量作业）时直接返回已有作业，不重复提交
+        :return: 作业信息，coalesced 表示是否复用了已有作业
+        """
+        return self.enqueue_many([datasource_id], task_type=task_type, etl_task_id=etl_task_id,
+                                 priority=priority, requested_by=requested_by)[0]
+
+    def enqueue_many(self, datasource_ids: List[int], task_type: str = 'full', etl_task_id: int = None,
+                     priority: int = 0, requested_by: str = None) -> List[Dict[str, Any]]:
+        """
+        在一个事务中为多个数据源提交抽取作业，任一数据源不存在时不提交任何作业
+        :return: 与 datasource_ids 顺序一致的作业信息列表
+        """
+        if task_type not in TASK_TYPES:
+            raise ValidationException(f"不支持的任务类型: {task_type}")
+
+        jobs = []
+        with get_db_session() as session:
+            found = {row[0] for row in session.query(DataSource.id).filter(DataSource.id.in_(datasource_ids))}
+            missing = [datasource_id for datasource_id in datasource_ids if datasource_id not in found]
+            if not missing:
+                now = datetime.utcnow()
+                for datasource_id in datasource_ids:
+                    jobs.append(self._enqueue(session, datasource_id, task_type, etl_task_id, priority,
+                                              requested_by, now))
+
+        # 在会话外抛出，避免被会话包装为数据库异常
+        if missing:
+            raise DataSourceNotFoundException(f"数据源不存在: {', '.join(str(i) for i in missing)}")
+        return jobs
+
+    def _enqueue(self, session, datasource_id: int, task_type: str, etl_task_id: Optional[int], priority: int,
+                 requested_by: Optional[str], now: datetime) -> Dict[str, Any]:
+        """在给定会话中提交单个作业，已有可合并的作业时直接返回"""
+        existing = session.query(ExtractionJob).filter(
+            ExtractionJob.datasource_id == datasource_id,
+            ExtractionJob.task_type.in_({task_type, 'full'}),
+            ExtractionJob.status.in_(ACTIVE_JOB_STATUSES)
+        ).order_by(ExtractionJob.id.asc()).first()
+        if existing:
+            return {**job_to_dict(existing), 'coalesced': True}
+
+        job = ExtractionJob(
+            datasource_id=datasource_id,
+            task_type=task_type,
+            etl_task_id=etl_task_id,
+            status='queued',
+            priority=priority,
+            attempts=0,
+            max_attempts=self.max_attempts,
+            available_at=now,
+            enqueued_at=now,
+            requested_by=requested_by
+        )
+        session.add(job)
+        session.flush()
+        return {**job_to_dict(job), 'coalesced': False}
+
+    def lease(self, worker_id: str) -> Optional[Dict[str, Any]]:
+        """
+        租用一个可执行的作业
+        同一数据源已有租出的作业时跳过该数据源的其他作业（不同任务类型的作业也不同时执行）
+        :return: 作业信息，队列为空时返回None
+        """
+        with get_db_session() as session:
+            now = datetime.utcnow()
+            leased = aliased(ExtractionJob)
+            query = session.query(ExtractionJob).filter(
+                ExtractionJob.status == 'queued',
+                ExtractionJob.available_at <= now,
+                ~session.query(leased.id).filter(
+                    leased.datasource_id == ExtractionJob.datasource_id,
+                    leased.status == 'leased'
+                ).exists()
+            ).order_by(ExtractionJob.priority.desc(), ExtractionJob.id.asc())
+
+            # MySQL 8+/PostgreSQL 跳过其他工作进程已锁定的行，SQLite 不支持行锁，依赖下面的条件更新
+            if session.bind.dialect.name in ('mysql', 'postgresql'):
+                query = query.with_for_update(skip_locked=True)
+
+            for job in query.limit(5).all():
+                # 条件更新保证同一作业只会被一个工作进程租用
+                updated = session.query(ExtractionJob).filter(
+                    ExtractionJob.id == job.id,
+                    ExtractionJob.status == 'queued'
+                ).update({
+                    ExtractionJob.status: 'leased',
+                    ExtractionJob.worker_id: worker_id,
+                    ExtractionJob.attempts: ExtractionJob.attempts + 1,
+                    ExtractionJob.lease_expires_at: now + timedelta(seconds=self.lease_seconds),
+                    ExtractionJob.heartbeat_at: now,
+                    ExtractionJob.started_at: now,
+                    ExtractionJob.error: None
+                }, synchronize_session=False)
+                if updated == 1:
+                    if job.available_at:
+                        JOB_LEASE_LAG.observe(max(0.0, (now - job.available_at).total_seconds()))
+                    session.flush()
+                    session.refresh(job)
+                    return job_to_dict(job)
+            return None
+
+    def heartbeat(self, job_ids: List[int], worker_id: str) -> List[int]:
+        """
+        为工作进程持有的作业续约
+        :return: 仍由该工作进程持有的作业ID（租约已被收回的作业不在其中）
+        """
+        if not job_ids:
+            return []
+        with get_db_session() as session:
+            now = datetime.utcnow()
+            session.query(ExtractionJob).filter(
+                ExtractionJob.id.in_(job_ids),
+                ExtractionJob.worker_id == worker_id,
+                ExtractionJob.status == 'leased'
+            ).update({
+                ExtractionJob.heartbeat_at: now,
+                ExtractionJob.lease_expires_at: now + timedelta(seconds=self.lease_seconds)
+            }, synchronize_session=False)
+            return [row[0] for row in session.query(ExtractionJob.id).filter(
+                ExtractionJob.id.in_(job_ids),
+                ExtractionJob.worker_id == worker_id,
+                ExtractionJob.status == 'leased'
+            ).all()]
+
+    def attach_history(self, job_id: int, worker_id: str, history_id: int):
+        """记录作业对应的抽取历史记录"""
+        with get_db_session() as session:
+            session.query(ExtractionJob).filter(
+                ExtractionJob.id == job_id,
+                ExtractionJob.worker_id == worker_id
+            ).update({ExtractionJob.history_id: history_id}, synchronize_session=False)
+
+    def complete(self, job_id: int, worker_id: str, status: str, error: str = None) -> bool:
+        """
+        完成作业
+        只有仍持有租约的工作进程才能提交结果，避免被收回的作业覆盖新一轮执行的状态
+        """
+        with get_db_session() as session:
+            updated = session.query(ExtractionJob).filter(
+                ExtractionJob.id == job_id,
+                ExtractionJob.worker_id == worker_id,
+                ExtractionJob.status == 'leased'
+            ).update({
+                ExtractionJob.status: status,
+                ExtractionJob.finished_at: datetime.utcnow(),
+                ExtractionJob.lease_expires_at: None,
+                ExtractionJob.error: error
+            }, synchronize_session=False)
+            return updated == 1
+
+    def fail(self, job_id: int, worker_id: str, error: str) -> str:
+        """
+        作业执行失败：未超过最大尝试次数时按指数退避重新排队
+        :return: 作业的新状态
+        """
+        with get_db_session() as session:
+            job = session.query(ExtractionJob).filter(
+                ExtractionJob.id == job_id,
+                ExtractionJob.worker_id == worker_id,
+                ExtractionJob.status == 'leased'
+            ).first()
+            if not job:
+                return 'lost'
+            now = datetime.utcnow()
+            job.error = error
+            job.lease_expires_at = None
+            if job.attempts < job.max_attempts:
+                job.status = 'queued'
+                job.worker_id = None
+                job.available_at = now + timedelta(seconds=self.retry_backoff * (2 ** (job.attempts - 1)))
+            else:
+                job.status = 'failed'
+                job.finished_at = now
+            return job.status
+
+    def defer(self, job_id: int, worker_id: str, reason: str) -> bool:
+        """
+        数据源正被其他运行抽取：作业延后重新排队，退还本次租用计入的尝试次数
+        :return: 是否仍持有该作业
+        """
+        with get_db_session() as session:
+            updated = session.query(ExtractionJob).filter(
+                ExtractionJob.id == job_id,
+                ExtractionJob.worker_id == worker_id,
+                ExtractionJob.status == 'leased'
+            ).update({
+                ExtractionJob.status: 'queued',
+                ExtractionJob.worker_id: None,
+                ExtractionJob.attempts: ExtractionJob.attempts - 1,
+                ExtractionJob.lease_expires_at: None,
+                ExtractionJob.history_id: None,
+                ExtractionJob.available_at: datetime.utcnow() + timedelta(seconds=self.retry_backoff),
+                ExtractionJob.error: reason
+            }, synchronize_session=False)
+            return updated == 1
+
+    def requeue_expired(self) -> int:
+        """
+        回收租约已过期的作业（工作进程崩溃或失联）
+        未超过最大尝试次数的作业重新排队，否则标记为失败；对应的抽取历史记录标记为失败
+        :return: 回收的作业数量
+        """
+        with get_db_session() as session:
+            now = datetime.utcnow()
+            query = session.query(ExtractionJob).filter(
+                ExtractionJob.status == 'leased',
+                ExtractionJob.lease_expires_at < now
+            )
+            if session.bind.dialect.name in ('mysql', 'postgresql'):
+                query = query.with_for_update(skip_locked=True)
+            expired = query.all()
+
+            for job in expired:
+                logging.warning(f"作业 {job.id} 的租约已过期（工作进程: {job.worker_id}），重新排队")
+                if job.history_id:
+                    session.query(ExtractionHistory).filter(
+                        ExtractionHistory.id == job.history_id,
+                        ExtractionHistory.status == 'running'
+                    ).update({
+                        ExtractionHistory.status: 'failed',
+                        ExtractionHistory.message: f"工作进程 {job.worker_id} 失联，租约过期"
+                    }, synchronize_session=False)
+                job.error = f"工作进程 {job.worker_id} 租约过期"
+                job.worker_id = None
+                job.lease_expires_at = None
+                job.history_id = None
+                if job.attempts < job.max_attempts:
+                    job.status = 'queued'
+                    job.available_at = now
+                else:
+                    job.status = 'failed'
+                    job.finished_at = now
+            return len(expired)
+
+    def list_jobs(self, status: str = None, datasource_id: int = None, limit: int = 100) -> List[Dict[str, Any]]:
+        """查询作业列表"""
+        with get_db_session() as session:
+            query = session.query(ExtractionJob)
+            if status:
+                query = query.filter(ExtractionJob.status == status)
+            if datasource_id:
+                query = query.filter(ExtractionJob.datasource_id == datasource_id)
+            return [job_to_dict(job) for job in query.order_by(ExtractionJob.id.desc()).limit(limit).all()]
+
+    def get_job(self, job_id: int) -> Optional[Dict[str, Any]]:
+        """获取单个作业"""
+        with get_db_session() as session:
+            job = session.query(ExtractionJob).filter(ExtractionJob.id == job_id).first()
+            return job_to_dict(job) if job else None
+
+
+def default_worker_id() -> str:
+    """生成默认的工作进程ID：主机名-进程号-随机后缀"""
+    return f"{socket.gethostname()}-{os.getpid()}-{uuid.uuid4().hex[:6]}"
+
+
+class ExtractionWorker:
+    """
+    抽取工作进程
+    """
+
+    def __init__(self, worker_id: str = None, concurrency: int = None, queue: JobQueue = None,
+                 handler: Callable[..., Dict[str, Any]] = None,
+                 poll_seconds: float = None, heartbeat_seconds: float = None):
+        self.worker_id = worker_id or default_worker_id()
+        self.concurrency = concurrency or Config.WORKER_CONCURRENCY
+        self.queue = queue or JobQueue()
+        self.handler = handler or run_extraction
+        self.poll_seconds = poll_seconds if poll_seconds is not None else Config.WORKER_POLL_SECONDS
+        self.heartbeat_seconds = heartbeat_seconds or Config.WORKER_HEARTBEAT_SECONDS
+
+        self._stop = threading.Event()
+        self._heartbeat_stop = threading.Event()
+        self._lock = threading.Lock()
+        self._in_flight: Dict[int, Dict[str, Any]] = {}
+        # 执行中作业的取消令牌，租约被收回时取消
+        self._cancel_tokens: Dict[int, CancellationToken] = {}
+
+    def stop(self):
+        """请求停止：不再租用新作业，等待执行中的作业完成"""
+        self._stop.set()
+
+    def _execute(self, job: Dict[str, Any]):
+        """执行单个作业"""
+        job_id = job['id']
+        cancel_token = CancellationToken()
+        with self._lock:
+            self._cancel_tokens[job_id] = cancel_token
+        try:
+            result = self.handler(
+                job['datasource_id'],
+                task_type=job['task_type'],
+                etl_task_id=job['etl_task_id'],
+                on_history_created=lambda history_id: self.queue.attach_history(job_id, self.worker_id, history_id),
+                cancel_token=cancel_token
+            )
+            status = result.get('status', 'failed')
+            if status == 'failed':
+                self.queue.fail(job_id, self.worker_id, result.get('message') or '抽取失败')
+            elif not self.queue.complete(job_id, self.worker_id, status, result.get('message')):
+                logging.warning(f"作业 {job_id} 的租约已被收回，丢弃执行结果")
+        except DataSourceNotFoundException as e:
+            # 数据源已删除，重试没有意义
+            self.queue.complete(job_id, self.worker_id, 'failed', str(e))
+        except ExtractionInProgressException as e:
+            # 数据源只是正被其他运行抽取，不算失败
+            logging.info(f"作业 {job_id} 的数据源正在抽取中（抽取记录: {e.holder.get('history_id')}），延后执行")
+            self.queue.defer(job_id, self.worker_id, str(e))
+        except Exception as e:
+            logging.error(f"工作进程 {self.worker_id} 执行作业 {job_id} 失败: {str(e)}")
+            self.queue.fail(job_id, self.worker_id, str(e))
+        finally:
+            with self._lock:
+                self._in_flight.pop(job_id, None)
+                self._cancel_tokens.pop(job_id, None)
+
+    def _heartbeat_loop(self):
+        """后台心跳线程：为执行中的作业续约，并回收其他工作进程遗留的过期作业"""
+        while not self._heartbeat_stop.wait(self.heartbeat_seconds):
+            try:
+                with self._lock:
+                    job_ids = list(self._in_flight.keys())
+                held = set(self.queue.heartbeat(job_ids, self.worker_id))
+                for job_id in set(job_ids) - held:
+                    logging.warning(f"工作进程 {self.worker_id} 已失去作业 {job_id} 的租约，停止抽取")
+                    with self._lock:
+                        cancel_token = self._cancel_tokens.get(job_id)
+                    if cancel_token:
+                        cancel_token.cancel('作业租约已被收回')
+                self.queue.requeue_expired()
+            except Exception as e:
+                logging.error(f"工作进程 {self.worker_id} 心跳失败: {str(e)}")
+
+    def run(self, once: bool = False) -> int:
+        """
+        运行工作进程主循环
+        :param once: 为True时队列为空即退出（用于cron或测试）
+        :return: 处理的作业数量
+        """
+        logging.info(f"抽取工作进程 {self.worker_id} 启动，并发数: {self.concurrency}")
+        processed = 0
+        heartbeat_thread = threading.Thread(target=self._heartbeat_loop, name=f'heartbeat-{self.worker_id}', daemon=True)
+        heartbeat_thread.start()
+
+        try:
+            self.queue.requeue_expired()
+        except Exception as e:
+            logging.error(f"回收过期作业失败: {str(e)}")
+
+        with ThreadPoolExecutor(max_workers=self.concurrency, thread_name_prefix=f'worker-{self.worker_id}') as pool:
+            while not self._stop.is_set():
+                with self._lock:
+                    has_slot = len(self._in_flight) < self.concurrency
+                job = None
+                if has_slot:
+                    try:
+                        job = self.queue.lease(self.worker_id)
+                    except Exception as e:
+                        logging.error(f"工作进程 {self.worker_id} 租用作业失败: {str(e)}")
+
+                if job:
+                    with self._lock:
+                        self._in_flight[job['id']] = job
+                    processed += 1
+                    pool.submit(self._execute, job)
+                    continue
+
+                with self._lock:
+                    idle = not self._in_flight
+                if once and idle:
+                    break
+                self._stop.wait(self.poll_seconds if idle else min(self.poll_seconds, 1))
+
+        # 线程池退出时执行中的作业均已结束，停止心跳
+        self._stop.set()
+        self._heartbeat_stop.set()
+        logging.info(f"抽取工作进程 {self.worker_id} 退出，共处理 {processed} 个作业")
+        return processed
+
+
+def main(argv=None):
+    """工作进程命令行入口"""
+    parser = argparse.ArgumentParser(description='Super MetaData 分布式抽取工作进程')
+    parser.add_argument('--worker-id', help='工作进程ID，默认使用 主机名-进程号')
+    parser.add_argument('--concurrency', type=int, default=Config.WORKER_CONCURRENCY, help='同时执行的作业数')
+    parser.add_argument('--database-url', default=Config.DATABASE_URL, help='元数据库连接URL')
+    parser.add_argument('--once', action='store_true', help='队列为空时退出')
+    args = parser.parse_args(argv)
+
+    logging.basicConfig(level=Config.LOG_LEVEL, format='%(asctime)s - %(levelname)s - %(message)s')
+
+    from db_manager import init_db_manager
+    from models import init_database
+    init_db_manager(args.database_url)
+    init_database()
+
+    worker = ExtractionWorker(worker_id=args.worker_id, concurrency=args.concurrency)
+
+    def handle_signal(signum, frame):
+        logging.info(f"收到信号 {signum}，等待执行中的作业完成后退出")
+        worker.stop()
+
+    signal.signal(signal.SIGTERM, handle_signal)
+    signal.signal(signal.SIGINT, handle_signal)
+
+    worker.run(once=args.once)
+    return 0
+
+
+if __name__ == '__main__':
+    raise SystemExit(main())
@@ -1,14 +1,52 @@
 import abc
-from typing import List, Dict, Any
+from contextlib import nullcontext
+from typing import List, Dict, Any, Callable, Iterable, Optional, Tuple
 from sqlalchemy import create_engine, text
+from sqlalchemy.exc import DBAPIError, DisconnectionError, OperationalError
+from config import Config
 from models import DataSource, TableMetadata, ColumnMetadata, ExtractionHistory
 from db_config import get_connection_string
-from exceptions import DatabaseConnectionException, ExtractionException
+from database_connections import SUPPORTED_DATABASES, SQLITE_DATABASE_CONFIG
+from exceptions import DatabaseConnectionException, ExtractionException, ExtractionCancelledException
+from extraction_timeout import apply_statement_timeout, is_statement_timeout, CancellationToken
+from source_throttle import get_throttle
 import logging
 from etl_logger import ETLLogger
 import time
 
 
+def is_transient_error(error: Exception) -> bool:
+    """
+    判断是否为可重试的瞬时错误（连接断开、网络超时、死锁等）
+    :param error: 异常
+    :return: 是否可重试
+    """
+    # 语句超时是查询本身过慢，重试只会再次超时
+    if is_statement_timeout(error):
+        return False
+    if isinstance(error, (DisconnectionError, OperationalError, TimeoutError, ConnectionError)):
+        return True
+    if isinstance(error, DBAPIError) and error.connection_invalidated:
+        return True
+    return False
+
+
+def retry_delay(attempt: int) -> float:
+    """第attempt次重试前的退避时间（指数退避）"""
+    return Config.EXTRACTION_RETRY_BACKOFF_SECONDS * (2 ** (attempt - 1))
+
+
+def sample_percent(limit: int, estimated_rows: int) -> Optional[float]:
+    """
+    抽样 limit 行所需的抽样百分比（留一倍余量，块抽样的行数波动较大）
+    :param estimated_rows: 表的估算行数
+    :return: 百分比，表较小或行数未知时返回None（直接有界扫描）
+    """
+    if not estimated_rows or estimated_rows <= limit * 2:
+        return None
+    return max(round(limit * 200.0 / estimated_rows, 6), 0.000001)
+
+
 class MetadataExtractorBase(abc.ABC):
     """
     元数据抽取器基类
@@ -19,6 +57,39 @@ class MetadataExtractorBase(abc.ABC):
         self.datasource = datasource
         self.connection = None
         self.engine = None
+        self.throttle = get_throttle(datasource)
+        # 查询剖析器（QueryProfiler），由抽取服务在运行前设置
+        self.profiler = None
+
+    def default_schema(self) -> str:
+        """抽取的表所在的模式，与 get_table_metadata 返回的 schema_name 一致"""
+        return self.datasource.database
+
+    def table_key(self, table_name: str) -> Tuple[str, str]:
+        """表在检查点中的键 (schema_name, table_name)，从检查点恢复时据此跳过已完成的表"""
+        return (self.default_schema(), table_name)
+
+    def _phase(self, name: str):
+        """标记抽取阶段，未设置剖析器时不做任何事"""
+        return self.profiler.phase(name) if self.profiler else nullcontext()
+
+    def _table_scope(self, table_name: str):
+        """标记当前抽取的表，期间的语句计入该表，未设置剖析器时不做任何事"""
+        return self.profiler.table(table_name) if self.profiler else nullcontext()
+
+    def _record_table(self, table_name: str, seconds: float, table_data: Dict[str, Any] = None,
+                      error: Exception = None):
+        """将单个表的抽取结果记录到剖析器，运行结束后写入 table_extraction_stats"""
+        if not self.profiler:
+            return
+        if error is not None:
+            self.profiler.record_table(table_name, seconds,
+                                       status='timeout' if is_statement_timeout(error) else 'failed',
+                                       error=str(error))
+        else:
+            self.profiler.record_table(table_name, seconds,
+                                       row_count=table_data['table_info'].get('row_count'),
+                                       size_bytes=table_data['table_info'].get('size_bytes'))
         
     def connect(self):
         """连接到数据源"""
@@ -33,6 +104,10 @@ class MetadataExtractorBase(abc.ABC):
             )
             
             self.engine = create_engine(connection_string)
+            apply_statement_timeout(self.engine, self.datasource.type)
+            self.throttle.instrument(self.engine)
+            if self.profiler:
+                self.profiler.instrument(self.engine)
             self.connection = self.engine.connect()
             
             ETLLogger.log_connection_success(
@@ -111,6 +186,14 @@ class MetadataExtractorBase(abc.ABC):
         """
         pass
 
+    def get_estimated_row_count(self, table_name: str) -> int:
+        """
+        获取表的估算行数（来自数据库统计信息，不扫描表），用于静默时段的轻量统计
+        :param table_name: 表名
+        :return: 估算行数，不支持时返回0
+        """
+        return 0
+
     def get_table_update_time(self, table_name: str) -> str:
         """
         获取表的更新时间（用于增量抽取）
@@ -119,6 +202,106 @@ class MetadataExtractorBase(abc.ABC):
         """
         return None
 
+    def _quote(self, name: str) -> str:
+        """按源库方言转义标识符"""
+        return self.connection.dialect.identifier_preparer.quote(name)
+
+    def _sample_source(self, table_name: str) -> str:
+        """抽样查询中的表引用"""
+        return self._quote(table_name)
+
+    def get_sample_rows(self, table_name: str, column_names: List[str], limit: int,
+                        estimated_rows: int = 0) -> tuple:
+        """
+        抽样读取表的部分字段（用于字段画像），默认为有界的 LIMIT 扫描，支持引擎原生抽样的子类覆盖
+        :param column_names: 字段名列表
+        :param limit: 最多读取的行数
+        :param estimated_rows: 表的估算行数，用于计算抽样比例
+        :return: (抽样方式, 行列表)
+        """
+        columns = ', '.join(self._quote(name) for name in column_names)
+        query = text(f"SELECT {columns} FROM {self._sample_source(table_name)} LIMIT {int(limit)}")
+        return 'limit', self.connection.execute(query).fetchall()
+
+    def is_table_changed(self, table_name: str, last_sync_time: str) -> bool:
+        """
+        增量抽取时判断表是否在上次同步后变更
+        :param table_name: 表名
+        :param last_sync_time: 上次同步时间
+        :return: 是否需要重新抽取
+        """
+        with self._phase('change_check'):
+            update_time = self.get_table_update_time(table_name)
+        return bool(update_time) and str(update_time) > str(last_sync_time)
+
+    def extract_table(self, table_name: str, include_stats: bool = True) -> Dict[str, Any]:
+        """
+        抽取单个表的元数据（表信息、列信息及可选的统计信息）
+        :param table_name: 表名
+        :param include_stats: 是否包含统计信息（行数、大小）
+        :return: {"table_info": ..., "columns": [...]}
+        """
+        with self._phase('table_metadata'):
+            table_meta = self.get_table_metadata(table_name)
+        with self._phase('columns'):
+            column_meta = self.get_column_metadata(table_name)
+
+        # 根据参数决定是否添加统计信息，静默时段只使用估算行数，不执行 COUNT(*)
+        if include_stats:
+            with self._phase('row_count'):
+                if self.throttle.lightweight_only():
+                    table_meta['row_count'] = self.get_estimated_row_count(table_name)
+                else:
+                    table_meta['row_count'] = self.get_row_count(table_name)
+            with self._phase('table_size'):
+                table_meta['size_bytes'] = self.get_table_size(table_name)
+        else:
+            table_meta['row_count'] = 0
+            table_meta['size_bytes'] = 0
+
+        return {
+            "table_info": table_meta,
+            "columns": column_meta
+        }
+
+    def reconnect(self):
+        """重建源库连接，用于连接断开后的重试"""
+        self.disconnect()
+        self.connection = None
+        self.engine = None
+        self.connect()
+
+    def extract_table_with_retry(self, table_name: str, include_stats: bool = True,
+                                 last_sync_time: str = None,
+                                 cancel_token: Optional[CancellationToken] = None) -> Optional[Dict[str, Any]]:
+        """
+        抽取单个表，瞬时错误按指数退避重试，连接失效时先重连
+        :param last_sync_time: 增量抽取的上次同步时间，表未变更时返回None
+        :param cancel_token: 取消令牌，退避等待期间取消或到达截止时间时不再重试
+        :return: 表数据，或None（表未变更）
+        :raises ExtractionCancelledException: 退避等待期间被取消
+        """
+        attempt = 0
+        while True:
+            try:
+                if last_sync_time and not self.is_table_changed(table_name, last_sync_time):
+                    return None
+                return self.extract_table(table_name, include_stats)
+            except Exception as e:
+                attempt += 1
+                if attempt > Config.EXTRACTION_TABLE_RETRIES or not is_transient_error(e):
+                    raise
+                delay = retry_delay(attempt)
+                logging.warning(f"抽取表 {table_name} 遇到瞬时错误，{delay:.1f}秒后第 {attempt} 次重试: {str(e)}")
+                if cancel_token is None:
+                    time.sleep(delay)
+                elif cancel_token.wait(delay):
+                    raise ExtractionCancelledException(cancel_token.reason)
+                try:
+                    self.reconnect()
+                except Exception as reconnect_error:
+                    logging.warning(f"重连数据源失败: {str(reconnect_error)}")
+
     def extract_all_metadata(self) -> Dict[str, Any]:
         """
         抽取所有表的元数据（全量抽取）
@@ -141,17 +324,32 @@ class MetadataExtractorBase(abc.ABC):
         """
         return self.extract_metadata(full=True, include_stats=False)
 
-    def extract_metadata(self, full: bool = True, include_stats: bool = True, last_sync_time: str = None) -> Dict[str, Any]:
+    def extract_metadata(self, full: bool = True, include_stats: bool = True, last_sync_time: str = None,
+                         skip_tables: Optional[Iterable[Tuple[str, str]]] = None,
+                         on_batch: Optional[Callable[[List[Dict[str, Any]]], None]] = None,
+                         batch_size: int = None,
+                         cancel_token: Optional[CancellationToken] = None) -> Dict[str, Any]:
         """
         通用的元数据抽取方法
         :param full: 是否全量抽取
         :param include_stats: 是否包含统计信息（行数、大小）
         :param last_sync_time: 上次同步时间（用于增量抽取）
+        :param skip_tables: 已完成的表 (schema_name, table_name)（从检查点恢复时跳过）
+        :param on_batch: 检查点回调，每抽取 batch_size 个表调用一次；
+                         指定后表数据全部通过回调交付，返回结果中的 tables 为空
+        :param batch_size: 每批表数量，默认 Config.EXTRACTION_BATCH_SIZE
+        :param cancel_token: 取消令牌，取消或超过截止时间后不再抽取后续的表，
+                             已抽取的部分照常返回，状态为 partial_success
         :return: 包含元数据的字典
         """
         start_time = time.time()
         success_tables = 0
         failed_tables = 0
+        skip_tables = set(skip_tables or [])
+        batch_size = batch_size or Config.EXTRACTION_BATCH_SIZE
+        delivered_tables = 0
+        skipped_tables = []
+        timed_out_tables = []
         
         ETLLogger.log_extraction_start(
             self.datasource.id,
@@ -160,7 +358,9 @@ class MetadataExtractorBase(abc.ABC):
         )
         
         try:
-            if not self.connect():
+            with self._phase('connect'):
+                connected = self.connect()
+            if not connected:
                 ETLLogger.log_extraction_failed(
                     self.datasource.id,
                     "无法连接到数据库"
@@ -168,57 +368,76 @@ class MetadataExtractorBase(abc.ABC):
                 return {"status": "failed", "message": "无法连接到数据库"}
 
             tables_data = []
-            table_names = self.get_table_list()
+            with self._phase('table_list'):
+                table_names = self.get_table_list()
             
             ETLLogger.get_logger().info(f"发现 {len(table_names)} 个表")
 
+            if skip_tables:
+                ETLLogger.get_logger().info(f"从检查点恢复，跳过已完成的 {len(skip_tables)} 个表")
+
             for table_name in table_names:
+                if self.table_key(table_name) in skip_tables:
+                    continue
+                if cancel_token and cancel_token.is_cancelled():
+                    skipped_tables.append(table_name)
+                    continue
                 table_start_time = time.time()
                 
                 try:
-                    # 增量抽取：检查表是否变更
-                    if not full and last_sync_time:
-                        update_time = self.get_table_update_time(table_name)
-                        if not update_time or str(update_time) <= str(last_sync_time):
-                            continue  # 跳过未变更的表
-
-                    table_meta = self.get_table_metadata(table_name)
-                    column_meta = self.get_column_metadata(table_name)
-
-                    # 根据参数决定是否添加统计信息
-                    if include_stats:
-                        table_meta['row_count'] = self.get_row_count(table_name)
-                        table_meta['size_bytes'] = self.get_table_size(table_name)
-                    else:
-                        table_meta['row_count'] = 0
-                        table_meta['size_bytes'] = 0
-
-                    table_data = {
-                        "table_info": table_meta,
-                        "columns": column_meta
-                    }
+                    # 增量抽取：跳过未变更的表
+                    with self._table_scope(table_name):
+                        table_data = self.extract_table_with_retry(
+                            table_name, include_stats, last_sync_time if not full else None, cancel_token
+                        )
+                    if table_data is None:
+                        continue
                     tables_data.append(table_data)
                     
                     table_duration = time.time() - table_start_time
+                    self._record_table(table_name, table_duration, table_data)
                     ETLLogger.log_table_extracted(
                         table_name,
-                        table_meta['row_count'],
-                        table_meta['size_bytes'],
-                        table_duration
+                        table_data['table_info']['row_count'],
+                        table_data['table_info']['size_bytes'],
+                        table_duration,
+                        column_count=len(table_data['columns'])
                     )
-                    ETLLogger.log_column_extracted(table_name, len(column_meta))
                     
                     success_tables += 1
                     
+                except ExtractionCancelledException:
+                    # 重试等待期间被取消，与尚未开始的表一样记为跳过
+                    skipped_tables.append(table_name)
+                    continue
                 except Exception as e:
                     failed_tables += 1
+                    if is_statement_timeout(e):
+                        timed_out_tables.append(table_name)
+                    self._record_table(table_name, time.time() - table_start_time, error=e)
                     ETLLogger.log_table_failed(table_name, str(e))
                     logging.warning(f"抽取表 {table_name} 失败: {str(e)}")
                     continue
 
-            # 获取表关联关系（只有全量抽取才获取）
-            if full:
-                relationships = self.get_table_relationships()
+                # 达到批次大小时写入检查点，写入失败视为整次抽取失败
+                if on_batch and len(tables_data) >= batch_size:
+                    with self._phase('checkpoint'):
+                        on_batch(tables_data)
+                    delivered_tables += len(tables_data)
+                    tables_data = []
+
+            if on_batch and tables_data:
+                with self._phase('checkpoint'):
+                    on_batch(tables_data)
+                delivered_tables += len(tables_data)
+                tables_data = []
+
+            cancelled = cancel_token is not None and cancel_token.is_cancelled()
+
+            # 获取表关联关系（只有全量抽取才获取，取消后不再获取）
+            if full and not cancelled:
+                with self._phase('relationships'):
+                    relationships = self.get_table_relationships()
                 for rel in relationships:
                     ETLLogger.log_relationship_extracted(
                         rel.get('constraint_name', ''),
@@ -231,24 +450,32 @@ class MetadataExtractorBase(abc.ABC):
             total_duration = time.time() - start_time
             
             result = {
-                "status": "success",
+                "status": "partial_success" if cancelled else "success",
                 "datasource_id": self.datasource.id,
-                "tables_count": len(tables_data),
+                "tables_count": len(tables_data) + delivered_tables,
+                "failed_tables": failed_tables,
+                "skipped_tables": skipped_tables,
+                "timed_out_tables": timed_out_tables,
                 "tables": tables_data,
                 "relationships": relationships,
                 "extraction_type": "full" if full else "incremental"
             }
+            if cancelled:
+                result["message"] = f"{cancel_token.reason}，已抽取 {result['tables_count']} 个表，跳过 {len(skipped_tables)} 个表"
+                if full:
+                    result["message"] += "，未获取关联关系"
+                ETLLogger.get_logger().warning(result["message"])
             
             ETLLogger.log_extraction_success(
                 self.datasource.id,
-                len(tables_data),
+                result["tables_count"],
                 len(relationships),
                 total_duration
             )
             
             if failed_tables > 0:
                 ETLLogger.log_summary(
-                    len(tables_data) + failed_tables,
+                    result["tables_count"] + failed_tables,
                     success_tables,
                     failed_tables
                 )
@@ -262,7 +489,7 @@ class MetadataExtractorBase(abc.ABC):
                 str(e)
             )
             logging.error(f"抽取元数据失败: {str(e)}")
-            return {"status": "failed", "message": str(e)}
+            return {"status": "failed", "message": str(e), "tables_count": delivered_tables}
         finally:
             self.disconnect()
 
@@ -347,6 +574,24 @@ class MySQLMetadataExtractor(MetadataExtractorBase):
             logging.warning(f"获取表 {table_name} 行数失败: {str(e)}, 返回0")
             return 0
     
+    def get_estimated_row_count(self, table_name: str) -> int:
+        """从 INFORMATION_SCHEMA 读取估算行数，不扫描表"""
+        query = text("""
+            SELECT TABLE_ROWS
+            FROM INFORMATION_SCHEMA.TABLES
+            WHERE TABLE_SCHEMA = :database_name
+            AND TABLE_NAME = :table_name
+        """)
+        try:
+            result = self.connection.execute(query, {
+                "database_name": self.datasource.database,
+                "table_name": table_name
+            }).fetchone()
+            return int(result[0]) if result and result[0] else 0
+        except Exception as e:
+            logging.warning(f"获取表 {table_name} 估算行数失败: {str(e)}, 返回0")
+            return 0
+    
     def get_table_size(self, table_name: str) -> int:
         query = text("""
             SELECT 
@@ -396,6 +641,9 @@ class MySQLMetadataExtractor(MetadataExtractorBase):
 
         return relationships
 
+    def _sample_source(self, table_name: str) -> str:
+        return f"{self._quote(self.datasource.database)}.{self._quote(table_name)}"
+
     def get_table_update_time(self, table_name: str) -> str:
         """获取表的更新时间"""
         query = text("""
@@ -418,6 +666,9 @@ class PostgreSQLMetadataExtractor(MetadataExtractorBase):
     """
     PostgreSQL元数据抽取器
     """
+
+    def default_schema(self) -> str:
+        return 'public'
     
     def get_table_list(self) -> List[str]:
         query = text("""
@@ -486,6 +737,21 @@ class PostgreSQLMetadataExtractor(MetadataExtractorBase):
             logging.warning(f"获取表 {table_name} 行数失败: {str(e)}, 返回0")
             return 0
     
+    def get_estimated_row_count(self, table_name: str) -> int:
+        """从 pg_class.reltuples 读取估算行数，不扫描表"""
+        query = text("""
+            SELECT c.reltuples::bigint
+            FROM pg_class c
+            JOIN pg_namespace n ON n.oid = c.relnamespace
+            WHERE n.nspname = 'public' AND c.relname = :table_name
+        """)
+        try:
+            result = self.connection.execute(query, {"table_name": table_name}).fetchone()
+            return max(int(result[0]), 0) if result and result[0] is not None else 0
+        except Exception as e:
+            logging.warning(f"获取表 {table_name} 估算行数失败: {str(e)}, 返回0")
+            return 0
+    
     def get_table_size(self, table_name: str) -> int:
         query = text(f"SELECT pg_total_relation_size('{table_name}') AS size_bytes")
         
@@ -531,6 +797,20 @@ class PostgreSQLMetadataExtractor(MetadataExtractorBase):
 
         return relationships
 
+    def _sample_source(self, table_name: str) -> str:
+        return f"public.{self._quote(table_name)}"
+
+    def get_sample_rows(self, table_name: str, column_names: List[str], limit: int,
+                        estimated_rows: int = 0) -> tuple:
+        """大表使用 TABLESAMPLE SYSTEM 按数据块抽样，只读取抽中的页"""
+        percent = sample_percent(limit, estimated_rows)
+        if percent is None:
+            return super().get_sample_rows(table_name, column_names, limit, estimated_rows)
+        columns = ', '.join(self._quote(name) for name in column_names)
+        query = text(f"SELECT {columns} FROM {self._sample_source(table_name)} "
+                     f"TABLESAMPLE SYSTEM ({percent}) LIMIT {int(limit)}")
+        return 'tablesample', self.connection.execute(query).fetchall()
+
     def get_table_update_time(self, table_name: str) -> str:
         """获取表的更新时间"""
         query = text("""
@@ -552,6 +832,9 @@ class SQLServerMetadataExtractor(MetadataExtractorBase):
     """
     SQL Server元数据抽取器
     """
+
+    def default_schema(self) -> str:
+        return 'dbo'
     
     def get_table_list(self) -> List[str]:
         query = text("""
@@ -655,6 +938,22 @@ class SQLServerMetadataExtractor(MetadataExtractorBase):
             logging.warning(f"获取表 {table_name} 行数失败: {str(e)}, 返回0")
             return 0
     
+    def get_estimated_row_count(self, table_name: str) -> int:
+        """从 sys.partitions 读取行数，不扫描表"""
+        query = text("""
+            SELECT SUM(p.rows)
+            FROM sys.tables t
+            INNER JOIN sys.partitions p ON t.object_id = p.object_id
+            WHERE t.name = :table_name
+            AND p.index_id IN (0, 1)
+        """)
+        try:
+            result = self.connection.execute(query, {"table_name": table_name}).fetchone()
+            return int(result[0]) if result and result[0] else 0
+        except Exception as e:
+            logging.warning(f"获取表 {table_name} 估算行数失败: {str(e)}, 返回0")
+            return 0
+    
     def get_table_size(self, table_name: str) -> int:
         query = text(f"""
             SELECT SUM(a.total_pages) * 8 * 1024 AS size_bytes
@@ -706,6 +1005,18 @@ class SQLServerMetadataExtractor(MetadataExtractorBase):
 
         return relationships
 
+    def _sample_source(self, table_name: str) -> str:
+        return f"dbo.{self._quote(table_name)}"
+
+    def get_sample_rows(self, table_name: str, column_names: List[str], limit: int,
+                        estimated_rows: int = 0) -> tuple:
+        """SQL Server 不支持 LIMIT，使用 TOP；大表使用 TABLESAMPLE 按数据页抽样"""
+        percent = sample_percent(limit, estimated_rows)
+        columns = ', '.join(self._quote(name) for name in column_names)
+        sample = f" TABLESAMPLE ({percent} PERCENT)" if percent is not None else ""
+        query = text(f"SELECT TOP ({int(limit)}) {columns} FROM {self._sample_source(table_name)}{sample}")
+        return 'tablesample' if sample else 'limit', self.connection.execute(query).fetchall()
+
     def get_table_update_time(self, table_name: str) -> str:
         """获取表的更新时间"""
         # 注意：SQL Server 的 STATS_DATE 返回的是统计信息更新时间，而不是数据修改时间
@@ -725,6 +1036,9 @@ class OracleMetadataExtractor(MetadataExtractorBase):
     """
     Oracle元数据抽取器
     """
+
+    def default_schema(self) -> str:
+        return self.datasource.username.upper()
     
     def get_table_list(self) -> List[str]:
         query = text("""
@@ -819,6 +1133,20 @@ class OracleMetadataExtractor(MetadataExtractorBase):
             logging.warning(f"获取表 {table_name} 行数失败: {str(e)}, 返回0")
             return 0
     
+    def get_estimated_row_count(self, table_name: str) -> int:
+        """从统计信息 USER_TABLES.NUM_ROWS 读取估算行数，不扫描表"""
+        query = text("""
+            SELECT num_rows
+            FROM user_tables
+            WHERE table_name = UPPER(:table_name)
+        """)
+        try:
+            result = self.connection.execute(query, {"table_name": table_name}).fetchone()
+            return int(result[0]) if result and result[0] else 0
+        except Exception as e:
+            logging.warning(f"获取表 {table_name} 估算行数失败: {str(e)}, 返回0")
+            return 0
+    
     def get_table_size(self, table_name: str) -> int:
         query = text("""
             SELECT bytes
@@ -870,6 +1198,19 @@ class OracleMetadataExtractor(MetadataExtractorBase):
 
         return relationships
 
+    def _sample_source(self, table_name: str) -> str:
+        return f"{self._quote(self.datasource.username.upper())}.{self._quote(table_name.upper())}"
+
+    def get_sample_rows(self, table_name: str, column_names: List[str], limit: int,
+                        estimated_rows: int = 0) -> tuple:
+        """Oracle 使用 ROWNUM 限制行数；大表使用 SAMPLE 子句按行抽样"""
+        percent = sample_percent(limit, estimated_rows)
+        # 元数据中的字段名已转为小写，方言会将小写名称视为不区分大小写而不加引号
+        columns = ', '.join(self._quote(name) for name in column_names)
+        sample = f" SAMPLE ({min(percent, 99.999999)})" if percent is not None else ""
+        query = text(f"SELECT {columns} FROM {self._sample_source(table_name)}{sample} WHERE ROWNUM <= {int(limit)}")
+        return 'sample' if sample else 'limit', self.connection.execute(query).fetchall()
+
     def get_table_update_time(self, table_name: str) -> str:
         """获取表的更新时间"""
         query = text("""
@@ -1134,6 +1475,24 @@ class StarRocksMetadataExtractor(MetadataExtractorBase):
             logging.warning(f"获取表 {table_name} 行数失败: {str(e)}, 返回0")
             return 0
     
+    def get_estimated_row_count(self, table_name: str) -> int:
+        """从 INFORMATION_SCHEMA 读取估算行数，不扫描表"""
+        query = text("""
+            SELECT TABLE_ROWS
+            FROM INFORMATION_SCHEMA.TABLES
+            WHERE TABLE_SCHEMA = :database_name
+            AND TABLE_NAME = :table_name
+        """)
+        try:
+            result = self.connection.execute(query, {
+                "database_name": self.datasource.database,
+                "table_name": table_name
+            }).fetchone()
+            return int(result[0]) if result and result[0] else 0
+        except Exception as e:
+            logging.warning(f"获取表 {table_name} 估算行数失败: {str(e)}, 返回0")
+            return 0
+    
     def get_table_size(self, table_name: str) -> int:
         """获取表的数据大小（字节）"""
         try:
@@ -1233,6 +1592,104 @@ class StarRocksMetadataExtractor(MetadataExtractorBase):
             return None
 
 
+class SQLiteMetadataExtractor(MetadataExtractorBase):
+    """
+    SQLite元数据抽取器
+    数据源的 database 为数据库文件路径；SQLite 没有表和字段注释，
+    表大小依赖 dbstat 虚拟表（编译时未启用时为0）
+    """
+
+    def default_schema(self) -> str:
+        return 'main'
+
+    def get_table_list(self) -> List[str]:
+        query = text("""
+            SELECT name
+            FROM sqlite_master
+            WHERE type = 'table'
+            AND name NOT LIKE 'sqlite_%'
+            ORDER BY name
+        """)
+        return [row[0] for row in self.connection.execute(query).fetchall()]
+
+    def get_table_metadata(self, table_name: str) -> Dict[str, Any]:
+        return {
+            "table_name": table_name,
+            "schema_name": "main",
+            "comment": ""
+        }
+
+    def get_column_metadata(self, table_name: str) -> List[Dict[str, Any]]:
+        query = text("""
+            SELECT cid, name, type, "notnull", dflt_value, pk
+            FROM pragma_table_info(:table_name)
+            ORDER BY cid
+        """)
+        columns = []
+        for row in self.connection.execute(query, {"table_name": table_name}):
+            columns.append({
+                "column_name": row.name,
+                "data_type": (row.type or '').lower(),
+                "is_nullable": 'NO' if row.notnull or row.pk else 'YES',
+                "default_value": row.dflt_value,
+                "ordinal_position": row.cid + 1,
+                "column_comment": ""
+            })
+        return columns
+
+    def get_row_count(self, table_name: str) -> int:
+        query = text(f"SELECT COUNT(*) FROM {self._quote(table_name)}")
+        try:
+            result = self.connection.execute(query).fetchone()
+            return result[0] if result else 0
+        except Exception as e:
+            logging.warning(f"获取表 {table_name} 行数失败: {str(e)}, 返回0")
+            return 0
+
+    def get_estimated_row_count(self, table_name: str) -> int:
+        """从 ANALYZE 生成的 sqlite_stat1 读取估算行数，未执行过 ANALYZE 时返回0"""
+        query = text("SELECT stat FROM sqlite_stat1 WHERE tbl = :table_name LIMIT 1")
+        try:
+            result = self.connection.execute(query, {"table_name": table_name}).fetchone()
+            return int(result[0].split()[0]) if result and result[0] else 0
+        except Exception:
+            return 0
+
+    def get_table_size(self, table_name: str) -> int:
+        query = text("SELECT SUM(pgsize) FROM dbstat WHERE name = :table_name")
+        try:
+            result = self.connection.execute(query, {"table_name": table_name}).fetchone()
+            return int(result[0]) if result and result[0] else 0
+        except Exception:
+            return 0
+
+    def get_table_relationships(self) -> List[Dict[str, Any]]:
+        # pragma 表值函数一次读取所有表的外键，避免逐表查询；
+        # 外键未写被引用字段时引用的是被引用表的主键
+        query = text("""
+            SELECT m.name AS table_name, f.id, f."table" AS referenced_table_name,
+                   f."from" AS column_name, COALESCE(f."to", p.name) AS referenced_column_name
+            FROM sqlite_master m
+            JOIN pragma_foreign_key_list(m.name) f
+            LEFT JOIN pragma_table_info(f."table") p ON f."to" IS NULL AND p.pk = f.seq + 1
+            WHERE m.type = 'table'
+            ORDER BY m.name, f.id, f.seq
+        """)
+
+        relationships = []
+        for row in self.connection.execute(query):
+            relationships.append({
+                "constraint_name": f"fk_{row.table_name}_{row.id}",
+                "table_name": row.table_name,
+                "column_name": row.column_name,
+                "referenced_table_name": row.referenced_table_name,
+                "referenced_column_name": row.referenced_column_name,
+                "constraint_type": "FOREIGN KEY"
+            })
+
+        return relationships
+
+
 def init_database():
     """初始化数据库表"""
     from db_manager import db_manager
@@ -1240,3 +1697,35 @@ def init_database():
         raise Exception("数据库管理器未初始化")
     Base.metadata.create_all(bind=db_manager.engine)
     return db_manager.engine
+
+
+# 数据库类型到抽取器的映射（API、编排器、命令行共用）
+EXTRACTOR_MAP = {
+    'mysql': MySQLMetadataExtractor,
+    'postgresql': PostgreSQLMetadataExtractor,
+    'sqlserver': SQLServerMetadataExtractor,
+    'oracle': OracleMetadataExtractor,
+    'starrocks': StarRocksMetadataExtractor
+}
+
+
+def enable_sqlite_sources():
+    """
+    注册 SQLite 数据源类型（基准测试和本地测试使用）
+    SQLite 数据源可以读取服务器上的任意文件，默认不注册，只在 ALLOW_SQLITE_SOURCES 开启或由基准测试显式调用时注册
+    """
+    SUPPORTED_DATABASES.setdefault('sqlite', SQLITE_DATABASE_CONFIG)
+    EXTRACTOR_MAP['sqlite'] = SQLiteMetadataExtractor
+
+
+if Config.ALLOW_SQLITE_SOURCES:
+    enable_sqlite_sources()
+
+
+def get_extractor_class(db_type: str):
+    """
+    根据数据库类型获取抽取器类
+    :param db_type: 数据库类型
+    :return: 抽取器类，不支持时返回None
+    """
+    return EXTRACTOR_MAP.get(db_type)
@@ -0,0 +1,301 @@
+"""
+抽取历史保留
+
+extraction_history 按数据源的保留期清理（DataSource.history_retention_days，为空时使用 HISTORY_RETENTION_DAYS，
+0 表示永久保留），每个数据源运行中的记录和最近一次成功的记录始终保留：
+1. 汇总：过期记录按 (数据源, 日期, 任务类型, 状态) 累加到 extraction_history_daily，概览和长期统计不受清理影响
+2. 归档：过期记录连同其剖析结果和表抽取统计写入 gzip 压缩的 JSONL 文件（HISTORY_ARCHIVE_DIR），
+   每批在删除事务提交后才写入，回滚的批次不会出现在归档中
+3. 删除：按主键分批删除，每批一个短事务，同时删除检查点、剖析和表抽取统计，
+   结构版本、作业和恢复运行对被删记录的引用置空
+
+extraction_history 被多张表通过外键引用，MySQL 的分区表不支持外键，因此不使用按时间分区 + 删除分区的方式，
+而是依靠 (datasource_id, extraction_time) 索引分批删除，避免长事务和大范围锁
+
+用法:
+    python history_retention.py --dry-run
+    python history_retention.py --datasource-id 3 --batch-size 200
+"""
+import argparse
+import gzip
+import json
+import logging
+from datetime import datetime, timedelta
+from pathlib import Path
+from typing import Dict, Any, List, Optional
+
+from sqlalchemy import func
+
+from config import Config
+from models import (DataSource, ExtractionHistory, ExtractionHistoryDaily, ExtractionCheckpoint, ExtractionProfile,
+                    TableExtractionStat, SchemaVersion, ExtractionJob)
+from db_manager import get_db_session
+from exceptions import DataSourceNotFoundException, ValidationException
+
+
+def _archive_dir() -> Path:
+    if Config.HISTORY_ARCHIVE_DIR:
+        return Path(Config.HISTORY_ARCHIVE_DIR)
+    return Path(__file__).parent / 'archive' / 'extraction_history'
+
+
+def parse_retention_days(value) -> Optional[int]:
+    """
+    校验数据源的保留天数
+    :param value: 非负整数，为空表示使用全局配置
+    """
+    if value is None:
+        return None
+    if isinstance(value, bool) or not isinstance(value, int) or value < 0:
+        raise ValidationException("保留天数必须是非负整数")
+    return value
+
+
+def retention_days(source: DataSource) -> Optional[int]:
+    """数据源的有效保留天数，None 表示永久保留"""
+    days = source.history_retention_days
+    if days is None:
+        days = Config.HISTORY_RETENTION_DAYS
+    return days or None
+
+
+def _row_dict(row) -> Dict[str, Any]:
+    return {column.name: getattr(row, column.name) for column in row.__table__.columns}
+
+
+def rollup_history(session, records: List[ExtractionHistory]) -> int:
+    """
+    将历史记录累加到按天汇总表
+    :return: 涉及的汇总行数
+    """
+    groups: Dict[tuple, Dict[str, int]] = {}
+    for record in records:
+        moment = record.extraction_time or datetime.utcnow()
+        key = (record.datasource_id, moment.replace(hour=0, minute=0, second=0, microsecond=0),
+               record.task_type or '', record.status)
+        group = groups.setdefault(key, {'runs': 0, 'extracted_tables': 0, 'total_duration': 0, 'max_duration': None})
+        group['runs'] += 1
+        group['extracted_tables'] += record.extracted_tables or 0
+        group['total_duration'] += record.duration or 0
+        if record.duration is not None:
+            group['max_duration'] = max(group['max_duration'] or 0, record.duration)
+
+    for (datasource_id, day, task_type, status), group in groups.items():
+        row = session.query(ExtractionHistoryDaily).filter(
+            ExtractionHistoryDaily.datasource_id == datasource_id,
+            ExtractionHistoryDaily.day == day,
+            ExtractionHistoryDaily.task_type == task_type,
+            ExtractionHistoryDaily.status == status
+        ).first()
+        if row is None:
+            session.add(ExtractionHistoryDaily(datasource_id=datasource_id, day=day, task_type=task_type,
+                                               status=status, **group))
+            continue
+        row.runs += group['runs']
+        row.extracted_tables += group['extracted_tables']
+        row.total_duration += group['total_duration']
+        if group['max_duration'] is not None:
+            row.max_duration = max(row.max_duration or 0, group['max_duration'])
+    session.flush()
+    return len(groups)
+
+
+def _archive_lines(session, records: List[ExtractionHistory]) -> List[str]:
+    """生成一批历史记录的归档行，包含剖析结果和表抽取统计"""
+    ids = [record.id for record in records]
+    profiles = {profile.history_id: profile for profile in session.query(ExtractionProfile).filter(
+        ExtractionProfile.history_id.in_(ids)
+    ).all()}
+    stats: Dict[int, List[Dict[str, Any]]] = {}
+    for stat in session.query(TableExtractionStat).filter(TableExtractionStat.history_id.in_(ids)).all():
+        stats.setdefault(stat.history_id, []).append(_row_dict(stat))
+    lines = []
+    for record in records:
+        profile = profiles.get(record.id)
+        lines.append(json.dumps({
+            'history': _row_dict(record),
+            'profile': _row_dict(profile) if profile else None,
+            'table_stats': stats.get(record.id, [])
+        }, ensure_ascii=False, default=str) + '\n')
+    return lines
+
+
+def _purge_batch(session, records: List[ExtractionHistory]) -> int:
+    """汇总并删除一批历史记录"""
+    ids = [record.id for record in records]
+    rollup_history(session, records)
+    session.query(ExtractionCheckpoint).filter(ExtractionCheckpoint.history_id.in_(ids)).delete(
+        synchronize_session=False)
+    session.query(ExtractionProfile).filter(ExtractionProfile.history_id.in_(ids)).delete(
+        synchronize_session=False)
+    session.query(TableExtractionStat).filter(TableExtractionStat.history_id.in_(ids)).delete(
+        synchronize_session=False)
+    session.query(SchemaVersion).filter(SchemaVersion.history_id.in_(ids)).update(
+        {SchemaVersion.history_id: None}, synchronize_session=False)
+    session.query(ExtractionJob).filter(ExtractionJob.history_id.in_(ids)).update(
+        {ExtractionJob.history_id: None}, synchronize_session=False)
+    session.query(ExtractionHistory).filter(ExtractionHistory.resumed_from_id.in_(ids)).update(
+        {ExtractionHistory.resumed_from_id: None}, synchronize_session=False)
+    return session.query(ExtractionHistory).filter(ExtractionHistory.id.in_(ids)).delete(
+        synchronize_session=False)
+
+
+def purge_history(datasource_id: Optional[int] = None, dry_run: bool = False, archive: bool = True,
+                  batch_size: Optional[int] = None, now: Optional[datetime] = None) -> Dict[str, Any]:
+    """
+    清理超过保留期的抽取历史
+    :param datasource_id: 只清理指定数据源，为空时清理全部
+    :param dry_run: 只统计将被清理的记录数
+    :param archive: 是否写入归档文件
+    :param batch_size: 每个事务删除的记录数，默认为 HISTORY_PURGE_BATCH_SIZE
+    :return: {purged, archive, sources: [{datasource_id, retention_days, cutoff, purged}]}
+    """
+    now = now or datetime.utcnow()
+    batch_size = max(1, batch_size or Config.HISTORY_PURGE_BATCH_SIZE)
+    with get_db_session() as session:
+        query = session.query(DataSource)
+        if datasource_id:
+            query = query.filter(DataSource.id == datasource_id)
+        sources = [(source.id, retention_days(source)) for source in query.order_by(DataSource.id).all()]
+    if datasource_id and not sources:
+        raise DataSourceNotFoundException(f"数据源 {datasource_id} 不存在")
+
+    archive_path = None
+    archive_file = None
+    results = []
+    try:
+        for source_id, days in sources:
+            result = {'datasource_id': source_id, 'retention_days': days, 'cutoff': None, 'purged': 0}
+            results.append(result)
+            if days is None:
+                continue
+            cutoff = now - timedelta(days=days)
+            result['cutoff'] = cutoff.isoformat()
+            with get_db_session() as session:
+                keep_id = session.query(func.max(ExtractionHistory.id)).filter(
+                    ExtractionHistory.datasource_id == source_id,
+                    ExtractionHistory.status == 'success'
+                ).scalar()
+            expired = [
+                ExtractionHistory.datasource_id == source_id,
+                ExtractionHistory.extraction_time < cutoff,
+                ExtractionHistory.status != 'running',
+                ExtractionHistory.id != (keep_id or 0)
+            ]
+            if dry_run:
+                with get_db_session() as session:
+                    result['purged'] = session.query(func.count(ExtractionHistory.id)).filter(*expired).scalar()
+                continue
+
+            while True:
+                with get_db_session() as session:
+                    records = session.query(ExtractionHistory).filter(*expired).order_by(
+                        ExtractionHistory.id
+                    ).limit(batch_size).all()
+                    if not records:
+                        break
+                    lines = _archive_lines(session, records) if archive else []
+                    purged = _purge_batch(session, records)
+                # 删除事务已提交，再写入归档，回滚的批次不会被归档
+                result['purged'] += purged
+                if lines:
+                    if archive_file is None:
+                        archive_path = _archive_dir() / f"extraction_history_{now:%Y%m%d%H%M%S}.jsonl.gz"
+                        archive_path.parent.mkdir(parents=True, exist_ok=True)
+                        archive_file = gzip.open(archive_path, 'at', encoding='utf-8')
+                    archive_file.writelines(lines)
+                    archive_file.flush()
+                if len(records) < batch_size:
+                    break
+            if result['purged']:
+                logging.info(f"数据源 {source_id} 清理了 {result['purged']} 条 {cutoff:%Y-%m-%d} 之前的抽取历史")
+    finally:
+        if archive_file is not None:
+            archive_file.close()
+
+    return {
+        'dry_run': dry_run,
+        'purged': sum(result['purged'] for result in results),
+        'archive': str(archive_path) if archive_path else None,
+        'sources': results
+    }
+
+
+def total_extracted_tables(session) -> int:
+    """所有抽取记录的表数量合计：保留期内的明细加上已清理记录的按天汇总"""
+    live = session.query(func.sum(ExtractionHistory.extracted_tables)).scalar() or 0
+    rolled_up = session.query(func.sum(ExtractionHistoryDaily.extracted_tables)).scalar() or 0
+    return int(live) + int(rolled_up)
+
+
+def daily_history(datasource_id: Optional[int] = None, days: int = 90) -> List[Dict[str, Any]]:
+    """
+    按天统计的抽取运行（包含已清理的记录）
+    :return: [{day, datasource_id, task_type, status, runs, extracted_tables, total_duration, max_duration}]
+    """
+    since = (datetime.utcnow() - timedelta(days=days)).replace(hour=0, minute=0, second=0, microsecond=0)
+    with get_db_session() as session:
+        query = session.query(ExtractionHistoryDaily).filter(ExtractionHistoryDaily.day >= since)
+        if datasource_id:
+            query = query.filter(ExtractionHistoryDaily.datasource_id == datasource_id)
+        rolled_up = [(row.datasource_id, row.day, row.task_type, row.status, row.runs, row.extracted_tables,
+                      row.total_duration, row.max_duration) for row in query.all()]
+
+        day = func.date(ExtractionHistory.extraction_time)
+        live_query = session.query(
+            ExtractionHistory.datasource_id, day, func.coalesce(ExtractionHistory.task_type, ''),
+            ExtractionHistory.status, func.count(ExtractionHistory.id),
+            func.coalesce(func.sum(ExtractionHistory.extracted_tables), 0),
+            func.coalesce(func.sum(ExtractionHistory.duration), 0), func.max(ExtractionHistory.duration)
+        ).filter(ExtractionHistory.extraction_time >= since)
+        if datasource_id:
+            live_query = live_query.filter(ExtractionHistory.datasource_id == datasource_id)
+        live = live_query.group_by(
+            ExtractionHistory.datasource_id, day, ExtractionHistory.task_type, ExtractionHistory.status
+        ).all()
+
+    merged: Dict[tuple, Dict[str, Any]] = {}
+    for source_id, moment, task_type, status, runs, tables, duration, max_duration in rolled_up + live:
+        if isinstance(moment, str):
+            moment = datetime.fromisoformat(moment)
+        key = (moment.strftime('%Y-%m-%d'), source_id, task_type, status)
+        entry = merged.setdefault(key, {'day': key[0], 'datasource_id': source_id, 'task_type': task_type or None,
+                                        'status': status, 'runs': 0, 'extracted_tables': 0,
+                                        'total_duration': 0, 'max_duration': None})
+        entry['runs'] += int(runs)
+        entry['extracted_tables'] += int(tables or 0)
+        entry['total_duration'] += int(duration or 0)
+        if max_duration is not None:
+            entry['max_duration'] = max(entry['max_duration'] or 0, int(max_duration))
+    return [merged[key] for key in sorted(merged)]
+
+
+def main(argv=None):
+    """抽取历史清理命令行入口"""
+    parser = argparse.ArgumentParser(description='Super MetaData 抽取历史清理')
+    parser.add_argument('--datasource-id', type=int, help='只清理指定数据源')
+    parser.add_argument('--dry-run', action='store_true', help='只统计将被清理的记录数')
+    parser.add_argument('--no-archive', action='store_true', help='不写入归档文件')
+    parser.add_argument('--batch-size', type=int, default=Config.HISTORY_PURGE_BATCH_SIZE, help='每个事务删除的记录数')
+    parser.add_argument('--database-url', default=Config.DATABASE_URL, help='元数据库连接URL')
+    args = parser.parse_args(argv)
+
+    logging.basicConfig(level=Config.LOG_LEVEL, format='%(asctime)s - %(levelname)s - %(message)s')
+
+    from db_manager import init_db_manager
+    from models import init_database
+    init_db_manager(args.database_url)
+    init_database()
+
+    try:
+        result = purge_history(args.datasource_id, dry_run=args.dry_run, archive=not args.no_archive,
+                               batch_size=args.batch_size)
+    except DataSourceNotFoundException as e:
+        logging.error(str(e))
+        return 2
+    print(json.dumps(result, ensure_ascii=False, indent=2))
+    return 0
+
+
+if __name__ == '__main__':
+    raise SystemExit(main())
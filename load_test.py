@@ -0,0 +1,434 @@
+"""
+API 负载测试
+
+向元数据库写入大规模的合成目录后，以多个并发级别驱动带登录态的并发请求，
+找出表列表、表详情、资源概览等接口在多大并发下开始退化：
+1. 种子数据：数据源、表、字段、关联关系和抽取历史，批量插入；
+   未指定 --database-url 时使用临时 SQLite 文件并自动写入
+2. 目标：进程内（Flask 测试客户端，每个并发线程一个客户端）或 --url 指定的本机服务（HTTP，先登录）
+3. 指标：每个并发级别、每个接口的 p50/p95/p99 延迟、吞吐、错误率；
+   进程内模式还统计每个请求执行的 SQL 语句数和请求期间连接池的最大占用（饱和度 = 占用 / 容量）
+4. 阈值：超过阈值时记入 failures，退出码为1，可用于发现回退
+
+用法:
+    python load_test.py --concurrency 1 8 32 --duration 10
+    python load_test.py --tables 50000 --thresholds thresholds.json -o report.json
+    python load_test.py --url http://127.0.0.1:5000 --username admin --password *** --concurrency 16
+"""
+import argparse
+import http.cookiejar
+import json
+import logging
+import os
+import random
+import sys
+import tempfile
+import threading
+import time
+import urllib.error
+import urllib.request
+from typing import Dict, Any, List, Optional, Callable
+
+from sqlalchemy import event, insert, func
+
+from config import Config
+
+
+# 默认的接口组合：名称 -> (权重, 生成请求路径的函数)
+ENDPOINT_WEIGHTS = {'list_tables': 4, 'table_detail': 5, 'overview': 1}
+
+# 阈值的默认值（None 表示不检查），可被 --thresholds 文件中按接口的配置覆盖
+DEFAULT_THRESHOLDS = {
+    'p95_ms': None,
+    'p99_ms': None,
+    'error_rate': 0.01,
+    'statements_max': None,
+    'pool_saturation': None,
+}
+
+COLUMN_NAMES = ('name', 'status', 'amount', 'remark', 'created_at', 'updated_at', 'created_by', 'deleted',
+                'code', 'type', 'price', 'quantity', 'address', 'phone', 'email', 'version')
+COLUMN_TYPES = ('varchar', 'int', 'bigint', 'decimal', 'datetime', 'text', 'tinyint', 'date')
+
+SEED_CHUNK_SIZE = 5000
+
+
+def _chunks(rows: List[Dict[str, Any]], size: int = SEED_CHUNK_SIZE):
+    for index in range(0, len(rows), size):
+        yield rows[index:index + size]
+
+
+def seed_catalog(sources: int, tables: int, columns: int, relationships: float, seed: int = 42) -> Dict[str, int]:
+    """
+    向元数据库写入合成目录
+    :param tables: 表总数（平均分配到各数据源）
+    :param columns: 每表平均字段数
+    :param relationships: 每表平均关联关系数（只在同一数据源内）
+    :return: 写入的数量
+    """
+    from db_manager import get_db_session
+    from models import DataSource, TableMetadata, ColumnMetadata, TableRelationship, ExtractionHistory
+
+    rng = random.Random(seed)
+    counts = {'sources': 0, 'tables': 0, 'columns': 0, 'relationships': 0}
+    per_source = max(1, tables // sources)
+    for source_index in range(sources):
+        with get_db_session() as session:
+            source = DataSource(name=f"loadtest_{seed}_{source_index}", type='mysql', host=f"10.0.{source_index}.1",
+                                port=3306, username='reader', password='', database=f"db_{source_index}")
+            session.add(source)
+            session.flush()
+            source_id = source.id
+
+            table_rows = [{
+                'table_name': f"t_{source_index}_{index:06d}",
+                'schema_name': f"db_{source_index}",
+                'row_count': rng.randint(0, 10 ** 7),
+                'size_bytes': rng.randint(0, 10 ** 10),
+                'comment': f"合成表 {index}",
+                'datasource_id': source_id
+            } for index in range(per_source)]
+            for chunk in _chunks(table_rows):
+                session.execute(insert(TableMetadata), chunk)
+            table_ids = [row[0] for row in session.query(TableMetadata.id).filter(
+                TableMetadata.datasource_id == source_id
+            ).order_by(TableMetadata.id).all()]
+
+            column_rows = []
+            relationship_rows = []
+            for position, table_id in enumerate(table_ids):
+                width = rng.randint(max(1, columns // 2), max(1, columns * 3 // 2))
+                column_rows.append({'table_id': table_id, 'column_name': 'id', 'data_type': 'bigint',
+                                    'is_nullable': 'NO', 'ordinal_position': 1, 'column_comment': '主键'})
+                for ordinal in range(2, width + 1):
+                    column_rows.append({
+                        'table_id': table_id,
+                        'column_name': f"{COLUMN_NAMES[ordinal % len(COLUMN_NAMES)]}_{ordinal}",
+                        'data_type': COLUMN_TYPES[(position + ordinal) % len(COLUMN_TYPES)],
+                        'is_nullable': 'YES',
+                        'ordinal_position': ordinal,
+                        'column_comment': f"字段 {ordinal}"
+                    })
+                count = int(relationships) + (1 if rng.random() < relationships - int(relationships) else 0)
+                for _ in range(count if position else 0):
+                    referenced_id = table_ids[rng.randrange(position)]
+                    relationship_rows.append({
+                        'constraint_name': f"fk_{table_id}_{referenced_id}",
+                        'table_id': table_id,
+                        'referenced_table_id': referenced_id,
+                        'column_name': f"ref_{referenced_id}_id",
+                        'referenced_column_name': 'id',
+                        'constraint_type': 'FOREIGN KEY',
+                        'confidence': 1.0
+                    })
+                if len(column_rows) >= SEED_CHUNK_SIZE:
+                    session.execute(insert(ColumnMetadata), column_rows)
+                    counts['columns'] += len(column_rows)
+                    column_rows = []
+            if column_rows:
+                session.execute(insert(ColumnMetadata), column_rows)
+                counts['columns'] += len(column_rows)
+            for chunk in _chunks(relationship_rows):
+                session.execute(insert(TableRelationship), chunk)
+
+            session.add(ExtractionHistory(datasource_id=source_id, status='success', message='负载测试种子数据',
+                                          extracted_tables=len(table_ids), duration=0, task_type='full',
+                                          total_tables=len(table_ids), checkpointed_tables=len(table_ids)))
+            counts['sources'] += 1
+            counts['tables'] += len(table_ids)
+            counts['relationships'] += len(relationship_rows)
+        logging.warning(f"已写入数据源 {source_index + 1}/{sources}: {len(table_ids)} 个表")
+    return counts
+
+
+def load_targets() -> Dict[str, List[int]]:
+    """请求中随机选择的数据源ID和表ID"""
+    from db_manager import get_db_session
+    from models import DataSource, TableMetadata
+
+    with get_db_session() as session:
+        source_ids = [row[0] for row in session.query(DataSource.id).all()]
+        table_ids = [row[0] for row in session.query(TableMetadata.id).order_by(func.random()).limit(10000).all()]
+        tables_per_source = dict(session.query(TableMetadata.datasource_id, func.count(TableMetadata.id)).group_by(
+            TableMetadata.datasource_id
+        ).all())
+    if not table_ids:
+        raise ValueError("元数据库中没有表，请使用 --seed 写入种子数据")
+    return {'source_ids': source_ids, 'table_ids': table_ids,
+            'max_page': max(1, max(tables_per_source.values(), default=0) // 20)}
+
+
+def endpoint_paths(targets: Dict[str, Any]) -> Dict[str, Callable[[random.Random], str]]:
+    return {
+        'list_tables': lambda rng: (f"/api/data-sources/{rng.choice(targets['source_ids'])}/tables"
+                                    f"?page={rng.randint(1, targets['max_page'])}&per_page=20"),
+        'table_detail': lambda rng: f"/api/tables/{rng.choice(targets['table_ids'])}",
+        'overview': lambda rng: '/api/overview',
+    }
+
+
+class RequestProbe:
+    """
+    进程内模式下按线程统计每个请求执行的 SQL 语句数和连接池的最大占用
+    """
+
+    def __init__(self, manager):
+        self.manager = manager
+        self.engine = manager.engine
+        self.pool = manager.engine.pool
+        self.capacity = manager.capacity
+        self._local = threading.local()
+        event.listen(self.engine, 'before_cursor_execute', self._on_execute)
+        event.listen(self.pool, 'checkout', self._on_checkout)
+
+    def _on_execute(self, conn, cursor, statement, parameters, context, executemany):
+        self._local.statements = getattr(self._local, 'statements', 0) + 1
+
+    def _on_checkout(self, dbapi_connection, connection_record, connection_proxy):
+        self._local.pool_peak = max(getattr(self._local, 'pool_peak', 0), self.pool.checkedout())
+
+    def reset(self):
+        self._local.statements = 0
+        self._local.pool_peak = 0
+
+    def read(self) -> Dict[str, int]:
+        return {'statements': self._local.statements, 'pool_peak': self._local.pool_peak}
+
+    def close(self):
+        event.remove(self.engine, 'before_cursor_execute', self._on_execute)
+        event.remove(self.pool, 'checkout', self._on_checkout)
+
+
+class InProcessClient:
+    """每个并发线程一个 Flask 测试客户端，会话中直接写入登录态"""
+
+    def __init__(self, app):
+        self.client = app.test_client()
+        with self.client.session_transaction() as sess:
+            sess['user_id'] = 1
+            sess['role'] = 'admin'
+
+    def get(self, path: str) -> int:
+        return self.client.get(path).status_code
+
+
+class HttpClient:
+    """通过 HTTP 请求本机服务，先调用登录接口获取会话 cookie"""
+
+    def __init__(self, base_url: str, username: str, password: str, timeout: float = 30):
+        self.base_url = base_url.rstrip('/')
+        self.timeout = timeout
+        self.opener = urllib.request.build_opener(urllib.request.HTTPCookieProcessor(http.cookiejar.CookieJar()))
+        request = urllib.request.Request(
+            f"{self.base_url}/api/login", method='POST',
+            data=json.dumps({'username': username, 'password': password}).encode('utf-8'),
+            headers={'Content-Type': 'application/json'}
+        )
+        with self.opener.open(request, timeout=timeout) as response:
+            if response.status != 200:
+                raise ValueError(f"登录失败: HTTP {response.status}")
+
+    def get(self, path: str) -> int:
+        try:
+            with self.opener.open(f"{self.base_url}{path}", timeout=self.timeout) as response:
+                response.read()
+                return response.status
+        except urllib.error.HTTPError as e:
+            return e.code
+        except OSError:
+            return 0
+
+
+def percentile(ordered: List[float], rank: float) -> Optional[float]:
+    """已排序样本的分位数（最近秩）"""
+    if not ordered:
+        return None
+    return ordered[min(len(ordered) - 1, max(0, int(round(rank * len(ordered))) - 1))]
+
+
+def summarize(samples: List[Dict[str, Any]], duration: float, pool_capacity: Optional[int]) -> Dict[str, Any]:
+    """
+    汇总一个接口在一个并发级别下的样本
+    :param samples: [{'ms', 'status', 'statements', 'pool_peak'}]
+    """
+    latencies = sorted(sample['ms'] for sample in samples)
+    errors = sum(1 for sample in samples if not 200 <= sample['status'] < 400)
+    statements = [sample['statements'] for sample in samples if sample.get('statements') is not None]
+    pool_peaks = [sample['pool_peak'] for sample in samples if sample.get('pool_peak') is not None]
+    return {
+        'requests': len(samples),
+        'errors': errors,
+        'error_rate': round(errors / len(samples), 4) if samples else 0,
+        'throughput_rps': round(len(samples) / duration, 2) if duration else None,
+        'p50_ms': round(percentile(latencies, 0.5), 3) if latencies else None,
+        'p95_ms': round(percentile(latencies, 0.95), 3) if latencies else None,
+        'p99_ms': round(percentile(latencies, 0.99), 3) if latencies else None,
+        'max_ms': round(latencies[-1], 3) if latencies else None,
+        'statements_avg': round(sum(statements) / len(statements), 2) if statements else None,
+        'statements_max': max(statements) if statements else None,
+        'pool_peak': max(pool_peaks) if pool_peaks else None,
+        'pool_saturation': round(max(pool_peaks) / pool_capacity, 3) if pool_peaks and pool_capacity else None,
+    }
+
+
+def check_thresholds(levels: List[Dict[str, Any]], thresholds: Dict[str, Dict[str, Any]]) -> List[Dict[str, Any]]:
+    """
+    检查各并发级别、各接口是否超过阈值
+    :param thresholds: {'default': {...}, 接口名: {...}}，接口的配置覆盖默认配置
+    :return: 超过阈值的项
+    """
+    failures = []
+    for level in levels:
+        for endpoint, stats in level['endpoints'].items():
+            limits = dict(thresholds.get('default', {}), **thresholds.get(endpoint, {}))
+            for metric, limit in limits.items():
+                value = stats.get(metric)
+                if limit is not None and value is not None and value > limit:
+                    failures.append({'concurrency': level['concurrency'], 'endpoint': endpoint,
+                                     'metric': metric, 'value': value, 'threshold': limit})
+    return failures
+
+
+def run_level(make_client: Callable[[], Any], paths: Dict[str, Callable], weights: Dict[str, int],
+              concurrency: int, duration: float, probe: Optional[RequestProbe], seed: int) -> Dict[str, Any]:
+    """以固定并发数持续发送请求 duration 秒"""
+    names = list(weights)
+    samples: Dict[str, List[Dict[str, Any]]] = {name: [] for name in names}
+    lock = threading.Lock()
+    deadline = time.perf_counter() + duration
+    clients = [make_client() for _ in range(concurrency)]
+
+    def worker(index: int):
+        rng = random.Random(seed * 1000 + index)
+        client = clients[index]
+        local: Dict[str, List[Dict[str, Any]]] = {name: [] for name in names}
+        while time.perf_counter() < deadline:
+            name = rng.choices(names, weights=[weights[name] for name in names])[0]
+            path = paths[name](rng)
+            if probe:
+                probe.reset()
+            start = time.perf_counter()
+            status = client.get(path)
+            sample = {'ms': (time.perf_counter() - start) * 1000, 'status': status}
+            if probe:
+                sample.update(probe.read())
+            local[name].append(sample)
+        with lock:
+            for name in names:
+                samples[name].extend(local[name])
+
+    threads = [threading.Thread(target=worker, args=(index,), name=f"load-{index}") for index in range(concurrency)]
+    start = time.perf_counter()
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join()
+    elapsed = time.perf_counter() - start
+
+    capacity = probe.capacity if probe else None
+    endpoints = {name: summarize(samples[name], elapsed, capacity) for name in names if samples[name]}
+    total = sum(len(items) for items in samples.values())
+    return {'concurrency': concurrency, 'duration': round(elapsed, 3),
+            'throughput_rps': round(total / elapsed, 2) if elapsed else None, 'endpoints': endpoints}
+
+
+def main(argv=None):
+    """负载测试命令行入口"""
+    parser = argparse.ArgumentParser(description='Super MetaData API 负载测试')
+    parser.add_argument('--database-url', help='元数据库连接URL，默认使用临时 SQLite 文件并写入种子数据')
+    parser.add_argument('--seed', action='store_true', help='向 --database-url 写入种子数据')
+    parser.add_argument('--sources', type=int, default=5, help='种子数据源数量')
+    parser.add_argument('--tables', type=int, default=20000, help='种子表总数')
+    parser.add_argument('--columns', type=int, default=20, help='每表平均字段数')
+    parser.add_argument('--relationships', type=float, default=0.5, help='每表平均关联关系数')
+    parser.add_argument('--url', help='本机服务地址（HTTP 模式），不指定时在进程内请求')
+    parser.add_argument('--username', help='HTTP 模式的登录用户名')
+    parser.add_argument('--password', help='HTTP 模式的登录密码')
+    parser.add_argument('--concurrency', type=int, nargs='+', default=[1, 8, 32], help='依次测试的并发数')
+    parser.add_argument('--duration', type=float, default=10, help='每个并发级别的持续时间（秒）')
+    parser.add_argument('--endpoints', nargs='+', choices=sorted(ENDPOINT_WEIGHTS), help='只测试指定的接口')
+    parser.add_argument('--thresholds', help='阈值 JSON 文件：{"default": {...}, "table_detail": {"p95_ms": 50}}')
+    parser.add_argument('--max-p95-ms', type=float, help='所有接口的 p95 延迟上限')
+    parser.add_argument('--max-error-rate', type=float, default=DEFAULT_THRESHOLDS['error_rate'], help='错误率上限')
+    parser.add_argument('--random-seed', type=int, default=42, help='随机种子')
+    parser.add_argument('-o', '--output', help='结果 JSON 文件，默认为标准输出')
+    args = parser.parse_args(argv)
+
+    logging.basicConfig(level=logging.WARNING, format='%(asctime)s - %(levelname)s - %(message)s')
+    if args.url and not (args.username and args.password):
+        parser.error('HTTP 模式需要 --username 和 --password')
+
+    from db_manager import init_db_manager
+    from models import init_database
+
+    seed = args.seed
+    if args.database_url:
+        Config.DATABASE_URL = args.database_url
+    elif not args.url:
+        Config.DATABASE_URL = f"sqlite:///{os.path.join(tempfile.mkdtemp(prefix='metadata-load-'), 'metadata.db')}"
+        seed = True
+    init_db_manager(Config.DATABASE_URL)
+    init_database()
+
+    seeded = None
+    if seed:
+        seeded = seed_catalog(args.sources, args.tables, args.columns, args.relationships, args.random_seed)
+    targets = load_targets()
+    paths = endpoint_paths(targets)
+    weights = {name: weight for name, weight in ENDPOINT_WEIGHTS.items()
+               if not args.endpoints or name in args.endpoints}
+
+    probe = None
+    if args.url:
+        def make_client():
+            return HttpClient(args.url, args.username, args.password)
+    else:
+        from api import create_app
+        import db_manager
+        app = create_app()
+        probe = RequestProbe(db_manager.db_manager)
+
+        def make_client():
+            return InProcessClient(app)
+
+    levels = []
+    for concurrency in args.concurrency:
+        level = run_level(make_client, paths, weights, concurrency, args.duration, probe, args.random_seed)
+        levels.append(level)
+        logging.warning(f"并发 {concurrency}: {level['throughput_rps']} 请求/秒，" + '，'.join(
+            f"{name} p95 {stats['p95_ms']}ms" for name, stats in level['endpoints'].items()
+        ))
+    if probe:
+        probe.close()
+
+    thresholds = {'default': dict(DEFAULT_THRESHOLDS, error_rate=args.max_error_rate, p95_ms=args.max_p95_ms)}
+    if args.thresholds:
+        with open(args.thresholds, encoding='utf-8') as file:
+            for key, limits in json.load(file).items():
+                thresholds[key] = dict(thresholds.get(key, {}), **limits)
+    failures = check_thresholds(levels, thresholds)
+    for failure in failures:
+        logging.warning(f"超过阈值: 并发 {failure['concurrency']} {failure['endpoint']} {failure['metric']} "
+                        f"{failure['value']} > {failure['threshold']}")
+
+    report = {
+        'mode': 'http' if args.url else 'in_process',
+        'database': Config.DATABASE_URL.split('@')[-1] if not args.url else None,
+        'seeded': seeded,
+        'targets': {'sources': len(targets['source_ids']), 'sampled_tables': len(targets['table_ids'])},
+        'levels': levels,
+        'thresholds': thresholds,
+        'pool': probe.manager.pool_status() if probe else None,
+        'failures': failures,
+    }
+    text = json.dumps(report, ensure_ascii=False, indent=2)
+    if args.output:
+        with open(args.output, 'w', encoding='utf-8') as file:
+            file.write(text + '\n')
+    else:
+        print(text)
+    return 1 if failures else 0
+
+
+if __name__ == '__main__':
+    sys.exit(main())
@@ -0,0 +1,346 @@
+"""
+元数据命令行工具
+
+不启动 Flask 应用，直接使用与 API 相同的抽取器注册表（EXTRACTOR_MAP）和抽取服务（run_extraction），
+适合在 cron、CI 中调用：
+1. extract：并发抽取一个、多个或全部数据源（由 ExtractionOrchestrator 按主机、数据库类型限制并发），
+   运行期间在标准错误输出进度，结束后在标准输出打印 JSON 运行摘要
+2. check：测试数据源连接
+3. status：各数据源的表、字段数量和最近一次抽取
+
+退出码：0 全部成功，1 有数据源失败，2 参数错误或数据源不存在，3 没有失败但有部分成功（超时或被取消）
+
+用法:
+    python metadata_cli.py extract --all --workers 4 > summary.json
+    python metadata_cli.py extract --datasource-id 1 --datasource-id 3 --task-type schema_only
+    python metadata_cli.py check --name 订单库
+    python metadata_cli.py status --json
+"""
+import argparse
+import json
+import logging
+import signal
+import sys
+import threading
+import time
+from typing import Dict, Any, List
+
+from sqlalchemy import func
+
+from config import Config
+from models import DataSource, TableMetadata, ColumnMetadata, ExtractionHistory
+from db_manager import get_db_session
+from extractor_base import get_extractor_class
+from extraction_service import run_extraction, cancel_extraction, TASK_TYPES
+from extraction_orchestrator import ExtractionOrchestrator
+from exceptions import ValidationException
+
+
+EXIT_SUCCESS = 0
+EXIT_FAILED = 1
+EXIT_USAGE = 2
+EXIT_PARTIAL = 3
+
+
+def _print_progress(message: str):
+    print(f"[{time.strftime('%H:%M:%S')}] {message}", file=sys.stderr, flush=True)
+
+
+def select_sources(source_ids: List[int] = None, names: List[str] = None,
+                   select_all: bool = False) -> List[DataSource]:
+    """
+    按ID、名称或全部选择数据源（与会话分离）
+    :raises ValidationException: 没有指定数据源，或指定的数据源不存在
+    """
+    source_ids = source_ids or []
+    names = names or []
+    if not (source_ids or names or select_all):
+        raise ValidationException("请指定 --datasource-id、--name 或 --all")
+
+    with get_db_session() as session:
+        query = session.query(DataSource).order_by(DataSource.id)
+        if not select_all:
+            query = query.filter(DataSource.id.in_(source_ids) | DataSource.name.in_(names))
+        sources = query.all()
+        for source in sources:
+            session.expunge(source)
+
+    missing = ([str(source_id) for source_id in source_ids if source_id not in {s.id for s in sources}]
+               + [name for name in names if name not in {s.name for s in sources}])
+    if missing:
+        raise ValidationException(f"数据源不存在: {', '.join(missing)}")
+    if not sources:
+        raise ValidationException("没有可抽取的数据源")
+    return sources
+
+
+class ProgressReporter:
+    """
+    抽取进度报告
+    各数据源开始、结束时立即输出，运行期间每隔 interval 秒输出执行中数据源已写入检查点的表数量
+    """
+
+    def __init__(self, total: int, interval: float):
+        self.total = total
+        self.interval = interval
+        self.results: Dict[int, Dict[str, Any]] = {}
+        self.running: Dict[int, str] = {}  # {历史记录ID: 数据源名称}
+        self._lock = threading.Lock()
+        self._stopped = threading.Event()
+        self._thread = None
+
+    def extract(self, names: Dict[int, str]):
+        """包装 run_extraction，作为编排器的 extract_func"""
+        def extract_func(source_id: int, **kwargs) -> Dict[str, Any]:
+            name = names.get(source_id, source_id)
+            history_ids = []
+
+            def on_history_created(history_id: int):
+                history_ids.append(history_id)
+                with self._lock:
+                    self.running[history_id] = name
+                _print_progress(f"开始抽取 {name}（运行 {history_id}）")
+
+            try:
+                result = run_extraction(source_id, on_history_created=on_history_created, **kwargs)
+            except Exception as e:
+                result = {'status': 'failed', 'message': str(e), 'datasource_id': source_id}
+            with self._lock:
+                for history_id in history_ids:
+                    self.running.pop(history_id, None)
+                self.results[source_id] = result
+                done = len(self.results)
+            message = f"，{result['message']}" if result['status'] != 'success' and result.get('message') else ''
+            _print_progress(f"[{done}/{self.total}] {name}: {result['status']}，"
+                            f"{result.get('tables_count', 0)} 个表，{result.get('duration', 0)} 秒{message}")
+            return result
+        return extract_func
+
+    def _report(self):
+        last_message = None
+        while not self._stopped.wait(self.interval):
+            with self._lock:
+                running = dict(self.running)
+                done = len(self.results)
+            if not running:
+                continue
+            try:
+                with get_db_session() as session:
+                    checkpointed = dict(session.query(
+                        ExtractionHistory.id, ExtractionHistory.checkpointed_tables
+                    ).filter(ExtractionHistory.id.in_(list(running))).all())
+            except Exception as e:
+                logging.warning(f"读取抽取进度失败: {str(e)}")
+                continue
+            message = f"[{done}/{self.total}] 执行中: " + '，'.join(
+                f"{name} {checkpointed.get(history_id) or 0} 个表" for history_id, name in running.items()
+            )
+            # 进度没有变化时不重复输出
+            if message != last_message:
+                _print_progress(message)
+                last_message = message
+
+    def start(self):
+        if self.interval > 0:
+            self._thread = threading.Thread(target=self._report, name='cli-progress', daemon=True)
+            self._thread.start()
+
+    def stop(self):
+        self._stopped.set()
+        if self._thread:
+            self._thread.join()
+
+    def cancel_running(self):
+        """取消执行中的抽取，已抽取的部分照常保存"""
+        with self._lock:
+            history_ids = list(self.running)
+        for history_id in history_ids:
+            try:
+                cancel_extraction(history_id)
+            except ValidationException:
+                pass
+
+
+def exit_code(results: List[Dict[str, Any]]) -> int:
+    statuses = {result.get('status') for result in results}
+    if statuses - {'success', 'partial_success'}:
+        return EXIT_FAILED
+    if 'partial_success' in statuses:
+        return EXIT_PARTIAL
+    return EXIT_SUCCESS
+
+
+def extract_command(args) -> int:
+    sources = select_sources(args.datasource_id, args.name, args.all)
+    orchestrator = ExtractionOrchestrator(max_workers=args.workers, per_host_limit=args.per_host_limit,
+                                          task_type=args.task_type)
+    reporter = ProgressReporter(len(sources), args.progress_interval)
+    orchestrator.extract_func = reporter.extract({source.id: source.name for source in sources})
+
+    def handle_signal(signum, frame):
+        _print_progress(f"收到信号 {signum}，取消执行中的抽取")
+        reporter.cancel_running()
+
+    signal.signal(signal.SIGTERM, handle_signal)
+    signal.signal(signal.SIGINT, handle_signal)
+
+    _print_progress(f"抽取 {len(sources)} 个数据源，任务类型 {args.task_type}，并发 {orchestrator.max_workers}")
+    reporter.start()
+    try:
+        run = orchestrator.run([source.id for source in sources], triggered_by=args.triggered_by)
+    finally:
+        reporter.stop()
+
+    results = [reporter.results.get(source.id, {'status': 'failed', 'datasource_id': source.id})
+               for source in sources]
+    summary = {
+        'run_id': run['id'],
+        'status': run['status'],
+        'message': run['message'],
+        'task_type': args.task_type,
+        'duration': run['duration'],
+        'sources': [dict(result, datasource_name=source.name) for source, result in zip(sources, results)]
+    }
+    _write_json(summary, args.output)
+    return exit_code(results)
+
+
+def check_command(args) -> int:
+    results = []
+    for source in select_sources(args.datasource_id, args.name, args.all):
+        extractor_class = get_extractor_class(source.type)
+        result = {'datasource_id': source.id, 'datasource_name': source.name, 'type': source.type,
+                  'host': source.host, 'port': source.port, 'database': source.database}
+        if not extractor_class:
+            result.update(connected=False, error=f"不支持的数据库类型: {source.type}")
+        else:
+            start_time = time.time()
+            extractor = extractor_class(source)
+            try:
+                result['connected'] = bool(extractor.connect())
+            except Exception as e:
+                result.update(connected=False, error=str(e))
+            finally:
+                extractor.disconnect()
+            result['seconds'] = round(time.time() - start_time, 3)
+        _print_progress(f"{source.name}: {'连接成功' if result['connected'] else '连接失败'}")
+        results.append(result)
+    _write_json(results, args.output)
+    return EXIT_SUCCESS if all(result['connected'] for result in results) else EXIT_FAILED
+
+
+def source_status(source_ids: List[int] = None) -> List[Dict[str, Any]]:
+    """各数据源的表、字段数量和最近一次抽取"""
+    with get_db_session() as session:
+        query = session.query(DataSource.id, DataSource.name, DataSource.type, DataSource.host, DataSource.database)
+        if source_ids:
+            query = query.filter(DataSource.id.in_(source_ids))
+        sources = query.order_by(DataSource.id).all()
+
+        tables = dict(session.query(TableMetadata.datasource_id, func.count(TableMetadata.id)).group_by(
+            TableMetadata.datasource_id
+        ).all())
+        columns = dict(session.query(TableMetadata.datasource_id, func.count(ColumnMetadata.id)).join(
+            ColumnMetadata, ColumnMetadata.table_id == TableMetadata.id
+        ).group_by(TableMetadata.datasource_id).all())
+        latest_ids = session.query(func.max(ExtractionHistory.id)).group_by(ExtractionHistory.datasource_id)
+        latest = {history.datasource_id: history for history in session.query(ExtractionHistory).filter(
+            ExtractionHistory.id.in_(latest_ids.scalar_subquery())
+        ).all()}
+
+        return [{
+            'datasource_id': source_id,
+            'datasource_name': name,
+            'type': db_type,
+            'host': host,
+            'database': database,
+            'tables': tables.get(source_id, 0),
+            'columns': columns.get(source_id, 0),
+            'last_extraction': {
+                'history_id': latest[source_id].id,
+                'status': latest[source_id].status,
+                'task_type': latest[source_id].task_type,
+                'extraction_time': latest[source_id].extraction_time.isoformat()
+                if latest[source_id].extraction_time else None,
+                'extracted_tables': latest[source_id].extracted_tables,
+                'duration': latest[source_id].duration,
+                'message': latest[source_id].message
+            } if source_id in latest else None
+        } for source_id, name, db_type, host, database in sources]
+
+
+def status_command(args) -> int:
+    rows = source_status(args.datasource_id)
+    if args.json:
+        _write_json(rows, args.output)
+        return EXIT_SUCCESS
+    print(f"{'ID':<5} {'名称':<30} {'类型':<12} {'表数':>8} {'字段数':>10}  最近抽取")
+    print('-' * 100)
+    for row in rows:
+        last = row['last_extraction']
+        last_text = f"{last['extraction_time']} {last['status']} ({last['task_type']})" if last else '-'
+        print(f"{row['datasource_id']:<5} {row['datasource_name']:<30} {row['type']:<12} "
+              f"{row['tables']:>8} {row['columns']:>10}  {last_text}")
+    return EXIT_SUCCESS
+
+
+def _write_json(data, output: str = None):
+    text = json.dumps(data, ensure_ascii=False, indent=2, default=str)
+    if output:
+        with open(output, 'w', encoding='utf-8') as file:
+            file.write(text + '\n')
+    else:
+        print(text)
+
+
+def _add_selection(parser):
+    parser.add_argument('--datasource-id', type=int, action='append', help='数据源ID，可重复指定')
+    parser.add_argument('--name', action='append', help='数据源名称，可重复指定')
+    parser.add_argument('--all', action='store_true', help='全部数据源')
+
+
+def main(argv=None):
+    """命令行入口"""
+    common = argparse.ArgumentParser(add_help=False)
+    common.add_argument('--database-url', default=Config.DATABASE_URL, help='元数据库连接URL')
+    common.add_argument('-o', '--output', help='JSON 结果写入的文件，默认为标准输出')
+
+    parser = argparse.ArgumentParser(description='Super MetaData 命令行工具')
+    commands = parser.add_subparsers(dest='command', required=True)
+
+    extract_parser = commands.add_parser('extract', parents=[common], help='抽取数据源元数据')
+    _add_selection(extract_parser)
+    extract_parser.add_argument('--task-type', choices=TASK_TYPES, default='full', help='任务类型')
+    extract_parser.add_argument('--workers', type=int, default=Config.ORCHESTRATOR_MAX_WORKERS,
+                                help='并发抽取的数据源数')
+    extract_parser.add_argument('--per-host-limit', type=int, default=Config.ORCHESTRATOR_PER_HOST_LIMIT,
+                                help='同一主机的并发上限')
+    extract_parser.add_argument('--progress-interval', type=float, default=5,
+                                help='进度输出间隔（秒），0 为只输出开始和结束')
+    extract_parser.add_argument('--triggered-by', default='cli', help='记录在编排运行中的触发者')
+
+    check_parser = commands.add_parser('check', parents=[common], help='测试数据源连接')
+    _add_selection(check_parser)
+
+    status_parser = commands.add_parser('status', parents=[common], help='数据源元数据概况')
+    status_parser.add_argument('--datasource-id', type=int, action='append', help='数据源ID，可重复指定')
+    status_parser.add_argument('--json', action='store_true', help='输出 JSON')
+    args = parser.parse_args(argv)
+
+    logging.basicConfig(level=Config.LOG_LEVEL, format='%(asctime)s - %(levelname)s - %(message)s')
+
+    from db_manager import init_db_manager
+    from models import init_database
+    init_db_manager(args.database_url)
+    init_database()
+
+    handlers = {'extract': extract_command, 'check': check_command, 'status': status_command}
+    try:
+        return handlers[args.command](args)
+    except ValidationException as e:
+        logging.error(str(e))
+        return EXIT_USAGE
+
+
+if __name__ == '__main__':
+    raise SystemExit(main())
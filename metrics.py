@@ -0,0 +1,487 @@
+"""
+运行指标
+
+以 Prometheus 文本格式在 /metrics 暴露服务和抽取流水线的指标，不依赖外部组件：
+1. 计数器和直方图按线程分片累加，热路径上只写本线程的分片，不加全局锁；抓取时汇总各分片
+2. 连接池使用情况、作业队列深度、调度延迟、各数据源最近一次成功抽取距今的时间在抓取时计算，
+   这些值来自元数据库，对独立部署的抽取工作进程同样有效
+
+主要指标：
+- http_request_duration_seconds: 各Flask路由的请求耗时
+- db_pool_checkout_wait_seconds / db_pool_*: 元数据库连接池的取连接等待时间和使用情况
+- extraction_tables_total / extraction_columns_total / extraction_last_run_tables_per_second: 抽取吞吐
+- extraction_in_flight / extraction_jobs: 进行中的抽取和作业队列
+- extraction_scheduler_lag_seconds / etl_task_schedule_lag_seconds: 调度延迟
+- extraction_last_success_age_seconds: 各数据源最近一次成功抽取距今的秒数
+"""
+import abc
+import logging
+import threading
+import time
+from datetime import datetime
+from typing import Dict, Any, List, Tuple, Callable, Iterable, Optional
+
+from sqlalchemy.pool import QueuePool
+
+
+# 默认的耗时直方图分桶（秒）
+DEFAULT_BUCKETS = (0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0, 30.0, 60.0)
+# 抽取运行、作业排队等较长耗时的分桶（秒）
+LONG_BUCKETS = (1.0, 5.0, 15.0, 30.0, 60.0, 120.0, 300.0, 600.0, 1800.0, 3600.0, 7200.0)
+
+CONTENT_TYPE = 'text/plain; version=0.0.4; charset=utf-8'
+
+
+def _escape(value: str) -> str:
+    return str(value).replace('\\', '\\\\').replace('\n', '\\n').replace('"', '\\"')
+
+
+def _format_labels(labelnames: Tuple[str, ...], labelvalues: Tuple[str, ...], extra: str = '') -> str:
+    pairs = [f'{name}="{_escape(value)}"' for name, value in zip(labelnames, labelvalues)]
+    if extra:
+        pairs.append(extra)
+    return '{' + ','.join(pairs) + '}' if pairs else ''
+
+
+def _format_value(value: float) -> str:
+    if value == float('inf'):
+        return '+Inf'
+    return repr(float(value)) if isinstance(value, float) and not value.is_integer() else str(int(value))
+
+
+class _Sharded(abc.ABC):
+    """
+    按线程分片的存储
+    每个线程第一次写入时注册自己的分片（只有这一步加锁），之后只修改本线程的字典；
+    已退出线程的分片在抓取时合并到归档分片中，避免按请求创建线程时分片无限增长
+    """
+
+    def __init__(self):
+        self._local = threading.local()
+        self._shards: List[Tuple[threading.Thread, Dict]] = []
+        self._retired: Dict = {}
+        self._shards_lock = threading.Lock()
+
+    def _shard(self) -> Dict:
+        shard = getattr(self._local, 'shard', None)
+        if shard is None:
+            shard = {}
+            with self._shards_lock:
+                self._shards.append((threading.current_thread(), shard))
+            self._local.shard = shard
+        return shard
+
+    @abc.abstractmethod
+    def _merge(self, target: Dict, source: Dict):
+        """将source分片的值合并到target"""
+        pass
+
+    def _snapshot(self) -> List[Dict]:
+        with self._shards_lock:
+            live = []
+            for thread, shard in self._shards:
+                if thread.is_alive():
+                    live.append((thread, shard))
+                else:
+                    self._merge(self._retired, shard)
+            self._shards = live
+            snapshot = [self._copy(self._retired)]
+        # 写入线程可能同时新增键，复制时重试
+        for _, shard in live:
+            while True:
+                try:
+                    snapshot.append(self._copy(shard))
+                    break
+                except RuntimeError:
+                    continue
+        return snapshot
+
+    def _copy(self, shard: Dict) -> Dict:
+        return dict(shard)
+
+
+class Counter(_Sharded):
+    """单调递增的计数器"""
+    type_name = 'counter'
+
+    def __init__(self, name: str, documentation: str, labelnames: Iterable[str] = ()):
+        super().__init__()
+        self.name = name
+        self.documentation = documentation
+        self.labelnames = tuple(labelnames)
+
+    def inc(self, amount: float = 1, **labels):
+        key = tuple(str(labels.get(name, '')) for name in self.labelnames)
+        shard = self._shard()
+        shard[key] = shard.get(key, 0) + amount
+
+    def _merge(self, target: Dict, source: Dict):
+        for key, value in source.items():
+            target[key] = target.get(key, 0) + value
+
+    def values(self) -> Dict[tuple, float]:
+        totals = {}
+        for shard in self._snapshot():
+            self._merge(totals, shard)
+        return totals
+
+    def collect(self) -> List[str]:
+        values = self.values()
+        if not values and not self.labelnames:
+            values = {(): 0}
+        return [f"{self.name}{_format_labels(self.labelnames, key)} {_format_value(value)}"
+                for key, value in sorted(values.items())]
+
+
+class Gauge(Counter):
+    """
+    可增减的仪表
+    inc/dec 按线程分片累加，同一个值可以在不同线程中增减；set 只用于单一写入方的场景
+    """
+    type_name = 'gauge'
+
+    def __init__(self, name: str, documentation: str, labelnames: Iterable[str] = ()):
+        super().__init__(name, documentation, labelnames)
+        self._set_values: Dict[tuple, float] = {}
+
+    def dec(self, amount: float = 1, **labels):
+        self.inc(-amount, **labels)
+
+    def set(self, value: float, **labels):
+        key = tuple(str(labels.get(name, '')) for name in self.labelnames)
+        self._set_values[key] = value
+
+    def values(self) -> Dict[tuple, float]:
+        totals = super().values()
+        for key, value in list(self._set_values.items()):
+            totals[key] = totals.get(key, 0) + value
+        return totals
+
+
+class Histogram(_Sharded):
+    """
+    直方图
+    每个分片按标签保存 [各分桶计数..., 总和, 总数]，观测时只做一次二分查找和列表原地更新
+    """
+    type_name = 'histogram'
+
+    def __init__(self, name: str, documentation: str, labelnames: Iterable[str] = (),
+                 buckets: Iterable[float] = DEFAULT_BUCKETS):
+        super().__init__()
+        self.name = name
+        self.documentation = documentation
+        self.labelnames = tuple(labelnames)
+        self.buckets = tuple(sorted(buckets))
+
+    def observe(self, value: float, **labels):
+        key = tuple(str(labels.get(name, '')) for name in self.labelnames)
+        shard = self._shard()
+        state = shard.get(key)
+        if state is None:
+            state = [0] * (len(self.buckets) + 2)
+            shard[key] = state
+        low, high = 0, len(self.buckets)
+        while low < high:
+            middle = (low + high) // 2
+            if value <= self.buckets[middle]:
+                high = middle
+            else:
+                low = middle + 1
+        if low < len(self.buckets):
+            state[low] += 1
+        state[-2] += value
+        state[-1] += 1
+
+    def time(self, **labels):
+        """计时上下文管理器"""
+        histogram = self
+
+        class _Timer:
+            def __enter__(self):
+                self.start = time.perf_counter()
+                return self
+
+            def __exit__(self, *exc):
+                histogram.observe(time.perf_counter() - self.start, **labels)
+                return False
+
+        return _Timer()
+
+    def _copy(self, shard: Dict) -> Dict:
+        return {key: list(state) for key, state in shard.items()}
+
+    def _merge(self, target: Dict, source: Dict):
+        for key, state in source.items():
+            merged = target.setdefault(key, [0] * len(state))
+            for index, value in enumerate(state):
+                merged[index] += value
+
+    def collect(self) -> List[str]:
+        totals: Dict[tuple, List[float]] = {}
+        for shard in self._snapshot():
+            self._merge(totals, shard)
+        lines = []
+        for key, state in sorted(totals.items()):
+            cumulative = 0
+            for bound, count in zip(self.buckets, state):
+                cumulative += count
+                labels = _format_labels(self.labelnames, key, 'le="%s"' % bound)
+                lines.append(f"{self.name}_bucket{labels} {int(cumulative)}")
+            labels = _format_labels(self.labelnames, key, 'le="+Inf"')
+            lines.append(f"{self.name}_bucket{labels} {int(state[-1])}")
+            lines.append(f"{self.name}_sum{_format_labels(self.labelnames, key)} {_format_value(state[-2])}")
+            lines.append(f"{self.name}_count{_format_labels(self.labelnames, key)} {int(state[-1])}")
+        return lines
+
+
+class CallbackGauge:
+    """
+    抓取时由回调计算的仪表
+    回调返回 {标签值元组: 值}，无标签时键为空元组
+    """
+    type_name = 'gauge'
+
+    def __init__(self, name: str, documentation: str, callback: Callable[[], Dict[tuple, float]],
+                 labelnames: Iterable[str] = ()):
+        self.name = name
+        self.documentation = documentation
+        self.callback = callback
+        self.labelnames = tuple(labelnames)
+
+    def collect(self) -> List[str]:
+        return [f"{self.name}{_format_labels(self.labelnames, key)} {_format_value(value)}"
+                for key, value in sorted(self.callback().items())]
+
+
+class MetricsRegistry:
+    """指标注册表"""
+
+    def __init__(self):
+        self._metrics = []
+        self._lock = threading.Lock()
+
+    def register(self, metric):
+        with self._lock:
+            self._metrics.append(metric)
+        return metric
+
+    def counter(self, name: str, documentation: str, labelnames: Iterable[str] = ()) -> Counter:
+        return self.register(Counter(name, documentation, labelnames))
+
+    def gauge(self, name: str, documentation: str, labelnames: Iterable[str] = ()) -> Gauge:
+        return self.register(Gauge(name, documentation, labelnames))
+
+    def histogram(self, name: str, documentation: str, labelnames: Iterable[str] = (),
+                  buckets: Iterable[float] = DEFAULT_BUCKETS) -> Histogram:
+        return self.register(Histogram(name, documentation, labelnames, buckets))
+
+    def callback_gauge(self, name: str, documentation: str, callback: Callable[[], Dict[tuple, float]],
+                       labelnames: Iterable[str] = ()) -> CallbackGauge:
+        return self.register(CallbackGauge(name, documentation, callback, labelnames))
+
+    def render(self) -> str:
+        """生成 Prometheus 文本格式的指标，单个指标采集失败不影响其他指标"""
+        with self._lock:
+            metrics = list(self._metrics)
+        lines = []
+        for metric in metrics:
+            try:
+                samples = metric.collect()
+            except Exception as e:
+                logging.warning(f"采集指标 {metric.name} 失败: {str(e)}")
+                continue
+            lines.append(f"# HELP {metric.name} {metric.documentation}")
+            lines.append(f"# TYPE {metric.name} {metric.type_name}")
+            lines.extend(samples)
+        return '\n'.join(lines) + '\n'
+
+
+REGISTRY = MetricsRegistry()
+
+# ---------- HTTP ----------
+
+HTTP_REQUEST_DURATION = REGISTRY.histogram(
+    'http_request_duration_seconds', 'HTTP请求耗时（秒）', ('method', 'route', 'status'))
+
+# ---------- 元数据库连接池 ----------
+
+DB_POOL_CHECKOUT_WAIT = REGISTRY.histogram(
+    'db_pool_checkout_wait_seconds', '从元数据库连接池取得连接的等待时间（秒）',
+    buckets=(0.001, 0.005, 0.01, 0.05, 0.1, 0.5, 1.0, 5.0, 30.0))
+DB_POOL_CHECKOUT_TIMEOUTS = REGISTRY.counter(
+    'db_pool_checkout_timeouts_total', '从元数据库连接池取连接超时的次数')
+
+# ---------- 抽取 ----------
+
+EXTRACTION_RUNS = REGISTRY.counter(
+    'extraction_runs_total', '抽取运行次数', ('datasource_id', 'task_type', 'status'))
+EXTRACTION_DURATION = REGISTRY.histogram(
+    'extraction_duration_seconds', '抽取运行耗时（秒）', ('task_type',), buckets=LONG_BUCKETS)
+EXTRACTION_TABLES = REGISTRY.counter(
+    'extraction_tables_total', '已抽取并持久化的表数量', ('datasource_id',))
+EXTRACTION_COLUMNS = REGISTRY.counter(
+    'extraction_columns_total', '已抽取并持久化的列数量', ('datasource_id',))
+EXTRACTION_TABLES_PER_SECOND = REGISTRY.gauge(
+    'extraction_last_run_tables_per_second', '最近一次抽取运行的表吞吐（表/秒）', ('datasource_id',))
+EXTRACTION_COLUMNS_PER_SECOND = REGISTRY.gauge(
+    'extraction_last_run_columns_per_second', '最近一次抽取运行的列吞吐（列/秒）', ('datasource_id',))
+EXTRACTION_IN_FLIGHT = REGISTRY.gauge(
+    'extraction_in_flight', '本进程中正在执行的抽取运行数')
+JOB_LEASE_LAG = REGISTRY.histogram(
+    'extraction_job_lease_lag_seconds', '作业从可执行到被工作进程租用的延迟（秒）', buckets=LONG_BUCKETS)
+
+
+class InstrumentedQueuePool(QueuePool):
+    """记录取连接等待时间的连接池"""
+
+    def _do_get(self):
+        start = time.perf_counter()
+        try:
+            return super()._do_get()
+        except Exception as e:
+            if e.__class__.__name__ == 'TimeoutError':
+                DB_POOL_CHECKOUT_TIMEOUTS.inc()
+            raise
+        finally:
+            DB_POOL_CHECKOUT_WAIT.observe(time.perf_counter() - start)
+
+
+def record_extraction(datasource_id: int, task_type: str, status: str, duration: float,
+                      tables: int, columns: int):
+    """
+    记录一次抽取运行的结果和吞吐
+    :param duration: 运行耗时（秒）
+    :param tables: 本次持久化的表数量
+    :param columns: 本次持久化的列数量
+    """
+    EXTRACTION_RUNS.inc(datasource_id=datasource_id, task_type=task_type, status=status)
+    EXTRACTION_DURATION.observe(duration, task_type=task_type)
+    EXTRACTION_TABLES.inc(tables, datasource_id=datasource_id)
+    EXTRACTION_COLUMNS.inc(columns, datasource_id=datasource_id)
+    if duration > 0:
+        EXTRACTION_TABLES_PER_SECOND.set(round(tables / duration, 3), datasource_id=datasource_id)
+        EXTRACTION_COLUMNS_PER_SECOND.set(round(columns / duration, 3), datasource_id=datasource_id)
+
+
+# ---------- 抓取时计算的指标 ----------
+
+def _pool():
+    import db_manager
+    if db_manager.db_manager is None or db_manager.db_manager.engine is None:
+        return None
+    return db_manager.db_manager.engine.pool
+
+
+def _pool_stat(name: str) -> Callable[[], Dict[tuple, float]]:
+    def callback():
+        pool = _pool()
+        if pool is None or not hasattr(pool, name):
+            return {}
+        return {(): getattr(pool, name)()}
+    return callback
+
+
+REGISTRY.callback_gauge('db_pool_size', '元数据库连接池大小', _pool_stat('size'))
+REGISTRY.callback_gauge('db_pool_checked_out', '元数据库连接池中已借出的连接数', _pool_stat('checkedout'))
+REGISTRY.callback_gauge('db_pool_checked_in', '元数据库连接池中空闲的连接数', _pool_stat('checkedin'))
+REGISTRY.callback_gauge('db_pool_overflow', '元数据库连接池的溢出连接数', _pool_stat('overflow'))
+
+
+def _pool_capacity() -> Dict[tuple, float]:
+    import db_manager
+    if db_manager.db_manager is None:
+        return {}
+    return {(): db_manager.db_manager.capacity}
+
+
+REGISTRY.callback_gauge('db_pool_capacity', '本进程元数据库连接池的容量（pool_size + max_overflow）', _pool_capacity)
+
+
+def _query_metadata_db(query: Callable) -> Optional[Any]:
+    """在元数据库上执行抓取查询，数据库不可用时返回None"""
+    import db_manager
+    if db_manager.db_manager is None:
+        return None
+    try:
+        with db_manager.get_db_session() as session:
+            return query(session)
+    except Exception as e:
+        logging.warning(f"采集指标查询失败: {str(e)}")
+        return None
+
+
+def _job_counts() -> Dict[tuple, float]:
+    from sqlalchemy import func
+    from models import ExtractionJob
+    rows = _query_metadata_db(lambda session: session.query(
+        ExtractionJob.status, func.count(ExtractionJob.id)
+    ).filter(ExtractionJob.status.in_(('queued', 'leased'))).group_by(ExtractionJob.status).all())
+    counts = {('queued',): 0, ('leased',): 0}
+    for status, count in rows or []:
+        counts[(status,)] = count
+    return counts
+
+
+def _scheduler_lag() -> Dict[tuple, float]:
+    from sqlalchemy import func
+    from models import ExtractionJob
+    now = datetime.utcnow()
+    oldest = _query_metadata_db(lambda session: session.query(func.min(ExtractionJob.available_at)).filter(
+        ExtractionJob.status == 'queued', ExtractionJob.available_at <= now
+    ).scalar())
+    return {(): max(0.0, (now - oldest).total_seconds()) if oldest else 0}
+
+
+def _etl_schedule_lag() -> Dict[tuple, float]:
+    from sqlalchemy import func
+    from models import ETLTask
+    now = datetime.utcnow()
+    oldest = _query_metadata_db(lambda session: session.query(func.min(ETLTask.next_run)).filter(
+        ETLTask.status == 'active', ETLTask.schedule_type != 'manual', ETLTask.next_run <= now
+    ).scalar())
+    return {(): max(0.0, (now - oldest).total_seconds()) if oldest else 0}
+
+
+def _last_success_age() -> Dict[tuple, float]:
+    from sqlalchemy import func
+    from models import ExtractionHistory, DataSource
+    now = datetime.utcnow()
+    rows = _query_metadata_db(lambda session: session.query(
+        DataSource.id, DataSource.name, func.max(ExtractionHistory.extraction_time)
+    ).join(ExtractionHistory, ExtractionHistory.datasource_id == DataSource.id).filter(
+        ExtractionHistory.status == 'success'
+    ).group_by(DataSource.id, DataSource.name).all())
+    return {(str(source_id), name): max(0.0, (now - last_success).total_seconds())
+            for source_id, name, last_success in rows or [] if last_success}
+
+
+REGISTRY.callback_gauge('extraction_jobs', '作业队列中各状态的作业数', _job_counts, ('status',))
+REGISTRY.callback_gauge('extraction_scheduler_lag_seconds', '最早一个可执行但未被租用的作业已等待的秒数',
+                        _scheduler_lag)
+REGISTRY.callback_gauge('etl_task_schedule_lag_seconds', '到期未运行的ETL任务中最早的一个已超期的秒数',
+                        _etl_schedule_lag)
+REGISTRY.callback_gauge('extraction_last_success_age_seconds', '各数据源最近一次成功抽取距今的秒数',
+                        _last_success_age, ('datasource_id', 'datasource_name'))
+
+
+# ---------- Flask 挂载 ----------
+
+def instrument_app(app):
+    """
+    记录每个请求的耗时，按路由规则（而非实际URL）聚合，避免路径参数导致标签数量膨胀
+    :param app: Flask应用
+    """
+    from flask import request, g
+
+    @app.before_request
+    def start_request_timer():
+        g._metrics_start = time.perf_counter()
+
+    @app.after_request
+    def record_request_duration(response):
+        start = g.pop('_metrics_start', None)
+        if start is not None:
+            route = request.url_rule.rule if request.url_rule is not None else 'unmatched'
+            HTTP_REQUEST_DURATION.observe(time.perf_counter() - start, method=request.method,
+                                          route=route, status=response.status_code)
+        return response
@@ -1,4 +1,5 @@
-from sqlalchemy import Column, Integer, String, Text, DateTime, BigInteger, ForeignKey, Boolean
+from sqlalchemy import Column, Integer, String, Text, DateTime, BigInteger, Float, ForeignKey, Boolean, Index, LargeBinary, inspect, text
+from sqlalchemy.dialects.mysql import LONGBLOB
 from sqlalchemy.ext.declarative import declarative_base
 from sqlalchemy.orm import relationship
 from datetime import datetime
@@ -20,6 +21,8 @@ class DataSource(Base):
     username = Column(String(255), nullable=False)  # 用户名
     password = Column(String(255), nullable=False)  # 密码
     database = Column(String(255), nullable=False)  # 数据库名
+    throttle_config = Column(Text)  # 限流配置（JSON）：max_qps, max_concurrent, latency_factor, quiet_hours
+    history_retention_days = Column(Integer)  # 抽取历史保留天数，为空时使用 HISTORY_RETENTION_DAYS，0表示永久保留
     created_at = Column(DateTime, default=datetime.utcnow)
     updated_at = Column(DateTime, default=datetime.utcnow)
 
@@ -81,7 +84,8 @@ class TableRelationship(Base):
     referenced_table_id = Column(Integer, ForeignKey('table_metadata.id'), nullable=False)  # 引用表ID
     column_name = Column(String(255), nullable=False)  # 主表字段名
     referenced_column_name = Column(String(255), nullable=False)  # 引用表字段名
-    constraint_type = Column(String(50), nullable=False)  # 约束类型：FOREIGN KEY, PRIMARY KEY等
+    constraint_type = Column(String(50), nullable=False)  # 约束类型：FOREIGN KEY, PRIMARY KEY等，推断的关系为 INFERRED
+    confidence = Column(Float)  # 置信度：声明的约束为1，推断的关系为0~1
     created_at = Column(DateTime, default=datetime.utcnow)
     
     # 关系：定义双向关系
@@ -94,6 +98,9 @@ class ExtractionHistory(Base):
     抽取历史记录表
     """
     __tablename__ = 'extraction_history'
+    __table_args__ = (
+        Index('idx_history_source_time', 'datasource_id', 'extraction_time'),
+    )
 
     id = Column(Integer, primary_key=True, autoincrement=True)
     datasource_id = Column(Integer, ForeignKey('data_sources.id'), nullable=False)
@@ -103,9 +110,62 @@ class ExtractionHistory(Base):
     extracted_tables = Column(Integer)  # 抽取的表数量
     duration = Column(Integer)  # 耗时（秒）
     etl_task_id = Column(Integer, ForeignKey('etl_tasks.id'), nullable=True)  # 关联的ETL任务ID
+    orchestration_run_id = Column(Integer, ForeignKey('orchestration_runs.id'), nullable=True)  # 关联的批量编排运行ID
+    task_type = Column(String(50))  # 任务类型：full, incremental, schema_only
+    total_tables = Column(Integer)  # 本次运行需要抽取的表数量
+    checkpointed_tables = Column(Integer, default=0)  # 已写入检查点的表数量
+    checkpoint_cursor = Column(String(255))  # 最近一个写入检查点的表名
+    resumed_from_id = Column(Integer, ForeignKey('extraction_history.id'), nullable=True)  # 从哪次运行的检查点恢复
+    cancel_requested = Column(Boolean, default=False)  # 是否已请求取消
+    details = Column(Text)  # 运行详情（JSON）：跳过的表、超时的表等
 
     datasource = relationship("DataSource")
     etl_task = relationship("ETLTask", back_populates="extraction_history")
+    orchestration_run = relationship("OrchestrationRun", back_populates="extraction_history")
+
+
+class ExtractionHistoryDaily(Base):
+    """
+    抽取历史按天汇总表
+    超过保留期的抽取历史删除前按 (数据源, 日期, 任务类型, 状态) 累加到这里，概览和长期统计不受清理影响
+    """
+    __tablename__ = 'extraction_history_daily'
+    __table_args__ = (
+        Index('idx_history_daily_key', 'datasource_id', 'day', 'task_type', 'status', unique=True),
+    )
+
+    id = Column(Integer, primary_key=True, autoincrement=True)
+    datasource_id = Column(Integer, ForeignKey('data_sources.id'), nullable=False)
+    day = Column(DateTime, nullable=False)  # 日期（当天零点）
+    task_type = Column(String(50), nullable=False, default='')  # 任务类型，未记录时为空字符串
+    status = Column(String(20), nullable=False)  # 状态
+    runs = Column(Integer, default=0)  # 运行次数
+    extracted_tables = Column(BigInteger, default=0)  # 抽取的表数量合计
+    total_duration = Column(BigInteger, default=0)  # 耗时合计（秒）
+    max_duration = Column(Integer)  # 最长耗时（秒）
+
+
+class OrchestrationRun(Base):
+    """
+    批量抽取编排运行记录表
+    一次编排运行并发抽取多个数据源，每个数据源对应一条ExtractionHistory
+    """
+    __tablename__ = 'orchestration_runs'
+
+    id = Column(Integer, primary_key=True, autoincrement=True)
+    status = Column(String(20), nullable=False)  # 状态：running, success, partial_success, failed
+    message = Column(Text)  # 详细信息
+    total_sources = Column(Integer, default=0)  # 计划抽取的数据源数量
+    success_sources = Column(Integer, default=0)  # 成功的数据源数量
+    failed_sources = Column(Integer, default=0)  # 失败的数据源数量
+    extracted_tables = Column(Integer, default=0)  # 抽取的表总数
+    max_workers = Column(Integer)  # 全局并发上限
+    triggered_by = Column(String(80))  # 触发者
+    started_at = Column(DateTime, default=datetime.utcnow)
+    finished_at = Column(DateTime)
+    duration = Column(Integer)  # 耗时（秒）
+
+    extraction_history = relationship("ExtractionHistory", back_populates="orchestration_run")
 
 
 class ETLTask(Base):
@@ -134,10 +194,237 @@ class ETLTask(Base):
     extraction_history = relationship("ExtractionHistory", back_populates="etl_task")
 
 
+class ExtractionJob(Base):
+    """
+    抽取作业队列表
+    独立的抽取工作进程从此表租用作业执行，支持多主机部署
+    """
+    __tablename__ = 'extraction_jobs'
+
+    id = Column(Integer, primary_key=True, autoincrement=True)
+    datasource_id = Column(Integer, ForeignKey('data_sources.id'), nullable=False, index=True)
+    task_type = Column(String(50), nullable=False, default='full')  # 任务类型：full, incremental, schema_only
+    etl_task_id = Column(Integer, ForeignKey('etl_tasks.id'), nullable=True)  # 关联的ETL任务ID
+    status = Column(String(20), nullable=False, default='queued', index=True)  # 状态：queued, leased, success, partial_success, failed
+    priority = Column(Integer, default=0)  # 优先级，数值越大越优先
+    attempts = Column(Integer, default=0)  # 已尝试次数
+    max_attempts = Column(Integer, default=3)  # 最大尝试次数
+    worker_id = Column(String(255))  # 当前租用作业的工作进程ID
+    lease_expires_at = Column(DateTime, index=True)  # 租约到期时间，超时未续约的作业会被重新排队
+    heartbeat_at = Column(DateTime)  # 最近一次心跳时间
+    available_at = Column(DateTime, default=datetime.utcnow)  # 最早可被租用的时间（用于失败重试退避）
+    enqueued_at = Column(DateTime, default=datetime.utcnow)
+    started_at = Column(DateTime)
+    finished_at = Column(DateTime)
+    history_id = Column(Integer, ForeignKey('extraction_history.id'), nullable=True)  # 关联的抽取历史记录ID
+    error = Column(Text)  # 最近一次错误信息
+    requested_by = Column(String(80))  # 提交者
+
+    datasource = relationship("DataSource")
+
+
+class ExtractionLock(Base):
+    """
+    抽取锁表
+    每个数据源同一时间只允许一个抽取运行，跨进程、跨主机生效；持有者定期续约，过期未续约的锁可被其他进程接管
+    """
+    __tablename__ = 'extraction_locks'
+
+    datasource_id = Column(Integer, ForeignKey('data_sources.id'), primary_key=True, autoincrement=False)
+    owner = Column(String(255), nullable=False)  # 持有者：主机名:进程号:随机后缀
+    task_type = Column(String(50))  # 持有锁的运行的任务类型
+    history_id = Column(Integer, ForeignKey('extraction_history.id'), nullable=True)  # 持有锁的抽取历史记录ID
+    acquired_at = Column(DateTime, default=datetime.utcnow)  # 获得锁的时间
+    heartbeat_at = Column(DateTime)  # 最近一次续约时间
+    expires_at = Column(DateTime, nullable=False)  # 锁到期时间，过期未续约的锁可被接管
+
+
+class ExtractionCheckpoint(Base):
+    """
+    抽取检查点表
+    抽取过程中每完成一批表就写入检查点，失败或取消的运行可以从检查点恢复
+    """
+    __tablename__ = 'extraction_checkpoints'
+
+    id = Column(Integer, primary_key=True, autoincrement=True)
+    history_id = Column(Integer, ForeignKey('extraction_history.id'), nullable=False, index=True)
+    datasource_id = Column(Integer, ForeignKey('data_sources.id'), nullable=False)
+    schema_name = Column(String(255))  # 模式名
+    table_name = Column(String(255), nullable=False)  # 已完成的表名
+    batch_no = Column(Integer, nullable=False)  # 批次号
+    created_at = Column(DateTime, default=datetime.utcnow)
+
+
+class ExtractionProfile(Base):
+    """
+    抽取剖析表
+    每次抽取运行一条，记录按阶段、语句指纹汇总的查询耗时、返回行数和错误
+    """
+    __tablename__ = 'extraction_profiles'
+
+    id = Column(Integer, primary_key=True, autoincrement=True)
+    history_id = Column(Integer, ForeignKey('extraction_history.id'), nullable=False, unique=True)
+    datasource_id = Column(Integer, ForeignKey('data_sources.id'), nullable=False)
+    total_ms = Column(Float)  # 运行总耗时（毫秒）
+    statement_count = Column(Integer, default=0)  # 执行的语句数
+    error_count = Column(Integer, default=0)  # 出错的语句数
+    rows_fetched = Column(BigInteger, default=0)  # 返回的行数
+    profile = Column(Text)  # 剖析结果JSON：阶段、语句指纹、最慢的表
+    created_at = Column(DateTime, default=datetime.utcnow)
+
+
+class TableExtractionStat(Base):
+    """
+    表抽取统计表
+    每次运行每个表一条，记录耗时、语句数、行数、大小和状态，用于热点分析和运行耗时预测
+    """
+    __tablename__ = 'table_extraction_stats'
+    __table_args__ = (
+        Index('idx_table_stats_source_table', 'datasource_id', 'table_name'),
+    )
+
+    id = Column(Integer, primary_key=True, autoincrement=True)
+    history_id = Column(Integer, ForeignKey('extraction_history.id'), nullable=False, index=True)
+    datasource_id = Column(Integer, ForeignKey('data_sources.id'), nullable=False)
+    table_name = Column(String(255), nullable=False)
+    status = Column(String(20), nullable=False)  # 状态：success, failed, timeout
+    duration_ms = Column(Float)  # 抽取耗时（毫秒，包含重试）
+    query_count = Column(Integer, default=0)  # 执行的语句数
+    row_count = Column(BigInteger)  # 行数
+    size_bytes = Column(BigInteger)  # 数据大小（字节）
+    error = Column(String(1000))  # 错误信息（截断）
+    created_at = Column(DateTime, default=datetime.utcnow, index=True)
+
+
+class TableSizeSample(Base):
+    """
+    表容量采样表
+    按粒度分层存储表的行数和大小：raw 为每次抽取的采样（只在数值变化时写入），
+    day/week/month 为按天、周、月汇总的最后一次取值，各层按不同的保留期清理
+    """
+    __tablename__ = 'table_size_samples'
+    __table_args__ = (
+        Index('idx_size_samples_key', 'datasource_id', 'table_name', 'granularity', 'bucket_start', unique=True),
+        Index('idx_size_samples_tier', 'granularity', 'bucket_start'),
+    )
+
+    id = Column(Integer, primary_key=True, autoincrement=True)
+    datasource_id = Column(Integer, ForeignKey('data_sources.id'), nullable=False)
+    table_name = Column(String(255), nullable=False)
+    granularity = Column(String(10), nullable=False)  # 粒度：raw, day, week, month
+    bucket_start = Column(DateTime, nullable=False)  # 采样时间（raw）或汇总区间的起始时间
+    row_count = Column(BigInteger)  # 行数（汇总层为区间内最后一次采样的值）
+    size_bytes = Column(BigInteger)  # 数据大小（字节）
+    samples = Column(Integer, default=1)  # 汇总的采样次数
+
+
+class SchemaVersion(Base):
+    """
+    表结构版本表
+    每个数据源的结构发生变化时记录一个版本，只保存相对上一版本的增量（新增、删除、修改的表和字段），
+    每隔 SCHEMA_CHECKPOINT_INTERVAL 个版本保存一次完整快照，按时间点重建结构时从最近的快照开始应用增量
+    """
+    __tablename__ = 'schema_versions'
+    __table_args__ = (
+        Index('idx_schema_versions_source_version', 'datasource_id', 'version', unique=True),
+    )
+
+    id = Column(Integer, primary_key=True, autoincrement=True)
+    datasource_id = Column(Integer, ForeignKey('data_sources.id'), nullable=False)
+    version = Column(Integer, nullable=False)  # 数据源内递增的版本号
+    history_id = Column(Integer, ForeignKey('extraction_history.id'))  # 产生该版本的抽取历史ID
+    is_checkpoint = Column(Boolean, default=False)  # 是否为完整快照
+    payload = Column(LargeBinary().with_variant(LONGBLOB(), 'mysql'), nullable=False)  # zlib压缩的JSON：完整快照或增量
+    tables_count = Column(Integer, default=0)  # 该版本的表数量
+    tables_added = Column(Integer, default=0)  # 新增的表数量
+    tables_removed = Column(Integer, default=0)  # 删除的表数量
+    tables_altered = Column(Integer, default=0)  # 修改的表数量
+    created_at = Column(DateTime, default=datetime.utcnow, index=True)
+
+
+class ColumnProfile(Base):
+    """
+    字段画像表
+    基于采样数据的字段统计：空值率、不同值数（HyperLogLog）、最值、分位数（KLL）、高频值（Misra-Gries），
+    草图随画像一起保存，后续采样与近期的画像合并
+    """
+    __tablename__ = 'column_profiles'
+    __table_args__ = (
+        Index('idx_column_profiles_key', 'datasource_id', 'table_name', 'column_name', unique=True),
+    )
+
+    id = Column(Integer, primary_key=True, autoincrement=True)
+    datasource_id = Column(Integer, ForeignKey('data_sources.id'), nullable=False)
+    table_name = Column(String(255), nullable=False)
+    column_name = Column(String(255), nullable=False)
+    data_type = Column(String(100))  # 画像时的字段类型，类型变化后不再合并旧草图
+    sample_method = Column(String(20))  # 抽样方式：tablesample, sample, limit
+    sampled_rows = Column(BigInteger, default=0)  # 累计采样行数
+    null_count = Column(BigInteger, default=0)  # 采样中的空值数
+    distinct_count = Column(BigInteger)  # 采样中不同值数的估算
+    min_value = Column(String(255))  # 最小值
+    max_value = Column(String(255))  # 最大值
+    quantiles = Column(Text)  # 数值字段的分位数（JSON）
+    top_values = Column(Text)  # 高频值及估算频次（JSON）
+    sketch = Column(LargeBinary().with_variant(LONGBLOB(), 'mysql'))  # zlib压缩的JSON：可合并的草图
+    samples = Column(Integer, default=1)  # 合并的采样次数
+    cost_seconds = Column(Float)  # 最近一次采样该表的耗时（秒）
+    profiled_at = Column(DateTime, default=datetime.utcnow)  # 最近一次画像时间
+
+
+# 在已有表上追加的字段：(表名, 字段名, 字段DDL类型)
+# create_all 不会修改已存在的表，这里的字段在初始化时按需补齐
+ADDED_COLUMNS = [
+    ('data_sources', 'throttle_config', 'TEXT'),
+    ('table_relationships', 'confidence', 'FLOAT'),
+    ('extraction_history', 'orchestration_run_id', 'INTEGER'),
+    ('extraction_history', 'task_type', 'VARCHAR(50)'),
+    ('extraction_history', 'total_tables', 'INTEGER'),
+    ('extraction_history', 'checkpointed_tables', 'INTEGER DEFAULT 0'),
+    ('extraction_history', 'checkpoint_cursor', 'VARCHAR(255)'),
+    ('extraction_history', 'resumed_from_id', 'INTEGER'),
+    ('extraction_history', 'cancel_requested', 'BOOLEAN DEFAULT FALSE'),
+    ('extraction_history', 'details', 'TEXT'),
+    ('data_sources', 'history_retention_days', 'INTEGER'),
+]
+
+# 在已有表上追加的索引：(表名, 索引名, 字段)
+ADDED_INDEXES = [
+    ('extraction_history', 'idx_history_source_time', ('datasource_id', 'extraction_time')),
+]
+
+
+def migrate_added_columns(engine):
+    """为已存在的表补齐新增字段"""
+    inspector = inspect(engine)
+    existing_tables = set(inspector.get_table_names())
+    with engine.begin() as conn:
+        for table_name, column_name, column_type in ADDED_COLUMNS:
+            if table_name not in existing_tables:
+                continue
+            columns = {col['name'] for col in inspector.get_columns(table_name)}
+            if column_name not in columns:
+                conn.execute(text(f"ALTER TABLE {table_name} ADD COLUMN {column_name} {column_type}"))
+
+
+def migrate_added_indexes(engine):
+    """为已存在的表补齐新增索引"""
+    inspector = inspect(engine)
+    existing_tables = set(inspector.get_table_names())
+    with engine.begin() as conn:
+        for table_name, index_name, columns in ADDED_INDEXES:
+            if table_name not in existing_tables:
+                continue
+            if index_name not in {index['name'] for index in inspector.get_indexes(table_name)}:
+                conn.execute(text(f"CREATE INDEX {index_name} ON {table_name} ({', '.join(columns)})"))
+
+
 def init_database():
     """初始化数据库表"""
     from db_manager import db_manager
     if db_manager is None:
         raise Exception("数据库管理器未初始化")
     Base.metadata.create_all(bind=db_manager.engine)
+    migrate_added_columns(db_manager.engine)
+    migrate_added_indexes(db_manager.engine)
     return db_manager.engine
\ No newline at end of file
@@ -0,0 +1,261 @@
+"""
+抽取查询剖析
+
+剖析器挂在源库引擎的 before/after_cursor_execute 事件上，记录一次抽取运行中每条目录查询的耗时、
+返回行数和错误，按阶段（表列表、表信息、列信息、行数统计、关联关系等）和语句指纹汇总：
+1. 阶段由抽取器通过 phase() 标记，使用 contextvars 跟踪，线程池和协程并发抽取时互不干扰
+2. 语句按指纹归并（字面量、带引号的标识符替换为 ?），同一目录查询对不同表的执行合并为一条
+3. 运行结束后生成紧凑的剖析结果，持久化到 extraction_profiles 表，供历史页面的火焰图展示
+4. 同时按表记录耗时、语句数、行数、大小和状态，写入 table_extraction_stats 表（见 extraction_stats）
+"""
+import contextvars
+import re
+import threading
+import time
+from contextlib import contextmanager
+from typing import Dict, Any, List, Optional
+
+from sqlalchemy import event
+
+
+# 剖析结果中保留的语句指纹数量（按总耗时排序）以及耗时最长的表数量
+MAX_PROFILE_STATEMENTS = 50
+MAX_PROFILE_TABLES = 20
+# 单次运行最多跟踪的语句指纹数，超出的语句归入 OTHER_STATEMENT
+MAX_FINGERPRINTS = 500
+OTHER_STATEMENT = '<其他语句>'
+# 语句指纹的最大长度
+FINGERPRINT_MAX_LENGTH = 300
+# 未标记阶段时语句所属的阶段
+DEFAULT_PHASE = 'other'
+
+# 阶段的显示名称
+PHASE_LABELS = {
+    'connect': '建立连接',
+    'table_list': '获取表列表',
+    'change_check': '变更检查',
+    'table_metadata': '表信息',
+    'columns': '列信息',
+    'row_count': '行数统计',
+    'table_size': '表大小',
+    'relationships': '关联关系',
+    'checkpoint': '写入检查点',
+    DEFAULT_PHASE: '其他',
+}
+
+_FINGERPRINT_PATTERNS = [
+    (re.compile(r"'(?:[^']|'')*'"), '?'),                 # 字符串字面量
+    (re.compile(r'"[^"]*"|`[^`]*`|\[[^\]]*\]'), '?'),     # 带引号的标识符（表名常直接拼入SQL）
+    (re.compile(r'\b\d+(?:\.\d+)?\b'), '?'),              # 数字字面量
+    (re.compile(r'\s+'), ' '),
+]
+
+_current_phase: contextvars.ContextVar = contextvars.ContextVar('extraction_profile_phase', default=DEFAULT_PHASE)
+_current_table: contextvars.ContextVar = contextvars.ContextVar('extraction_profile_table', default=None)
+
+
+def fingerprint(statement: str) -> str:
+    """
+    生成语句指纹，同一目录查询对不同表的执行归并为同一指纹
+    :param statement: SQL语句
+    :return: 指纹
+    """
+    for pattern, replacement in _FINGERPRINT_PATTERNS:
+        statement = pattern.sub(replacement, statement)
+    statement = statement.strip()
+    if len(statement) > FINGERPRINT_MAX_LENGTH:
+        statement = statement[:FINGERPRINT_MAX_LENGTH] + '...'
+    return statement
+
+
+def _new_stats() -> Dict[str, Any]:
+    return {'count': 0, 'total': 0.0, 'max': 0.0, 'rows': 0, 'errors': 0}
+
+
+def _round_stats(stats: Dict[str, Any]) -> Dict[str, Any]:
+    return {
+        'count': stats['count'],
+        'total_ms': round(stats['total'] * 1000, 2),
+        'avg_ms': round(stats['total'] * 1000 / stats['count'], 2) if stats['count'] else 0,
+        'max_ms': round(stats['max'] * 1000, 2),
+        'rows': stats['rows'],
+        'errors': stats['errors'],
+    }
+
+
+class QueryProfiler:
+    """
+    单次抽取运行的查询剖析器
+    """
+
+    def __init__(self):
+        self.started_at = time.monotonic()
+        self._lock = threading.Lock()
+        # 阶段墙钟耗时（包含语句执行之外的处理时间）
+        self._phase_wall: Dict[str, Dict[str, Any]] = {}
+        # 阶段内语句的执行统计
+        self._phase_statements: Dict[str, Dict[str, Any]] = {}
+        # (阶段, 指纹) -> 语句统计
+        self._statements: Dict[tuple, Dict[str, Any]] = {}
+        self._tables: Dict[str, float] = {}
+        # 表名 -> 该表执行的语句数 / 该表的抽取结果
+        self._table_queries: Dict[str, int] = {}
+        self._table_records: Dict[str, Dict[str, Any]] = {}
+
+    @contextmanager
+    def phase(self, name: str):
+        """
+        标记一个抽取阶段，期间执行的语句计入该阶段；嵌套时内层阶段优先
+        :param name: 阶段名称，见 PHASE_LABELS
+        """
+        token = _current_phase.set(name)
+        start = time.monotonic()
+        failed = False
+        try:
+            yield
+        except Exception:
+            failed = True
+            raise
+        finally:
+            elapsed = time.monotonic() - start
+            _current_phase.reset(token)
+            with self._lock:
+                stats = self._phase_wall.setdefault(name, _new_stats())
+                stats['count'] += 1
+                stats['total'] += elapsed
+                stats['max'] = max(stats['max'], elapsed)
+                if failed:
+                    stats['errors'] += 1
+
+    @contextmanager
+    def table(self, table_name: str):
+        """标记当前抽取的表，期间执行的语句计入该表的语句数"""
+        token = _current_table.set(table_name)
+        try:
+            yield
+        finally:
+            _current_table.reset(token)
+
+    def record_table(self, table_name: str, seconds: float, status: str = 'success',
+                     row_count: Optional[int] = None, size_bytes: Optional[int] = None,
+                     error: Optional[str] = None):
+        """
+        记录单个表的抽取结果
+        :param seconds: 抽取耗时（包含重试）
+        :param status: success, failed, timeout
+        :param error: 失败时的错误信息
+        """
+        with self._lock:
+            self._tables[table_name] = self._tables.get(table_name, 0.0) + seconds
+            self._table_records[table_name] = {
+                'table_name': table_name,
+                'status': status,
+                'duration_ms': round(seconds * 1000, 2),
+                'row_count': row_count,
+                'size_bytes': size_bytes,
+                'error': error,
+            }
+
+    def table_records(self) -> List[Dict[str, Any]]:
+        """各表的抽取结果，附带该表执行的语句数"""
+        with self._lock:
+            return [dict(record, query_count=self._table_queries.get(name, 0))
+                    for name, record in self._table_records.items()]
+
+    def record_statement(self, statement: str, seconds: Optional[float], rows: int = 0, error: bool = False):
+        """
+        记录一条语句的执行结果
+        :param statement: SQL语句
+        :param seconds: 执行耗时，出错时可为None
+        :param rows: 返回或影响的行数
+        :param error: 是否执行出错
+        """
+        phase = _current_phase.get()
+        table_name = _current_table.get()
+        key_fingerprint = fingerprint(statement)
+        with self._lock:
+            if table_name is not None:
+                self._table_queries[table_name] = self._table_queries.get(table_name, 0) + 1
+            key = (phase, key_fingerprint)
+            if key not in self._statements and len(self._statements) >= MAX_FINGERPRINTS:
+                key = (phase, OTHER_STATEMENT)
+            for stats in (self._statements.setdefault(key, _new_stats()),
+                          self._phase_statements.setdefault(phase, _new_stats())):
+                stats['count'] += 1
+                stats['rows'] += rows
+                if seconds is not None:
+                    stats['total'] += seconds
+                    stats['max'] = max(stats['max'], seconds)
+                if error:
+                    stats['errors'] += 1
+
+    # ---------- 引擎挂载 ----------
+
+    def instrument(self, engine):
+        """
+        在源库引擎上注册语句事件
+        :param engine: 同步引擎（异步引擎传入 engine.sync_engine）
+        """
+        @event.listens_for(engine, 'before_cursor_execute')
+        def before_cursor_execute(conn, cursor, statement, parameters, context, executemany):
+            if context is not None:
+                context._profile_start = time.monotonic()
+
+        @event.listens_for(engine, 'after_cursor_execute')
+        def after_cursor_execute(conn, cursor, statement, parameters, context, executemany):
+            start = getattr(context, '_profile_start', None)
+            # 多数驱动在缓冲结果集后 rowcount 即为返回行数，不支持时为 -1
+            rows = getattr(cursor, 'rowcount', -1)
+            self.record_statement(statement, time.monotonic() - start if start is not None else None,
+                                  rows=rows if rows and rows > 0 else 0)
+
+        @event.listens_for(engine, 'handle_error')
+        def handle_error(exception_context):
+            context = exception_context.execution_context
+            start = getattr(context, '_profile_start', None)
+            self.record_statement(exception_context.statement or '',
+                                  time.monotonic() - start if start is not None else None, error=True)
+
+    # ---------- 结果 ----------
+
+    def profile(self) -> Dict[str, Any]:
+        """
+        生成紧凑的剖析结果
+        :return: {total_ms, statement_count, error_count, rows_fetched, phases, statements, slowest_tables}
+        """
+        with self._lock:
+            phase_names = set(self._phase_wall) | set(self._phase_statements)
+            phases = []
+            for name in phase_names:
+                wall = self._phase_wall.get(name)
+                executed = _round_stats(self._phase_statements.get(name, _new_stats()))
+                phases.append({
+                    'phase': name,
+                    'label': PHASE_LABELS.get(name, name),
+                    # 未标记阶段的语句没有墙钟耗时，以语句耗时代替
+                    'wall_ms': round(wall['total'] * 1000, 2) if wall else executed['total_ms'],
+                    'calls': wall['count'] if wall else 0,
+                    'failed_calls': wall['errors'] if wall else 0,
+                    'statements': executed,
+                })
+            phases.sort(key=lambda item: item['wall_ms'], reverse=True)
+
+            statements = [
+                dict(_round_stats(stats), phase=phase, fingerprint=statement)
+                for (phase, statement), stats in self._statements.items()
+            ]
+            statements.sort(key=lambda item: item['total_ms'], reverse=True)
+
+            tables = sorted(self._tables.items(), key=lambda item: item[1], reverse=True)[:MAX_PROFILE_TABLES]
+
+            return {
+                'total_ms': round((time.monotonic() - self.started_at) * 1000, 2),
+                'statement_count': sum(stats['count'] for stats in self._phase_statements.values()),
+                'error_count': sum(stats['errors'] for stats in self._phase_statements.values()),
+                'rows_fetched': sum(stats['rows'] for stats in self._phase_statements.values()),
+                'phases': phases,
+                'statements': statements[:MAX_PROFILE_STATEMENTS],
+                'statements_truncated': max(0, len(statements) - MAX_PROFILE_STATEMENTS),
+                'slowest_tables': [{'table_name': name, 'duration_ms': round(seconds * 1000, 2)}
+                                   for name, seconds in tables],
+            }
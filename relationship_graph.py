@@ -0,0 +1,273 @@
+"""
+表关联关系图索引
+
+按数据源在内存中构建 table_relationships 的邻接索引，回答多跳问题：
+1. 两个表之间最短的关联路径（双向BFS，关联可以沿外键的任一方向走）
+2. 一个表的影响范围：传递引用它的所有表（upstream），或它传递依赖的所有表（downstream）
+
+索引按数据源缓存（LRU，最多 RELATIONSHIP_GRAPH_CACHE_SOURCES 个），以数据源最近一次成功抽取的历史ID为版本，
+抽取完成后（包括其他进程中的抽取）下一次查询时发现版本变化即重建；每个索引另有查询结果的LRU缓存
+"""
+import threading
+from collections import OrderedDict, deque
+from typing import Dict, Any, List, Optional, Tuple
+
+from config import Config
+from models import TableMetadata, TableRelationship, ExtractionHistory
+from db_manager import get_db_session
+from exceptions import ValidationException
+
+
+# 每个索引缓存的查询结果数
+QUERY_CACHE_SIZE = 256
+# 影响分析默认返回的表数量上限
+DEFAULT_IMPACT_LIMIT = 1000
+IMPACT_DIRECTIONS = ('upstream', 'downstream')
+
+
+class RelationshipGraph:
+    """
+    单个数据源的关联关系图，构建后只读
+    """
+
+    def __init__(self, datasource_id: int, version: Optional[int], tables: Dict[int, str], edges: List[tuple]):
+        """
+        :param tables: {表ID: 表名}
+        :param edges: [(表ID, 字段名, 引用表ID, 引用字段名, 约束名, 约束类型, 置信度)]
+        """
+        self.datasource_id = datasource_id
+        self.version = version
+        self.tables = tables
+        self.edges = edges
+        # 表ID -> [(相邻表ID, 边序号)]
+        self.outgoing: Dict[int, List[Tuple[int, int]]] = {}
+        self.incoming: Dict[int, List[Tuple[int, int]]] = {}
+        for index, (table_id, _, referenced_id, *_) in enumerate(edges):
+            self.outgoing.setdefault(table_id, []).append((referenced_id, index))
+            self.incoming.setdefault(referenced_id, []).append((table_id, index))
+        self._cache: OrderedDict = OrderedDict()
+        self._cache_lock = threading.Lock()
+
+    def _cached(self, key: tuple, compute):
+        with self._cache_lock:
+            if key in self._cache:
+                self._cache.move_to_end(key)
+                return self._cache[key]
+        result = compute()
+        with self._cache_lock:
+            self._cache[key] = result
+            while len(self._cache) > QUERY_CACHE_SIZE:
+                self._cache.popitem(last=False)
+        return result
+
+    def _neighbors(self, table_id: int):
+        for neighbor, index in self.outgoing.get(table_id, ()):
+            yield neighbor, index, 'forward'
+        for neighbor, index in self.incoming.get(table_id, ()):
+            yield neighbor, index, 'reverse'
+
+    def _hop(self, from_id: int, to_id: int, index: int, direction: str) -> Dict[str, Any]:
+        table_id, column, referenced_id, referenced_column, constraint_name, constraint_type, confidence = self.edges[index]
+        from_column, to_column = (column, referenced_column) if direction == 'forward' else (referenced_column, column)
+        return {
+            'from_table_id': from_id, 'from_table': self.tables.get(from_id),
+            'from_column': from_column,
+            'to_table_id': to_id, 'to_table': self.tables.get(to_id),
+            'to_column': to_column,
+            'constraint_name': constraint_name, 'constraint_type': constraint_type,
+            'confidence': confidence,
+            'direction': direction
+        }
+
+    def shortest_path(self, source_id: int, target_id: int, max_depth: int) -> Optional[List[Dict[str, Any]]]:
+        """
+        两个表之间最短的关联路径
+        :param max_depth: 最多经过的关联数
+        :return: 路径上的各跳，起点终点相同时为空列表，不可达时返回None
+        """
+        return self._cached(('path', source_id, target_id, max_depth),
+                            lambda: self._shortest_path(source_id, target_id, max_depth))
+
+    def _shortest_path(self, source_id: int, target_id: int, max_depth: int):
+        if source_id == target_id:
+            return []
+        # 双向BFS：每次扩展较小一侧的一整层，记录到达各表的前驱 (上一个表, 边序号, 方向) 和距离
+        parents = [{source_id: None}, {target_id: None}]
+        distances = [{source_id: 0}, {target_id: 0}]
+        frontiers = [[source_id], [target_id]]
+        depth = 0
+        meet = None
+        while frontiers[0] and frontiers[1] and depth < max_depth and meet is None:
+            side = 0 if len(frontiers[0]) <= len(frontiers[1]) else 1
+            seen, other = parents[side], distances[1 - side]
+            next_frontier = []
+            for table_id in frontiers[side]:
+                for neighbor, index, direction in self._neighbors(table_id):
+                    if neighbor in seen:
+                        continue
+                    seen[neighbor] = (table_id, index, direction)
+                    distances[side][neighbor] = distances[side][table_id] + 1
+                    next_frontier.append(neighbor)
+                    # 本层新到达的表距离相同，取对侧距离最小的相遇点才是最短路径
+                    if neighbor in other and (meet is None or other[neighbor] < other[meet]):
+                        meet = neighbor
+            frontiers[side] = next_frontier
+            depth += 1
+        if meet is None:
+            return None
+
+        # 起点一侧从相遇点回溯到起点，终点一侧从相遇点走到终点
+        hops = []
+        node = meet
+        while parents[0][node] is not None:
+            previous, index, direction = parents[0][node]
+            hops.append(self._hop(previous, node, index, direction))
+            node = previous
+        hops.reverse()
+        node = meet
+        while parents[1][node] is not None:
+            following, index, direction = parents[1][node]
+            hops.append(self._hop(node, following, index, 'reverse' if direction == 'forward' else 'forward'))
+            node = following
+        return hops
+
+    def impact(self, table_id: int, direction: str, max_depth: int, limit: int) -> Dict[str, Any]:
+        """
+        传递闭包：upstream 为直接或间接引用该表的所有表，downstream 为该表直接或间接引用的所有表
+        :return: {tables: [{table_id, table_name, depth, via_table_id}], truncated}，按深度排序
+        """
+        return self._cached(('impact', table_id, direction, max_depth, limit),
+                            lambda: self._impact(table_id, direction, max_depth, limit))
+
+    def _impact(self, table_id: int, direction: str, max_depth: int, limit: int):
+        adjacency = self.incoming if direction == 'upstream' else self.outgoing
+        visited = {table_id}
+        queue = deque([(table_id, 0)])
+        result = []
+        truncated = False
+        while queue:
+            current, depth = queue.popleft()
+            if depth >= max_depth:
+                continue
+            for neighbor, _ in adjacency.get(current, ()):
+                if neighbor in visited:
+                    continue
+                visited.add(neighbor)
+                if len(result) >= limit:
+                    truncated = True
+                    break
+                result.append({'table_id': neighbor, 'table_name': self.tables.get(neighbor),
+                               'depth': depth + 1, 'via_table_id': current})
+                queue.append((neighbor, depth + 1))
+            if truncated:
+                break
+        return {'tables': result, 'truncated': truncated}
+
+    def stats(self) -> Dict[str, Any]:
+        return {'datasource_id': self.datasource_id, 'version': self.version,
+                'tables': len(self.tables), 'relationships': len(self.edges)}
+
+
+_graphs: OrderedDict = OrderedDict()
+_graphs_lock = threading.Lock()
+_build_locks: Dict[int, threading.Lock] = {}
+
+
+def _graph_version(session, datasource_id: int) -> Optional[int]:
+    """数据源最近一次成功抽取的历史ID，作为关联关系图的版本"""
+    return session.query(ExtractionHistory.id).filter(
+        ExtractionHistory.datasource_id == datasource_id,
+        ExtractionHistory.status == 'success'
+    ).order_by(ExtractionHistory.id.desc()).limit(1).scalar()
+
+
+def build_graph(session, datasource_id: int, version: Optional[int] = None) -> RelationshipGraph:
+    """从元数据表构建数据源的关联关系图"""
+    tables = dict(session.query(TableMetadata.id, TableMetadata.table_name).filter(
+        TableMetadata.datasource_id == datasource_id
+    ).all())
+    edges = session.query(
+        TableRelationship.table_id, TableRelationship.column_name,
+        TableRelationship.referenced_table_id, TableRelationship.referenced_column_name,
+        TableRelationship.constraint_name, TableRelationship.constraint_type, TableRelationship.confidence
+    ).join(TableMetadata, TableMetadata.id == TableRelationship.table_id).filter(
+        TableMetadata.datasource_id == datasource_id
+    ).all()
+    return RelationshipGraph(datasource_id, version, tables, [tuple(edge) for edge in edges])
+
+
+def get_graph(datasource_id: int) -> RelationshipGraph:
+    """
+    获取数据源的关联关系图，版本变化时重建；同一数据源同时只有一个线程在构建
+    :param datasource_id: 数据源ID
+    """
+    with get_db_session() as session:
+        version = _graph_version(session, datasource_id)
+    with _graphs_lock:
+        graph = _graphs.get(datasource_id)
+        if graph is not None and graph.version == version:
+            _graphs.move_to_end(datasource_id)
+            return graph
+        build_lock = _build_locks.setdefault(datasource_id, threading.Lock())
+
+    with build_lock:
+        with _graphs_lock:
+            graph = _graphs.get(datasource_id)
+        if graph is None or graph.version != version:
+            with get_db_session() as session:
+                graph = build_graph(session, datasource_id, version)
+            with _graphs_lock:
+                _graphs[datasource_id] = graph
+                _graphs.move_to_end(datasource_id)
+                while len(_graphs) > Config.RELATIONSHIP_GRAPH_CACHE_SOURCES:
+                    _graphs.popitem(last=False)
+    return graph
+
+
+def invalidate_graph(datasource_id: int):
+    """丢弃数据源的关联关系图，下一次查询时重建"""
+    with _graphs_lock:
+        _graphs.pop(datasource_id, None)
+
+
+def _table_source(table_id: int) -> int:
+    with get_db_session() as session:
+        datasource_id = session.query(TableMetadata.datasource_id).filter(TableMetadata.id == table_id).scalar()
+    if datasource_id is None:
+        raise ValidationException(f"表不存在: {table_id}")
+    return datasource_id
+
+
+def _check_depth(max_depth: Optional[int]) -> int:
+    if max_depth is None:
+        return Config.RELATIONSHIP_GRAPH_MAX_DEPTH
+    if max_depth < 1 or max_depth > Config.RELATIONSHIP_GRAPH_MAX_DEPTH:
+        raise ValidationException(f"深度必须在 1 到 {Config.RELATIONSHIP_GRAPH_MAX_DEPTH} 之间")
+    return max_depth
+
+
+def find_join_path(table_id: int, target_table_id: int, max_depth: Optional[int] = None) -> Dict[str, Any]:
+    """
+    查询两个表之间最短的关联路径
+    :return: {found, length, path}
+    """
+    max_depth = _check_depth(max_depth)
+    datasource_id = _table_source(table_id)
+    if _table_source(target_table_id) != datasource_id:
+        raise ValidationException("两个表不属于同一个数据源")
+    path = get_graph(datasource_id).shortest_path(table_id, target_table_id, max_depth)
+    return {'found': path is not None, 'length': len(path) if path is not None else None, 'path': path or []}
+
+
+def find_impact(table_id: int, direction: str = 'upstream', max_depth: Optional[int] = None,
+                limit: int = DEFAULT_IMPACT_LIMIT) -> Dict[str, Any]:
+    """
+    查询表的影响范围
+    :param direction: upstream（引用该表的表）或 downstream（该表引用的表）
+    """
+    if direction not in IMPACT_DIRECTIONS:
+        raise ValidationException(f"不支持的方向: {direction}")
+    max_depth = _check_depth(max_depth)
+    graph = get_graph(_table_source(table_id))
+    return dict(graph.impact(table_id, direction, max_depth, limit), table_id=table_id,
+                table_name=graph.tables.get(table_id), direction=direction, max_depth=max_depth)
@@ -0,0 +1,250 @@
+"""
+关联关系推断
+
+多数 MySQL、StarRocks 数据源没有声明外键，按命名规则从已抽取的元数据中推断关联关系：
+1. 候选：名为 xxx_id / xxxId 的字段指向表 xxx（兼容复数形式和 t_、dim_ 等常见表名前缀）的 id 或同名字段，
+   表名和字段名都先建立规范化索引，每个字段只做常数次查找，不做两两比较
+2. 打分：命名匹配方式、目标字段、两侧类型的兼容性（见 schema_diff）共同决定置信度，类型不兼容的候选直接丢弃
+3. 可选抽样校验：从源库抽取子表字段的若干不同值，检查在父表中的包含率，包含率过低的候选丢弃
+
+推断的关系以 constraint_type='INFERRED' 和置信度与声明的外键一起保存在 table_relationships 中，
+每次推断先删除该数据源旧的推断关系；已声明外键的字段不再推断
+"""
+import logging
+import re
+from typing import Dict, Any, List, Optional
+
+from sqlalchemy import select, insert, table as sql_table, column as sql_column
+
+from config import Config
+from models import TableMetadata, ColumnMetadata, TableRelationship
+from schema_diff import normalize_type, classify_type_change
+from extractor_base import get_extractor_class
+from exceptions import ValidationException
+
+
+INFERRED_CONSTRAINT_TYPE = 'INFERRED'
+# 常见的数仓分层、表名前缀
+TABLE_PREFIXES = ('t_', 'tb_', 'tbl_', 'dim_', 'dwd_', 'dws_', 'ods_', 'ads_', 'fact_', 'fct_')
+# 置信度各项的分值
+BASE_SCORE = 0.4
+EXACT_NAME_SCORE = 0.2
+PREFIXED_NAME_SCORE = 0.1
+TARGET_COLUMN_SCORE = 0.1
+TYPE_EQUIVALENT_SCORE = 0.2
+TYPE_COMPATIBLE_SCORE = 0.1
+AMBIGUITY_PENALTY = 0.1
+# 抽样包含率低于该值的候选丢弃
+MIN_CONTAINMENT = 0.5
+# 抽样校验中包含率占最终置信度的权重
+CONTAINMENT_WEIGHT = 0.4
+# 单次推断最多抽样校验的候选数，避免对源库发出过多查询
+MAX_SAMPLED_CANDIDATES = 500
+
+_ID_COLUMN_PATTERN = re.compile(r'^(.+?)_?id$', re.IGNORECASE)
+_CAMEL_ID_PATTERN = re.compile(r'^(.+[a-z0-9])Id$')
+
+
+def _singular(name: str) -> str:
+    if name.endswith('ies') and len(name) > 4:
+        return name[:-3] + 'y'
+    if name.endswith(('ses', 'xes', 'ches', 'shes')) and len(name) > 4:
+        return name[:-2]
+    if name.endswith('s') and not name.endswith('ss') and len(name) > 2:
+        return name[:-1]
+    return name
+
+
+def table_keys(table_name: str) -> List[tuple]:
+    """
+    表名的规范化查找键
+    :return: [(键, 是否去掉了前缀)]
+    """
+    name = table_name.lower()
+    keys = [(_singular(name), False)]
+    for prefix in TABLE_PREFIXES:
+        if name.startswith(prefix) and len(name) > len(prefix):
+            keys.append((_singular(name[len(prefix):]), True))
+            break
+    return keys
+
+
+def referenced_key(column_name: str) -> Optional[str]:
+    """
+    字段名指向的表的查找键，如 user_id、userId、userid -> user；不是引用字段时返回None
+    """
+    match = _CAMEL_ID_PATTERN.match(column_name)
+    if not match:
+        match = _ID_COLUMN_PATTERN.match(column_name)
+    if not match:
+        return None
+    key = match.group(1).lower().rstrip('_')
+    return _singular(key) if key else None
+
+
+def _load_columns(session, datasource_id: int) -> Dict[int, Dict[str, Any]]:
+    """{表ID: {table_name, schema_name, columns: {小写字段名: (字段名, 类型)}}}"""
+    tables = {table_id: {'table_name': table_name, 'schema_name': schema_name, 'columns': {}}
+              for table_id, table_name, schema_name in session.query(
+                  TableMetadata.id, TableMetadata.table_name, TableMetadata.schema_name
+              ).filter(TableMetadata.datasource_id == datasource_id).all()}
+    for table_id, column_name, data_type in session.query(
+        ColumnMetadata.table_id, ColumnMetadata.column_name, ColumnMetadata.data_type
+    ).join(TableMetadata, TableMetadata.id == ColumnMetadata.table_id).filter(
+        TableMetadata.datasource_id == datasource_id
+    ).all():
+        tables[table_id]['columns'][column_name.lower()] = (column_name, data_type)
+    return tables
+
+
+def find_candidates(tables: Dict[int, Dict[str, Any]], declared: set) -> List[Dict[str, Any]]:
+    """
+    按命名规则和类型兼容性生成候选关系
+    :param tables: _load_columns 的结果
+    :param declared: 已声明外键的 (表ID, 小写字段名)
+    :return: [{table_id, column_name, referenced_table_id, referenced_column_name, confidence}]
+    """
+    index: Dict[str, List[tuple]] = {}
+    for table_id, table in tables.items():
+        for key, prefixed in table_keys(table['table_name']):
+            index.setdefault(key, []).append((table_id, prefixed))
+
+    candidates = []
+    for table_id, table in tables.items():
+        for lower_name, (column_name, data_type) in table['columns'].items():
+            if (table_id, lower_name) in declared or lower_name == 'id':
+                continue
+            key = referenced_key(column_name)
+            if not key:
+                continue
+            targets = [(target_id, prefixed) for target_id, prefixed in index.get(key, ()) if target_id != table_id]
+            for target_id, prefixed in targets:
+                target_columns = tables[target_id]['columns']
+                # 目标字段：与子表字段同名（users.user_id）优先，其次为 id
+                target = target_columns.get(lower_name) or target_columns.get('id')
+                if not target:
+                    continue
+                compatibility = classify_type_change(normalize_type(data_type), normalize_type(target[1]))
+                if compatibility == 'incompatible':
+                    continue
+                score = BASE_SCORE + TARGET_COLUMN_SCORE
+                score += PREFIXED_NAME_SCORE if prefixed else EXACT_NAME_SCORE
+                score += TYPE_EQUIVALENT_SCORE if compatibility == 'equivalent' else TYPE_COMPATIBLE_SCORE
+                if len(targets) > 1:
+                    score -= AMBIGUITY_PENALTY
+                candidates.append({
+                    'table_id': table_id,
+                    'table_name': table['table_name'],
+                    'column_name': column_name,
+                    'referenced_table_id': target_id,
+                    'referenced_table_name': tables[target_id]['table_name'],
+                    'referenced_column_name': target[0],
+                    'confidence': round(min(score, 0.95), 2)
+                })
+    return candidates
+
+
+def _containment(connection, tables: Dict[int, Dict[str, Any]], candidate: Dict[str, Any], sample_size: int) -> Optional[float]:
+    """
+    抽样检查子表字段的值在父表中的包含率
+    :return: 0~1，子表没有非空值时返回None
+    """
+    child = tables[candidate['table_id']]
+    parent = tables[candidate['referenced_table_id']]
+    child_column = sql_table(child['table_name'], sql_column(candidate['column_name']),
+                             schema=child['schema_name'] or None).c[candidate['column_name']]
+    values = [row[0] for row in connection.execute(
+        select(child_column).where(child_column.isnot(None)).distinct().limit(sample_size)
+    )]
+    if not values:
+        return None
+    parent_column = sql_table(parent['table_name'], sql_column(candidate['referenced_column_name']),
+                              schema=parent['schema_name'] or None).c[candidate['referenced_column_name']]
+    found = {row[0] for row in connection.execute(
+        select(parent_column).where(parent_column.in_(values)).distinct()
+    )}
+    return len(found) / len(values)
+
+
+def verify_candidates(source, tables: Dict[int, Dict[str, Any]], candidates: List[Dict[str, Any]],
+                      sample_size: int) -> List[Dict[str, Any]]:
+    """
+    连接源库抽样校验候选关系，按包含率调整置信度，包含率过低的丢弃；查询失败的候选保留原置信度
+    :param source: 数据源
+    """
+    extractor_class = get_extractor_class(source.type)
+    if not extractor_class:
+        raise ValidationException(f"不支持的数据库类型: {source.type}")
+    extractor = extractor_class(source)
+    extractor.connect()
+    verified = []
+    try:
+        for index, candidate in enumerate(candidates):
+            if index >= MAX_SAMPLED_CANDIDATES:
+                verified.append(candidate)
+                continue
+            try:
+                ratio = _containment(extractor.connection, tables, candidate, sample_size)
+            except Exception as e:
+                logging.warning(f"抽样校验关联关系失败 {candidate['table_name']}.{candidate['column_name']}: {str(e)}")
+                extractor.connection.rollback()
+                verified.append(candidate)
+                continue
+            if ratio is None:
+                verified.append(candidate)
+            elif ratio >= MIN_CONTAINMENT:
+                confidence = candidate['confidence'] * (1 - CONTAINMENT_WEIGHT) + ratio * CONTAINMENT_WEIGHT
+                verified.append(dict(candidate, confidence=round(min(confidence, 0.99), 2), containment=round(ratio, 3)))
+    finally:
+        extractor.disconnect()
+    return verified
+
+
+def infer_relationships(session, source, sample_size: Optional[int] = None, min_confidence: Optional[float] = None,
+                        dry_run: bool = False) -> Dict[str, Any]:
+    """
+    推断数据源的关联关系并替换旧的推断结果
+    :param session: 数据库会话
+    :param source: 数据源
+    :param sample_size: 抽样校验的值数量，0表示只按命名和类型推断，默认 RELATIONSHIP_INFERENCE_SAMPLE_SIZE
+    :param min_confidence: 保存的最低置信度，默认 RELATIONSHIP_INFERENCE_MIN_CONFIDENCE
+    :param dry_run: 只返回结果，不保存
+    :return: {candidates, saved, relationships}
+    """
+    sample_size = Config.RELATIONSHIP_INFERENCE_SAMPLE_SIZE if sample_size is None else sample_size
+    min_confidence = Config.RELATIONSHIP_INFERENCE_MIN_CONFIDENCE if min_confidence is None else min_confidence
+    tables = _load_columns(session, source.id)
+    table_ids = list(tables)
+    declared = set()
+    for start in range(0, len(table_ids), 1000):
+        declared.update((table_id, column_name.lower()) for table_id, column_name in session.query(
+            TableRelationship.table_id, TableRelationship.column_name
+        ).filter(
+            TableRelationship.table_id.in_(table_ids[start:start + 1000]),
+            TableRelationship.constraint_type != INFERRED_CONSTRAINT_TYPE
+        ).all())
+
+    candidates = find_candidates(tables, declared)
+    if sample_size > 0 and candidates:
+        candidates = verify_candidates(source, tables, candidates, sample_size)
+    relationships = sorted((candidate for candidate in candidates if candidate['confidence'] >= min_confidence),
+                           key=lambda candidate: candidate['confidence'], reverse=True)
+
+    if not dry_run:
+        for start in range(0, len(table_ids), 1000):
+            session.query(TableRelationship).filter(
+                TableRelationship.table_id.in_(table_ids[start:start + 1000]),
+                TableRelationship.constraint_type == INFERRED_CONSTRAINT_TYPE
+            ).delete(synchronize_session=False)
+        if relationships:
+            session.execute(insert(TableRelationship), [{
+                'constraint_name': f"inferred_{candidate['table_name']}_{candidate['column_name']}"[:255],
+                'table_id': candidate['table_id'],
+                'referenced_table_id': candidate['referenced_table_id'],
+                'column_name': candidate['column_name'],
+                'referenced_column_name': candidate['referenced_column_name'],
+                'constraint_type': INFERRED_CONSTRAINT_TYPE,
+                'confidence': candidate['confidence']
+            } for candidate in relationships])
+    return {'candidates': len(candidates), 'saved': 0 if dry_run else len(relationships),
+            'relationships': relationships}
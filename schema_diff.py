@@ -0,0 +1,292 @@
+"""
+表结构比较
+
+比较任意两个目录（两个数据源，或同一数据源的两个版本、时间点、抽取运行）的表结构，用于迁移校验
+（如 MySQL -> StarRocks、生产与预发环境）：
+1. 表名、字段名按规范化的键（默认忽略大小写，可选带模式名）建立哈希索引，两侧按键直接匹配
+2. 每个表先比较整表指纹（规范化后的字段、类型、可空性），指纹相同的表跳过逐字段比较
+3. 字段类型规范化后按兼容性分类：equivalent（写法不同但等价）、widening（放宽，安全）、
+   narrowing（收窄，可能丢数据）、incompatible（类型族不同）
+4. 结果以事件流的形式逐条产生，API 可以直接以 NDJSON 流式输出，也可以汇总成一个结构化结果
+"""
+import re
+from datetime import datetime
+from typing import Dict, Any, Iterator, Optional, Tuple
+
+from models import DataSource
+from db_manager import get_db_session
+from schema_history import load_current_schema, schema_state
+from exceptions import DataSourceNotFoundException, ValidationException
+
+
+# 类型别名 -> 规范名称
+TYPE_ALIASES = {
+    'integer': 'int', 'int4': 'int', 'serial': 'int', 'int2': 'smallint', 'smallserial': 'smallint',
+    'int8': 'bigint', 'bigserial': 'bigint',
+    'bool': 'boolean', 'bit': 'boolean',
+    'character varying': 'varchar', 'nvarchar': 'varchar', 'varchar2': 'varchar', 'nvarchar2': 'varchar',
+    'character': 'char', 'nchar': 'char', 'bpchar': 'char',
+    'double precision': 'double', 'float8': 'double', 'float4': 'float', 'real': 'float', 'binary_double': 'double',
+    'binary_float': 'float',
+    'numeric': 'decimal', 'number': 'decimal', 'decimalv3': 'decimal', 'money': 'decimal',
+    'timestamp without time zone': 'timestamp', 'timestamp with time zone': 'timestamptz',
+    'datetime2': 'datetime', 'smalldatetime': 'datetime', 'datetimeoffset': 'timestamptz',
+    'clob': 'text', 'nclob': 'text', 'ntext': 'text',
+    'bytea': 'blob', 'image': 'blob', 'raw': 'varbinary',
+    'jsonb': 'json',
+}
+
+# 规范名称 -> (类型族, 族内容量等级)
+TYPE_FAMILIES = {
+    'boolean': ('boolean', 1),
+    'tinyint': ('integer', 1), 'smallint': ('integer', 2), 'mediumint': ('integer', 3),
+    'int': ('integer', 4), 'bigint': ('integer', 5), 'largeint': ('integer', 6),
+    'float': ('float', 1), 'double': ('float', 2),
+    'decimal': ('decimal', 0),
+    'char': ('string', 0), 'varchar': ('string', 0), 'tinytext': ('string', 255), 'text': ('string', 65535),
+    'mediumtext': ('string', 16777215), 'longtext': ('string', 4294967295), 'string': ('string', 2147483647),
+    'date': ('datetime', 1), 'datetime': ('datetime', 2), 'timestamp': ('datetime', 2), 'timestamptz': ('datetime', 3),
+    'time': ('time', 1),
+    'binary': ('binary', 0), 'varbinary': ('binary', 0), 'tinyblob': ('binary', 255), 'blob': ('binary', 65535),
+    'mediumblob': ('binary', 16777215), 'longblob': ('binary', 4294967295),
+    'json': ('json', 1),
+}
+
+# 整数类型的十进制位数，用于判断整数 -> decimal 是否放宽
+INTEGER_DIGITS = {1: 3, 2: 5, 3: 8, 4: 10, 5: 19, 6: 39}
+# 不带长度的 varchar / varbinary 视为 MySQL 的最大长度
+DEFAULT_VARIABLE_LENGTH = 65535
+
+COMPATIBILITY_CLASSES = ('equivalent', 'widening', 'narrowing', 'incompatible')
+
+_PARAMS_PATTERN = re.compile(r'\(([^)]*)\)')
+_IGNORED_WORDS = {'unsigned', 'zerofill', 'signed'}
+
+
+def normalize_type(data_type: Optional[str]) -> Tuple[str, tuple]:
+    """
+    规范化字段类型
+    :param data_type: 原始类型，如 VARCHAR(20)、int(11) unsigned、character varying
+    :return: (规范名称, 参数元组)，整数的显示宽度、时间精度等不影响兼容性的参数会被丢弃
+    """
+    text = (data_type or '').strip().lower()
+    match = _PARAMS_PATTERN.search(text)
+    params = ()
+    if match:
+        params = tuple(int(part) if part.strip().isdigit() else part.strip()
+                       for part in match.group(1).split(',') if part.strip())
+        text = _PARAMS_PATTERN.sub(' ', text)
+    name = ' '.join(word for word in text.split() if word not in _IGNORED_WORDS)
+    name = TYPE_ALIASES.get(name, name)
+
+    # tinyint(1) 在 MySQL 中用作布尔类型
+    if name == 'tinyint' and params == (1,):
+        return 'boolean', ()
+    family = TYPE_FAMILIES.get(name, (None, 0))[0]
+    if family in ('integer', 'float', 'datetime', 'time', 'boolean', 'json'):
+        params = ()
+    elif family == 'decimal':
+        precision = params[0] if params and isinstance(params[0], int) else 10
+        scale = params[1] if len(params) > 1 and isinstance(params[1], int) else 0
+        params = (precision, scale)
+    return name, params
+
+
+def _capacity(name: str, params: tuple) -> int:
+    """字符串、二进制类型的容量"""
+    rank = TYPE_FAMILIES[name][1]
+    if rank:
+        return rank
+    if params and isinstance(params[0], int):
+        return params[0]
+    # 无长度的 char/binary 为 1，varchar(max) 之类视为最大长度
+    return 1 if name in ('char', 'binary') and not params else DEFAULT_VARIABLE_LENGTH
+
+
+def classify_type_change(left: Tuple[str, tuple], right: Tuple[str, tuple]) -> str:
+    """
+    判断从左侧类型迁移到右侧类型的兼容性
+    :param left: normalize_type 的结果
+    :param right: normalize_type 的结果
+    :return: equivalent, widening, narrowing, incompatible
+    """
+    if left == right:
+        return 'equivalent'
+    left_name, left_params = left
+    right_name, right_params = right
+    left_family, left_rank = TYPE_FAMILIES.get(left_name, (left_name, 0))
+    right_family, right_rank = TYPE_FAMILIES.get(right_name, (right_name, 0))
+
+    if left_family == right_family:
+        if left_family == 'decimal':
+            (left_precision, left_scale), (right_precision, right_scale) = left_params, right_params
+            widened = right_scale >= left_scale and right_precision - right_scale >= left_precision - left_scale
+            return 'widening' if widened else 'narrowing'
+        if left_family in ('string', 'binary'):
+            left_capacity, right_capacity = _capacity(left_name, left_params), _capacity(right_name, right_params)
+            if left_capacity == right_capacity:
+                return 'equivalent'
+            return 'widening' if right_capacity > left_capacity else 'narrowing'
+        if left_rank == right_rank:
+            return 'equivalent'
+        return 'widening' if right_rank > left_rank else 'narrowing'
+
+    if left_family == 'boolean' and right_family == 'integer':
+        return 'widening'
+    if left_family == 'integer' and right_family == 'boolean':
+        return 'narrowing'
+    if left_family == 'integer' and right_family == 'decimal':
+        precision, scale = right_params
+        return 'widening' if precision - scale >= INTEGER_DIGITS[left_rank] else 'narrowing'
+    if left_family == 'integer' and right_family == 'float':
+        # double 的有效位数约 15 位，bigint 及以上转换可能丢失精度
+        return 'widening' if (right_rank == 2 and left_rank <= 4) or left_rank <= 2 else 'narrowing'
+    if left_family == 'decimal' and right_family == 'float':
+        return 'narrowing'
+    return 'incompatible'
+
+
+def _table_key(table_name: str, schema_name: Optional[str], ignore_case: bool, match_schema: bool) -> str:
+    key = f"{schema_name or ''}.{table_name}" if match_schema else table_name
+    return key.lower() if ignore_case else key
+
+
+def _index(schema: Dict[str, Dict[str, Any]], ignore_case: bool, match_schema: bool) -> Dict[str, tuple]:
+    """
+    为结构建立哈希索引
+    :return: {表键: (表名, {字段键: (字段名, 原始类型, 规范类型, 可空)}, 整表指纹)}
+    """
+    index = {}
+    for table_name, table in schema.items():
+        columns = {}
+        for column_name, column in table['columns'].items():
+            key = column_name.lower() if ignore_case else column_name
+            columns[key] = (column_name, column.get('data_type'), normalize_type(column.get('data_type')),
+                            (column.get('is_nullable') or '').upper() in ('YES', 'Y', 'TRUE', '1'))
+        fingerprint = hash(frozenset((key, value[2], value[3]) for key, value in columns.items()))
+        index[_table_key(table_name, table.get('schema_name'), ignore_case, match_schema)] = (
+            table_name, columns, fingerprint)
+    return index
+
+
+def iter_schema_diff(left: Dict[str, Dict[str, Any]], right: Dict[str, Dict[str, Any]],
+                     ignore_case: bool = True, match_schema: bool = False) -> Iterator[Dict[str, Any]]:
+    """
+    逐条产生两个结构的差异，最后产生汇总
+    :param left: 左侧结构（load_current_schema / schema_state 的格式）
+    :param right: 右侧结构
+    :param ignore_case: 表名、字段名是否忽略大小写
+    :param match_schema: 表是否按 模式名.表名 匹配（同构环境比较时使用，跨库迁移时模式名通常不同）
+    :return: 事件：{type: table_only_left / table_only_right / table_changed / summary, ...}
+    """
+    left_index = _index(left, ignore_case, match_schema)
+    right_index = _index(right, ignore_case, match_schema)
+    summary = {
+        'tables_left': len(left_index), 'tables_right': len(right_index),
+        'tables_only_left': 0, 'tables_only_right': 0, 'tables_identical': 0, 'tables_changed': 0,
+        'columns_only_left': 0, 'columns_only_right': 0, 'columns_nullable_changed': 0,
+        'columns_type_changed': dict.fromkeys(COMPATIBILITY_CLASSES, 0)
+    }
+
+    for key in sorted(left_index.keys() | right_index.keys()):
+        if key not in right_index:
+            table_name, columns, _ = left_index[key]
+            summary['tables_only_left'] += 1
+            yield {'type': 'table_only_left', 'table': table_name, 'columns': len(columns)}
+            continue
+        if key not in left_index:
+            table_name, columns, _ = right_index[key]
+            summary['tables_only_right'] += 1
+            yield {'type': 'table_only_right', 'table': table_name, 'columns': len(columns)}
+            continue
+
+        left_name, left_columns, left_fingerprint = left_index[key]
+        right_name, right_columns, right_fingerprint = right_index[key]
+        if left_fingerprint == right_fingerprint:
+            summary['tables_identical'] += 1
+            continue
+
+        only_left = [left_columns[column][0] for column in sorted(left_columns.keys() - right_columns.keys())]
+        only_right = [right_columns[column][0] for column in sorted(right_columns.keys() - left_columns.keys())]
+        changed = []
+        for column in sorted(left_columns.keys() & right_columns.keys()):
+            left_column, right_column = left_columns[column], right_columns[column]
+            if left_column[2:] == right_column[2:]:
+                continue
+            change = {'column': left_column[0], 'left_type': left_column[1], 'right_type': right_column[1]}
+            if left_column[2] != right_column[2]:
+                change['compatibility'] = classify_type_change(left_column[2], right_column[2])
+                summary['columns_type_changed'][change['compatibility']] += 1
+            if left_column[3] != right_column[3]:
+                change['nullable'] = [left_column[3], right_column[3]]
+                summary['columns_nullable_changed'] += 1
+            changed.append(change)
+
+        if not (only_left or only_right or changed):
+            # 指纹碰撞，两表实际相同
+            summary['tables_identical'] += 1
+            continue
+        summary['tables_changed'] += 1
+        summary['columns_only_left'] += len(only_left)
+        summary['columns_only_right'] += len(only_right)
+        yield {'type': 'table_changed', 'table': left_name, 'right_table': right_name,
+               'columns_only_left': only_left, 'columns_only_right': only_right, 'columns_changed': changed}
+
+    yield dict(summary, type='summary')
+
+
+def load_catalog(spec: Dict[str, Any]) -> Tuple[Dict[str, Any], Dict[str, Dict[str, Any]]]:
+    """
+    加载要比较的目录
+    :param spec: {datasource_id, version?, at?, history_id?}，只给 datasource_id 时使用当前元数据
+    :return: (目录描述, 结构)
+    """
+    if not isinstance(spec, dict) or not spec.get('datasource_id'):
+        raise ValidationException("比较的目录必须指定 datasource_id")
+    datasource_id = int(spec['datasource_id'])
+    at = spec.get('at')
+    if isinstance(at, str):
+        try:
+            at = datetime.fromisoformat(at)
+        except ValueError:
+            raise ValidationException(f"无效的时间: {at}")
+
+    with get_db_session() as session:
+        source_name = session.query(DataSource.name).filter(DataSource.id == datasource_id).scalar()
+        if source_name is None:
+            state, description = None, None
+        elif spec.get('version') is None and at is None and spec.get('history_id') is None:
+            state = load_current_schema(session, datasource_id)
+            description = {'datasource_id': datasource_id, 'datasource_name': source_name, 'version': 'current'}
+        else:
+            state = schema_state(session, datasource_id, version=spec.get('version'), at=at,
+                                 history_id=spec.get('history_id'))
+            if state:
+                target, state = state
+                description = {'datasource_id': datasource_id, 'datasource_name': source_name,
+                               'version': target.version, 'created_at': target.created_at.isoformat()}
+
+    if source_name is None:
+        raise DataSourceNotFoundException(f"数据源不存在: {datasource_id}")
+    if state is None:
+        raise ValidationException(f"数据源 {source_name} 在指定版本或时间点没有结构记录")
+    return description, state
+
+
+def diff_catalogs(left_spec: Dict[str, Any], right_spec: Dict[str, Any], ignore_case: bool = True,
+                  match_schema: bool = False) -> Dict[str, Any]:
+    """
+    比较两个目录并汇总为一个结构化结果
+    :return: {left, right, summary, tables_only_left, tables_only_right, tables_changed}
+    """
+    left_description, left = load_catalog(left_spec)
+    right_description, right = load_catalog(right_spec)
+    result = {'left': left_description, 'right': right_description,
+              'tables_only_left': [], 'tables_only_right': [], 'tables_changed': []}
+    for event in iter_schema_diff(left, right, ignore_case, match_schema):
+        kind = event.pop('type')
+        if kind == 'summary':
+            result['summary'] = event
+        else:
+            result[kind.replace('table_', 'tables_', 1)].append(event)
+    return result
@@ -0,0 +1,282 @@
+"""
+表结构版本历史
+
+全量抽取会删除并重建数据源的元数据，之前的结构无法追溯。每次成功抽取后：
+1. 从元数据表读取数据源当前的结构（表和字段），与上一版本比较
+2. 结构有变化时记录新版本，只保存增量（新增、删除、修改的表和字段，修改项保留新旧值）
+3. 每隔 SCHEMA_CHECKPOINT_INTERVAL 个版本额外保存一次完整快照，第一个版本总是快照
+
+按版本号或时间点重建结构时，从不晚于目标版本的最近快照开始顺序应用增量，最多应用 SCHEMA_CHECKPOINT_INTERVAL 个增量
+"""
+import json
+import zlib
+from datetime import datetime
+from typing import Dict, Any, List, Optional, Tuple
+
+from config import Config
+from models import TableMetadata, ColumnMetadata, SchemaVersion
+from db_manager import get_db_session
+
+
+# 参与比较的表属性和字段属性（行数、大小等统计信息不属于结构）
+TABLE_FIELDS = ('schema_name', 'comment')
+COLUMN_FIELDS = ('data_type', 'is_nullable', 'default_value', 'column_comment', 'ordinal_position')
+
+
+def _encode(payload: Dict[str, Any]) -> bytes:
+    return zlib.compress(json.dumps(payload, ensure_ascii=False, separators=(',', ':')).encode('utf-8'))
+
+
+def _decode(payload: bytes) -> Dict[str, Any]:
+    return json.loads(zlib.decompress(payload).decode('utf-8'))
+
+
+def load_current_schema(session, datasource_id: int) -> Dict[str, Dict[str, Any]]:
+    """
+    从元数据表读取数据源当前的结构
+    :return: {表名: {schema_name, comment, columns: {字段名: {data_type, ...}}}}
+    """
+    schema = {}
+    table_names = {}
+    for table_id, table_name, schema_name, comment in session.query(
+        TableMetadata.id, TableMetadata.table_name, TableMetadata.schema_name, TableMetadata.comment
+    ).filter(TableMetadata.datasource_id == datasource_id).all():
+        schema[table_name] = {'schema_name': schema_name, 'comment': comment, 'columns': {}}
+        table_names[table_id] = table_name
+
+    for row in session.query(
+        ColumnMetadata.table_id, ColumnMetadata.column_name, *[getattr(ColumnMetadata, field) for field in COLUMN_FIELDS]
+    ).join(TableMetadata, TableMetadata.id == ColumnMetadata.table_id).filter(
+        TableMetadata.datasource_id == datasource_id
+    ).all():
+        schema[table_names[row[0]]]['columns'][row[1]] = dict(zip(COLUMN_FIELDS, row[2:]))
+    return schema
+
+
+def _changed_fields(old: Dict[str, Any], new: Dict[str, Any], fields) -> Dict[str, list]:
+    return {field: [old.get(field), new.get(field)] for field in fields if old.get(field) != new.get(field)}
+
+
+def diff_schemas(old: Dict[str, Dict[str, Any]], new: Dict[str, Dict[str, Any]]) -> Dict[str, Any]:
+    """
+    比较两个结构
+    :return: {added: {表名: 结构}, removed: [表名], altered: {表名: {fields, columns_added, columns_removed, columns_altered}}}，
+             修改项为 [旧值, 新值]
+    """
+    added = {name: new[name] for name in new.keys() - old.keys()}
+    removed = sorted(old.keys() - new.keys())
+    altered = {}
+    for name in old.keys() & new.keys():
+        old_columns, new_columns = old[name]['columns'], new[name]['columns']
+        change = {
+            'fields': _changed_fields(old[name], new[name], TABLE_FIELDS),
+            'columns_added': {column: new_columns[column] for column in new_columns.keys() - old_columns.keys()},
+            'columns_removed': sorted(old_columns.keys() - new_columns.keys()),
+            'columns_altered': {}
+        }
+        for column in old_columns.keys() & new_columns.keys():
+            fields = _changed_fields(old_columns[column], new_columns[column], COLUMN_FIELDS)
+            if fields:
+                change['columns_altered'][column] = fields
+        change = {key: value for key, value in change.items() if value}
+        if change:
+            altered[name] = change
+    return {'added': added, 'removed': removed, 'altered': altered}
+
+
+def is_empty_delta(delta: Dict[str, Any]) -> bool:
+    return not (delta['added'] or delta['removed'] or delta['altered'])
+
+
+def apply_delta(schema: Dict[str, Dict[str, Any]], delta: Dict[str, Any]) -> Dict[str, Dict[str, Any]]:
+    """将增量应用到结构上（原地修改并返回）"""
+    for name in delta['removed']:
+        schema.pop(name, None)
+    schema.update(delta['added'])
+    for name, change in delta['altered'].items():
+        table = schema[name]
+        for field, (_, value) in change.get('fields', {}).items():
+            table[field] = value
+        for column in change.get('columns_removed', []):
+            table['columns'].pop(column, None)
+        table['columns'].update(change.get('columns_added', {}))
+        for column, fields in change.get('columns_altered', {}).items():
+            for field, (_, value) in fields.items():
+                table['columns'][column][field] = value
+    return schema
+
+
+def _reconstruct(session, datasource_id: int, version: int) -> Tuple[Dict[str, Dict[str, Any]], int]:
+    """
+    重建指定版本的结构
+    :return: (结构, 所用快照的版本号)
+    """
+    checkpoint = session.query(SchemaVersion).filter(
+        SchemaVersion.datasource_id == datasource_id,
+        SchemaVersion.is_checkpoint.is_(True),
+        SchemaVersion.version <= version
+    ).order_by(SchemaVersion.version.desc()).first()
+    schema = _decode(checkpoint.payload)['schema']
+    for (payload,) in session.query(SchemaVersion.payload).filter(
+        SchemaVersion.datasource_id == datasource_id,
+        SchemaVersion.version > checkpoint.version,
+        SchemaVersion.version <= version
+    ).order_by(SchemaVersion.version).all():
+        apply_delta(schema, _decode(payload)['delta'])
+    return schema, checkpoint.version
+
+
+def record_schema_version(session, datasource_id: int, history_id: Optional[int] = None) -> Optional[int]:
+    """
+    记录数据源当前结构的版本，结构没有变化时不记录
+    :param session: 数据库会话（应在元数据持久化之后调用）
+    :return: 新版本号，未记录时返回None
+    """
+    current = load_current_schema(session, datasource_id)
+    latest = session.query(SchemaVersion.version).filter(
+        SchemaVersion.datasource_id == datasource_id
+    ).order_by(SchemaVersion.version.desc()).first()
+
+    if latest is None:
+        version, checkpoint = 1, True
+        delta = diff_schemas({}, current)
+    else:
+        previous, checkpoint_version = _reconstruct(session, datasource_id, latest.version)
+        delta = diff_schemas(previous, current)
+        if is_empty_delta(delta):
+            return None
+        version = latest.version + 1
+        checkpoint = version - checkpoint_version >= Config.SCHEMA_CHECKPOINT_INTERVAL
+
+    payload = {'delta': delta}
+    if checkpoint:
+        payload['schema'] = current
+    session.add(SchemaVersion(
+        datasource_id=datasource_id,
+        version=version,
+        history_id=history_id,
+        is_checkpoint=checkpoint,
+        payload=_encode(payload),
+        tables_count=len(current),
+        tables_added=len(delta['added']),
+        tables_removed=len(delta['removed']),
+        tables_altered=len(delta['altered'])
+    ))
+    return version
+
+
+def _version_summary(record: SchemaVersion) -> Dict[str, Any]:
+    return {
+        'version': record.version,
+        'history_id': record.history_id,
+        'is_checkpoint': bool(record.is_checkpoint),
+        'tables_count': record.tables_count,
+        'tables_added': record.tables_added,
+        'tables_removed': record.tables_removed,
+        'tables_altered': record.tables_altered,
+        'created_at': record.created_at
+    }
+
+
+def _table_changes(delta: Dict[str, Any], table_name: str, column_name: Optional[str] = None) -> Optional[Dict[str, Any]]:
+    """从增量中取出某个表（或表中某个字段）的变化"""
+    if table_name in delta['added']:
+        if column_name and column_name not in delta['added'][table_name]['columns']:
+            return None
+        return {'change': 'table_added'}
+    if table_name in delta['removed']:
+        return {'change': 'table_removed'}
+    change = delta['altered'].get(table_name)
+    if not change or not column_name:
+        return dict(change, change='table_altered') if change else None
+    if column_name in change.get('columns_added', {}):
+        return {'change': 'column_added', 'column': change['columns_added'][column_name]}
+    if column_name in change.get('columns_removed', []):
+        return {'change': 'column_removed'}
+    if column_name in change.get('columns_altered', {}):
+        return {'change': 'column_altered', 'fields': change['columns_altered'][column_name]}
+    return None
+
+
+def schema_history(datasource_id: int, table_name: Optional[str] = None, column_name: Optional[str] = None,
+                   limit: int = 50) -> List[Dict[str, Any]]:
+    """
+    数据源的结构版本列表（按版本倒序）
+    :param table_name: 只返回涉及该表的版本，并附带该表的变化
+    :param column_name: 与 table_name 一起使用，只返回涉及该字段的版本（如字段类型何时变化）
+    """
+    with get_db_session() as session:
+        query = session.query(SchemaVersion).filter(
+            SchemaVersion.datasource_id == datasource_id
+        ).order_by(SchemaVersion.version.desc())
+        if not table_name:
+            return [_version_summary(record) for record in query.limit(limit).all()]
+
+        result = []
+        for record in query.yield_per(100):
+            changes = _table_changes(_decode(record.payload)['delta'], table_name, column_name)
+            if changes:
+                result.append(dict(_version_summary(record), changes=changes))
+                if len(result) >= limit:
+                    break
+        return result
+
+
+def schema_version_detail(datasource_id: int, version: int) -> Optional[Dict[str, Any]]:
+    """单个版本的摘要和完整增量"""
+    with get_db_session() as session:
+        record = session.query(SchemaVersion).filter(
+            SchemaVersion.datasource_id == datasource_id,
+            SchemaVersion.version == version
+        ).first()
+        if not record:
+            return None
+        return dict(_version_summary(record), delta=_decode(record.payload)['delta'])
+
+
+def schema_state(session, datasource_id: int, version: Optional[int] = None, at: Optional[datetime] = None,
+                 history_id: Optional[int] = None) -> Optional[Tuple[Any, Dict[str, Dict[str, Any]]]]:
+    """
+    重建数据源在指定版本、时间点或抽取运行之后的结构
+    :param version: 版本号
+    :param at: 时间点（UTC），取该时间之前的最后一个版本
+    :param history_id: 抽取历史ID，取该运行及之前产生的最后一个版本
+    :return: ((version, created_at), 结构)，条件都为空时取最新版本，没有版本时返回None
+    """
+    query = session.query(SchemaVersion.version, SchemaVersion.created_at).filter(
+        SchemaVersion.datasource_id == datasource_id
+    )
+    if version is not None:
+        query = query.filter(SchemaVersion.version == version)
+    elif at is not None:
+        query = query.filter(SchemaVersion.created_at <= at)
+    elif history_id is not None:
+        query = query.filter(SchemaVersion.history_id <= history_id)
+    target = query.order_by(SchemaVersion.version.desc()).first()
+    if not target:
+        return None
+    return target, _reconstruct(session, datasource_id, target.version)[0]
+
+
+def schema_at(datasource_id: int, version: Optional[int] = None, at: Optional[datetime] = None) -> Optional[Dict[str, Any]]:
+    """
+    重建数据源在指定版本或时间点的结构
+    :param version: 版本号
+    :param at: 时间点（UTC），取该时间之前的最后一个版本；两者都为空时取最新版本
+    :return: {version, created_at, tables: [{table_name, schema_name, comment, columns: [...]}]}，没有版本时返回None
+    """
+    with get_db_session() as session:
+        state = schema_state(session, datasource_id, version=version, at=at)
+    if not state:
+        return None
+    target, schema = state
+
+    tables = []
+    for table_name in sorted(schema):
+        table = schema[table_name]
+        columns = sorted(({'column_name': name, **column} for name, column in table['columns'].items()),
+                         key=lambda column: (column['ordinal_position'] is None, column['ordinal_position'] or 0))
+        tables.append({'table_name': table_name, 'schema_name': table['schema_name'],
+                       'comment': table['comment'], 'columns': columns})
+    return {'datasource_id': datasource_id, 'version': target.version,
+            'created_at': target.created_at, 'tables': tables}
@@ -79,6 +79,8 @@ CREATE TABLE IF NOT EXISTS data_sources (
     username VARCHAR(255) NOT NULL,
     password VARCHAR(255) NOT NULL,
     `database` VARCHAR(255) NOT NULL,
+    throttle_config TEXT COMMENT '限流配置（JSON）：max_qps, max_concurrent, latency_factor, quiet_hours',
+    history_retention_days INT COMMENT '抽取历史保留天数，为空时使用全局配置，0表示永久保留',
     created_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP,
     updated_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP ON UPDATE CURRENT_TIMESTAMP,
     INDEX idx_type (type)
@@ -132,7 +134,8 @@ CREATE TABLE IF NOT EXISTS table_relationships (
     referenced_table_id INT NOT NULL,
     column_name VARCHAR(255) NOT NULL,
     referenced_column_name VARCHAR(255) NOT NULL,
-    constraint_type VARCHAR(50) NOT NULL COMMENT 'FOREIGN KEY, PRIMARY KEY',
+    constraint_type VARCHAR(50) NOT NULL COMMENT 'FOREIGN KEY, PRIMARY KEY, INFERRED（推断）',
+    confidence FLOAT COMMENT '置信度：声明的约束为1，推断的关系为0~1',
     created_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP,
     FOREIGN KEY (table_id) REFERENCES table_metadata(id) ON DELETE CASCADE,
     FOREIGN KEY (referenced_table_id) REFERENCES table_metadata(id) ON DELETE CASCADE,
@@ -151,11 +154,20 @@ CREATE TABLE IF NOT EXISTS extraction_history (
     message TEXT,
     extracted_tables INT,
     etl_task_id INT,
+    orchestration_run_id INT COMMENT '关联的批量编排运行ID',
+    task_type VARCHAR(50) COMMENT '任务类型：full, incremental, schema_only',
+    total_tables INT COMMENT '本次运行需要抽取的表数量',
+    checkpointed_tables INT DEFAULT 0 COMMENT '已写入检查点的表数量',
+    checkpoint_cursor VARCHAR(255) COMMENT '最近一个写入检查点的表名',
+    resumed_from_id INT COMMENT '从哪次运行的检查点恢复',
+    cancel_requested BOOLEAN DEFAULT FALSE COMMENT '是否已请求取消',
+    details TEXT COMMENT '运行详情（JSON）：跳过的表、超时的表等',
     created_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP,
     FOREIGN KEY (datasource_id) REFERENCES data_sources(id) ON DELETE CASCADE,
     FOREIGN KEY (etl_task_id) REFERENCES etl_tasks(id) ON DELETE SET NULL,
     INDEX idx_datasource_id (datasource_id),
     INDEX idx_extraction_time (extraction_time),
+    INDEX idx_history_source_time (datasource_id, extraction_time),
     INDEX idx_etl_task_id (etl_task_id)
 ) ENGINE=InnoDB DEFAULT CHARSET=utf8mb4 COLLATE=utf8mb4_unicode_ci;
 
@@ -183,6 +195,207 @@ CREATE TABLE IF NOT EXISTS etl_tasks (
     INDEX idx_task_type (task_type)
 ) ENGINE=InnoDB DEFAULT CHARSET=utf8mb4 COLLATE=utf8mb4_unicode_ci;
 
+-- ============================================
+-- 12. 批量抽取编排运行表 (orchestration_runs)
+-- ============================================
+CREATE TABLE IF NOT EXISTS orchestration_runs (
+    id INT PRIMARY KEY AUTO_INCREMENT,
+    status VARCHAR(20) NOT NULL COMMENT 'running, success, partial_success, failed',
+    message TEXT,
+    total_sources INT DEFAULT 0,
+    success_sources INT DEFAULT 0,
+    failed_sources INT DEFAULT 0,
+    extracted_tables INT DEFAULT 0,
+    max_workers INT,
+    triggered_by VARCHAR(80),
+    started_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP,
+    finished_at TIMESTAMP NULL,
+    duration INT,
+    INDEX idx_status (status),
+    INDEX idx_started_at (started_at)
+) ENGINE=InnoDB DEFAULT CHARSET=utf8mb4 COLLATE=utf8mb4_unicode_ci;
+
+-- ============================================
+-- 13. 抽取作业队列表 (extraction_jobs)
+-- ============================================
+CREATE TABLE IF NOT EXISTS extraction_jobs (
+    id INT PRIMARY KEY AUTO_INCREMENT,
+    datasource_id INT NOT NULL,
+    task_type VARCHAR(50) NOT NULL DEFAULT 'full' COMMENT 'full, incremental, schema_only',
+    etl_task_id INT,
+    status VARCHAR(20) NOT NULL DEFAULT 'queued' COMMENT 'queued, leased, success, partial_success, failed',
+    priority INT DEFAULT 0,
+    attempts INT DEFAULT 0,
+    max_attempts INT DEFAULT 3,
+    worker_id VARCHAR(255),
+    lease_expires_at DATETIME NULL,
+    heartbeat_at DATETIME NULL,
+    available_at DATETIME NULL,
+    enqueued_at DATETIME NULL,
+    started_at DATETIME NULL,
+    finished_at DATETIME NULL,
+    history_id INT,
+    error TEXT,
+    requested_by VARCHAR(80),
+    FOREIGN KEY (datasource_id) REFERENCES data_sources(id) ON DELETE CASCADE,
+    FOREIGN KEY (etl_task_id) REFERENCES etl_tasks(id) ON DELETE SET NULL,
+    FOREIGN KEY (history_id) REFERENCES extraction_history(id) ON DELETE SET NULL,
+    INDEX idx_status_available (status, priority, available_at),
+    INDEX idx_lease_expires_at (lease_expires_at),
+    INDEX idx_datasource_id (datasource_id)
+) ENGINE=InnoDB DEFAULT CHARSET=utf8mb4 COLLATE=utf8mb4_unicode_ci;
+
+-- ============================================
+-- 14. 抽取检查点表 (extraction_checkpoints)
+-- ============================================
+CREATE TABLE IF NOT EXISTS extraction_checkpoints (
+    id INT PRIMARY KEY AUTO_INCREMENT,
+    history_id INT NOT NULL COMMENT '所属的抽取历史ID',
+    datasource_id INT NOT NULL,
+    schema_name VARCHAR(255),
+    table_name VARCHAR(255) NOT NULL COMMENT '已完成的表名',
+    batch_no INT NOT NULL COMMENT '批次号',
+    created_at DATETIME NULL,
+    FOREIGN KEY (history_id) REFERENCES extraction_history(id) ON DELETE CASCADE,
+    FOREIGN KEY (datasource_id) REFERENCES data_sources(id) ON DELETE CASCADE,
+    INDEX idx_history_id (history_id)
+) ENGINE=InnoDB DEFAULT CHARSET=utf8mb4 COLLATE=utf8mb4_unicode_ci;
+
+-- ============================================
+-- 15. 抽取剖析表 (extraction_profiles)
+-- ============================================
+CREATE TABLE IF NOT EXISTS extraction_profiles (
+    id INT PRIMARY KEY AUTO_INCREMENT,
+    history_id INT NOT NULL COMMENT '所属的抽取历史ID',
+    datasource_id INT NOT NULL,
+    total_ms DOUBLE COMMENT '运行总耗时（毫秒）',
+    statement_count INT DEFAULT 0 COMMENT '执行的语句数',
+    error_count INT DEFAULT 0 COMMENT '出错的语句数',
+    rows_fetched BIGINT DEFAULT 0 COMMENT '返回的行数',
+    profile LONGTEXT COMMENT '剖析结果JSON',
+    created_at DATETIME NULL,
+    FOREIGN KEY (history_id) REFERENCES extraction_history(id) ON DELETE CASCADE,
+    FOREIGN KEY (datasource_id) REFERENCES data_sources(id) ON DELETE CASCADE,
+    UNIQUE KEY uk_history_id (history_id)
+) ENGINE=InnoDB DEFAULT CHARSET=utf8mb4 COLLATE=utf8mb4_unicode_ci;
+
+-- ============================================
+-- 16. 表抽取统计表 (table_extraction_stats)
+-- ============================================
+CREATE TABLE IF NOT EXISTS table_extraction_stats (
+    id INT PRIMARY KEY AUTO_INCREMENT,
+    history_id INT NOT NULL COMMENT '所属的抽取历史ID',
+    datasource_id INT NOT NULL,
+    table_name VARCHAR(255) NOT NULL,
+    status VARCHAR(20) NOT NULL COMMENT '状态：success, failed, timeout',
+    duration_ms DOUBLE COMMENT '抽取耗时（毫秒，包含重试）',
+    query_count INT DEFAULT 0 COMMENT '执行的语句数',
+    row_count BIGINT COMMENT '行数',
+    size_bytes BIGINT COMMENT '数据大小（字节）',
+    error VARCHAR(1000) COMMENT '错误信息（截断）',
+    created_at DATETIME NULL,
+    FOREIGN KEY (history_id) REFERENCES extraction_history(id) ON DELETE CASCADE,
+    FOREIGN KEY (datasource_id) REFERENCES data_sources(id) ON DELETE CASCADE,
+    INDEX idx_history_id (history_id),
+    INDEX idx_table_stats_source_table (datasource_id, table_name),
+    INDEX idx_created_at (created_at)
+) ENGINE=InnoDB DEFAULT CHARSET=utf8mb4 COLLATE=utf8mb4_unicode_ci;
+
+-- ============================================
+-- 17. 表容量采样表 (table_size_samples)
+-- ============================================
+CREATE TABLE IF NOT EXISTS table_size_samples (
+    id INT PRIMARY KEY AUTO_INCREMENT,
+    datasource_id INT NOT NULL,
+    table_name VARCHAR(255) NOT NULL,
+    granularity VARCHAR(10) NOT NULL COMMENT '粒度：raw, day, week, month',
+    bucket_start DATETIME NOT NULL COMMENT '采样时间（raw）或汇总区间的起始时间',
+    row_count BIGINT COMMENT '行数（汇总层为区间内最后一次采样的值）',
+    size_bytes BIGINT COMMENT '数据大小（字节）',
+    samples INT DEFAULT 1 COMMENT '汇总的采样次数',
+    FOREIGN KEY (datasource_id) REFERENCES data_sources(id) ON DELETE CASCADE,
+    UNIQUE INDEX idx_size_samples_key (datasource_id, table_name, granularity, bucket_start),
+    INDEX idx_size_samples_tier (granularity, bucket_start)
+) ENGINE=InnoDB DEFAULT CHARSET=utf8mb4 COLLATE=utf8mb4_unicode_ci;
+
+-- ============================================
+-- 18. 表结构版本表 (schema_versions)
+-- ============================================
+CREATE TABLE IF NOT EXISTS schema_versions (
+    id INT PRIMARY KEY AUTO_INCREMENT,
+    datasource_id INT NOT NULL,
+    version INT NOT NULL COMMENT '数据源内递增的版本号',
+    history_id INT COMMENT '产生该版本的抽取历史ID',
+    is_checkpoint BOOLEAN DEFAULT FALSE COMMENT '是否为完整快照',
+    payload LONGBLOB NOT NULL COMMENT 'zlib压缩的JSON：完整快照或增量',
+    tables_count INT DEFAULT 0 COMMENT '该版本的表数量',
+    tables_added INT DEFAULT 0 COMMENT '新增的表数量',
+    tables_removed INT DEFAULT 0 COMMENT '删除的表数量',
+    tables_altered INT DEFAULT 0 COMMENT '修改的表数量',
+    created_at DATETIME NULL,
+    FOREIGN KEY (datasource_id) REFERENCES data_sources(id) ON DELETE CASCADE,
+    FOREIGN KEY (history_id) REFERENCES extraction_history(id) ON DELETE SET NULL,
+    UNIQUE INDEX idx_schema_versions_source_version (datasource_id, version),
+    INDEX idx_created_at (created_at)
+) ENGINE=InnoDB DEFAULT CHARSET=utf8mb4 COLLATE=utf8mb4_unicode_ci;
+
+-- ============================================
+-- 19. 字段画像表 (column_profiles)
+-- ============================================
+CREATE TABLE IF NOT EXISTS column_profiles (
+    id INT PRIMARY KEY AUTO_INCREMENT,
+    datasource_id INT NOT NULL,
+    table_name VARCHAR(255) NOT NULL,
+    column_name VARCHAR(255) NOT NULL,
+    data_type VARCHAR(100) COMMENT '画像时的字段类型',
+    sample_method VARCHAR(20) COMMENT '抽样方式：tablesample, sample, limit',
+    sampled_rows BIGINT DEFAULT 0 COMMENT '累计采样行数',
+    null_count BIGINT DEFAULT 0 COMMENT '采样中的空值数',
+    distinct_count BIGINT COMMENT '采样中不同值数的估算',
+    min_value VARCHAR(255) COMMENT '最小值',
+    max_value VARCHAR(255) COMMENT '最大值',
+    quantiles TEXT COMMENT '数值字段的分位数（JSON）',
+    top_values TEXT COMMENT '高频值及估算频次（JSON）',
+    sketch LONGBLOB COMMENT 'zlib压缩的JSON：可合并的草图',
+    samples INT DEFAULT 1 COMMENT '合并的采样次数',
+    cost_seconds FLOAT COMMENT '最近一次采样该表的耗时（秒）',
+    profiled_at DATETIME NULL COMMENT '最近一次画像时间',
+    FOREIGN KEY (datasource_id) REFERENCES data_sources(id) ON DELETE CASCADE,
+    UNIQUE INDEX idx_column_profiles_key (datasource_id, table_name, column_name)
+) ENGINE=InnoDB DEFAULT CHARSET=utf8mb4 COLLATE=utf8mb4_unicode_ci;
+
+-- ============================================
+-- 20. 抽取历史按天汇总表 (extraction_history_daily)
+-- ============================================
+CREATE TABLE IF NOT EXISTS extraction_history_daily (
+    id INT PRIMARY KEY AUTO_INCREMENT,
+    datasource_id INT NOT NULL,
+    day DATETIME NOT NULL COMMENT '日期（当天零点）',
+    task_type VARCHAR(50) NOT NULL DEFAULT '' COMMENT '任务类型，未记录时为空字符串',
+    status VARCHAR(20) NOT NULL COMMENT '状态',
+    runs INT DEFAULT 0 COMMENT '运行次数',
+    extracted_tables BIGINT DEFAULT 0 COMMENT '抽取的表数量合计',
+    total_duration BIGINT DEFAULT 0 COMMENT '耗时合计（秒）',
+    max_duration INT COMMENT '最长耗时（秒）',
+    FOREIGN KEY (datasource_id) REFERENCES data_sources(id) ON DELETE CASCADE,
+    UNIQUE INDEX idx_history_daily_key (datasource_id, day, task_type, status)
+) ENGINE=InnoDB DEFAULT CHARSET=utf8mb4 COLLATE=utf8mb4_unicode_ci;
+
+-- ============================================
+-- 21. 数据源抽取锁表 (extraction_locks)
+-- ============================================
+CREATE TABLE IF NOT EXISTS extraction_locks (
+    datasource_id INT PRIMARY KEY COMMENT '数据源ID，每个数据源最多一把锁',
+    owner VARCHAR(255) NOT NULL COMMENT '持有者：主机名:进程号:随机后缀',
+    task_type VARCHAR(50) COMMENT '持有锁的运行的任务类型',
+    history_id INT COMMENT '持有锁的抽取历史记录ID',
+    acquired_at DATETIME COMMENT '获得锁的时间',
+    heartbeat_at DATETIME COMMENT '最近一次续约时间',
+    expires_at DATETIME NOT NULL COMMENT '锁到期时间，过期未续约的锁可被接管',
+    FOREIGN KEY (datasource_id) REFERENCES data_sources(id) ON DELETE CASCADE,
+    FOREIGN KEY (history_id) REFERENCES extraction_history(id) ON DELETE SET NULL
+) ENGINE=InnoDB DEFAULT CHARSET=utf8mb4 COLLATE=utf8mb4_unicode_ci;
+
 -- ============================================
 -- 初始化数据
 -- ============================================
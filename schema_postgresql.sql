@@ -76,6 +76,8 @@ CREATE TABLE IF NOT EXISTS data_sources (
     username VARCHAR(255) NOT NULL,
     password VARCHAR(255) NOT NULL,
     database VARCHAR(255) NOT NULL,
+    throttle_config TEXT,  -- 限流配置（JSON）：max_qps, max_concurrent, latency_factor, quiet_hours
+    history_retention_days INTEGER,  -- 抽取历史保留天数，为空时使用全局配置，0表示永久保留
     created_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP,
     updated_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP
 );
@@ -130,7 +132,8 @@ CREATE TABLE IF NOT EXISTS table_relationships (
     referenced_table_id INTEGER NOT NULL REFERENCES table_metadata(id) ON DELETE CASCADE,
     column_name VARCHAR(255) NOT NULL,
     referenced_column_name VARCHAR(255) NOT NULL,
-    constraint_type VARCHAR(50) NOT NULL,  -- FOREIGN KEY, PRIMARY KEY
+    constraint_type VARCHAR(50) NOT NULL,  -- FOREIGN KEY, PRIMARY KEY, INFERRED（推断）
+    confidence REAL,  -- 置信度：声明的约束为1，推断的关系为0~1
     created_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP
 );
 
@@ -147,12 +150,21 @@ CREATE TABLE IF NOT EXISTS extraction_history (
     status VARCHAR(20) NOT NULL,  -- success, failed
     message TEXT,
     extracted_tables INTEGER,
-    etl_task_id INTEGER REFERENCES etl_tasks(id) ON DELETE SET NULL
+    etl_task_id INTEGER REFERENCES etl_tasks(id) ON DELETE SET NULL,
+    orchestration_run_id INTEGER,  -- 关联的批量编排运行ID
+    task_type VARCHAR(50),  -- full, incremental, schema_only
+    total_tables INTEGER,  -- 本次运行需要抽取的表数量
+    checkpointed_tables INTEGER DEFAULT 0,  -- 已写入检查点的表数量
+    checkpoint_cursor VARCHAR(255),  -- 最近一个写入检查点的表名
+    resumed_from_id INTEGER,  -- 从哪次运行的检查点恢复
+    cancel_requested BOOLEAN DEFAULT FALSE,  -- 是否已请求取消
+    details TEXT  -- 运行详情（JSON）：跳过的表、超时的表等
 );
 
 CREATE INDEX idx_extraction_history_datasource ON extraction_history(datasource_id);
 CREATE INDEX idx_extraction_history_time ON extraction_history(extraction_time);
 CREATE INDEX idx_extraction_history_task ON extraction_history(etl_task_id);
+CREATE INDEX idx_history_source_time ON extraction_history(datasource_id, extraction_time);
 
 -- ============================================
 -- 11. ETL任务表 (etl_tasks)
@@ -178,6 +190,198 @@ CREATE INDEX idx_etl_tasks_datasource ON etl_tasks(datasource_id);
 CREATE INDEX idx_etl_tasks_status ON etl_tasks(status);
 CREATE INDEX idx_etl_tasks_type ON etl_tasks(task_type);
 
+-- ============================================
+-- 12. 批量抽取编排运行表 (orchestration_runs)
+-- ============================================
+CREATE TABLE IF NOT EXISTS orchestration_runs (
+    id SERIAL PRIMARY KEY,
+    status VARCHAR(20) NOT NULL,  -- running, success, partial_success, failed
+    message TEXT,
+    total_sources INTEGER DEFAULT 0,
+    success_sources INTEGER DEFAULT 0,
+    failed_sources INTEGER DEFAULT 0,
+    extracted_tables INTEGER DEFAULT 0,
+    max_workers INTEGER,
+    triggered_by VARCHAR(80),
+    started_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP,
+    finished_at TIMESTAMP,
+    duration INTEGER
+);
+
+CREATE INDEX idx_orchestration_runs_status ON orchestration_runs(status);
+CREATE INDEX idx_orchestration_runs_started ON orchestration_runs(started_at);
+
+-- ============================================
+-- 13. 抽取作业队列表 (extraction_jobs)
+-- ============================================
+CREATE TABLE IF NOT EXISTS extraction_jobs (
+    id SERIAL PRIMARY KEY,
+    datasource_id INTEGER NOT NULL REFERENCES data_sources(id) ON DELETE CASCADE,
+    task_type VARCHAR(50) NOT NULL DEFAULT 'full',  -- full, incremental, schema_only
+    etl_task_id INTEGER REFERENCES etl_tasks(id) ON DELETE SET NULL,
+    status VARCHAR(20) NOT NULL DEFAULT 'queued',  -- queued, leased, success, partial_success, failed
+    priority INTEGER DEFAULT 0,
+    attempts INTEGER DEFAULT 0,
+    max_attempts INTEGER DEFAULT 3,
+    worker_id VARCHAR(255),
+    lease_expires_at TIMESTAMP,
+    heartbeat_at TIMESTAMP,
+    available_at TIMESTAMP,
+    enqueued_at TIMESTAMP,
+    started_at TIMESTAMP,
+    finished_at TIMESTAMP,
+    history_id INTEGER REFERENCES extraction_history(id) ON DELETE SET NULL,
+    error TEXT,
+    requested_by VARCHAR(80)
+);
+
+CREATE INDEX idx_extraction_jobs_status_available ON extraction_jobs(status, priority, available_at);
+CREATE INDEX idx_extraction_jobs_lease ON extraction_jobs(lease_expires_at);
+CREATE INDEX idx_extraction_jobs_datasource ON extraction_jobs(datasource_id);
+
+-- ============================================
+-- 14. 抽取检查点表 (extraction_checkpoints)
+-- ============================================
+CREATE TABLE IF NOT EXISTS extraction_checkpoints (
+    id SERIAL PRIMARY KEY,
+    history_id INTEGER NOT NULL REFERENCES extraction_history(id) ON DELETE CASCADE,  -- 所属的抽取历史ID
+    datasource_id INTEGER NOT NULL REFERENCES data_sources(id) ON DELETE CASCADE,
+    schema_name VARCHAR(255),
+    table_name VARCHAR(255) NOT NULL,  -- 已完成的表名
+    batch_no INTEGER NOT NULL,  -- 批次号
+    created_at TIMESTAMP
+);
+
+CREATE INDEX idx_extraction_checkpoints_history ON extraction_checkpoints(history_id);
+
+-- ============================================
+-- 15. 抽取剖析表 (extraction_profiles)
+-- ============================================
+CREATE TABLE IF NOT EXISTS extraction_profiles (
+    id SERIAL PRIMARY KEY,
+    history_id INTEGER NOT NULL UNIQUE REFERENCES extraction_history(id) ON DELETE CASCADE,  -- 所属的抽取历史ID
+    datasource_id INTEGER NOT NULL REFERENCES data_sources(id) ON DELETE CASCADE,
+    total_ms DOUBLE PRECISION,  -- 运行总耗时（毫秒）
+    statement_count INTEGER DEFAULT 0,  -- 执行的语句数
+    error_count INTEGER DEFAULT 0,  -- 出错的语句数
+    rows_fetched BIGINT DEFAULT 0,  -- 返回的行数
+    profile TEXT,  -- 剖析结果JSON
+    created_at TIMESTAMP
+);
+
+-- ============================================
+-- 16. 表抽取统计表 (table_extraction_stats)
+-- ============================================
+CREATE TABLE IF NOT EXISTS table_extraction_stats (
+    id SERIAL PRIMARY KEY,
+    history_id INTEGER NOT NULL REFERENCES extraction_history(id) ON DELETE CASCADE,  -- 所属的抽取历史ID
+    datasource_id INTEGER NOT NULL REFERENCES data_sources(id) ON DELETE CASCADE,
+    table_name VARCHAR(255) NOT NULL,
+    status VARCHAR(20) NOT NULL,  -- success, failed, timeout
+    duration_ms DOUBLE PRECISION,  -- 抽取耗时（毫秒，包含重试）
+    query_count INTEGER DEFAULT 0,  -- 执行的语句数
+    row_count BIGINT,
+    size_bytes BIGINT,
+    error VARCHAR(1000),  -- 错误信息（截断）
+    created_at TIMESTAMP
+);
+
+CREATE INDEX idx_table_extraction_stats_history ON table_extraction_stats(history_id);
+CREATE INDEX idx_table_stats_source_table ON table_extraction_stats(datasource_id, table_name);
+CREATE INDEX idx_table_extraction_stats_created ON table_extraction_stats(created_at);
+
+-- ============================================
+-- 17. 表容量采样表 (table_size_samples)
+-- ============================================
+CREATE TABLE IF NOT EXISTS table_size_samples (
+    id SERIAL PRIMARY KEY,
+    datasource_id INTEGER NOT NULL REFERENCES data_sources(id) ON DELETE CASCADE,
+    table_name VARCHAR(255) NOT NULL,
+    granularity VARCHAR(10) NOT NULL,  -- raw, day, week, month
+    bucket_start TIMESTAMP NOT NULL,  -- 采样时间（raw）或汇总区间的起始时间
+    row_count BIGINT,  -- 行数（汇总层为区间内最后一次采样的值）
+    size_bytes BIGINT,
+    samples INTEGER DEFAULT 1  -- 汇总的采样次数
+);
+
+CREATE UNIQUE INDEX idx_size_samples_key ON table_size_samples(datasource_id, table_name, granularity, bucket_start);
+CREATE INDEX idx_size_samples_tier ON table_size_samples(granularity, bucket_start);
+
+-- ============================================
+-- 18. 表结构版本表 (schema_versions)
+-- ============================================
+CREATE TABLE IF NOT EXISTS schema_versions (
+    id SERIAL PRIMARY KEY,
+    datasource_id INTEGER NOT NULL REFERENCES data_sources(id) ON DELETE CASCADE,
+    version INTEGER NOT NULL,  -- 数据源内递增的版本号
+    history_id INTEGER REFERENCES extraction_history(id) ON DELETE SET NULL,  -- 产生该版本的抽取历史ID
+    is_checkpoint BOOLEAN DEFAULT FALSE,  -- 是否为完整快照
+    payload BYTEA NOT NULL,  -- zlib压缩的JSON：完整快照或增量
+    tables_count INTEGER DEFAULT 0,
+    tables_added INTEGER DEFAULT 0,
+    tables_removed INTEGER DEFAULT 0,
+    tables_altered INTEGER DEFAULT 0,
+    created_at TIMESTAMP
+);
+
+CREATE UNIQUE INDEX idx_schema_versions_source_version ON schema_versions(datasource_id, version);
+CREATE INDEX idx_schema_versions_created ON schema_versions(created_at);
+
+-- ============================================
+-- 19. 字段画像表 (column_profiles)
+-- ============================================
+CREATE TABLE IF NOT EXISTS column_profiles (
+    id SERIAL PRIMARY KEY,
+    datasource_id INTEGER NOT NULL REFERENCES data_sources(id) ON DELETE CASCADE,
+    table_name VARCHAR(255) NOT NULL,
+    column_name VARCHAR(255) NOT NULL,
+    data_type VARCHAR(100),  -- 画像时的字段类型
+    sample_method VARCHAR(20),  -- tablesample, sample, limit
+    sampled_rows BIGINT DEFAULT 0,  -- 累计采样行数
+    null_count BIGINT DEFAULT 0,  -- 采样中的空值数
+    distinct_count BIGINT,  -- 采样中不同值数的估算
+    min_value VARCHAR(255),
+    max_value VARCHAR(255),
+    quantiles TEXT,  -- 数值字段的分位数（JSON）
+    top_values TEXT,  -- 高频值及估算频次（JSON）
+    sketch BYTEA,  -- zlib压缩的JSON：可合并的草图
+    samples INTEGER DEFAULT 1,  -- 合并的采样次数
+    cost_seconds REAL,  -- 最近一次采样该表的耗时（秒）
+    profiled_at TIMESTAMP  -- 最近一次画像时间
+);
+
+CREATE UNIQUE INDEX idx_column_profiles_key ON column_profiles(datasource_id, table_name, column_name);
+
+-- ============================================
+-- 20. 抽取历史按天汇总表 (extraction_history_daily)
+-- ============================================
+CREATE TABLE IF NOT EXISTS extraction_history_daily (
+    id SERIAL PRIMARY KEY,
+    datasource_id INTEGER NOT NULL REFERENCES data_sources(id) ON DELETE CASCADE,
+    day TIMESTAMP NOT NULL,  -- 日期（当天零点）
+    task_type VARCHAR(50) NOT NULL DEFAULT '',  -- 任务类型，未记录时为空字符串
+    status VARCHAR(20) NOT NULL,
+    runs INTEGER DEFAULT 0,  -- 运行次数
+    extracted_tables BIGINT DEFAULT 0,  -- 抽取的表数量合计
+    total_duration BIGINT DEFAULT 0,  -- 耗时合计（秒）
+    max_duration INTEGER  -- 最长耗时（秒）
+);
+
+CREATE UNIQUE INDEX idx_history_daily_key ON extraction_history_daily(datasource_id, day, task_type, status);
+
+-- ============================================
+-- 21. 数据源抽取锁表 (extraction_locks)
+-- ============================================
+CREATE TABLE IF NOT EXISTS extraction_locks (
+    datasource_id INTEGER PRIMARY KEY REFERENCES data_sources(id) ON DELETE CASCADE,  -- 每个数据源最多一把锁
+    owner VARCHAR(255) NOT NULL,  -- 持有者：主机名:进程号:随机后缀
+    task_type VARCHAR(50),  -- 持有锁的运行的任务类型
+    history_id INTEGER REFERENCES extraction_history(id) ON DELETE SET NULL,  -- 持有锁的抽取历史记录ID
+    acquired_at TIMESTAMP,  -- 获得锁的时间
+    heartbeat_at TIMESTAMP,  -- 最近一次续约时间
+    expires_at TIMESTAMP NOT NULL  -- 锁到期时间，过期未续约的锁可被接管
+);
+
 -- ============================================
 -- 初始化数据
 -- ============================================
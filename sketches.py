@@ -0,0 +1,173 @@
+"""
+可合并的数据草图
+
+字段画像只能基于采样数据计算，多次采样的结果需要能够合并，这里实现三种固定内存、可合并的草图：
+1. HyperLogLog：估算不同值的数量（NDV）
+2. KLL：估算数值字段的分位数
+3. Misra-Gries：估算出现频率最高的值
+
+草图可以序列化为JSON兼容的字典，与字段画像一起保存，下次采样后合并
+"""
+import base64
+import hashlib
+import math
+import random
+from typing import Dict, Any, List, Optional
+
+
+def _hash64(value) -> int:
+    """值的64位哈希（跨进程稳定，不能使用内置 hash）"""
+    return int.from_bytes(hashlib.blake2b(repr(value).encode('utf-8'), digest_size=8).digest(), 'big')
+
+
+class HyperLogLog:
+    """
+    HyperLogLog 不同值计数，2^precision 个寄存器，相对误差约 1.04 / sqrt(2^precision)
+    """
+
+    def __init__(self, precision: int = 12, registers: Optional[bytearray] = None):
+        self.precision = precision
+        self.size = 1 << precision
+        self.registers = registers if registers is not None else bytearray(self.size)
+
+    def add(self, value):
+        hashed = _hash64(value)
+        index = hashed >> (64 - self.precision)
+        rest = hashed & ((1 << (64 - self.precision)) - 1)
+        rank = (64 - self.precision) - rest.bit_length() + 1
+        if rank > self.registers[index]:
+            self.registers[index] = rank
+
+    def merge(self, other: 'HyperLogLog'):
+        if other.precision != self.precision:
+            raise ValueError("HyperLogLog 精度不一致，不能合并")
+        self.registers = bytearray(max(a, b) for a, b in zip(self.registers, other.registers))
+
+    def count(self) -> int:
+        alpha = 0.7213 / (1 + 1.079 / self.size)
+        estimate = alpha * self.size * self.size / sum(2.0 ** -register for register in self.registers)
+        zeros = self.registers.count(0)
+        # 小基数时使用线性计数修正
+        if estimate <= 2.5 * self.size and zeros:
+            estimate = self.size * math.log(self.size / zeros)
+        return int(round(estimate))
+
+    def to_dict(self) -> Dict[str, Any]:
+        return {'precision': self.precision, 'registers': base64.b64encode(bytes(self.registers)).decode('ascii')}
+
+    @classmethod
+    def from_dict(cls, data: Dict[str, Any]) -> 'HyperLogLog':
+        return cls(data['precision'], bytearray(base64.b64decode(data['registers'])))
+
+
+class KLLSketch:
+    """
+    KLL 分位数草图：多层压缩器，每层满时排序后随机保留一半并提升到上一层（权重翻倍），
+    k 越大越精确，保留的值约为 3k 个
+    """
+
+    def __init__(self, k: int = 200, compactors: Optional[List[List[float]]] = None, count: int = 0):
+        self.k = k
+        self.compactors = compactors or [[]]
+        self.count = count
+
+    def _capacity(self, level: int) -> int:
+        depth = len(self.compactors) - level - 1
+        return max(2, int(math.ceil(self.k * (2 / 3) ** depth)))
+
+    def _size(self) -> int:
+        return sum(len(compactor) for compactor in self.compactors)
+
+    def _max_size(self) -> int:
+        return sum(self._capacity(level) for level in range(len(self.compactors)))
+
+    def _compress(self):
+        while self._size() > self._max_size():
+            for level, compactor in enumerate(self.compactors):
+                if len(compactor) >= self._capacity(level):
+                    if level + 1 == len(self.compactors):
+                        self.compactors.append([])
+                    compactor.sort()
+                    offset = random.randint(0, 1)
+                    self.compactors[level + 1].extend(compactor[offset::2])
+                    self.compactors[level] = []
+                    break
+
+    def add(self, value: float):
+        self.compactors[0].append(value)
+        self.count += 1
+        if len(self.compactors[0]) >= self._capacity(0):
+            self._compress()
+
+    def merge(self, other: 'KLLSketch'):
+        while len(self.compactors) < len(other.compactors):
+            self.compactors.append([])
+        for level, compactor in enumerate(other.compactors):
+            self.compactors[level].extend(compactor)
+        self.count += other.count
+        self._compress()
+
+    def quantiles(self, ranks: List[float]) -> List[Optional[float]]:
+        """
+        :param ranks: 0~1 之间的分位点
+        :return: 各分位点的估算值，草图为空时为None
+        """
+        weighted = sorted((value, 1 << level) for level, compactor in enumerate(self.compactors) for value in compactor)
+        if not weighted:
+            return [None for _ in ranks]
+        total = sum(weight for _, weight in weighted)
+        result = []
+        for rank in ranks:
+            target = rank * total
+            cumulative = 0
+            for value, weight in weighted:
+                cumulative += weight
+                if cumulative >= target:
+                    break
+            result.append(value)
+        return result
+
+    def to_dict(self) -> Dict[str, Any]:
+        return {'k': self.k, 'count': self.count, 'compactors': self.compactors}
+
+    @classmethod
+    def from_dict(cls, data: Dict[str, Any]) -> 'KLLSketch':
+        return cls(data['k'], [list(compactor) for compactor in data['compactors']], data['count'])
+
+
+class FrequentItems:
+    """
+    Misra-Gries 高频值草图：最多保留 capacity 个计数器，计数为真实频次的下界，误差不超过 N / (capacity + 1)
+    """
+
+    def __init__(self, capacity: int = 32, counters: Optional[Dict[str, int]] = None):
+        self.capacity = capacity
+        self.counters = counters or {}
+
+    def _trim(self):
+        if len(self.counters) <= self.capacity:
+            return
+        # 所有计数减去第 capacity+1 大的计数，丢弃不为正的
+        threshold = sorted(self.counters.values(), reverse=True)[self.capacity]
+        self.counters = {item: count - threshold for item, count in self.counters.items() if count > threshold}
+
+    def update(self, counts: Dict[str, int]):
+        """批量加入精确计数（如一次采样的 Counter），只做一次裁剪"""
+        for item, count in counts.items():
+            self.counters[item] = self.counters.get(item, 0) + count
+        self._trim()
+
+    def merge(self, other: 'FrequentItems'):
+        self.update(other.counters)
+
+    def top(self, limit: int) -> List[List[Any]]:
+        """[[值, 估算频次]]，按频次倒序"""
+        return [[item, count] for item, count in
+                sorted(self.counters.items(), key=lambda pair: pair[1], reverse=True)[:limit]]
+
+    def to_dict(self) -> Dict[str, Any]:
+        return {'capacity': self.capacity, 'counters': self.counters}
+
+    @classmethod
+    def from_dict(cls, data: Dict[str, Any]) -> 'FrequentItems':
+        return cls(data['capacity'], dict(data['counters']))
@@ -0,0 +1,324 @@
+"""
+数据源保护限流
+
+抽取面对的源库通常是生产OLTP库，限流器挂在源库引擎的 before/after_cursor_execute 事件上，
+对每条语句生效，不需要修改各抽取器的查询：
+1. 令牌桶限制每秒查询数（max_qps）
+2. 限制同时执行的语句数（max_concurrent）
+3. 跟踪语句延迟的快慢两条EWMA，快线超过基线的 latency_factor 倍时逐级退避，恢复后逐级解除
+4. 静默时段（quiet_hours）内只允许轻量统计：行数使用目录中的估算值，不执行 COUNT(*)
+
+同一数据源在进程内共用一个限流器，限流决策按运行记录到抽取历史的 details 中
+"""
+import asyncio
+import json
+import logging
+import threading
+import time
+from datetime import datetime
+from typing import Dict, Any, List, Optional
+
+from sqlalchemy import event
+from sqlalchemy.util import await_only
+
+from config import Config
+from exceptions import ValidationException
+
+
+# 延迟基线需要的最少样本数，之前不做退避判断
+WARMUP_SAMPLES = 20
+# 快、慢EWMA的平滑系数
+FAST_ALPHA = 0.3
+SLOW_ALPHA = 0.02
+# 延迟高出基线的绝对值下限（秒），避免毫秒级以下的抖动触发退避
+MIN_LATENCY_DELTA = 0.005
+# 两次调整退避等级之间至少观察的样本数
+ADJUST_INTERVAL = 5
+# 退避等级上限及每级的基础等待时间（秒）
+MAX_BACKOFF_LEVEL = 6
+BACKOFF_BASE_DELAY = 0.05
+# 每个限流器最多保留的决策记录数，以及每次运行写入历史记录的决策数
+MAX_DECISIONS = 500
+MAX_RUN_DECISIONS = 50
+
+
+def _parse_window(window: str):
+    """解析 'HH:MM-HH:MM' 格式的时段，返回 (开始分钟, 结束分钟)"""
+    try:
+        start, end = window.split('-')
+        start_hour, start_minute = (int(part) for part in start.strip().split(':'))
+        end_hour, end_minute = (int(part) for part in end.strip().split(':'))
+    except ValueError:
+        raise ValidationException(f"静默时段格式错误，应为 HH:MM-HH:MM: {window}")
+    if not (0 <= start_hour < 24 and 0 <= end_hour < 24 and 0 <= start_minute < 60 and 0 <= end_minute < 60):
+        raise ValidationException(f"静默时段时间无效: {window}")
+    return start_hour * 60 + start_minute, end_hour * 60 + end_minute
+
+
+def parse_throttle_config(raw) -> Dict[str, Any]:
+    """
+    解析并校验数据源的限流配置，未配置的项使用全局默认值
+    :param raw: JSON字符串或字典，可包含 max_qps, max_concurrent, latency_factor, quiet_hours
+    :return: 完整的限流配置
+    """
+    if isinstance(raw, str):
+        try:
+            raw = json.loads(raw) if raw.strip() else {}
+        except ValueError:
+            raise ValidationException("限流配置不是有效的JSON")
+    raw = raw or {}
+    if not isinstance(raw, dict):
+        raise ValidationException("限流配置必须是对象")
+
+    quiet_hours = raw.get('quiet_hours', Config.THROTTLE_QUIET_HOURS) or []
+    if isinstance(quiet_hours, str):
+        quiet_hours = [window.strip() for window in quiet_hours.split(',') if window.strip()]
+    if not isinstance(quiet_hours, list) or not all(isinstance(window, str) for window in quiet_hours):
+        raise ValidationException("quiet_hours 必须是 HH:MM-HH:MM 格式的字符串或字符串列表")
+    for window in quiet_hours:
+        _parse_window(window)
+
+    try:
+        config = {
+            'max_qps': float(raw.get('max_qps', Config.THROTTLE_MAX_QPS)),
+            'max_concurrent': int(raw.get('max_concurrent', Config.THROTTLE_MAX_CONCURRENT)),
+            'latency_factor': float(raw.get('latency_factor', Config.THROTTLE_LATENCY_FACTOR)),
+            'quiet_hours': list(quiet_hours),
+        }
+    except (TypeError, ValueError):
+        raise ValidationException("限流配置的数值项无效")
+    if config['max_qps'] < 0 or config['max_concurrent'] < 0:
+        raise ValidationException("max_qps 和 max_concurrent 不能为负数（0表示不限制）")
+    if config['latency_factor'] <= 1:
+        raise ValidationException("latency_factor 必须大于1")
+    return config
+
+
+class SourceThrottle:
+    """
+    单个数据源的自适应限流器
+    """
+
+    def __init__(self, source_id: int, config: Dict[str, Any]):
+        self.source_id = source_id
+        self.config = config
+        self.max_qps = config['max_qps']
+        self.max_concurrent = config['max_concurrent']
+        self.latency_factor = config['latency_factor']
+        self.quiet_windows = [_parse_window(window) for window in config['quiet_hours']]
+
+        self._lock = threading.Lock()
+        self._slot_available = threading.Condition(self._lock)
+        self._tokens = max(self.max_qps, 1.0)
+        self._last_refill = time.monotonic()
+        self._in_flight = 0
+
+        self._fast_latency = None
+        self._baseline_latency = None
+        self._samples = 0
+        self._samples_since_adjust = 0
+        self.backoff_level = 0
+        self._quiet_active = False
+
+        self.statements = 0
+        self.wait_seconds = 0.0
+        self._decisions: List[Dict[str, Any]] = []
+        self._decision_seq = 0
+
+    # ---------- 决策记录 ----------
+
+    def _record(self, action: str, **detail):
+        """记录一条限流决策，调用方需持有锁"""
+        self._decision_seq += 1
+        self._decisions.append({
+            'seq': self._decision_seq,
+            'time': datetime.utcnow().isoformat(),
+            'action': action,
+            **detail
+        })
+        if len(self._decisions) > MAX_DECISIONS:
+            del self._decisions[:len(self._decisions) - MAX_DECISIONS]
+        logging.info(f"数据源 {self.source_id} 限流决策: {action} {detail}")
+
+    def marker(self) -> Dict[str, Any]:
+        """运行开始时的位置标记，配合 summary_since 获取本次运行的限流情况"""
+        with self._lock:
+            return {'seq': self._decision_seq, 'statements': self.statements, 'wait_seconds': self.wait_seconds}
+
+    def summary_since(self, marker: Dict[str, Any]) -> Dict[str, Any]:
+        """获取标记之后的限流统计和决策（只保留最近的 MAX_RUN_DECISIONS 条）"""
+        with self._lock:
+            decisions = [d for d in self._decisions if d['seq'] > marker['seq']]
+            return {
+                'config': self.config,
+                'statements': self.statements - marker['statements'],
+                'wait_seconds': round(self.wait_seconds - marker['wait_seconds'], 3),
+                'backoff_level': self.backoff_level,
+                'quiet_hours': self._quiet_active,
+                'baseline_latency_ms': round(self._baseline_latency * 1000, 2) if self._baseline_latency else None,
+                'decisions_count': self._decision_seq - marker['seq'],
+                'decisions': decisions[-MAX_RUN_DECISIONS:],
+            }
+
+    # ---------- 静默时段 ----------
+
+    def in_quiet_hours(self, now: datetime = None) -> bool:
+        """当前是否处于静默时段（本地时间）"""
+        if not self.quiet_windows:
+            return False
+        now = now or datetime.now()
+        minute = now.hour * 60 + now.minute
+        for start, end in self.quiet_windows:
+            if start <= end:
+                if start <= minute < end:
+                    return True
+            elif minute >= start or minute < end:  # 跨零点的时段
+                return True
+        return False
+
+    def lightweight_only(self) -> bool:
+        """是否只允许轻量统计查询，进入和离开静默时段时记录决策"""
+        quiet = self.in_quiet_hours()
+        with self._lock:
+            if quiet != self._quiet_active:
+                self._quiet_active = quiet
+                self._record('quiet_hours_start' if quiet else 'quiet_hours_end',
+                             windows=self.config['quiet_hours'])
+        return quiet
+
+    # ---------- 令牌桶与退避 ----------
+
+    def _refill(self, now: float):
+        if self.max_qps <= 0:
+            return
+        self._tokens = min(max(self.max_qps, 1.0), self._tokens + (now - self._last_refill) * self.max_qps)
+        self._last_refill = now
+
+    def _backoff_delay(self) -> float:
+        return BACKOFF_BASE_DELAY * (2 ** self.backoff_level) if self.backoff_level else 0.0
+
+    def _reserve(self) -> float:
+        """
+        占用一个令牌（余额可以为负），返回调用方在执行语句前需要等待的秒数，调用方需持有锁
+        """
+        now = time.monotonic()
+        self._refill(now)
+        delay = self._backoff_delay()
+        if self.max_qps > 0:
+            self._tokens -= 1
+            if self._tokens < 0:
+                delay = max(delay, -self._tokens / self.max_qps)
+        self.statements += 1
+        self.wait_seconds += delay
+        return delay
+
+    def acquire(self):
+        """语句执行前调用（阻塞）：等待并发名额、令牌和退避时间"""
+        with self._slot_available:
+            waited = time.monotonic()
+            while self.max_concurrent and self._in_flight >= self.max_concurrent:
+                self._slot_available.wait()
+            self.wait_seconds += time.monotonic() - waited
+            self._in_flight += 1
+            delay = self._reserve()
+        if delay > 0:
+            time.sleep(delay)
+
+    async def acquire_async(self):
+        """
+        异步驱动的语句执行前调用：占用令牌并等待，不阻塞事件循环
+        并发数由异步抽取器的连接池大小限制（不超过 max_concurrent），这里不等待并发名额
+        """
+        with self._lock:
+            self._in_flight += 1
+            delay = self._reserve()
+        if delay > 0:
+            await asyncio.sleep(delay)
+
+    def release(self, latency: Optional[float]):
+        """语句结束后调用：释放并发名额并根据延迟调整退避等级"""
+        with self._slot_available:
+            self._in_flight = max(0, self._in_flight - 1)
+            if latency is not None:
+                self._observe(latency)
+            self._slot_available.notify()
+
+    def _observe(self, latency: float):
+        """更新延迟EWMA并调整退避等级，调用方需持有锁"""
+        self._samples += 1
+        if self._fast_latency is None:
+            self._fast_latency = self._baseline_latency = latency
+            return
+        self._fast_latency += FAST_ALPHA * (latency - self._fast_latency)
+        if self._samples < WARMUP_SAMPLES:
+            self._baseline_latency += (latency - self._baseline_latency) / self._samples
+            return
+
+        self._samples_since_adjust += 1
+        congested = (self._fast_latency > self._baseline_latency * self.latency_factor
+                     and self._fast_latency - self._baseline_latency > MIN_LATENCY_DELTA)
+        if not congested and self.backoff_level == 0:
+            # 只在未退避时更新基线，避免源库持续变慢时基线被抬高
+            self._baseline_latency += SLOW_ALPHA * (latency - self._baseline_latency)
+            return
+        if self._samples_since_adjust < ADJUST_INTERVAL:
+            return
+
+        if congested and self.backoff_level < MAX_BACKOFF_LEVEL:
+            self.backoff_level += 1
+            self._samples_since_adjust = 0
+            self._record('backoff', level=self.backoff_level,
+                         latency_ms=round(self._fast_latency * 1000, 2),
+                         baseline_ms=round(self._baseline_latency * 1000, 2))
+        elif self.backoff_level > 0 and self._fast_latency < self._baseline_latency * 1.2:
+            self.backoff_level -= 1
+            self._samples_since_adjust = 0
+            self._record('recover', level=self.backoff_level,
+                         latency_ms=round(self._fast_latency * 1000, 2))
+
+    # ---------- 引擎挂载 ----------
+
+    def instrument(self, engine, blocking: bool = True):
+        """
+        在源库引擎上注册语句事件
+        :param engine: 同步引擎（异步引擎传入 engine.sync_engine）
+        :param blocking: 是否在语句执行前阻塞等待；异步驱动的事件在 run_sync 的 greenlet 中触发，
+                         需要传False，通过 await_only 在事件循环中等待
+        """
+        @event.listens_for(engine, 'before_cursor_execute')
+        def before_cursor_execute(conn, cursor, statement, parameters, context, executemany):
+            if blocking:
+                self.acquire()
+            else:
+                await_only(self.acquire_async())
+            if context is not None:
+                context._throttle_start = time.monotonic()
+
+        @event.listens_for(engine, 'after_cursor_execute')
+        def after_cursor_execute(conn, cursor, statement, parameters, context, executemany):
+            start = getattr(context, '_throttle_start', None)
+            self.release(time.monotonic() - start if start is not None else None)
+
+        @event.listens_for(engine, 'handle_error')
+        def handle_error(exception_context):
+            context = exception_context.execution_context
+            if context is not None and hasattr(context, '_throttle_start'):
+                self.release(None)
+
+
+_throttles: Dict[int, SourceThrottle] = {}
+_throttles_lock = threading.Lock()
+
+
+def get_throttle(datasource) -> SourceThrottle:
+    """
+    获取数据源的限流器，同一进程内同一数据源共用；配置变更后重建
+    :param datasource: 数据源
+    """
+    config = parse_throttle_config(getattr(datasource, 'throttle_config', None))
+    with _throttles_lock:
+        throttle = _throttles.get(datasource.id)
+        if throttle is None or throttle.config != config:
+            throttle = SourceThrottle(datasource.id, config)
+            _throttles[datasource.id] = throttle
+        return throttle
@@ -0,0 +1,297 @@
+"""
+表容量增长
+
+每次抽取后追加各表的行数和大小采样，分层紧凑存储在 table_size_samples 中：
+1. raw：每次抽取的采样，只在数值变化（或距上一条超过一天）时写入，保留 GROWTH_RAW_RETENTION_DAYS 天
+2. day / week / month：按区间汇总，记录区间内最后一次采样的值，
+   分别保留 GROWTH_DAILY_RETENTION_DAYS、GROWTH_WEEKLY_RETENTION_DAYS 天和永久
+查询时按时间范围自动选择粒度，提供单表、单数据源的趋势和增长最快的表
+"""
+from datetime import datetime, timedelta
+from typing import Dict, Any, List, Optional
+
+from sqlalchemy import func, and_, insert
+from sqlalchemy.orm import aliased
+
+from config import Config
+from models import DataSource, TableSizeSample
+from db_manager import get_db_session
+from exceptions import ValidationException
+
+
+GRANULARITIES = ('raw', 'day', 'week', 'month')
+ROLLUP_GRANULARITIES = ('day', 'week', 'month')
+GROWTH_METRICS = ('size_bytes', 'row_count')
+# 数值未变化时，raw 层至少每隔多久保留一条采样，保证短时间范围的趋势有数据点
+RAW_HEARTBEAT = timedelta(days=1)
+
+
+def bucket_start(moment: datetime, granularity: str) -> datetime:
+    """
+    计算时间所属汇总区间的起始时间
+    :param granularity: raw（精确到秒）, day, week（周一）, month
+    """
+    if granularity == 'raw':
+        return moment.replace(microsecond=0)
+    day = moment.replace(hour=0, minute=0, second=0, microsecond=0)
+    if granularity == 'day':
+        return day
+    if granularity == 'week':
+        return day - timedelta(days=day.weekday())
+    if granularity == 'month':
+        return day.replace(day=1)
+    raise ValidationException(f"不支持的粒度: {granularity}")
+
+
+def retention_days(granularity: str) -> Optional[int]:
+    """各粒度的保留天数，None 表示永久保留"""
+    return {
+        'raw': Config.GROWTH_RAW_RETENTION_DAYS,
+        'day': Config.GROWTH_DAILY_RETENTION_DAYS,
+        'week': Config.GROWTH_WEEKLY_RETENTION_DAYS,
+        'month': None,
+    }[granularity]
+
+
+def pick_granularity(days: int, granularity: Optional[str] = None, rollup_only: bool = False) -> str:
+    """
+    选择能覆盖时间范围的最细粒度
+    :param days: 查询的天数
+    :param granularity: 调用方指定的粒度，校验后直接使用
+    :param rollup_only: 只使用汇总层（raw 层只记录变化点，不能跨表求和）
+    """
+    if granularity:
+        if granularity not in GRANULARITIES or (rollup_only and granularity == 'raw'):
+            raise ValidationException(f"不支持的粒度: {granularity}")
+        return granularity
+    for candidate in (ROLLUP_GRANULARITIES if rollup_only else GRANULARITIES):
+        keep = retention_days(candidate)
+        if keep is None or days <= keep:
+            return candidate
+    return 'month'
+
+
+def record_samples(session, datasource_id: int, records: List[Dict[str, Any]],
+                   sampled_at: Optional[datetime] = None) -> int:
+    """
+    记录一次抽取的表容量采样
+    :param session: 数据库会话
+    :param records: [{table_name, row_count, size_bytes}]，两项都为空的表忽略
+    :param sampled_at: 采样时间，默认当前时间
+    :return: 写入的 raw 采样数
+    """
+    sampled_at = sampled_at or datetime.utcnow()
+    records = {record['table_name']: record for record in records
+               if record.get('row_count') is not None or record.get('size_bytes') is not None}
+    if not records:
+        return 0
+
+    # 各表最近一条 raw 采样，数值未变化时不重复写入
+    latest = session.query(
+        TableSizeSample.table_name, func.max(TableSizeSample.bucket_start).label('bucket_start')
+    ).filter(
+        TableSizeSample.datasource_id == datasource_id,
+        TableSizeSample.granularity == 'raw'
+    ).group_by(TableSizeSample.table_name).subquery()
+    previous = {row.table_name: row for row in session.query(TableSizeSample).join(latest, and_(
+        TableSizeSample.table_name == latest.c.table_name,
+        TableSizeSample.bucket_start == latest.c.bucket_start
+    )).filter(
+        TableSizeSample.datasource_id == datasource_id,
+        TableSizeSample.granularity == 'raw'
+    ).all()}
+
+    # 本次采样所属的各汇总区间中已有的记录
+    buckets = {granularity: bucket_start(sampled_at, granularity) for granularity in GRANULARITIES}
+    existing = {(row.table_name, row.granularity): row for row in session.query(TableSizeSample).filter(
+        TableSizeSample.datasource_id == datasource_id,
+        TableSizeSample.table_name.in_(list(records)),
+        TableSizeSample.granularity.in_(GRANULARITIES),
+        TableSizeSample.bucket_start.in_(set(buckets.values()))
+    ).all() if row.bucket_start == buckets[row.granularity]}
+
+    new_rows = []
+    raw_written = 0
+    for table_name, record in records.items():
+        row_count, size_bytes = record.get('row_count'), record.get('size_bytes')
+        last = previous.get(table_name)
+        unchanged = (last is not None and last.row_count == row_count and last.size_bytes == size_bytes
+                     and sampled_at - last.bucket_start < RAW_HEARTBEAT)
+        for granularity in GRANULARITIES:
+            if granularity == 'raw' and unchanged:
+                continue
+            row = existing.get((table_name, granularity))
+            if row is not None:
+                row.row_count = row_count
+                row.size_bytes = size_bytes
+                row.samples = (row.samples or 0) + 1
+            else:
+                new_rows.append({
+                    'datasource_id': datasource_id,
+                    'table_name': table_name,
+                    'granularity': granularity,
+                    'bucket_start': buckets[granularity],
+                    'row_count': row_count,
+                    'size_bytes': size_bytes,
+                    'samples': 1
+                })
+            if granularity == 'raw':
+                raw_written += 1
+
+    if new_rows:
+        session.execute(insert(TableSizeSample), new_rows)
+    return raw_written
+
+
+def compact_samples(session, datasource_id: Optional[int] = None, now: Optional[datetime] = None) -> int:
+    """
+    按各粒度的保留期删除过期采样
+    :param datasource_id: 只清理指定数据源，为空时清理全部
+    :return: 删除的行数
+    """
+    now = now or datetime.utcnow()
+    deleted = 0
+    for granularity in GRANULARITIES:
+        keep = retention_days(granularity)
+        if keep is None:
+            continue
+        query = session.query(TableSizeSample).filter(
+            TableSizeSample.granularity == granularity,
+            TableSizeSample.bucket_start < now - timedelta(days=keep)
+        )
+        if datasource_id:
+            query = query.filter(TableSizeSample.datasource_id == datasource_id)
+        deleted += query.delete(synchronize_session=False)
+    return deleted
+
+
+def _point(moment: datetime, row_count, size_bytes) -> Dict[str, Any]:
+    return {
+        'time': moment.isoformat() if moment else None,
+        'row_count': int(row_count) if row_count is not None else None,
+        'size_bytes': int(size_bytes) if size_bytes is not None else None
+    }
+
+
+def table_trend(datasource_id: int, table_name: str, days: int = 90,
+                granularity: Optional[str] = None) -> Dict[str, Any]:
+    """
+    单表的容量趋势
+    :param days: 最近多少天
+    :param granularity: 粒度，默认按时间范围自动选择
+    :return: {granularity, points: [{time, row_count, size_bytes}]}，raw 粒度只包含变化点
+    """
+    granularity = pick_granularity(days, granularity)
+    since = datetime.utcnow() - timedelta(days=days)
+    with get_db_session() as session:
+        rows = session.query(
+            TableSizeSample.bucket_start, TableSizeSample.row_count, TableSizeSample.size_bytes
+        ).filter(
+            TableSizeSample.datasource_id == datasource_id,
+            TableSizeSample.table_name == table_name,
+            TableSizeSample.granularity == granularity,
+            TableSizeSample.bucket_start >= bucket_start(since, granularity)
+        ).order_by(TableSizeSample.bucket_start).all()
+
+    return {
+        'datasource_id': datasource_id,
+        'table_name': table_name,
+        'granularity': granularity,
+        'points': [_point(*row) for row in rows]
+    }
+
+
+def source_trend(datasource_id: int, days: int = 90, granularity: Optional[str] = None) -> Dict[str, Any]:
+    """
+    数据源所有表合计的容量趋势
+    增量抽取只采样变化的表，区间内未采样到的表沿用该表在之前区间的取值
+    :return: {granularity, points: [{time, row_count, size_bytes, tables}]}
+    """
+    granularity = pick_granularity(days, granularity, rollup_only=True)
+    since = datetime.utcnow() - timedelta(days=days)
+    with get_db_session() as session:
+        rows = session.query(
+            TableSizeSample.bucket_start, TableSizeSample.table_name,
+            TableSizeSample.row_count, TableSizeSample.size_bytes
+        ).filter(
+            TableSizeSample.datasource_id == datasource_id,
+            TableSizeSample.granularity == granularity,
+            TableSizeSample.bucket_start >= bucket_start(since, granularity)
+        ).order_by(TableSizeSample.bucket_start).all()
+
+    points = []
+    current: Dict[str, tuple] = {}
+    for index, (moment, table_name, row_count, size_bytes) in enumerate(rows):
+        current[table_name] = (row_count or 0, size_bytes or 0)
+        if index + 1 == len(rows) or rows[index + 1][0] != moment:
+            points.append(dict(_point(moment, sum(value[0] for value in current.values()),
+                                      sum(value[1] for value in current.values())), tables=len(current)))
+
+    return {'datasource_id': datasource_id, 'granularity': granularity, 'points': points}
+
+
+def top_growing_tables(days: int = 30, limit: int = 10, metric: str = 'size_bytes',
+                       datasource_id: Optional[int] = None) -> List[Dict[str, Any]]:
+    """
+    时间范围内增长最快的表（比较范围内第一个和最后一个汇总区间的取值）
+    :param metric: size_bytes 或 row_count
+    :param datasource_id: 只统计指定数据源
+    """
+    if metric not in GROWTH_METRICS:
+        raise ValidationException(f"不支持的增长指标: {metric}")
+    granularity = pick_granularity(days, rollup_only=True)
+    since = bucket_start(datetime.utcnow() - timedelta(days=days), granularity)
+
+    with get_db_session() as session:
+        bounds = session.query(
+            TableSizeSample.datasource_id,
+            TableSizeSample.table_name,
+            func.min(TableSizeSample.bucket_start).label('first_bucket'),
+            func.max(TableSizeSample.bucket_start).label('last_bucket')
+        ).filter(
+            TableSizeSample.granularity == granularity,
+            TableSizeSample.bucket_start >= since
+        )
+        if datasource_id:
+            bounds = bounds.filter(TableSizeSample.datasource_id == datasource_id)
+        bounds = bounds.group_by(TableSizeSample.datasource_id, TableSizeSample.table_name).subquery()
+
+        first = aliased(TableSizeSample)
+        last = aliased(TableSizeSample)
+        growth = getattr(last, metric) - getattr(first, metric)
+        rows = session.query(
+            bounds.c.datasource_id, DataSource.name, bounds.c.table_name,
+            bounds.c.first_bucket, bounds.c.last_bucket,
+            getattr(first, metric), getattr(last, metric), first.row_count, last.row_count,
+            first.size_bytes, last.size_bytes
+        ).join(DataSource, DataSource.id == bounds.c.datasource_id).join(first, and_(
+            first.datasource_id == bounds.c.datasource_id,
+            first.table_name == bounds.c.table_name,
+            first.granularity == granularity,
+            first.bucket_start == bounds.c.first_bucket
+        )).join(last, and_(
+            last.datasource_id == bounds.c.datasource_id,
+            last.table_name == bounds.c.table_name,
+            last.granularity == granularity,
+            last.bucket_start == bounds.c.last_bucket
+        )).filter(
+            bounds.c.first_bucket < bounds.c.last_bucket,
+            growth > 0
+        ).order_by(growth.desc()).limit(limit).all()
+
+    result = []
+    for (source_id, source_name, table_name, first_bucket, last_bucket, start_value, end_value,
+         start_rows, end_rows, start_bytes, end_bytes) in rows:
+        result.append({
+            'datasource_id': source_id,
+            'datasource_name': source_name,
+            'table_name': table_name,
+            'since': first_bucket.isoformat(),
+            'until': last_bucket.isoformat(),
+            'row_count_growth': (end_rows or 0) - (start_rows or 0),
+            'size_bytes_growth': (end_bytes or 0) - (start_bytes or 0),
+            'row_count': end_rows,
+            'size_bytes': end_bytes,
+            'growth_percent': round((end_value - start_value) * 100 / start_value, 1) if start_value else None
+        })
+    return result
@@ -0,0 +1,78 @@
+"""
+异步抽取器测试脚本
+
+使用 SQLite 合成源库以线程池方式运行 AsyncMetadataExtractor，验证结果结构与同步抽取器一致、
+检查点回调按批交付全部表，以及检查点写入失败后立即取消其余的表
+"""
+import os
+import sys
+import tempfile
+
+sys.path.insert(0, os.path.dirname(os.path.abspath(__file__)))
+
+from benchmark import generate_catalog
+from models import DataSource
+from extractor_base import SQLiteMetadataExtractor, enable_sqlite_sources
+from async_extractor import AsyncMetadataExtractor
+
+
+def _source(tables):
+    enable_sqlite_sources()
+    path = os.path.join(tempfile.mkdtemp(), 'source.db')
+    generate_catalog(path, tables=tables, columns=5, fk_density=1, rows=2, seed=3)
+    return DataSource(id=1, name='合成库', type='sqlite', host='localhost', port=0, username='', password='',
+                      database=path)
+
+
+def _by_name(tables):
+    return sorted(tables, key=lambda table: table['table_info']['table_name'])
+
+
+def test_matches_sync_extractor():
+    source = _source(12)
+    expected = SQLiteMetadataExtractor(source).extract_metadata(full=True)
+
+    extractor = AsyncMetadataExtractor(source, concurrency=3)
+    assert extractor.mode == 'thread'
+    batches = []
+    result = extractor.extract_metadata(full=True, on_batch=batches.append, batch_size=5)
+
+    assert set(result) == set(expected)
+    for key in ('status', 'tables_count', 'failed_tables', 'skipped_tables', 'timed_out_tables', 'extraction_type'):
+        assert result[key] == expected[key], key
+    assert result['tables'] == [] and sorted(len(batch) for batch in batches) == [2, 5, 5]
+    assert _by_name([table for batch in batches for table in batch]) == _by_name(expected['tables'])
+    key = lambda rel: (rel['table_name'], rel['column_name'])
+    assert sorted(result['relationships'], key=key) == sorted(expected['relationships'], key=key)
+
+
+def test_checkpoint_error_cancels_remaining(monkeypatch):
+    source = _source(40)
+    extracted = []
+    original = SQLiteMetadataExtractor.extract_table
+
+    def extract_table(self, table_name, include_stats=True):
+        extracted.append(table_name)
+        return original(self, table_name, include_stats)
+
+    def failing_checkpoint(batch):
+        raise RuntimeError('元数据库写入失败')
+
+    monkeypatch.setattr(SQLiteMetadataExtractor, 'extract_table', extract_table)
+    result = AsyncMetadataExtractor(source, concurrency=2).extract_metadata(
+        full=True, on_batch=failing_checkpoint, batch_size=1
+    )
+    assert result['status'] == 'failed' and '元数据库写入失败' in result['message']
+    # 第一批写入失败后不再抽取排队中的表
+    assert len(extracted) <= 4
+
+
+if __name__ == '__main__':
+    import pytest
+    print("1. 测试与同步抽取器结果一致...")
+    test_matches_sync_extractor()
+    print("[OK] 完成")
+    print("2. 测试检查点失败后取消其余表...")
+    with pytest.MonkeyPatch.context() as patch:
+        test_checkpoint_error_cancels_remaining(patch)
+    print("[OK] 完成")
@@ -0,0 +1,81 @@
+"""
+基准测试工具测试脚本
+
+验证合成源库的结构可以被 SQLiteMetadataExtractor 完整抽取（只读打开、默认不注册），以及基线比较的回退判定
+"""
+import os
+import sys
+import tempfile
+
+sys.path.insert(0, os.path.dirname(os.path.abspath(__file__)))
+
+from models import DataSource
+from extractor_base import SQLiteMetadataExtractor, get_extractor_class, enable_sqlite_sources
+from benchmark import generate_catalog, compare_results
+
+
+def test_sqlite_extractor_on_synthetic_catalog():
+    path = os.path.join(tempfile.mkdtemp(), 'source.db')
+    catalog = generate_catalog(path, tables=30, columns=6, fk_density=1.5, rows=2, seed=7)
+    size = os.path.getsize(path)
+    enable_sqlite_sources()
+    assert get_extractor_class('sqlite') is SQLiteMetadataExtractor
+
+    source = DataSource(name='合成库', type='sqlite', host='localhost', port=0, username='', password='',
+                        database=path)
+    extractor = SQLiteMetadataExtractor(source)
+    result = extractor.extract_metadata(full=True)
+    extractor.disconnect()
+    assert os.path.getsize(path) == size  # 只读打开，不修改源库
+
+    assert result['status'] == 'success' and result['tables_count'] == 30
+    assert sum(len(table['columns']) for table in result['tables']) == catalog['columns']
+    assert len(result['relationships']) == catalog['foreign_keys']
+    first = result['tables'][0]
+    assert first['table_info']['schema_name'] == 'main' and first['table_info']['row_count'] == 2
+    assert first['columns'][0]['column_name'] == 'id' and first['columns'][0]['is_nullable'] == 'NO'
+
+
+def test_sqlite_sources_disabled_by_default():
+    import subprocess
+    code = ("import os, tempfile; from extractor_base import get_extractor_class; "
+            "from database_connections import SUPPORTED_DATABASES; "
+            "assert get_extractor_class('sqlite') is None and 'sqlite' not in SUPPORTED_DATABASES")
+    env = {k: v for k, v in os.environ.items() if k != 'ALLOW_SQLITE_SOURCES'}
+    subprocess.run([sys.executable, '-c', code], check=True, env=env,
+                   cwd=os.path.dirname(os.path.abspath(__file__)))
+
+    # 只读打开：文件不存在时连接失败，不创建空库
+    enable_sqlite_sources()
+    missing = os.path.join(tempfile.mkdtemp(), 'missing.db')
+    extractor = SQLiteMetadataExtractor(DataSource(name='不存在', type='sqlite', host='', port=0, username='',
+                                                   password='', database=missing))
+    try:
+        extractor.connect()
+    except Exception:
+        pass
+    assert not os.path.exists(missing)
+
+
+def test_compare_results():
+    def results(first_run, p50, p95):
+        return {'memory_traced': True, 'scenarios': [{'name': 't1000', 'metrics': {
+            'first_run_seconds': first_run, 'first_run_columns': 10000,
+            'api': {'table_detail': {'p50_ms': p50, 'p95_ms': p95, 'max_ms': 100}}}}]}
+
+    baseline = results(10.0, 5.0, 8.0)
+    assert compare_results(results(11.0, 5.5, 9.0), baseline, tolerance=0.2) == []
+    regressions = compare_results(results(13.0, 5.5, 20.0), baseline, tolerance=0.2)
+    assert [regression['metric'] for regression in regressions] == ['first_run_seconds', 'api.table_detail.p95_ms']
+
+
+if __name__ == '__main__':
+    print("1. 测试 SQLite 抽取器和合成源库...")
+    test_sqlite_extractor_on_synthetic_catalog()
+    print("[OK] 完成")
+    print("2. 测试默认不启用 SQLite 数据源...")
+    test_sqlite_sources_disabled_by_default()
+    print("[OK] 完成")
+    print("3. 测试基线比较...")
+    test_compare_results()
+    print("[OK] 完成")
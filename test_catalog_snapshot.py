@@ -0,0 +1,84 @@
+"""
+离线快照测试脚本
+
+验证快照写入后可以流式读回，以及校验和、数量和版本的校验
+"""
+import gzip
+import os
+import sys
+import tempfile
+
+sys.path.insert(0, os.path.dirname(os.path.abspath(__file__)))
+
+from models import DataSource
+from catalog_snapshot import SnapshotWriter, verify_snapshot, iter_snapshot, SNAPSHOT_VERSION
+from exceptions import ValidationException
+
+
+def _write(path):
+    source = DataSource(name='订单库', type='mysql', host='10.0.0.5', port=3306, username='reader', database='orders')
+    writer = SnapshotWriter(path, source)
+    for batch in range(3):
+        writer([{'table_info': {'table_name': f"t{batch}_{index}", 'schema_name': 'orders', 'comment': '',
+                                'row_count': index, 'size_bytes': 0},
+                 'columns': [{'column_name': 'id', 'data_type': 'bigint', 'is_nullable': 'NO', 'default_value': None,
+                              'column_comment': '主键', 'ordinal_position': 1}]} for index in range(4)])
+    writer.finish([{'constraint_name': 'fk', 'table_name': 't0_1', 'column_name': 'id',
+                    'referenced_table_name': 't0_0', 'referenced_column_name': 'id'}])
+
+
+def _assert_rejected(path):
+    try:
+        verify_snapshot(path)
+        assert False, "应拒绝损坏的快照"
+    except ValidationException:
+        pass
+
+
+def test_round_trip():
+    path = os.path.join(tempfile.mkdtemp(), 'a.snapshot.gz')
+    _write(path)
+    summary = verify_snapshot(path)
+    assert summary['header']['version'] == SNAPSHOT_VERSION
+    assert summary['header']['source']['database'] == 'orders'
+    assert (summary['tables'], summary['columns'], summary['relationships']) == (12, 12, 1)
+    records = list(iter_snapshot(path))
+    assert [record['type'] for record in records] == ['table'] * 12 + ['relationship']
+    assert records[0]['columns'][0]['column_comment'] == '主键'
+
+
+def test_corrupted_snapshots():
+    directory = tempfile.mkdtemp()
+    path = os.path.join(directory, 'a.snapshot.gz')
+    _write(path)
+    lines = gzip.open(path, 'rb').read().splitlines(True)
+
+    # 修改一行内容、丢失文件尾、截断压缩流
+    tampered = os.path.join(directory, 'tampered.gz')
+    with gzip.open(tampered, 'wb') as file:
+        file.write(b''.join(lines).replace(b'"row_count": 3', b'"row_count": 4'))
+    _assert_rejected(tampered)
+
+    truncated = os.path.join(directory, 'truncated.gz')
+    with gzip.open(truncated, 'wb') as file:
+        file.write(b''.join(lines[:-1]))
+    _assert_rejected(truncated)
+
+    broken = os.path.join(directory, 'broken.gz')
+    with open(path, 'rb') as source, open(broken, 'wb') as target:
+        target.write(source.read()[:-20])
+    _assert_rejected(broken)
+
+    newer = os.path.join(directory, 'newer.gz')
+    with gzip.open(newer, 'wb') as file:
+        file.write(lines[0].replace(f'"version": {SNAPSHOT_VERSION}'.encode(), b'"version": 99') + b''.join(lines[1:]))
+    _assert_rejected(newer)
+
+
+if __name__ == '__main__':
+    print("1. 测试快照写入和读取...")
+    test_round_trip()
+    print("[OK] 完成")
+    print("2. 测试损坏快照的校验...")
+    test_corrupted_snapshots()
+    print("[OK] 完成")
@@ -0,0 +1,72 @@
+"""
+字段画像测试脚本
+
+验证草图的估算精度、合并后与一次性统计一致，以及画像字段的选择和抽样比例
+"""
+import os
+import random
+import sys
+
+sys.path.insert(0, os.path.dirname(os.path.abspath(__file__)))
+
+from sketches import HyperLogLog, KLLSketch, FrequentItems
+from column_profiling import ColumnSketch, profiled_columns
+from extractor_base import sample_percent
+
+
+def test_sketches():
+    hll = HyperLogLog()
+    for i in range(20000):
+        hll.add(str(i % 10000))
+    assert abs(hll.count() - 10000) < 500
+
+    rng = random.Random(7)
+    values = [rng.random() * 1000 for _ in range(50000)]
+    left, right = KLLSketch(), KLLSketch()
+    for index, value in enumerate(values):
+        (left if index % 2 else right).add(value)
+    left.merge(right)
+    assert left.count == 50000
+    median = left.quantiles([0.5])[0]
+    assert abs(median - sorted(values)[25000]) < 30
+
+    top = FrequentItems(capacity=8)
+    top.update({'hot': 500, **{f"cold{i}": 3 for i in range(100)}})
+    assert top.top(1)[0][0] == 'hot'
+
+
+def test_column_sketch_merge():
+    values = [None if i % 5 == 0 else i % 40 for i in range(1000)]
+    whole = ColumnSketch()
+    whole.update(values)
+    first, second = ColumnSketch(), ColumnSketch()
+    first.update(values[:400])
+    second.update(values[400:])
+    first.merge(ColumnSketch.from_dict(second.to_dict()))
+
+    summary = first.summary()
+    assert summary['sampled_rows'] == 1000 and summary['null_count'] == 200
+    # HyperLogLog 合并与一次性统计的结果完全相同
+    assert summary['distinct_count'] == whole.summary()['distinct_count']
+    assert abs(summary['distinct_count'] - 32) <= 1
+    assert summary['min_value'] == '1' and summary['max_value'] == '39'
+
+
+def test_profiled_columns_and_sampling():
+    columns = [('id', 'bigint'), ('payload', 'blob'), ('body', 'longtext'), ('attrs', 'json'), ('name', 'varchar(20)')]
+    assert profiled_columns(columns) == [('id', 'bigint'), ('name', 'varchar(20)')]
+    assert sample_percent(10000, 0) is None
+    assert sample_percent(10000, 15000) is None
+    assert sample_percent(10000, 10000000) == 0.2
+
+
+if __name__ == '__main__':
+    print("1. 测试草图精度...")
+    test_sketches()
+    print("[OK] 完成")
+    print("2. 测试字段草图合并...")
+    test_column_sketch_merge()
+    print("[OK] 完成")
+    print("3. 测试画像字段和抽样比例...")
+    test_profiled_columns_and_sampling()
+    print("[OK] 完成")
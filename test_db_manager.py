@@ -0,0 +1,66 @@
+"""
+数据库连接管理器测试脚本
+
+验证连接池按配置和进程数确定大小、连接参数按方言生成，以及重复初始化复用同一个连接池
+"""
+import os
+import sys
+import tempfile
+
+sys.path.insert(0, os.path.dirname(os.path.abspath(__file__)))
+
+import db_manager
+from db_manager import DatabaseManager, per_process_pool_size, init_db_manager
+from db_config import db_config
+
+
+def test_per_process_pool_size():
+    assert per_process_pool_size(10, 20) == (10, 20)
+    assert per_process_pool_size(10, 20, max_connections=100, worker_processes=4) == (10, 15)
+    assert per_process_pool_size(10, 20, max_connections=16, worker_processes=4) == (4, 0)
+    assert per_process_pool_size(10, 20, max_connections=2, worker_processes=4) == (1, 0)
+
+
+def test_manager_settings_and_status():
+    path = os.path.join(tempfile.mkdtemp(), 'metadata.db')
+    manager = DatabaseManager(f"sqlite:///{path}", pool_size=3, max_overflow=2, pool_recycle=120,
+                              max_connections=0)
+    assert 'charset' not in manager._connect_args() and manager._connect_args()['check_same_thread'] is False
+    assert manager.engine.pool._recycle == 120 and manager.capacity == 5
+    with manager.get_session() as session:
+        session.execute(db_manager.text('SELECT 1'))
+        status = manager.pool_status()
+        assert status['checked_out'] == 1 and status['utilization'] == 0.2
+    assert manager.pool_status()['checked_out'] == 0
+    manager.dispose()
+
+    memory = DatabaseManager('sqlite:///:memory:')
+    assert memory.pool_status()['pool_class'] == 'StaticPool' and memory.capacity == 1
+
+
+def test_init_is_idempotent():
+    original = db_manager.db_manager
+    work_dir = tempfile.mkdtemp()
+    try:
+        first = init_db_manager(f"sqlite:///{os.path.join(work_dir, 'a.db')}")
+        assert init_db_manager(f"sqlite:///{os.path.join(work_dir, 'a.db')}") is first
+        assert db_config.init_db() is first.engine and db_config.database_url == first.database_url
+        with db_config.get_session() as session:
+            session.execute(db_manager.text('SELECT 1'))
+        second = init_db_manager(f"sqlite:///{os.path.join(work_dir, 'b.db')}")
+        assert second is not first and db_manager.db_manager is second
+        assert init_db_manager(second.database_url, pool_size=2) is not second
+    finally:
+        db_manager.db_manager = original
+
+
+if __name__ == '__main__':
+    print("1. 测试按进程均分连接数...")
+    test_per_process_pool_size()
+    print("[OK] 完成")
+    print("2. 测试连接池配置和状态...")
+    test_manager_settings_and_status()
+    print("[OK] 完成")
+    print("3. 测试重复初始化...")
+    test_init_is_idempotent()
+    print("[OK] 完成")
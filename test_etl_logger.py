@@ -1,10 +1,17 @@
 """
 ETL日志测试脚本
 
-用于测试ETL日志记录功能
+用于测试ETL日志记录功能，以及按进程分开的日志文件和轮转时的过期日志清理
 """
+import json
+import logging
+import os
+import tempfile
+import time
+from pathlib import Path
 
-from etl_logger import ETLLogger
+import config
+from etl_logger import ETLLogger, SizeAndTimeRotatingFileHandler, cleanup_logs
 
 
 def test_etl_logger():
@@ -122,9 +129,76 @@ def test_etl_logger():
     print("所有测试完成！")
     print("=" * 80)
     print()
-    print("请查看日志文件：logs/etl.log")
+    print("请查看日志文件：logs/etl-<进程号>.log")
     print()
 
 
+def _reset_logger():
+    ETLLogger.shutdown()
+    logger = logging.getLogger('etl')
+    for handler in list(logger.handlers):
+        logger.removeHandler(handler)
+    for log_filter in list(logger.filters):
+        logger.removeFilter(log_filter)
+    ETLLogger._logger = None
+    ETLLogger._pid = None
+
+
+def test_process_log_file():
+    """每个进程写自己的日志文件"""
+    log_dir = tempfile.mkdtemp()
+    original = (config.Config.ETL_LOG_DIR, config.Config.ETL_LOG_PROCESS_NAME, config.Config.ETL_LOG_CONSOLE)
+    _reset_logger()
+    try:
+        config.Config.ETL_LOG_DIR = log_dir
+        config.Config.ETL_LOG_CONSOLE = False
+        config.Config.ETL_LOG_PROCESS_NAME = 'worker-1'
+        ETLLogger.log_extraction_start(source_id=1, source_name='MySQL_Test', source_type='mysql')
+        ETLLogger.shutdown()
+        with open(os.path.join(log_dir, 'etl-worker-1.log'), encoding='utf-8') as f:
+            assert json.loads(f.readline())['event'] == 'extraction_start'
+
+        # 未指定进程标识时使用进程号
+        _reset_logger()
+        config.Config.ETL_LOG_PROCESS_NAME = ''
+        ETLLogger.log_summary(total_tables=1, success_tables=1, failed_tables=0)
+        ETLLogger.shutdown()
+        assert os.path.exists(os.path.join(log_dir, f'etl-{os.getpid()}.log'))
+    finally:
+        _reset_logger()
+        config.Config.ETL_LOG_DIR, config.Config.ETL_LOG_PROCESS_NAME, config.Config.ETL_LOG_CONSOLE = original
+
+
+def test_cleanup_on_rollover():
+    """轮转时清理过期的单次运行日志和已退出进程的日志文件"""
+    log_dir = Path(tempfile.mkdtemp())
+    (log_dir / 'runs').mkdir()
+    old = time.time() - 40 * 86400
+    for name in ('runs/1.jsonl', 'etl-999.log', 'etl-999.log.1.gz', 'runs/2.jsonl', 'etl-1000.log'):
+        (log_dir / name).write_text('{}\n')
+    for name in ('runs/1.jsonl', 'etl-999.log', 'etl-999.log.1.gz'):
+        os.utime(log_dir / name, (old, old))
+
+    current = log_dir / 'etl-me.log'
+    handler = SizeAndTimeRotatingFileHandler(current, max_bytes=200, backup_count=2,
+                                             on_rollover=lambda: cleanup_logs(log_dir, 30, current=current))
+    handler.setFormatter(logging.Formatter('%(message)s'))
+    try:
+        assert (log_dir / 'runs/1.jsonl').exists()
+        for _ in range(10):
+            handler.emit(logging.LogRecord('etl', logging.INFO, __file__, 0, 'x' * 50, None, None))
+    finally:
+        handler.close()
+
+    remaining = sorted(str(path.relative_to(log_dir)) for path in log_dir.rglob('*') if path.is_file())
+    assert remaining == ['etl-1000.log', 'etl-me.log', 'etl-me.log.1.gz', 'etl-me.log.2.gz', 'runs/2.jsonl']
+
+
 if __name__ == "__main__":
     test_etl_logger()
+    print("11. 测试按进程分开的日志文件...")
+    test_process_log_file()
+    print("[OK] 完成")
+    print("12. 测试轮转时清理过期日志...")
+    test_cleanup_on_rollover()
+    print("[OK] 完成")
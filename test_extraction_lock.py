@@ -0,0 +1,191 @@
+"""
+抽取锁测试脚本
+
+验证同一数据源的抽取锁互斥、失效锁接管（失联运行的抽取记录标记为失败）、
+抽取记录已结束但仍在续约的锁不可接管、不存在的数据源抛出数据源不存在异常，
+以及本进程内相同任务类型的重复请求合并为一次运行（任务类型不同或恢复运行时拒绝）、其他进程持有锁时拒绝新运行
+"""
+import os
+import sys
+import tempfile
+import threading
+from datetime import datetime, timedelta
+
+import pytest
+from sqlalchemy import event
+
+sys.path.insert(0, os.path.dirname(os.path.abspath(__file__)))
+
+import db_manager
+import extraction_service
+from db_manager import init_db_manager, get_db_session
+from models import init_database, DataSource, ExtractionHistory, ExtractionLock
+from extraction_lock import acquire_lock, attach_history, release_lock, refresh_locks, get_lock
+from exceptions import ExtractionInProgressException, DataSourceNotFoundException
+
+
+def _setup():
+    init_db_manager(f"sqlite:///{os.path.join(tempfile.mkdtemp(), 'metadata.db')}")
+    init_database()
+    with get_db_session() as session:
+        source = DataSource(name='订单库', type='mysql', host='localhost', port=3306, username='u', password='',
+                            database='orders')
+        session.add(source)
+        session.flush()
+        history = ExtractionHistory(datasource_id=source.id, status='running', task_type='full')
+        session.add(history)
+        session.flush()
+        return source.id, history.id
+
+
+def _set_owner(datasource_id, owner, expires_at=None):
+    """模拟锁由其他进程持有"""
+    with get_db_session() as session:
+        values = {ExtractionLock.owner: owner}
+        if expires_at:
+            values[ExtractionLock.expires_at] = expires_at
+        session.query(ExtractionLock).filter(ExtractionLock.datasource_id == datasource_id).update(values)
+
+
+def test_acquire_and_takeover():
+    source_id, history_id = _setup()
+    assert acquire_lock(source_id, 'full') == (True, None)
+    attach_history(source_id, history_id)
+    _set_owner(source_id, 'other-host:1:abc')
+
+    acquired, holder = acquire_lock(source_id, 'full')
+    assert not acquired
+    assert holder['owner'] == 'other-host:1:abc' and holder['history_id'] == history_id
+    assert get_lock(source_id)['history_id'] == history_id
+
+    # 持有进程失联：锁过期后被接管，失联运行的抽取记录标记为失败
+    _set_owner(source_id, 'other-host:1:abc', datetime.utcnow() - timedelta(seconds=1))
+    assert acquire_lock(source_id, 'incremental') == (True, None)
+    with get_db_session() as session:
+        history = session.get(ExtractionHistory, history_id)
+        assert history.status == 'failed' and 'other-host:1:abc' in history.message
+    assert get_lock(source_id)['task_type'] == 'incremental'
+
+    # 续约时发现锁被接管，调用丢失回调
+    lost = []
+    release_lock(source_id)
+    assert acquire_lock(source_id, 'full', on_lost=lambda: lost.append(True))[0]
+    assert refresh_locks() == 1
+    _set_owner(source_id, 'other-host:2:def')
+    assert refresh_locks() == 0 and lost == [True]
+
+    release_lock(source_id)
+    assert get_lock(source_id) is not None  # 只能释放本进程持有的锁
+    with get_db_session() as session:
+        session.query(ExtractionLock).delete()
+    assert acquire_lock(source_id)[0]
+    release_lock(source_id)
+    assert get_lock(source_id) is None
+
+
+def test_finished_run_keeps_lock():
+    source_id, history_id = _setup()
+    assert acquire_lock(source_id, 'full')[0]
+    attach_history(source_id, history_id)
+    # 抽取结果已提交，持有进程仍在做画像等后处理，锁未过期
+    with get_db_session() as session:
+        session.get(ExtractionHistory, history_id).status = 'success'
+    _set_owner(source_id, 'other-host:1:abc')
+
+    acquired, holder = acquire_lock(source_id, 'full')
+    assert not acquired and holder['owner'] == 'other-host:1:abc'
+
+    # 过期未续约后才可接管，已结束的抽取记录不被改写
+    _set_owner(source_id, 'other-host:1:abc', datetime.utcnow() - timedelta(seconds=1))
+    assert acquire_lock(source_id, 'full') == (True, None)
+    with get_db_session() as session:
+        assert session.get(ExtractionHistory, history_id).status == 'success'
+    release_lock(source_id)
+
+
+def test_missing_source(monkeypatch):
+    source_id, _ = _setup()
+    calls = []
+    monkeypatch.setattr(extraction_service, '_execute_extraction', lambda *args: calls.append(args))
+    with pytest.raises(DataSourceNotFoundException):
+        extraction_service.run_extraction(source_id + 100)
+    assert calls == [] and get_lock(source_id + 100) is None
+
+    # 启用外键约束（MySQL/PostgreSQL 的行为）时，插入锁失败同样抛出数据源不存在异常
+    engine = db_manager.db_manager.engine
+    engine.dispose()
+    event.listen(engine, 'connect', lambda connection, record: connection.execute('PRAGMA foreign_keys=ON'))
+    with pytest.raises(DataSourceNotFoundException):
+        acquire_lock(source_id + 100)
+    assert acquire_lock(source_id)[0]
+    release_lock(source_id)
+
+
+def test_run_extraction_coalesces(monkeypatch):
+    source_id, _ = _setup()
+    started = threading.Event()
+    finish = threading.Event()
+    calls = []
+
+    def fake_execute(source_id, task_type, etl_task_id, orchestration_run_id, on_history_created, resume_from,
+                     cancel_token):
+        calls.append(source_id)
+        on_history_created(42)
+        started.set()
+        finish.wait(5)
+        return {'history_id': 42, 'status': 'success'}
+
+    monkeypatch.setattr(extraction_service, '_execute_extraction', fake_execute)
+    results = []
+    leader = threading.Thread(target=lambda: results.append(extraction_service.run_extraction(source_id)))
+    leader.start()
+    assert started.wait(5)
+    assert get_lock(source_id)['history_id'] == 42
+
+    # 任务类型不同或为恢复运行时不合并
+    for task_type, resume_from in (('incremental', None), ('full', 7)):
+        with pytest.raises(ExtractionInProgressException) as excinfo:
+            extraction_service.run_extraction(source_id, task_type, resume_from=resume_from)
+        assert excinfo.value.holder['history_id'] == 42 and excinfo.value.holder['task_type'] == 'full'
+
+    history_ids = []
+    follower = threading.Thread(target=lambda: results.append(
+        extraction_service.run_extraction(source_id, on_history_created=history_ids.append)))
+    follower.start()
+    for _ in range(500):  # 等待重复请求关联到正在执行的运行
+        if history_ids:
+            break
+        threading.Event().wait(0.01)
+    finish.set()
+    leader.join(5)
+    follower.join(5)
+
+    assert calls == [source_id] and history_ids == [42]
+    assert sorted(result['coalesced'] for result in results) == [False, True]
+    assert all(result['history_id'] == 42 for result in results)
+    assert get_lock(source_id) is None
+
+    # 其他进程持有未过期的锁时拒绝新运行
+    assert acquire_lock(source_id)[0]
+    _set_owner(source_id, 'other-host:1:abc')
+    with pytest.raises(ExtractionInProgressException) as excinfo:
+        extraction_service.run_extraction(source_id)
+    assert excinfo.value.holder['owner'] == 'other-host:1:abc'
+    assert calls == [source_id]
+
+
+if __name__ == '__main__':
+    print("1. 测试抽取锁获取和失效锁接管...")
+    test_acquire_and_takeover()
+    print("[OK] 完成")
+    print("2. 测试已结束运行的锁在后处理期间不可接管...")
+    test_finished_run_keeps_lock()
+    print("[OK] 完成")
+    print("3. 测试不存在的数据源...")
+    with pytest.MonkeyPatch.context() as patch:
+        test_missing_source(patch)
+    print("[OK] 完成")
+    print("4. 测试重复抽取请求合并...")
+    with pytest.MonkeyPatch.context() as patch:
+        test_run_extraction_coalesces(patch)
+    print("[OK] 完成")
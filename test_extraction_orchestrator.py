@@ -0,0 +1,130 @@
+"""
+批量抽取编排器测试脚本
+
+使用本地SQLite作为元数据库和模拟的抽取函数，验证：
+1. 优先级综合陈旧程度和预计耗时
+2. 全局、按主机、按数据库类型的并发配额
+3. 非法的并发配额参数被拒绝
+4. 正在由其他运行抽取的数据源在编排结果中记为抽取中而不是失败
+"""
+import os
+import sys
+import tempfile
+import threading
+import time
+from datetime import datetime, timedelta
+
+sys.path.insert(0, os.path.dirname(os.path.abspath(__file__)))
+
+from db_manager import init_db_manager, get_db_session
+from models import init_database, DataSource
+from extraction_orchestrator import ExtractionOrchestrator, SourcePlan
+from exceptions import ExtractionInProgressException, ValidationException
+
+
+def setup_database(work_dir, count=3, hosts=None, types=None):
+    init_db_manager(f"sqlite:///{os.path.join(work_dir, 'metadata.db')}")
+    init_database()
+    with get_db_session() as session:
+        sources = [DataSource(name=f'source_{i}', type=types[i] if types else 'mysql',
+                              host=hosts[i] if hosts else f'host_{i}', port=3306, username='u',
+                              password='', database=f'db_{i}') for i in range(count)]
+        session.add_all(sources)
+        session.flush()
+        return [source.id for source in sources]
+
+
+def test_priority_combines_staleness_and_duration():
+    now = datetime.utcnow()
+    never = SourcePlan(1, 'never', 'mysql', 'h', None, 600)
+    stale_slow = SourcePlan(2, 'stale_slow', 'mysql', 'h', now - timedelta(days=2), 3600)
+    stale_fast = SourcePlan(3, 'stale_fast', 'mysql', 'h', now - timedelta(days=1), 60)
+    fresh = SourcePlan(4, 'fresh', 'mysql', 'h', now - timedelta(hours=1), 600)
+    plans = sorted([fresh, stale_slow, stale_fast, never], key=lambda plan: plan.priority_key(now))
+    # 陈旧一天的快速数据源排在陈旧两天但需要一小时的数据源之前，而不是只按陈旧程度排序
+    assert [plan.name for plan in plans] == ['never', 'stale_fast', 'stale_slow', 'fresh']
+
+
+def test_concurrency_budget():
+    hosts = ['shared'] * 6 + [f'host_{i}' for i in range(6)]
+    types = ['mysql'] * 6 + ['postgresql'] * 3 + ['oracle'] * 3
+    setup_database(tempfile.mkdtemp(), count=12, hosts=hosts, types=types)
+    with get_db_session() as session:
+        source_info = {s.id: (s.host, s.type) for s in session.query(DataSource).all()}
+
+    lock = threading.Lock()
+    running = {'total': 0, 'host': {}, 'engine': {}}
+    peaks = {'total': 0, 'host': {}, 'engine': {}}
+
+    def track(kind, key, delta):
+        running[kind][key] = running[kind].get(key, 0) + delta
+        peaks[kind][key] = max(peaks[kind].get(key, 0), running[kind][key])
+
+    def fake_extraction(source_id, task_type='full', orchestration_run_id=None):
+        host, db_type = source_info[source_id]
+        with lock:
+            running['total'] += 1
+            peaks['total'] = max(peaks['total'], running['total'])
+            track('host', host, 1)
+            track('engine', db_type, 1)
+        time.sleep(0.05)
+        with lock:
+            running['total'] -= 1
+            track('host', host, -1)
+            track('engine', db_type, -1)
+        return {'status': 'success', 'tables_count': 1}
+
+    orchestrator = ExtractionOrchestrator(max_workers=4, per_host_limit=2, per_engine_limit=3,
+                                          extract_func=fake_extraction)
+    summary = orchestrator.run()
+    assert summary['status'] == 'success' and summary['success_sources'] == 12
+    assert peaks['total'] == 4
+    assert peaks['host']['shared'] == 2
+    assert max(peaks['engine'].values()) <= 3
+
+
+def test_invalid_limits_rejected():
+    for value in ('4', -1, 0, True, 2.5):
+        try:
+            ExtractionOrchestrator(max_workers=value)
+            assert False, f"max_workers={value!r} 应被拒绝"
+        except ValidationException:
+            pass
+    for name in ('per_host_limit', 'per_engine_limit'):
+        try:
+            ExtractionOrchestrator(**{name: -2})
+            assert False, f"{name} 应被拒绝"
+        except ValidationException:
+            pass
+    assert ExtractionOrchestrator(max_workers=3).max_workers == 3
+
+
+def test_busy_source_not_failed():
+    source_ids = setup_database(tempfile.mkdtemp())
+    busy_id = source_ids[0]
+
+    def fake_extraction(source_id, task_type='full', orchestration_run_id=None):
+        if source_id == busy_id:
+            raise ExtractionInProgressException('数据源正在抽取中', {'history_id': 99, 'job_id': 5})
+        return {'status': 'success', 'tables_count': 2}
+
+    summary = ExtractionOrchestrator(max_workers=2, extract_func=fake_extraction).run()
+    assert summary['status'] == 'success'
+    assert summary['success_sources'] == 2 and summary['failed_sources'] == 0
+    assert summary['extracted_tables'] == 4
+    assert '1 个正在由其他运行抽取' in summary['message']
+
+
+if __name__ == '__main__':
+    print("1. 测试优先级综合陈旧程度和预计耗时...")
+    test_priority_combines_staleness_and_duration()
+    print("[OK] 完成")
+    print("2. 测试并发配额...")
+    test_concurrency_budget()
+    print("[OK] 完成")
+    print("3. 测试非法并发配额参数...")
+    test_invalid_limits_rejected()
+    print("[OK] 完成")
+    print("4. 测试抽取中的数据源不计为失败...")
+    test_busy_source_not_failed()
+    print("[OK] 完成")
@@ -0,0 +1,124 @@
+"""
+检查点和断点恢复测试脚本
+
+使用 SQLite 合成源库运行真实的抽取流程，验证：
+检查点写入失败时已写入的批次保留，恢复运行只抽取剩余的表（按模式和表名匹配检查点），
+以及单表瞬时错误按退避重试、非瞬时错误不重试
+"""
+import os
+import sys
+import tempfile
+
+import pytest
+from sqlalchemy.exc import OperationalError
+
+sys.path.insert(0, os.path.dirname(os.path.abspath(__file__)))
+
+import config
+import extraction_service
+from benchmark import generate_catalog
+from db_manager import init_db_manager, get_db_session
+from models import init_database, DataSource, TableMetadata, ExtractionHistory, ExtractionCheckpoint
+from extractor_base import SQLiteMetadataExtractor, enable_sqlite_sources
+
+TABLES = ['t%06d' % index for index in range(6)]
+
+
+def _setup(monkeypatch):
+    work_dir = tempfile.mkdtemp()
+    enable_sqlite_sources()
+    generate_catalog(os.path.join(work_dir, 'source.db'), tables=len(TABLES), columns=4, fk_density=0, rows=2)
+    for name, value in (('EXTRACTION_BATCH_SIZE', 2), ('EXTRACTION_BACKEND', 'sync'),
+                        ('EXTRACTION_RETRY_BACKOFF_SECONDS', 0), ('COLUMN_PROFILING_ENABLED', False),
+                        ('RELATIONSHIP_INFERENCE_ENABLED', False)):
+        monkeypatch.setattr(config.Config, name, value)
+    init_db_manager(f"sqlite:///{os.path.join(work_dir, 'metadata.db')}")
+    init_database()
+    with get_db_session() as session:
+        source = DataSource(name='合成库', type='sqlite', host='localhost', port=0, username='', password='',
+                            database=os.path.join(work_dir, 'source.db'))
+        session.add(source)
+        session.flush()
+        return source.id
+
+
+def _spy_tables(monkeypatch):
+    """记录实际向源库抽取的表"""
+    extracted = []
+    original = SQLiteMetadataExtractor.extract_table
+
+    def extract_table(self, table_name, include_stats=True):
+        extracted.append(table_name)
+        return original(self, table_name, include_stats)
+
+    monkeypatch.setattr(SQLiteMetadataExtractor, 'extract_table', extract_table)
+    return extracted
+
+
+def test_resume_extracts_remaining_tables(monkeypatch):
+    source_id = _setup(monkeypatch)
+    extracted = _spy_tables(monkeypatch)
+    original_call = extraction_service.CheckpointWriter.__call__
+
+    def failing_call(self, tables, unchanged=None):
+        if self.batch_no == 2:
+            raise RuntimeError('元数据库写入失败')
+        return original_call(self, tables, unchanged)
+
+    monkeypatch.setattr(extraction_service.CheckpointWriter, '__call__', failing_call)
+    assert extraction_service.run_extraction(source_id)['status'] == 'failed'
+    monkeypatch.setattr(extraction_service.CheckpointWriter, '__call__', original_call)
+
+    with get_db_session() as session:
+        failed = session.query(ExtractionHistory).filter(ExtractionHistory.datasource_id == source_id).one()
+        assert failed.status == 'failed' and failed.checkpointed_tables == 4
+        assert session.query(TableMetadata).count() == 4
+        # 其他模式下的同名表不影响恢复
+        session.add(ExtractionCheckpoint(history_id=failed.id, datasource_id=source_id, schema_name='other',
+                                         table_name=TABLES[4], batch_no=9))
+        failed_id = failed.id
+
+    del extracted[:]
+    result = extraction_service.resume_extraction(failed_id)
+    assert result['status'] == 'success'
+    assert extracted == TABLES[4:]
+    assert result['resumed_tables'] == 4 and result['tables_count'] == 2
+    with get_db_session() as session:
+        assert sorted(row[0] for row in session.query(TableMetadata.table_name).all()) == TABLES
+        assert session.query(ExtractionCheckpoint).count() == 0
+
+
+def test_table_retry(monkeypatch):
+    source_id = _setup(monkeypatch)
+    original = SQLiteMetadataExtractor.extract_table
+    attempts = {}
+    reconnects = []
+
+    def flaky_extract_table(self, table_name, include_stats=True):
+        attempts[table_name] = attempts.get(table_name, 0) + 1
+        if table_name == TABLES[1] and attempts[table_name] < 3:
+            raise OperationalError('SELECT 1', {}, Exception('连接已断开'))
+        if table_name == TABLES[2]:
+            raise ValueError('非瞬时错误')
+        return original(self, table_name, include_stats)
+
+    original_reconnect = SQLiteMetadataExtractor.reconnect
+    monkeypatch.setattr(SQLiteMetadataExtractor, 'extract_table', flaky_extract_table)
+    monkeypatch.setattr(SQLiteMetadataExtractor, 'reconnect',
+                        lambda self: reconnects.append(True) or original_reconnect(self))
+
+    result = extraction_service.run_extraction(source_id)
+    assert result['status'] == 'success' and result['tables_count'] == len(TABLES) - 1
+    assert attempts[TABLES[1]] == 3 and len(reconnects) == 2
+    assert attempts[TABLES[2]] == 1
+
+
+if __name__ == '__main__':
+    print("1. 测试从检查点恢复...")
+    with pytest.MonkeyPatch.context() as patch:
+        test_resume_extracts_remaining_tables(patch)
+    print("[OK] 完成")
+    print("2. 测试单表重试...")
+    with pytest.MonkeyPatch.context() as patch:
+        test_table_retry(patch)
+    print("[OK] 完成")
@@ -0,0 +1,38 @@
+"""
+表抽取统计测试脚本
+
+验证按各表历史耗时预测运行耗时的计算
+"""
+import os
+import sys
+
+sys.path.insert(0, os.path.dirname(os.path.abspath(__file__)))
+
+from extraction_stats import _predict
+
+
+def test_predict_per_table():
+    # 最近两次运行：各表耗时之和分别为 10 秒和 20 秒，运行总耗时为其一半（并发抽取）
+    runs = [(2, 10), (1, 5)]
+    stats = [(2, 'a', 15000), (2, 'b', 5000), (1, 'a', 5000), (1, 'b', 5000)]
+    result = _predict(runs, stats)
+    assert result['method'] == 'per_table'
+    assert result['tables'] == 2
+    # a 的中位数 10 秒 + b 的中位数 5 秒，乘以比例 0.5
+    assert result['expected_seconds'] == 7.5
+
+
+def test_predict_fallback():
+    assert _predict([], [])['expected_seconds'] is None
+    result = _predict([(3, 30), (2, 10), (1, 20)], [])
+    assert result['method'] == 'history_median'
+    assert result['expected_seconds'] == 20
+
+
+if __name__ == '__main__':
+    print("1. 测试按表预测耗时...")
+    test_predict_per_table()
+    print("[OK] 完成")
+    print("2. 测试无表统计时的回退...")
+    test_predict_fallback()
+    print("[OK] 完成")
@@ -0,0 +1,165 @@
+"""
+抽取超时和取消测试脚本
+
+验证取消令牌的截止时间和显式取消、语句超时的连接设置和错误识别，
+以及使用 SQLite 合成源库时运行超过截止时间后在表之间停止：已抽取的表照常提交，
+运行记为 partial_success 并列出跳过和语句超时的表，重试退避期间取消时立即停止重试（同步和异步抽取器）
+"""
+import json
+import os
+import sys
+import tempfile
+import threading
+import time
+import types
+
+import pytest
+from sqlalchemy import create_engine, text
+from sqlalchemy.exc import OperationalError
+
+sys.path.insert(0, os.path.dirname(os.path.abspath(__file__)))
+
+import config
+import extraction_timeout
+import extraction_service
+from benchmark import generate_catalog
+from db_manager import init_db_manager, get_db_session
+from models import init_database, DataSource, TableMetadata, ExtractionHistory
+from extractor_base import SQLiteMetadataExtractor, enable_sqlite_sources
+from extraction_timeout import CancellationToken, apply_statement_timeout, is_statement_timeout
+
+TABLES = ['t%06d' % index for index in range(6)]
+
+
+def test_cancellation_token():
+    token = CancellationToken(timeout_seconds=0.05)
+    assert not token.is_cancelled() and 0 < token.remaining() <= 0.05
+    time.sleep(0.06)
+    assert token.is_cancelled() and '0.05' in token.reason and token.remaining() == 0
+
+    token = CancellationToken(timeout_seconds=0)
+    assert token.deadline is None and token.remaining() is None and not token.is_cancelled()
+    token.cancel('抽取已被用户取消')
+    token.cancel('第二次取消不覆盖原因')
+    assert token.is_cancelled() and token.reason == '抽取已被用户取消'
+
+    # 等待不超过截止时间，被取消时立即返回
+    token = CancellationToken(timeout_seconds=0.05)
+    started = time.monotonic()
+    assert token.wait(10) and time.monotonic() - started < 1
+    token = CancellationToken(timeout_seconds=0)
+    threading.Timer(0.05, token.cancel).start()
+    started = time.monotonic()
+    assert token.wait(10) and time.monotonic() - started < 1
+    assert not CancellationToken(timeout_seconds=0).wait(0.01)
+
+
+def test_statement_timeout(monkeypatch):
+    # SQLite 没有语句超时，用 busy_timeout 验证连接建立时执行了设置语句
+    monkeypatch.setitem(extraction_timeout.STATEMENT_TIMEOUT_SQL, 'sqlite', ["PRAGMA busy_timeout = {ms}"])
+    engine = create_engine('sqlite://')
+    apply_statement_timeout(engine, 'sqlite', timeout_seconds=2)
+    with engine.connect() as conn:
+        assert conn.execute(text("PRAGMA busy_timeout")).scalar() == 2000
+
+    # 不支持的会话变量只记录警告，连接照常可用
+    engine = create_engine('sqlite://')
+    apply_statement_timeout(engine, 'mysql', timeout_seconds=2)
+    with engine.connect() as conn:
+        assert conn.execute(text("SELECT 1")).scalar() == 1
+
+    assert is_statement_timeout(Exception('ERROR: canceling statement due to statement timeout'))
+    assert is_statement_timeout(Exception('(3024) Query execution was interrupted, maximum statement execution time exceeded'))
+    assert not is_statement_timeout(Exception('Lost connection to MySQL server'))
+
+
+def _setup(monkeypatch, backend):
+    work_dir = tempfile.mkdtemp()
+    enable_sqlite_sources()
+    generate_catalog(os.path.join(work_dir, 'source.db'), tables=len(TABLES), columns=4, fk_density=0, rows=2)
+    for name, value in (('EXTRACTION_BATCH_SIZE', 2), ('EXTRACTION_BACKEND', backend),
+                        ('ASYNC_PER_SOURCE_CONCURRENCY', 1), ('EXTRACTION_TIMEOUT', 3.5),
+                        ('COLUMN_PROFILING_ENABLED', False), ('RELATIONSHIP_INFERENCE_ENABLED', False)):
+        monkeypatch.setattr(config.Config, name, value)
+    init_db_manager(f"sqlite:///{os.path.join(work_dir, 'metadata.db')}")
+    init_database()
+    with get_db_session() as session:
+        source = DataSource(name='合成库', type='sqlite', host='localhost', port=0, username='', password='',
+                            database=os.path.join(work_dir, 'source.db'))
+        session.add(source)
+        session.flush()
+        return source.id
+
+
+@pytest.mark.parametrize('backend', ['sync', 'async'])
+def test_deadline_partial_success(monkeypatch, backend):
+    source_id = _setup(monkeypatch, backend)
+    # 每抽取一个表时钟前进1秒，截止时间3.5秒：抽取4个表后停止
+    clock = [0.0]
+    monkeypatch.setattr(extraction_timeout, 'time', types.SimpleNamespace(monotonic=lambda: clock[0]))
+    original = SQLiteMetadataExtractor.extract_table
+
+    def slow_extract_table(self, table_name, include_stats=True):
+        clock[0] += 1
+        if table_name == TABLES[1]:
+            raise OperationalError('SELECT COUNT(*)', {}, Exception('canceling statement due to statement timeout'))
+        return original(self, table_name, include_stats)
+
+    monkeypatch.setattr(SQLiteMetadataExtractor, 'extract_table', slow_extract_table)
+    result = extraction_service.run_extraction(source_id)
+
+    assert result['status'] == 'partial_success' and result['tables_count'] == 3
+    assert '超过抽取截止时间' in result['message']
+    assert result['details']['skipped_tables'] == {'count': 2, 'tables': TABLES[4:]}
+    assert result['details']['timed_out_tables'] == {'count': 1, 'tables': [TABLES[1]]}
+    with get_db_session() as session:
+        history = session.get(ExtractionHistory, result['history_id'])
+        assert history.status == 'partial_success' and history.extracted_tables == 3
+        assert json.loads(history.details)['skipped_tables']['tables'] == TABLES[4:]
+        assert sorted(row[0] for row in session.query(TableMetadata.table_name).all()) == \
+            [TABLES[0], TABLES[2], TABLES[3]]
+
+
+@pytest.mark.parametrize('backend', ['sync', 'async'])
+def test_cancel_during_retry_backoff(monkeypatch, backend):
+    source_id = _setup(monkeypatch, backend)
+    # 每次重试前退避60秒，取消后不应等完整个重试计划
+    monkeypatch.setattr(config.Config, 'EXTRACTION_RETRY_BACKOFF_SECONDS', 60)
+    monkeypatch.setattr(config.Config, 'EXTRACTION_TABLE_RETRIES', 3)
+    attempts = []
+
+    def flaky_extract_table(self, table_name, include_stats=True):
+        attempts.append(table_name)
+        raise OperationalError('SELECT 1', {}, Exception('Lost connection to server during query'))
+
+    monkeypatch.setattr(SQLiteMetadataExtractor, 'extract_table', flaky_extract_table)
+    monkeypatch.setattr(SQLiteMetadataExtractor, 'reconnect', lambda self: None)
+    token = CancellationToken(timeout_seconds=0)
+    threading.Timer(0.2, token.cancel, args=('抽取已被用户取消',)).start()
+
+    started = time.monotonic()
+    result = extraction_service.run_extraction(source_id, cancel_token=token)
+    assert time.monotonic() - started < 10
+    assert attempts == [TABLES[0]]
+    assert result['status'] == 'partial_success' and '抽取已被用户取消' in result['message']
+    assert result['details']['skipped_tables'] == {'count': len(TABLES), 'tables': TABLES}
+
+
+if __name__ == '__main__':
+    print("1. 测试取消令牌...")
+    test_cancellation_token()
+    print("[OK] 完成")
+    print("2. 测试语句超时设置...")
+    with pytest.MonkeyPatch.context() as patch:
+        test_statement_timeout(patch)
+    print("[OK] 完成")
+    for number, backend in ((3, 'sync'), (4, 'async')):
+        print(f"{number}. 测试超过截止时间后部分成功（{backend}）...")
+        with pytest.MonkeyPatch.context() as patch:
+            test_deadline_partial_success(patch, backend)
+        print("[OK] 完成")
+    for number, backend in ((5, 'sync'), (6, 'async')):
+        print(f"{number}. 测试重试退避期间取消（{backend}）...")
+        with pytest.MonkeyPatch.context() as patch:
+            test_cancel_during_retry_backoff(patch, backend)
+        print("[OK] 完成")
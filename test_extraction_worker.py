@@ -0,0 +1,241 @@
+"""
+抽取作业队列测试脚本
+
+使用本地SQLite作为元数据库，启动多个工作进程并发租用作业，
+验证每个作业只被执行一次，崩溃工作进程遗留的作业会被重新排队，同一数据源同一时间只租出一个作业，
+租约被收回时取消正在执行的抽取，数据源正被其他运行抽取时作业延后执行且不消耗尝试次数，
+以及提交作业的接口遇到不存在的数据源时返回404且不提交任何作业
+"""
+import multiprocessing
+import os
+import sys
+import tempfile
+import threading
+import time
+from datetime import datetime, timedelta
+
+sys.path.insert(0, os.path.dirname(os.path.abspath(__file__)))
+
+import config
+import db_manager
+from db_manager import init_db_manager, get_db_session
+from models import init_database, DataSource, ExtractionJob
+from extraction_worker import JobQueue, ExtractionWorker
+from exceptions import ExtractionInProgressException
+
+
+def fake_extraction(datasource_id, task_type='full', etl_task_id=None, on_history_created=None, cancel_token=None):
+    """模拟抽取：不连接源库，只占用一小段时间"""
+    time.sleep(0.05)
+    return {'status': 'success', 'message': f'pid {os.getpid()}'}
+
+
+def run_worker_process(database_url, worker_id, barrier):
+    """子进程入口：所有工作进程就绪后同时开始，运行到队列为空"""
+    init_db_manager(database_url)
+    barrier.wait(60)
+    worker = ExtractionWorker(worker_id=worker_id, concurrency=2, handler=fake_extraction,
+                              poll_seconds=0.05, heartbeat_seconds=1)
+    worker.run(once=True)
+
+
+def setup_database(path):
+    database_url = f"sqlite:///{path}"
+    init_db_manager(database_url)
+    init_database()
+    with get_db_session() as session:
+        for i in range(10):
+            session.add(DataSource(name=f'source_{i}', type='mysql', host='localhost', port=3306,
+                                   username='u', password='p', database=f'db_{i}'))
+    return database_url
+
+
+def test_jobs_leased_exactly_once():
+    """多个工作进程并发消费队列，每个作业只执行一次"""
+    with tempfile.TemporaryDirectory() as tmp:
+        database_url = setup_database(os.path.join(tmp, 'meta.db'))
+        queue = JobQueue()
+        for source_id in range(1, 11):
+            for task_type in ('schema_only', 'full'):
+                queue.enqueue(source_id, task_type=task_type)
+
+        # 同一数据源重复提交的作业会复用排队中的作业，全量作业包含增量抽取的内容
+        assert queue.enqueue(1, task_type='full')['coalesced'] is True
+        assert queue.enqueue(1, task_type='incremental')['coalesced'] is True
+
+        db_manager.db_manager.engine.dispose()
+        ctx = multiprocessing.get_context('spawn')
+        barrier = ctx.Barrier(3)
+        processes = [ctx.Process(target=run_worker_process, args=(database_url, f'worker-{i}', barrier))
+                     for i in range(3)]
+        for process in processes:
+            process.start()
+        for process in processes:
+            process.join(timeout=120)
+            assert process.exitcode == 0
+
+        with get_db_session() as session:
+            jobs = session.query(ExtractionJob).all()
+            assert len(jobs) == 20
+            assert all(job.status == 'success' for job in jobs)
+            assert all(job.attempts == 1 for job in jobs)
+            # 作业只由本次启动的工作进程执行，且分散到多个工作进程
+            distribution = {}
+            for job in jobs:
+                distribution[job.worker_id] = distribution.get(job.worker_id, 0) + 1
+            assert set(distribution) <= {f'worker-{i}' for i in range(3)}
+            assert len(distribution) >= 2 and sum(distribution.values()) == 20
+
+
+def test_expired_lease_requeued():
+    """租约过期的作业会被重新排队，超过最大尝试次数后标记失败"""
+    with tempfile.TemporaryDirectory() as tmp:
+        setup_database(os.path.join(tmp, 'meta.db'))
+        queue = JobQueue(max_attempts=2)
+        job = queue.enqueue(1)
+
+        for attempt in range(2):
+            leased = queue.lease('crashed-worker')
+            assert leased['id'] == job['id']
+            assert queue.lease('other-worker') is None
+
+            # 模拟工作进程崩溃：不再心跳，租约过期
+            with get_db_session() as session:
+                session.query(ExtractionJob).filter(ExtractionJob.id == job['id']).update({
+                    ExtractionJob.lease_expires_at: datetime.utcnow() - timedelta(seconds=1)
+                })
+            assert queue.requeue_expired() == 1
+
+            # 崩溃的工作进程无法再提交结果
+            assert queue.complete(job['id'], 'crashed-worker', 'success') is False
+
+        assert queue.get_job(job['id'])['status'] == 'failed'
+
+
+def test_one_job_per_source():
+    """同一数据源的不同类型作业不会同时租出"""
+    with tempfile.TemporaryDirectory() as tmp:
+        setup_database(os.path.join(tmp, 'meta.db'))
+        queue = JobQueue()
+        first = queue.enqueue(1, task_type='schema_only')
+        second = queue.enqueue(1, task_type='full')
+        other = queue.enqueue(2, task_type='full')
+        assert second['coalesced'] is False
+
+        assert queue.lease('worker-a')['id'] == first['id']
+        assert queue.lease('worker-b')['id'] == other['id']
+        assert queue.lease('worker-b') is None
+        assert queue.complete(first['id'], 'worker-a', 'success')
+        assert queue.lease('worker-b')['id'] == second['id']
+
+
+def test_lost_lease_cancels_extraction():
+    """心跳发现租约已被收回时取消正在执行的抽取"""
+    with tempfile.TemporaryDirectory() as tmp:
+        setup_database(os.path.join(tmp, 'meta.db'))
+        queue = JobQueue()
+        job = queue.enqueue(1)
+        started = threading.Event()
+        outcome = {}
+
+        def long_extraction(datasource_id, task_type='full', etl_task_id=None, on_history_created=None,
+                            cancel_token=None):
+            started.set()
+            deadline = time.monotonic() + 10
+            while not cancel_token.is_cancelled() and time.monotonic() < deadline:
+                time.sleep(0.01)
+            outcome['reason'] = cancel_token.reason
+            return {'status': 'partial_success', 'message': cancel_token.reason}
+
+        worker = ExtractionWorker(worker_id='worker-a', concurrency=1, queue=queue, handler=long_extraction,
+                                  poll_seconds=0.01, heartbeat_seconds=0.05)
+        thread = threading.Thread(target=worker.run, kwargs={'once': True})
+        thread.start()
+        assert started.wait(5)
+        # 模拟租约过期后作业被其他工作进程租用
+        with get_db_session() as session:
+            session.query(ExtractionJob).filter(ExtractionJob.id == job['id']).update({
+                ExtractionJob.worker_id: 'worker-b'
+            })
+        thread.join(10)
+
+        assert outcome['reason'] == '作业租约已被收回'
+        # 被收回的作业不接受原工作进程的结果
+        assert queue.get_job(job['id'])['worker_id'] == 'worker-b'
+        assert queue.get_job(job['id'])['status'] == 'leased'
+
+
+def test_busy_source_deferred():
+    """数据源正被其他运行抽取时作业重新排队，不计入尝试次数，也不会因此标记失败"""
+    with tempfile.TemporaryDirectory() as tmp:
+        setup_database(os.path.join(tmp, 'meta.db'))
+        queue = JobQueue(max_attempts=1, retry_backoff=0)
+        job = queue.enqueue(1)
+        calls = []
+
+        def busy_extraction(datasource_id, task_type='full', etl_task_id=None, on_history_created=None,
+                            cancel_token=None):
+            calls.append(datasource_id)
+            if len(calls) < 3:
+                raise ExtractionInProgressException('数据源正在抽取中', {'history_id': 99, 'job_id': None})
+            return {'status': 'success'}
+
+        worker = ExtractionWorker(worker_id='worker-busy', concurrency=1, queue=queue, handler=busy_extraction,
+                                  poll_seconds=0.01, heartbeat_seconds=1)
+        for _ in range(2):
+            worker._execute(queue.lease('worker-busy'))
+            deferred = queue.get_job(job['id'])
+            assert deferred['status'] == 'queued' and deferred['attempts'] == 0
+            assert deferred['worker_id'] is None and '正在抽取中' in deferred['error']
+
+        worker.run(once=True)
+        finished = queue.get_job(job['id'])
+        assert finished['status'] == 'success' and finished['attempts'] == 1 and len(calls) == 3
+
+
+def test_enqueue_unknown_source_rejected():
+    """提交的数据源中有不存在的，接口返回404，其他数据源的作业也不提交"""
+    original_url = config.Config.DATABASE_URL
+    with tempfile.TemporaryDirectory() as tmp:
+        database_url = setup_database(os.path.join(tmp, 'meta.db'))
+        try:
+            config.Config.DATABASE_URL = database_url
+            from api import create_app
+            client = create_app().test_client()
+            with client.session_transaction() as sess:
+                sess['user_id'] = 1
+                sess['role'] = 'admin'
+
+            response = client.post('/api/extraction-jobs', json={'datasource_ids': [1, 2, 999]})
+            assert response.status_code == 404 and '999' in response.json['error']
+            with get_db_session() as session:
+                assert session.query(ExtractionJob).count() == 0
+
+            response = client.post('/api/extraction-jobs', json={'datasource_ids': [1, 2, 1]})
+            assert response.status_code == 202
+            jobs = response.json['jobs']
+            assert [job['coalesced'] for job in jobs] == [False, False, True] and jobs[2]['id'] == jobs[0]['id']
+        finally:
+            config.Config.DATABASE_URL = original_url
+            db_manager.db_manager.engine.dispose()
+
+
+if __name__ == '__main__':
+    print("1. 测试多进程租用作业...")
+    test_jobs_leased_exactly_once()
+    print("[OK] 完成")
+    print("2. 测试过期租约回收...")
+    test_expired_lease_requeued()
+    print("[OK] 完成")
+    print("3. 测试同一数据源只租出一个作业...")
+    test_one_job_per_source()
+    print("[OK] 完成")
+    print("4. 测试租约被收回时取消抽取...")
+    test_lost_lease_cancels_extraction()
+    print("[OK] 完成")
+    print("5. 测试数据源抽取中的作业延后执行...")
+    test_busy_source_deferred()
+    print("[OK] 完成")
+    print("6. 测试提交不存在的数据源...")
+    test_enqueue_unknown_source_rejected()
+    print("[OK] 完成")
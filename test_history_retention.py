@@ -0,0 +1,144 @@
+"""
+抽取历史保留测试脚本
+
+验证过期记录被汇总到按天统计、写入归档并连同关联数据删除，运行中和最近一次成功的记录保留，
+以及数据源级保留天数和概览合计，删除事务回滚的批次不写入归档
+"""
+import glob
+import gzip
+import json
+import os
+import sys
+import tempfile
+from datetime import datetime, timedelta
+
+sys.path.insert(0, os.path.dirname(os.path.abspath(__file__)))
+
+import pytest
+
+import config
+import history_retention
+from db_manager import init_db_manager, get_db_session
+from models import (init_database, DataSource, ExtractionHistory, ExtractionHistoryDaily, TableExtractionStat,
+                    SchemaVersion)
+from history_retention import purge_history, total_extracted_tables, daily_history, parse_retention_days
+from exceptions import DatabaseConnectionException
+
+
+def _setup(work_dir):
+    init_db_manager(f"sqlite:///{os.path.join(work_dir, 'metadata.db')}")
+    init_database()
+    now = datetime.utcnow()
+    with get_db_session() as session:
+        ids = {}
+        for name, retention in (('订单库', None), ('日志库', 0)):
+            source = DataSource(name=name, type='mysql', host='localhost', port=3306, username='u', password='',
+                                database=name, history_retention_days=retention)
+            session.add(source)
+            session.flush()
+            ids[name] = source.id
+        runs = []
+        for source_id in ids.values():
+            for days_ago, status in ((100, 'success'), (100, 'failed'), (99, 'success'), (95, 'success'),
+                                     (90, 'running'), (1, 'failed')):
+                runs.append(ExtractionHistory(datasource_id=source_id, status=status, task_type='full',
+                                              extracted_tables=10, duration=5,
+                                              extraction_time=now - timedelta(days=days_ago, hours=1)))
+        session.add_all(runs)
+        session.flush()
+        session.add(TableExtractionStat(history_id=runs[0].id, datasource_id=ids['订单库'], table_name='orders',
+                                        status='success', duration_ms=12))
+        session.add(SchemaVersion(datasource_id=ids['订单库'], version=1, history_id=runs[0].id, payload=b''))
+    return ids, now
+
+
+def test_purge_history():
+    work_dir = tempfile.mkdtemp()
+    original = (config.Config.HISTORY_RETENTION_DAYS, config.Config.HISTORY_ARCHIVE_DIR)
+    config.Config.HISTORY_RETENTION_DAYS = 30
+    config.Config.HISTORY_ARCHIVE_DIR = os.path.join(work_dir, 'archive')
+    try:
+        ids, now = _setup(work_dir)
+        with get_db_session() as session:
+            total_before = total_extracted_tables(session)
+
+        assert purge_history(dry_run=True, now=now)['purged'] == 3
+        result = purge_history(now=now, batch_size=2)
+        assert result['purged'] == 3
+        by_source = {item['datasource_id']: item for item in result['sources']}
+        assert by_source[ids['日志库']]['retention_days'] is None and by_source[ids['日志库']]['purged'] == 0
+
+        with gzip.open(result['archive'], 'rt', encoding='utf-8') as file:
+            archived = [json.loads(line) for line in file]
+        assert len(archived) == 3 and archived[0]['table_stats'][0]['table_name'] == 'orders'
+
+        with get_db_session() as session:
+            left = session.query(ExtractionHistory.status).filter(
+                ExtractionHistory.datasource_id == ids['订单库']
+            ).order_by(ExtractionHistory.id).all()
+            # 最近一次成功（95天前）、运行中和保留期内的记录保留
+            assert [row[0] for row in left] == ['success', 'running', 'failed']
+            assert session.query(TableExtractionStat).count() == 0
+            assert session.query(SchemaVersion).one().history_id is None
+            daily = session.query(ExtractionHistoryDaily).order_by(ExtractionHistoryDaily.day,
+                                                                  ExtractionHistoryDaily.status).all()
+            assert [(row.status, row.runs, row.extracted_tables) for row in daily] == [
+                ('failed', 1, 10), ('success', 1, 10), ('success', 1, 10)]
+            assert total_extracted_tables(session) == total_before
+
+        days = daily_history(ids['订单库'], days=120)
+        assert sum(entry['runs'] for entry in days) == 6
+        assert purge_history(now=now)['purged'] == 0
+    finally:
+        config.Config.HISTORY_RETENTION_DAYS, config.Config.HISTORY_ARCHIVE_DIR = original
+
+
+def test_rolled_back_batch_not_archived(monkeypatch):
+    work_dir = tempfile.mkdtemp()
+    monkeypatch.setattr(config.Config, 'HISTORY_RETENTION_DAYS', 30)
+    monkeypatch.setattr(config.Config, 'HISTORY_ARCHIVE_DIR', os.path.join(work_dir, 'archive'))
+    ids, now = _setup(work_dir)
+    purge_batch = history_retention._purge_batch
+    calls = []
+
+    def failing_purge_batch(session, records):
+        calls.append(len(records))
+        if len(calls) == 2:
+            raise RuntimeError('模拟删除失败')
+        return purge_batch(session, records)
+
+    monkeypatch.setattr(history_retention, '_purge_batch', failing_purge_batch)
+    with pytest.raises(DatabaseConnectionException):
+        purge_history(now=now, batch_size=2)
+
+    archives = glob.glob(os.path.join(work_dir, 'archive', '*.jsonl.gz'))
+    with gzip.open(archives[0], 'rt', encoding='utf-8') as file:
+        archived = [json.loads(line)['history']['id'] for line in file]
+    with get_db_session() as session:
+        remaining = {row[0] for row in session.query(ExtractionHistory.id).all()}
+    # 只有已提交删除的第一批被归档，回滚的第二批仍在表中且不在归档里
+    assert len(archived) == 2 and not remaining & set(archived)
+
+
+def test_parse_retention_days():
+    assert parse_retention_days(None) is None and parse_retention_days(0) == 0
+    for value in (-1, '30', 1.5, True):
+        try:
+            parse_retention_days(value)
+        except Exception as e:
+            assert e.__class__.__name__ == 'ValidationException'
+        else:
+            raise AssertionError(value)
+
+
+if __name__ == '__main__':
+    print("1. 测试清理抽取历史...")
+    test_purge_history()
+    print("[OK] 完成")
+    print("2. 测试回滚的批次不写入归档...")
+    with pytest.MonkeyPatch.context() as patch:
+        test_rolled_back_batch_not_archived(patch)
+    print("[OK] 完成")
+    print("3. 测试保留天数校验...")
+    test_parse_retention_days()
+    print("[OK] 完成")
@@ -0,0 +1,60 @@
+"""
+负载测试工具测试脚本
+
+验证分位数、汇总和阈值判定，以及对临时元数据库的一次小规模进程内运行
+"""
+import json
+import os
+import sys
+import tempfile
+
+sys.path.insert(0, os.path.dirname(os.path.abspath(__file__)))
+
+from config import Config
+from load_test import percentile, summarize, check_thresholds, main
+
+
+def test_summarize_and_thresholds():
+    assert percentile(list(range(1, 101)), 0.95) == 95
+    assert percentile([], 0.5) is None
+
+    samples = [{'ms': float(ms), 'status': 200, 'statements': 3, 'pool_peak': 2} for ms in range(1, 100)]
+    samples.append({'ms': 500.0, 'status': 500, 'statements': 9, 'pool_peak': 5})
+    stats = summarize(samples, duration=2.0, pool_capacity=10)
+    assert stats['requests'] == 100 and stats['errors'] == 1 and stats['throughput_rps'] == 50
+    assert stats['p50_ms'] == 50 and stats['p99_ms'] == 99 and stats['max_ms'] == 500
+    assert stats['statements_max'] == 9 and stats['pool_saturation'] == 0.5
+
+    levels = [{'concurrency': 8, 'endpoints': {'table_detail': stats, 'overview': dict(stats, p95_ms=10)}}]
+    failures = check_thresholds(levels, {'default': {'p95_ms': 100, 'error_rate': 0.05},
+                                         'table_detail': {'p95_ms': 50}})
+    assert [(failure['endpoint'], failure['metric']) for failure in failures] == [('table_detail', 'p95_ms')]
+
+
+def test_in_process_run():
+    work_dir = tempfile.mkdtemp()
+    output = os.path.join(work_dir, 'report.json')
+    original = Config.DATABASE_URL
+    try:
+        code = main(['--database-url', f"sqlite:///{os.path.join(work_dir, 'metadata.db')}", '--seed',
+                     '--sources', '2', '--tables', '40', '--columns', '4', '--concurrency', '2',
+                     '--duration', '0.5', '--max-error-rate', '0', '-o', output])
+    finally:
+        Config.DATABASE_URL = original
+    with open(output, encoding='utf-8') as file:
+        report = json.load(file)
+
+    assert code == 0 and report['failures'] == []
+    assert report['seeded']['tables'] == 40
+    endpoints = report['levels'][0]['endpoints']
+    assert set(endpoints) == {'list_tables', 'table_detail', 'overview'}
+    assert all(stats['errors'] == 0 and stats['statements_max'] for stats in endpoints.values())
+
+
+if __name__ == '__main__':
+    print("1. 测试汇总和阈值判定...")
+    test_summarize_and_thresholds()
+    print("[OK] 完成")
+    print("2. 测试进程内运行...")
+    test_in_process_run()
+    print("[OK] 完成")
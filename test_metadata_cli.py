@@ -0,0 +1,49 @@
+"""
+命令行工具测试脚本
+
+验证退出码的判定，以及抽取包装函数记录各数据源的结果（抽取失败时不向编排器抛出异常）
+"""
+import os
+import sys
+
+sys.path.insert(0, os.path.dirname(os.path.abspath(__file__)))
+
+import metadata_cli
+from metadata_cli import ProgressReporter, exit_code, EXIT_SUCCESS, EXIT_FAILED, EXIT_PARTIAL
+
+
+def test_exit_code():
+    assert exit_code([{'status': 'success'}, {'status': 'success'}]) == EXIT_SUCCESS
+    assert exit_code([{'status': 'success'}, {'status': 'partial_success'}]) == EXIT_PARTIAL
+    assert exit_code([{'status': 'partial_success'}, {'status': 'failed'}]) == EXIT_FAILED
+
+
+def test_reporter_collects_results():
+    def fake_extraction(source_id, on_history_created=None, **kwargs):
+        on_history_created(source_id * 10)
+        if source_id == 2:
+            raise RuntimeError('无法连接到数据库')
+        return {'status': 'success', 'datasource_id': source_id, 'tables_count': 3, 'duration': 1}
+
+    original = metadata_cli.run_extraction
+    metadata_cli.run_extraction = fake_extraction
+    try:
+        reporter = ProgressReporter(total=2, interval=0)
+        extract = reporter.extract({1: '订单库', 2: '日志库'})
+        assert extract(1, task_type='full')['status'] == 'success'
+        assert extract(2, task_type='full')['status'] == 'failed'
+    finally:
+        metadata_cli.run_extraction = original
+
+    assert reporter.results[2]['message'] == '无法连接到数据库'
+    assert reporter.running == {}
+    assert exit_code(list(reporter.results.values())) == EXIT_FAILED
+
+
+if __name__ == '__main__':
+    print("1. 测试退出码...")
+    test_exit_code()
+    print("[OK] 完成")
+    print("2. 测试抽取结果收集...")
+    test_reporter_collects_results()
+    print("[OK] 完成")
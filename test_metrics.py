@@ -0,0 +1,72 @@
+"""
+运行指标测试脚本
+
+验证按线程分片的计数器在多线程下汇总正确（包括已退出线程的分片）、直方图的文本格式，
+以及未实现分片合并的指标类型在创建时即报错
+"""
+import os
+import sys
+import threading
+
+sys.path.insert(0, os.path.dirname(os.path.abspath(__file__)))
+
+from metrics import MetricsRegistry, _Sharded
+
+
+def test_sharded_counter():
+    registry = MetricsRegistry()
+    counter = registry.counter('test_total', '测试计数', ('source',))
+
+    def work():
+        for _ in range(1000):
+            counter.inc(source='a')
+
+    threads = [threading.Thread(target=work) for _ in range(8)]
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join()
+    counter.inc(5, source='b')
+
+    assert counter.values() == {('a',): 8000, ('b',): 5}
+    # 已退出线程的分片合并后数值不变
+    assert counter.values() == {('a',): 8000, ('b',): 5}
+    assert 'test_total{source="a"} 8000' in registry.render()
+
+
+def test_histogram_render():
+    registry = MetricsRegistry()
+    histogram = registry.histogram('test_seconds', '测试耗时', buckets=(0.1, 1.0))
+    for value in (0.05, 0.5, 0.5, 3):
+        histogram.observe(value)
+
+    text = registry.render()
+    assert '# TYPE test_seconds histogram' in text
+    assert 'test_seconds_bucket{le="0.1"} 1' in text
+    assert 'test_seconds_bucket{le="1.0"} 3' in text
+    assert 'test_seconds_bucket{le="+Inf"} 4' in text
+    assert 'test_seconds_count 4' in text
+
+
+def test_sharded_requires_merge():
+    class Incomplete(_Sharded):
+        pass
+
+    try:
+        Incomplete()
+    except TypeError as e:
+        assert '_merge' in str(e)
+    else:
+        raise AssertionError('未实现 _merge 的子类应在创建时报错')
+
+
+if __name__ == '__main__':
+    print("1. 测试多线程计数...")
+    test_sharded_counter()
+    print("[OK] 完成")
+    print("2. 测试直方图格式...")
+    test_histogram_render()
+    print("[OK] 完成")
+    print("3. 测试分片合并为抽象方法...")
+    test_sharded_requires_merge()
+    print("[OK] 完成")
@@ -0,0 +1,58 @@
+"""
+查询剖析器测试脚本
+
+在SQLite引擎上挂载剖析器，验证语句按阶段和指纹汇总，出错的语句计入错误数
+"""
+import os
+import sys
+
+from sqlalchemy import create_engine, text
+
+sys.path.insert(0, os.path.dirname(os.path.abspath(__file__)))
+
+from query_profiler import QueryProfiler, fingerprint
+
+
+def test_fingerprint_merges_tables():
+    assert fingerprint('SELECT COUNT(*) FROM `orders`') == fingerprint('SELECT  COUNT(*) FROM `users`')
+    assert fingerprint("SELECT * FROM t WHERE name = 'a' AND id = 10") == 'SELECT * FROM t WHERE name = ? AND id = ?'
+
+
+def test_profile_by_phase():
+    engine = create_engine('sqlite:///:memory:')
+    profiler = QueryProfiler()
+    profiler.instrument(engine)
+
+    with engine.connect() as conn:
+        with profiler.phase('table_list'):
+            conn.execute(text("SELECT name FROM sqlite_master")).fetchall()
+        for table in ('a', 'b', 'c'):
+            with profiler.phase('row_count'):
+                conn.execute(text(f'SELECT COUNT(*) FROM (SELECT 1) AS "{table}"')).scalar()
+        try:
+            with profiler.phase('columns'):
+                conn.execute(text("SELECT * FROM missing_table"))
+        except Exception:
+            pass
+        profiler.record_table('a', 0.5)
+
+    profile = profiler.profile()
+    phases = {phase['phase']: phase for phase in profile['phases']}
+    assert profile['statement_count'] == 5
+    assert profile['error_count'] == 1
+    assert phases['row_count']['calls'] == 3
+    assert phases['row_count']['statements']['count'] == 3
+    assert phases['columns']['failed_calls'] == 1
+    # 三个表的 COUNT(*) 归并为同一个指纹
+    row_count_statements = [stmt for stmt in profile['statements'] if stmt['phase'] == 'row_count']
+    assert len(row_count_statements) == 1 and row_count_statements[0]['count'] == 3
+    assert profile['slowest_tables'] == [{'table_name': 'a', 'duration_ms': 500.0}]
+
+
+if __name__ == '__main__':
+    print("1. 测试语句指纹...")
+    test_fingerprint_merges_tables()
+    print("[OK] 完成")
+    print("2. 测试按阶段汇总...")
+    test_profile_by_phase()
+    print("[OK] 完成")
@@ -0,0 +1,54 @@
+"""
+关联关系图测试脚本
+
+验证最短关联路径（包括逆着外键方向的跳）和影响范围的深度限制
+"""
+import os
+import sys
+
+sys.path.insert(0, os.path.dirname(os.path.abspath(__file__)))
+
+from relationship_graph import RelationshipGraph
+
+
+def _graph():
+    # orders -> users, orders -> products, reviews -> products, products -> vendors
+    tables = {1: 'users', 2: 'orders', 3: 'products', 4: 'reviews', 5: 'vendors', 6: 'logs'}
+    edges = [
+        (2, 'user_id', 1, 'id', 'fk_orders_user', 'FOREIGN KEY', 1.0),
+        (2, 'product_id', 3, 'id', 'fk_orders_product', 'FOREIGN KEY', 1.0),
+        (4, 'product_id', 3, 'id', 'fk_reviews_product', 'FOREIGN KEY', 1.0),
+        (3, 'vendor_id', 5, 'id', 'fk_products_vendor', 'FOREIGN KEY', 1.0),
+    ]
+    return RelationshipGraph(1, 1, tables, edges)
+
+
+def test_shortest_path():
+    graph = _graph()
+    path = graph.shortest_path(1, 4, max_depth=5)
+    assert [(hop['from_table'], hop['to_table'], hop['direction']) for hop in path] == [
+        ('users', 'orders', 'reverse'), ('orders', 'products', 'forward'), ('products', 'reviews', 'reverse')]
+    assert path[0]['from_column'] == 'id' and path[0]['to_column'] == 'user_id'
+    assert graph.shortest_path(1, 4, max_depth=2) is None
+    assert graph.shortest_path(1, 6, max_depth=5) is None
+    assert graph.shortest_path(3, 3, max_depth=5) == []
+
+
+def test_impact():
+    graph = _graph()
+    upstream = graph.impact(5, 'upstream', max_depth=5, limit=100)
+    assert [(table['table_name'], table['depth']) for table in upstream['tables']] == [
+        ('products', 1), ('orders', 2), ('reviews', 2)]
+    assert len(graph.impact(5, 'upstream', max_depth=1, limit=100)['tables']) == 1
+    assert graph.impact(5, 'upstream', max_depth=5, limit=2)['truncated']
+    downstream = graph.impact(2, 'downstream', max_depth=5, limit=100)
+    assert {table['table_name'] for table in downstream['tables']} == {'users', 'products', 'vendors'}
+
+
+if __name__ == '__main__':
+    print("1. 测试最短关联路径...")
+    test_shortest_path()
+    print("[OK] 完成")
+    print("2. 测试影响范围...")
+    test_impact()
+    print("[OK] 完成")
@@ -0,0 +1,60 @@
+"""
+关联关系推断测试脚本
+
+验证字段名到表名的规范化匹配，以及候选关系对已声明外键、类型不兼容字段的过滤
+"""
+import os
+import sys
+
+sys.path.insert(0, os.path.dirname(os.path.abspath(__file__)))
+
+from relationship_inference import referenced_key, table_keys, find_candidates
+
+
+def _table(name, columns):
+    return {'table_name': name, 'schema_name': 'shop',
+            'columns': {column.lower(): (column, data_type) for column, data_type in columns}}
+
+
+def test_name_matching():
+    assert referenced_key('user_id') == 'user'
+    assert referenced_key('userId') == 'user'
+    assert referenced_key('category_id') == 'category'
+    assert referenced_key('id') is None
+    assert referenced_key('name') is None
+    assert ('user', False) in table_keys('users')
+    assert ('category', True) in table_keys('dim_categories')
+
+
+def test_find_candidates():
+    tables = {
+        1: _table('users', [('id', 'bigint')]),
+        2: _table('orders', [('id', 'bigint'), ('user_id', 'int'), ('product_id', 'varchar(32)'), ('coupon_id', 'int')]),
+        3: _table('t_products', [('id', 'int')]),
+        4: _table('coupons', [('id', 'int')]),
+    }
+    candidates = {(c['table_id'], c['column_name']): c for c in find_candidates(tables, declared={(2, 'coupon_id')})}
+
+    user = candidates[(2, 'user_id')]
+    assert user['referenced_table_id'] == 1 and user['referenced_column_name'] == 'id'
+    # 字符串字段不能引用整数主键
+    assert (2, 'product_id') not in candidates
+    # 已声明外键的字段不再推断
+    assert (2, 'coupon_id') not in candidates
+
+    tables[2]['columns']['product_id'] = ('product_id', 'int')
+    candidates = {(c['table_id'], c['column_name']): c for c in find_candidates(tables, set())}
+    # 去掉表名前缀才匹配上的候选置信度较低
+    assert candidates[(2, 'product_id')]['referenced_table_id'] == 3
+    assert candidates[(2, 'product_id')]['confidence'] < candidates[(2, 'coupon_id')]['confidence']
+    # 类型兼容但不完全相同（int -> bigint）的候选置信度较低
+    assert user['confidence'] < candidates[(2, 'coupon_id')]['confidence']
+
+
+if __name__ == '__main__':
+    print("1. 测试名称匹配...")
+    test_name_matching()
+    print("[OK] 完成")
+    print("2. 测试候选关系...")
+    test_find_candidates()
+    print("[OK] 完成")
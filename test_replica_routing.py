@@ -0,0 +1,141 @@
+"""
+读写分离测试脚本
+
+用两个 SQLite 文件分别模拟主库和只读副本（副本中的表注释不同），验证：
+GET 请求读副本、写请求和写入后的读发往主库、副本延迟过大或不可用时回退到主库，
+以及副本检查缓慢时其他请求不排队等待
+"""
+import os
+import shutil
+import sys
+import tempfile
+import threading
+import time
+
+sys.path.insert(0, os.path.dirname(os.path.abspath(__file__)))
+
+import config
+import db_manager
+from db_manager import init_db_manager, use_read_replica, get_db_session
+from models import init_database, DataSource, TableMetadata
+
+
+def _setup():
+    work_dir = tempfile.mkdtemp()
+    primary = os.path.join(work_dir, 'primary.db')
+    replica = os.path.join(work_dir, 'replica.db')
+    init_db_manager(f"sqlite:///{primary}")
+    init_database()
+    with get_db_session() as session:
+        source = DataSource(name='订单库', type='mysql', host='localhost', port=3306, username='u', password='',
+                            database='orders')
+        session.add(source)
+        session.flush()
+        table = TableMetadata(table_name='orders', schema_name='orders', comment='主库', datasource_id=source.id)
+        session.add(table)
+        session.flush()
+        table_id = table.id
+    db_manager.db_manager.dispose()
+    shutil.copy(primary, replica)
+    manager = init_db_manager(f"sqlite:///{primary}", replica_urls=[f"sqlite:///{replica}"])
+    with manager.replicas[0].begin() as conn:
+        conn.execute(db_manager.text("UPDATE table_metadata SET comment = '副本'"))
+    return manager, table_id
+
+
+def _comment(table_id):
+    with get_db_session() as session:
+        return session.get(TableMetadata, table_id).comment
+
+
+def test_session_routing():
+    original = db_manager.db_manager
+    try:
+        manager, table_id = _setup()
+        assert _comment(table_id) == '主库'
+        with use_read_replica():
+            assert _comment(table_id) == '副本'
+            with get_db_session() as session:
+                # 会话中写入后，之后的读留在主库
+                table = session.get(TableMetadata, table_id)
+                table.row_count = 10
+                session.flush()
+                assert session.query(TableMetadata.comment).scalar() == '主库'
+
+            manager._replica_lag = lambda engine: config.Config.DB_REPLICA_MAX_LAG + 1
+            manager._replica_state.clear()
+            assert _comment(table_id) == '主库'
+            assert manager.pool_status()['replicas'][0]['healthy'] is False
+    finally:
+        db_manager.db_manager.dispose()
+        db_manager.db_manager = original
+
+
+def test_slow_check_does_not_block():
+    original = db_manager.db_manager
+    try:
+        manager, _ = _setup()
+        release = threading.Event()
+        checks = []
+
+        def slow_lag(engine):
+            checks.append(engine)
+            release.wait(5)  # 模拟连接不可达的副本等待超时
+            return 0
+
+        manager._replica_lag = slow_lag
+        picked = []
+        checker = threading.Thread(target=lambda: picked.append(manager.pick_replica()))
+        checker.start()
+        while not checks:
+            time.sleep(0.01)
+
+        # 检查进行中：其他线程立即回退到主库，不重复检查
+        started = time.monotonic()
+        assert manager.pick_replica() is None
+        assert time.monotonic() - started < 1 and len(checks) == 1
+
+        release.set()
+        checker.join(5)
+        assert picked == [manager.replicas[0]]
+        assert manager.pick_replica() is manager.replicas[0] and len(checks) == 1
+    finally:
+        db_manager.db_manager.dispose()
+        db_manager.db_manager = original
+
+
+def test_request_routing():
+    original = db_manager.db_manager
+    original_url = config.Config.DATABASE_URL
+    try:
+        manager, table_id = _setup()
+        config.Config.DATABASE_URL = manager.database_url
+        from api import create_app
+        app = create_app()
+        assert db_manager.db_manager is manager
+        client = app.test_client()
+        with client.session_transaction() as sess:
+            sess['user_id'] = 1
+            sess['role'] = 'admin'
+        assert client.get(f'/api/tables/{table_id}').json['comment'] == '副本'
+        assert client.put(f'/api/tables/{table_id}/comment', json={'comment': '新注释'}).status_code == 200
+        assert client.get(f'/api/tables/{table_id}').json['comment'] == '新注释'
+        with client.session_transaction() as sess:
+            sess['db_last_write_at'] = 0
+        assert client.get(f'/api/tables/{table_id}').json['comment'] == '副本'
+    finally:
+        config.Config.DATABASE_URL = original_url
+        db_manager.db_manager.dispose()
+        db_manager.db_manager = original
+
+
+if __name__ == '__main__':
+    print("1. 测试会话级读写路由...")
+    test_session_routing()
+    print("[OK] 完成")
+    print("2. 测试副本检查不阻塞其他请求...")
+    test_slow_check_does_not_block()
+    print("[OK] 完成")
+    print("3. 测试请求级读写路由...")
+    test_request_routing()
+    print("[OK] 完成")
@@ -0,0 +1,65 @@
+"""
+表结构比较测试脚本
+
+验证类型规范化、兼容性分类以及两个结构的差异事件
+"""
+import os
+import sys
+
+sys.path.insert(0, os.path.dirname(os.path.abspath(__file__)))
+
+from schema_diff import normalize_type, classify_type_change, iter_schema_diff
+
+
+def _classify(left, right):
+    return classify_type_change(normalize_type(left), normalize_type(right))
+
+
+def test_classify_type_change():
+    assert normalize_type('int(11) unsigned') == normalize_type('INTEGER')
+    assert normalize_type('character varying(20)') == ('varchar', (20,))
+    assert _classify('datetime', 'timestamp') == 'equivalent'
+    assert _classify('tinyint(1)', 'boolean') == 'equivalent'
+    assert _classify('int', 'bigint') == 'widening'
+    assert _classify('varchar(255)', 'string') == 'widening'
+    assert _classify('decimal(10,2)', 'decimal(12,2)') == 'widening'
+    assert _classify('varchar(50)', 'varchar(20)') == 'narrowing'
+    assert _classify('decimal(10,2)', 'decimal(10,4)') == 'narrowing'
+    assert _classify('int', 'decimal(10,0)') == 'widening'
+    assert _classify('datetime', 'varchar(30)') == 'incompatible'
+
+
+def test_iter_schema_diff():
+    def table(columns, schema_name='db'):
+        return {'schema_name': schema_name, 'comment': '',
+                'columns': {name: {'data_type': data_type, 'is_nullable': 'YES'} for name, data_type in columns.items()}}
+
+    left = {'Orders': table({'id': 'int(11)', 'amount': 'decimal(10,2)', 'note': 'text'}),
+            'users': table({'id': 'int'}), 'legacy': table({'id': 'int'})}
+    right = {'orders': table({'ID': 'INTEGER', 'amount': 'decimal(18,2)', 'status': 'varchar(20)'}, 'dw'),
+             'users': table({'id': 'int'}, 'dw'), 'events': table({'id': 'bigint'}, 'dw')}
+
+    events = list(iter_schema_diff(left, right))
+    summary = events[-1]
+    assert summary['type'] == 'summary'
+    assert summary['tables_identical'] == 1
+    assert summary['tables_only_left'] == 1 and summary['tables_only_right'] == 1
+    changed = [event for event in events if event['type'] == 'table_changed']
+    assert len(changed) == 1
+    assert changed[0]['columns_only_left'] == ['note']
+    assert changed[0]['columns_only_right'] == ['status']
+    assert changed[0]['columns_changed'] == [{'column': 'amount', 'left_type': 'decimal(10,2)',
+                                              'right_type': 'decimal(18,2)', 'compatibility': 'widening'}]
+
+    # 按 模式名.表名 匹配时两侧没有相同的表
+    summary = list(iter_schema_diff(left, right, match_schema=True))[-1]
+    assert summary['tables_only_left'] == 3 and summary['tables_only_right'] == 3
+
+
+if __name__ == '__main__':
+    print("1. 测试类型兼容性分类...")
+    test_classify_type_change()
+    print("[OK] 完成")
+    print("2. 测试结构差异...")
+    test_iter_schema_diff()
+    print("[OK] 完成")
@@ -0,0 +1,55 @@
+"""
+表结构版本测试脚本
+
+验证结构增量的计算和应用：对任意两个结构，将增量应用到旧结构上应得到新结构
+"""
+import copy
+import os
+import sys
+
+sys.path.insert(0, os.path.dirname(os.path.abspath(__file__)))
+
+from schema_history import diff_schemas, apply_delta, is_empty_delta
+
+
+def _column(data_type, position):
+    return {'data_type': data_type, 'is_nullable': 'YES', 'default_value': None,
+            'column_comment': '', 'ordinal_position': position}
+
+
+OLD = {
+    'orders': {'schema_name': 'shop', 'comment': '订单', 'columns': {
+        'id': _column('int', 1), 'amount': _column('decimal(10,2)', 2), 'note': _column('varchar(50)', 3)}},
+    'legacy': {'schema_name': 'shop', 'comment': '', 'columns': {'id': _column('int', 1)}},
+}
+NEW = {
+    'orders': {'schema_name': 'shop', 'comment': '订单表', 'columns': {
+        'id': _column('bigint', 1), 'amount': _column('decimal(10,2)', 2), 'status': _column('varchar(20)', 3)}},
+    'users': {'schema_name': 'shop', 'comment': '用户', 'columns': {'id': _column('int', 1)}},
+}
+
+
+def test_diff_schemas():
+    delta = diff_schemas(OLD, NEW)
+    assert list(delta['added']) == ['users']
+    assert delta['removed'] == ['legacy']
+    change = delta['altered']['orders']
+    assert change['fields'] == {'comment': ['订单', '订单表']}
+    assert change['columns_altered'] == {'id': {'data_type': ['int', 'bigint']}}
+    assert list(change['columns_added']) == ['status']
+    assert change['columns_removed'] == ['note']
+    assert is_empty_delta(diff_schemas(NEW, copy.deepcopy(NEW)))
+
+
+def test_apply_delta():
+    assert apply_delta(copy.deepcopy(OLD), diff_schemas(OLD, NEW)) == NEW
+    assert apply_delta(copy.deepcopy(NEW), diff_schemas(NEW, OLD)) == OLD
+
+
+if __name__ == '__main__':
+    print("1. 测试结构比较...")
+    test_diff_schemas()
+    print("[OK] 完成")
+    print("2. 测试应用增量...")
+    test_apply_delta()
+    print("[OK] 完成")
@@ -0,0 +1,135 @@
+"""
+数据源限流测试脚本
+
+使用可控的时钟验证令牌桶的等待时间和补充、异步驱动下按语句等待令牌、延迟EWMA的退避与恢复、
+跨零点的静默时段，以及限流配置的校验
+"""
+import asyncio
+import os
+import sys
+import types
+from datetime import datetime
+
+import pytest
+from sqlalchemy import create_engine, text
+from sqlalchemy.util import greenlet_spawn
+
+sys.path.insert(0, os.path.dirname(os.path.abspath(__file__)))
+
+import source_throttle
+from source_throttle import SourceThrottle, parse_throttle_config, ADJUST_INTERVAL, WARMUP_SAMPLES
+from exceptions import ValidationException
+
+
+def _throttle(monkeypatch, **config):
+    clock = [100.0]
+    monkeypatch.setattr(source_throttle, 'time', types.SimpleNamespace(monotonic=lambda: clock[0]))
+    return SourceThrottle(1, parse_throttle_config(config)), clock
+
+
+def test_token_bucket(monkeypatch):
+    throttle, clock = _throttle(monkeypatch, max_qps=2)
+    with throttle._lock:
+        # 桶容量为2，第三条语句需要等半秒，余额为负时继续累加等待
+        assert [throttle._reserve() for _ in range(4)] == [0, 0, 0.5, 1.0]
+        clock[0] += 1.5  # 补充3个令牌，余额 -2 + 3 = 1
+        assert throttle._reserve() == 0
+        clock[0] += 10  # 补充不超过桶容量
+        assert [throttle._reserve() for _ in range(3)] == [0, 0, 0.5]
+    assert throttle.statements == 8 and throttle.wait_seconds == 2.0
+
+    unlimited, _ = _throttle(monkeypatch, max_qps=0)
+    with unlimited._lock:
+        assert all(unlimited._reserve() == 0 for _ in range(100))
+
+
+def test_async_statements_wait(monkeypatch):
+    throttle, _ = _throttle(monkeypatch, max_qps=2)
+    delays = []
+
+    async def fake_sleep(delay):
+        delays.append(delay)
+
+    monkeypatch.setattr(source_throttle, 'asyncio', types.SimpleNamespace(sleep=fake_sleep))
+    engine = create_engine('sqlite://')
+    throttle.instrument(engine, blocking=False)
+
+    def statements():
+        with engine.connect() as conn:
+            for _ in range(5):
+                conn.execute(text('SELECT 1'))
+
+    # 与 AsyncConnection.run_sync 相同，在 greenlet 中执行同步代码，每条语句都在事件循环中等待令牌
+    asyncio.run(greenlet_spawn(statements))
+    assert delays == [0.5, 1.0, 1.5]
+    assert throttle.statements == 5 and throttle._in_flight == 0
+
+
+def test_backoff_and_recovery(monkeypatch):
+    throttle, _ = _throttle(monkeypatch, latency_factor=3)
+    with throttle._lock:
+        for _ in range(WARMUP_SAMPLES):
+            throttle._observe(0.01)
+        assert throttle.backoff_level == 0 and throttle._backoff_delay() == 0
+
+        # 延迟持续升高：每 ADJUST_INTERVAL 个样本升一级
+        for _ in range(ADJUST_INTERVAL * 3):
+            throttle._observe(0.2)
+        assert throttle.backoff_level == 3
+        assert throttle._backoff_delay() == source_throttle.BACKOFF_BASE_DELAY * 8
+        # 退避期间基线不被抬高
+        assert throttle._baseline_latency == pytest.approx(0.01)
+
+        # 延迟恢复后逐级解除
+        for _ in range(ADJUST_INTERVAL * 10):
+            throttle._observe(0.01)
+        assert throttle.backoff_level == 0
+    actions = [decision['action'] for decision in throttle.summary_since({'seq': 0, 'statements': 0,
+                                                                          'wait_seconds': 0})['decisions']]
+    # 快线回落前可能再升一级，之后逐级解除到0
+    assert actions[:3] == ['backoff'] * 3 and actions[-1] == 'recover'
+    assert actions.count('backoff') == actions.count('recover')
+
+
+def test_quiet_hours(monkeypatch):
+    throttle, _ = _throttle(monkeypatch, quiet_hours='22:00-06:00, 12:00-12:30')
+    at = lambda hour, minute: datetime(2026, 1, 1, hour, minute)
+    assert throttle.in_quiet_hours(at(22, 0)) and throttle.in_quiet_hours(at(23, 59))
+    assert throttle.in_quiet_hours(at(0, 0)) and throttle.in_quiet_hours(at(5, 59))
+    assert not throttle.in_quiet_hours(at(6, 0)) and not throttle.in_quiet_hours(at(21, 59))
+    assert throttle.in_quiet_hours(at(12, 15)) and not throttle.in_quiet_hours(at(12, 30))
+
+    no_quiet, _ = _throttle(monkeypatch, quiet_hours=[])
+    assert not no_quiet.in_quiet_hours(at(3, 0))
+
+
+def test_parse_throttle_config():
+    config = parse_throttle_config('{"max_qps": 5, "quiet_hours": ["01:00-02:00"]}')
+    assert config['max_qps'] == 5 and config['quiet_hours'] == ['01:00-02:00']
+    for raw in ({'quiet_hours': 5}, {'quiet_hours': {'start': '01:00'}}, {'quiet_hours': [1]},
+                {'quiet_hours': '25:00-01:00'}, {'max_qps': -1}, {'max_qps': 'abc'}, {'latency_factor': 1},
+                '[1, 2]', 'not json'):
+        with pytest.raises(ValidationException):
+            parse_throttle_config(raw)
+
+
+if __name__ == '__main__':
+    print("1. 测试令牌桶...")
+    with pytest.MonkeyPatch.context() as patch:
+        test_token_bucket(patch)
+    print("[OK] 完成")
+    print("2. 测试异步驱动按语句等待令牌...")
+    with pytest.MonkeyPatch.context() as patch:
+        test_async_statements_wait(patch)
+    print("[OK] 完成")
+    print("3. 测试退避和恢复...")
+    with pytest.MonkeyPatch.context() as patch:
+        test_backoff_and_recovery(patch)
+    print("[OK] 完成")
+    print("4. 测试静默时段...")
+    with pytest.MonkeyPatch.context() as patch:
+        test_quiet_hours(patch)
+    print("[OK] 完成")
+    print("5. 测试限流配置校验...")
+    test_parse_throttle_config()
+    print("[OK] 完成")
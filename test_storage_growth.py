@@ -0,0 +1,44 @@
+"""
+表容量增长测试脚本
+
+验证汇总区间的划分和按时间范围选择粒度
+"""
+import os
+import sys
+from datetime import datetime
+
+sys.path.insert(0, os.path.dirname(os.path.abspath(__file__)))
+
+from storage_growth import bucket_start, pick_granularity
+from exceptions import ValidationException
+
+
+def test_bucket_start():
+    moment = datetime(2024, 5, 16, 13, 45, 10, 500)  # 周四
+    assert bucket_start(moment, 'raw') == datetime(2024, 5, 16, 13, 45, 10)
+    assert bucket_start(moment, 'day') == datetime(2024, 5, 16)
+    assert bucket_start(moment, 'week') == datetime(2024, 5, 13)
+    assert bucket_start(moment, 'month') == datetime(2024, 5, 1)
+
+
+def test_pick_granularity():
+    assert pick_granularity(7) == 'raw'
+    assert pick_granularity(7, rollup_only=True) == 'day'
+    assert pick_granularity(365) == 'day'
+    assert pick_granularity(3 * 365) == 'week'
+    assert pick_granularity(10 * 365) == 'month'
+    assert pick_granularity(7, 'month') == 'month'
+    try:
+        pick_granularity(7, 'raw', rollup_only=True)
+        assert False, '汇总查询不应接受 raw 粒度'
+    except ValidationException:
+        pass
+
+
+if __name__ == '__main__':
+    print("1. 测试汇总区间划分...")
+    test_bucket_start()
+    print("[OK] 完成")
+    print("2. 测试粒度选择...")
+    test_pick_granularity()
+    print("[OK] 完成")